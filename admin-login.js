@@ -51,7 +51,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
 
                 // Success
-                sessionStorage.setItem('jwt_token', data.data.token);
+                storeSessionTokens(data.data);
                 sessionStorage.setItem('user_data', JSON.stringify(userData));
 
                 loginBtn.style.backgroundColor = '#10b981';
@@ -40,8 +40,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Logout
     document.getElementById('admin-logout-btn').addEventListener('click', () => {
-        sessionStorage.removeItem('jwt_token');
-        sessionStorage.removeItem('user_data');
+        endSession(API_BASE_URL);
         window.location.href = 'dashboard.html';
     });
 });
@@ -112,7 +111,7 @@ async function loadDashboardStats() {
     // We can reuse lists to get counts for now
     try {
         const [usersRes, reportsRes, modelsRes] = await Promise.all([
-            fetch(`${API_BASE_URL}/admin/users/`, { headers: { 'Authorization': `Bearer ${authToken}` } }),
+            fetch(`${API_BASE_URL}/admin/users/?limit=1`, { headers: { 'Authorization': `Bearer ${authToken}` } }),
             fetch(`${API_BASE_URL}/admin/reports/`, { headers: { 'Authorization': `Bearer ${authToken}` } }),
             fetch(`${API_BASE_URL}/admin/models/`, { headers: { 'Authorization': `Bearer ${authToken}` } })
         ]);
@@ -122,7 +121,7 @@ async function loadDashboardStats() {
         const modelsData = await modelsRes.json();
 
         if (usersData.status === 'success') {
-            document.getElementById('dash-total-users').textContent = usersData.data.length.toLocaleString();
+            document.getElementById('dash-total-users').textContent = usersData.data.total.toLocaleString();
         }
         if (reportsData.status === 'success') {
             document.getElementById('dash-total-reports').textContent = reportsData.data.length.toLocaleString();
@@ -279,15 +278,19 @@ function processReportsByRange(reports, range) {
 }
 
 // User Management
+// The list is paginated and searched server-side; "Load more" follows next_cursor
 let allUsers = [];
+let usersNextCursor = null;
+let userSearchTerm = '';
+let userSearchTimer = null;
 
-function renderUsers(usersToRender) {
+function renderUsers(usersToRender, offset = 0) {
     const list = document.getElementById('users-list');
-    list.innerHTML = usersToRender.map((user, index) => `
+    const rows = usersToRender.map((user, index) => `
         <tr>
             <td>
                 <div class="user-info-cell">
-                    <div class="avatar-small">${index + 1}</div>
+                    <div class="avatar-small">${offset + index + 1}</div>
                     <div>
                         <strong>${user.email}</strong>
                         <span class="sub-text" style="color:var(--text-dim);font-size:0.8rem">${user.first_name || ''} ${user.last_name || ''}</span>
@@ -303,35 +306,43 @@ function renderUsers(usersToRender) {
             </td>
         </tr>
     `).join('');
+    if (offset === 0) list.innerHTML = rows;
+    else list.insertAdjacentHTML('beforeend', rows);
 }
 
-async function loadUsers() {
+async function loadUsers(append = false) {
+    const params = new URLSearchParams({ limit: 50 });
+    if (userSearchTerm) params.set('q', userSearchTerm);
+    if (append && usersNextCursor) params.set('cursor', usersNextCursor);
     try {
-        const response = await fetch(`${API_BASE_URL}/admin/users/`, {
+        const response = await fetch(`${API_BASE_URL}/admin/users/?${params}`, {
             headers: { 'Authorization': `Bearer ${authToken}` }
         });
         const data = await response.json();
 
         if (data.status === 'success') {
-            allUsers = data.data;
-            renderUsers(allUsers);
+            const offset = append ? allUsers.length : 0;
+            allUsers = append ? allUsers.concat(data.data.users) : data.data.users;
+            usersNextCursor = data.data.next_cursor;
+            renderUsers(data.data.users, offset);
+            document.getElementById('users-load-more').style.display = usersNextCursor ? '' : 'none';
         }
     } catch (error) {
         console.error('Error loading users:', error);
     }
 }
 
-// Search functionality
+// Search functionality (server-side, debounced)
 document.getElementById('user-search').addEventListener('input', (e) => {
-    const searchTerm = e.target.value.toLowerCase();
-    const filtered = allUsers.filter(user =>
-        user.email.toLowerCase().includes(searchTerm) ||
-        (user.first_name && user.first_name.toLowerCase().includes(searchTerm)) ||
-        (user.last_name && user.last_name.toLowerCase().includes(searchTerm))
-    );
-    renderUsers(filtered);
+    clearTimeout(userSearchTimer);
+    userSearchTimer = setTimeout(() => {
+        userSearchTerm = e.target.value.trim();
+        loadUsers();
+    }, 300);
 });
 
+document.getElementById('users-load-more').addEventListener('click', () => loadUsers(true));
+
 // Model Moderation
 async function loadModels() {
     try {
@@ -400,6 +411,8 @@ async function loadModels() {
                     classesContainer.style.display = 'none';
                 }
             }
+
+            renderCanary(data.data.canary, data.data.canary_history || []);
         }
     } catch (error) {
         console.error('Error loading models:', error);
@@ -407,6 +420,76 @@ async function loadModels() {
     }
 }
 
+function renderCanary(canary, history) {
+    const details = document.getElementById('canary-details');
+    const actions = document.getElementById('canary-actions');
+    const historyEl = document.getElementById('canary-history');
+    if (!details || !actions) return;
+
+    if (canary) {
+        const metricRow = (label, arm) => `
+            <div class="model-detail-row">
+                <span>${label}:</span>
+                <strong>${arm.samples} scans | p95 ${arm.p95_latency_ms ?? '--'} ms | errors ${arm.error_rate !== null ? (arm.error_rate * 100).toFixed(1) + '%' : '--'}</strong>
+            </div>`;
+        details.innerHTML = `
+            <div class="model-detail-row">
+                <span>Candidate:</span> <strong>${canary.candidate_model}</strong>
+            </div>
+            <div class="model-detail-row">
+                <span>Traffic:</span> <strong>${canary.percentage}% (steps ${canary.steps.join(' → ')}%)</strong>
+            </div>
+            ${metricRow('Baseline', canary.metrics.baseline)}
+            ${metricRow('Canary', canary.metrics.canary)}
+        `;
+        actions.innerHTML = `
+            <button class="btn-primary" onclick="canaryAction('advance')">Next Step</button>
+            <button class="btn-primary" onclick="canaryAction('promote')">Promote</button>
+            <button class="btn-primary" onclick="canaryAction('rollback')">Roll Back</button>
+        `;
+        historyEl.innerHTML = canary.history.map(e => `
+            <div class="model-detail-row">
+                <span>${new Date(e.created_at).toLocaleString()}</span>
+                <strong>${e.action} → ${e.percentage}%${e.detail && e.detail.reason ? ' (' + e.detail.reason + ')' : ''}</strong>
+            </div>
+        `).join('');
+    } else {
+        details.innerHTML = '<p>No active canary.</p>';
+        actions.innerHTML = '<button class="btn-primary" onclick="canaryAction(\'start\')">Start Canary with Selected Model</button>';
+        historyEl.innerHTML = history.map(r => `
+            <div class="model-detail-row">
+                <span>${r.candidate_model}</span>
+                <strong>${r.status} (${new Date(r.updated_at).toLocaleDateString()})</strong>
+            </div>
+        `).join('');
+    }
+}
+
+async function canaryAction(action) {
+    const body = { action };
+    if (action === 'start') {
+        const selected = document.querySelector('input[name="global-model"]:checked');
+        if (!selected) return;
+        body.model_name = selected.value;
+    }
+
+    try {
+        const response = await fetch(`${API_BASE_URL}/admin/models/canary/`, {
+            method: 'POST',
+            headers: {
+                'Authorization': `Bearer ${authToken}`,
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(body)
+        });
+        const data = await response.json();
+        alert(data.message || data.error || 'Canary updated');
+        loadModels();
+    } catch (error) {
+        alert('Network error');
+    }
+}
+
 function deleteModel(modelName) {
     if (!confirm(`Are you sure you want to delete "${modelName}" ? This action cannot be undone.`)) {
         return;
@@ -607,25 +690,39 @@ async function loadReports() {
 }
 
 // Doctor Management
+// Both lists are paginated; each "Load more" follows its own next_cursor
+const doctorLists = {
+    pending: { verified: 'false', nextCursor: null, render: renderPendingDoctors },
+    active: { verified: 'true', nextCursor: null, render: renderActiveDoctors }
+};
+
+async function fetchDoctorPage(kind, cursor = null) {
+    const params = new URLSearchParams({ verified: doctorLists[kind].verified, limit: 50 });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${API_BASE_URL}/admin/doctors/?${params}`, {
+        headers: { 'Authorization': `Bearer ${authToken}` }
+    });
+    return response.json();
+}
+
+function showDoctorPage(kind, page, append = false) {
+    const list = doctorLists[kind];
+    list.nextCursor = page.next_cursor;
+    list.render(page.doctors, append);
+    document.getElementById(`${kind}-doctors-load-more`).style.display = list.nextCursor ? '' : 'none';
+}
+
 async function loadDoctors() {
     try {
-        console.log('loadDoctors: Fetching from', `${API_BASE_URL}/admin/doctors/`);
-        const response = await fetch(`${API_BASE_URL}/admin/doctors/`, {
-            headers: { 'Authorization': `Bearer ${authToken}` }
-        });
-        console.log('loadDoctors: Response status', response.status);
-        const data = await response.json();
-        console.log('loadDoctors: Data received', data);
+        const [pendingData, activeData] = await Promise.all([fetchDoctorPage('pending'), fetchDoctorPage('active')]);
+        const data = pendingData.status === 'success' ? activeData : pendingData;
 
         if (data.status === 'success') {
-            const pending = data.data.pending || [];
-            const active = data.data.active || [];
-
-            document.getElementById('pending-count').textContent = pending.length;
-            document.getElementById('active-count').textContent = active.length;
+            document.getElementById('pending-count').textContent = pendingData.data.total;
+            document.getElementById('active-count').textContent = activeData.data.total;
 
-            renderPendingDoctors(pending);
-            renderActiveDoctors(active);
+            showDoctorPage('pending', pendingData.data);
+            showDoctorPage('active', activeData.data);
         } else {
             console.error('loadDoctors: API returned error', data);
             document.getElementById('pending-doctors-list').innerHTML =
@@ -638,14 +735,26 @@ async function loadDoctors() {
     }
 }
 
-function renderPendingDoctors(doctors) {
+async function loadMoreDoctors(kind) {
+    try {
+        const data = await fetchDoctorPage(kind, doctorLists[kind].nextCursor);
+        if (data.status === 'success') showDoctorPage(kind, data.data, true);
+    } catch (error) {
+        console.error('loadMoreDoctors: Fetch failed', error);
+    }
+}
+
+document.getElementById('pending-doctors-load-more').addEventListener('click', () => loadMoreDoctors('pending'));
+document.getElementById('active-doctors-load-more').addEventListener('click', () => loadMoreDoctors('active'));
+
+function renderPendingDoctors(doctors, append = false) {
     const list = document.getElementById('pending-doctors-list');
-    if (doctors.length === 0) {
+    if (doctors.length === 0 && !append) {
         list.innerHTML = '<tr><td colspan="4" class="text-center">No pending approvals</td></tr>';
         return;
     }
 
-    list.innerHTML = doctors.map(doc => `
+    const rows = doctors.map(doc => `
             <tr>
                 <td>
                     <div class="user-info-cell">
@@ -668,16 +777,18 @@ function renderPendingDoctors(doctors) {
                 </td>
             </tr>
     `).join('');
+    if (append) list.insertAdjacentHTML('beforeend', rows);
+    else list.innerHTML = rows;
 }
 
-function renderActiveDoctors(doctors) {
+function renderActiveDoctors(doctors, append = false) {
     const list = document.getElementById('active-doctors-list');
-    if (doctors.length === 0) {
+    if (doctors.length === 0 && !append) {
         list.innerHTML = '<tr><td colspan="4" class="text-center">No active doctors</td></tr>';
         return;
     }
 
-    list.innerHTML = doctors.map(doc => `
+    const rows = doctors.map(doc => `
             <tr>
                 <td>
                     <div class="user-info-cell">
@@ -697,6 +808,8 @@ function renderActiveDoctors(doctors) {
                 </td>
             </tr>
     `).join('');
+    if (append) list.insertAdjacentHTML('beforeend', rows);
+    else list.innerHTML = rows;
 }
 
 window.handleDoctorAction = async (id, action) => {
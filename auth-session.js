@@ -0,0 +1,81 @@
+// ============================================
+// SkinScan AI - Session tokens
+// Access tokens are short-lived. This file renews them with the refresh
+// token when an API call comes back 401, then retries the call once.
+// Load it before the page's own script.
+// ============================================
+
+(function () {
+    const originalFetch = window.fetch.bind(window);
+    let refreshing = null;
+
+    function apiRoot(url) {
+        const index = url.indexOf('/api/');
+        return index === -1 ? null : url.slice(0, index + 5);
+    }
+
+    // One refresh at a time; concurrent 401s wait for the same result
+    function refreshAccessToken(root) {
+        const refreshToken = sessionStorage.getItem('refresh_token');
+        if (!refreshToken) return Promise.resolve(null);
+        if (!refreshing) {
+            refreshing = originalFetch(`${root}auth/token/refresh`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken })
+            })
+                .then(response => (response.ok ? response.json() : null))
+                .then(data => {
+                    if (!data || !data.data) return null;
+                    storeSessionTokens(data.data);
+                    return data.data.token;
+                })
+                .catch(() => null)
+                .finally(() => { refreshing = null; });
+        }
+        return refreshing;
+    }
+
+    window.fetch = async function (input, init = {}) {
+        const response = await originalFetch(input, init);
+        if (response.status !== 401) return response;
+
+        const url = typeof input === 'string' ? input : input.url;
+        const root = apiRoot(url);
+        if (!root || url.includes('/auth/token/refresh') || url.includes('/auth/login')) return response;
+
+        const headers = new Headers(init.headers || (input instanceof Request ? input.headers : undefined));
+        if (!headers.has('Authorization')) return response;
+
+        const token = await refreshAccessToken(root);
+        if (!token) return response;
+        headers.set('Authorization', `Bearer ${token}`);
+        return originalFetch(input, { ...init, headers });
+    };
+
+    // Saves the tokens returned by login / register / refresh
+    window.storeSessionTokens = function (data) {
+        sessionStorage.setItem('jwt_token', data.token);
+        if (data.refresh_token) sessionStorage.setItem('refresh_token', data.refresh_token);
+    };
+
+    // Revokes the tokens server-side, then clears them locally
+    window.endSession = function (apiBaseUrl) {
+        const token = sessionStorage.getItem('jwt_token');
+        const refreshToken = sessionStorage.getItem('refresh_token');
+        if (token || refreshToken) {
+            originalFetch(`${apiBaseUrl}/auth/logout`, {
+                method: 'POST',
+                keepalive: true,
+                headers: {
+                    'Content-Type': 'application/json',
+                    ...(token ? { 'Authorization': `Bearer ${token}` } : {})
+                },
+                body: JSON.stringify({ refresh_token: refreshToken })
+            }).catch(() => { });
+        }
+        sessionStorage.removeItem('jwt_token');
+        sessionStorage.removeItem('refresh_token');
+        sessionStorage.removeItem('user_data');
+    };
+})();
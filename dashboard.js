@@ -40,8 +40,7 @@ function requireAuth() {
 
 /** Clears session storage and redirects to login */
 function logout() {
-    sessionStorage.removeItem('jwt_token');
-    sessionStorage.removeItem('user_data');
+    endSession(API_BASE_URL);
     window.location.href = 'dashboard.html';
 }
 
@@ -1354,6 +1353,8 @@ async function changePassword() {
         const data = await response.json();
 
         if (data.status === 'success') {
+            // Every other session was signed out; keep this one on the fresh tokens
+            if (data.data && data.data.token) storeSessionTokens(data.data);
             alert('Password changed successfully!');
             document.getElementById('password-form').reset();
             document.getElementById('password-modal').classList.remove('show');
@@ -538,8 +538,7 @@ function setupLogout() {
     const logoutBtn = document.getElementById('doctor-logout-btn');
     if (logoutBtn) {
         logoutBtn.addEventListener('click', () => {
-            sessionStorage.removeItem('jwt_token');
-            sessionStorage.removeItem('user_data');
+            endSession(API_BASE_URL);
             window.location.href = 'dashboard.html';
         });
     }
@@ -598,15 +597,16 @@ async function fetchNotifications() {
         });
         const data = await response.json();
         if (data.status === 'success') {
-            saveNotifications(data.data);
+            saveNotifications(data.data.notifications);
             renderNotifications();
         }
-    } catch (e) { console.error("Poll Error:", e); }
+    } catch (e) { console.error("Notification Error:", e); }
 }
 
 function startNotificationPolling() {
     fetchNotifications();
-    setInterval(fetchNotifications, 30000);
+    // New notifications are pushed by the server (notification-stream.js)
+    streamNotifications(API_BASE_URL, { onUnread: () => fetchNotifications() });
 }
 
 function renderNotifications() {
@@ -112,7 +112,7 @@ document.getElementById('loginForm').addEventListener('submit', async function (
                 throw new Error("Access Denied: This portal is for doctors only.");
             }
 
-            sessionStorage.setItem('jwt_token', data.data.token);
+            storeSessionTokens(data.data);
             sessionStorage.setItem('user_data', JSON.stringify(data.data.user));
 
             btn.style.background = '#2e7d32'; // Success Green
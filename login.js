@@ -211,7 +211,7 @@ if (loginForm) {
                 }
 
                 // Store JWT token in sessionStorage
-                sessionStorage.setItem('jwt_token', data.data.token);
+                storeSessionTokens(data.data);
                 sessionStorage.setItem('user_data', JSON.stringify(data.data.user));
 
                 btn.classList.add('success');
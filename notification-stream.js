@@ -0,0 +1,75 @@
+// ============================================
+// SkinScan AI - Notification push channel
+// Reads the server-sent events of /auth/notifications/stream with fetch
+// (EventSource can't send the Authorization header) and reconnects with
+// Last-Event-ID when the server ends the stream. A server without a stream
+// (WSGI) answers at once with the unread count and a longer retry, which turns
+// this into a short poll. Load it after auth-session.js.
+// ============================================
+
+(function () {
+    const FALLBACK_POLL_MS = 30000;
+    const MIN_RECONNECT_MS = 1000;
+
+    // handlers: { onNotification(notification), onUnread(count) }
+    window.streamNotifications = function (apiBaseUrl, handlers) {
+        let lastEventId = null;
+        let retryMs = 3000;
+        let failures = 0;
+        let lastUnread = null;
+
+        function dispatch(block) {
+            let event = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('retry:')) retryMs = parseInt(line.slice(6), 10) || retryMs;
+                else if (line.startsWith('id:')) lastEventId = line.slice(3).trim();
+                else if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (!data) return;
+            const payload = JSON.parse(data);
+            if (event === 'notification' && handlers.onNotification) handlers.onNotification(payload);
+            // Every poll repeats the count; only a change is news
+            if (event === 'unread' && payload.unread_count !== lastUnread) {
+                lastUnread = payload.unread_count;
+                if (handlers.onUnread) handlers.onUnread(payload.unread_count);
+            }
+        }
+
+        async function connect() {
+            const token = sessionStorage.getItem('jwt_token');
+            if (!token) return;
+            const headers = { 'Authorization': `Bearer ${token}` };
+            if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+
+            try {
+                const response = await fetch(`${apiBaseUrl}/auth/notifications/stream`, { headers });
+                if (response.status === 401) return;  // Session is over
+                if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+                failures = 0;
+
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    let end;
+                    while ((end = buffer.indexOf('\n\n')) !== -1) {
+                        dispatch(buffer.slice(0, end));
+                        buffer = buffer.slice(end + 2);
+                    }
+                }
+            } catch (e) {
+                failures += 1;
+                console.warn('Notification stream error:', e);
+            }
+            // Ended normally (server time limit) or failed: back off on repeated failures
+            setTimeout(connect, failures > 3 ? FALLBACK_POLL_MS : Math.max(retryMs, MIN_RECONNECT_MS));
+        }
+
+        connect();
+    };
+})();
@@ -276,6 +276,7 @@ function loadDiagnosticData() {
                 treatmentSteps: parsedTreatment || parseTreatment(result.recommendation),
                 lifestyleTip: result.lifestyle_tip || 'Consult a healthcare professional for personalized advice.',
                 aiModelUsed: result.ai_model_used || 'gemini',
+                treatmentJobId: result.treatment_status === 'PENDING' ? result.treatment_job_id : null,
                 image: storedImage
             };
 
@@ -345,9 +346,17 @@ function loadDiagnosticData() {
     document.getElementById('confidenceText').textContent = reportData.diagnosis.confidence + "%";
     document.getElementById('confidenceBar').style.width = reportData.diagnosis.confidence + "%";
 
-    // Treatment Steps (no checkboxes)
+    // Treatment Steps (no checkboxes); still generating if the upload returned a job
     const stepsContainer = document.getElementById('treatmentSteps');
-    if (stepsContainer) {
+    if (stepsContainer && reportData.treatmentJobId) {
+        stepsContainer.innerHTML = `
+            <div style="text-align: center; padding: 30px; opacity: 0.7;">
+                <i class="fas fa-spinner fa-spin" style="font-size: 1.5rem; margin-bottom: 10px;"></i>
+                <p>Generating treatment plan...</p>
+            </div>
+        `;
+        loadPendingTreatment(reportData.treatmentJobId);
+    } else if (stepsContainer) {
         renderTreatmentSteps(reportData.treatmentSteps);
     }
 
@@ -408,6 +417,59 @@ function renderTreatmentSteps(steps) {
     });
 }
 
+// Poll a pending treatment plan job until it finishes (or the server gives up on it).
+// An ASGI server holds each request for up to `wait` seconds; a WSGI server answers at
+// once with `poll_after`, the seconds to wait before asking again.
+async function pollTreatmentPlan(jobId, maxSeconds = 90) {
+    const deadline = Date.now() + maxSeconds * 1000;
+    while (Date.now() < deadline) {
+        const response = await fetch(`${API_BASE_URL}/predict/treatment-plan/${jobId}?wait=20`, {
+            headers: { 'Authorization': `Bearer ${getAuthToken()}` }
+        });
+        if (!response.ok) return null;
+        const data = await response.json();
+        if (data.data.treatment_status !== 'PENDING') return data.data;
+        await new Promise(resolve => setTimeout(resolve, (data.data.poll_after || 0) * 1000));
+    }
+    return null;
+}
+
+// Wait for a treatment plan the upload didn't return inline, then render and store it
+async function loadPendingTreatment(jobId) {
+    let plan = null;
+    try {
+        plan = await pollTreatmentPlan(jobId);
+    } catch (error) {
+        console.error('Treatment plan fetch error:', error);
+    }
+
+    if (!plan || plan.treatment_status !== 'COMPLETED') {
+        renderTreatmentSteps([]);
+        const tipText = document.getElementById('tipText');
+        if (tipText) tipText.textContent = 'Failed to generate. Try another model.';
+        return;
+    }
+
+    renderTreatmentSteps(plan.treatment);
+    const tipText = document.getElementById('tipText');
+    if (tipText && plan.lifestyle_tip) tipText.textContent = plan.lifestyle_tip;
+
+    const severityBadge = document.getElementById('severityBadge');
+    if (severityBadge && plan.severity) {
+        severityBadge.textContent = plan.severity;
+        const level = plan.severity.toLowerCase();
+        severityBadge.className = `severity-badge badge-${level === 'high' || level === 'critical' ? 'high' : level === 'low' ? 'low' : 'mid'}`;
+    }
+    currentModelUsed = plan.ai_model_used || currentModelUsed;
+
+    // Keep the stored result complete for saving / sharing the report
+    const stored = JSON.parse(localStorage.getItem('latest_scan_result') || 'null');
+    if (stored && stored.treatment_job_id === jobId) {
+        Object.assign(stored, plan);
+        localStorage.setItem('latest_scan_result', JSON.stringify(stored));
+    }
+}
+
 // ============================================
 // MODEL SWITCHER
 // ============================================
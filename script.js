@@ -32,8 +32,7 @@ function requireAuth() {
 
 // Logout function
 function logout() {
-    sessionStorage.removeItem('jwt_token');
-    sessionStorage.removeItem('user_data');
+    endSession(API_BASE_URL);
     window.location.href = 'dashboard.html';
 }
 
@@ -346,6 +345,9 @@ function initDashboardPage() {
 
                 // SAVE DATA FOR REPORT
                 localStorage.setItem('latest_scan_result', JSON.stringify(prediction));
+                if (prediction.treatment_status === 'PENDING') {
+                    prefetchTreatmentPlan(prediction.treatment_job_id);
+                }
 
                 // Clear previous session cache
                 sessionStorage.removeItem('last_saved_prediction_id');
@@ -470,9 +472,39 @@ async function sendMessage() {
         }
     }
 
+    // Helper to format bot messages (Links, Bold, Newlines)
+    function formatMessage(text) {
+        // 1. Escape HTML (prevent XSS)
+        let safeText = text.replace(/&/g, "&amp;")
+            .replace(/</g, "&lt;")
+            .replace(/>/g, "&gt;")
+            .replace(/"/g, "&quot;")
+            .replace(/'/g, "&#039;");
+
+        // 2. Bold (**text**)
+        safeText = safeText.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
+
+        // 3. Markdown links [text](url)  must run BEFORE raw URL detection
+        safeText = safeText.replace(/\[([^\]]+)\]\((https?:\/\/[^\s)]+)\)/g, function (match, linkText, url) {
+            return `<a href="${url}" target="_blank" rel="noopener noreferrer">${linkText}</a>`;
+        });
+
+        // 4. Raw URLs  split by existing <a> tags so we don't double-link
+        const parts = safeText.split(/(<a\s[^>]*>.*?<\/a>)/g);
+        safeText = parts.map(part => {
+            if (part.startsWith('<a ')) return part; // Already a link, skip
+            return part.replace(/(https?:\/\/[^\s<]+)/g, function (url) {
+                return `<a href="${url}" target="_blank" rel="noopener noreferrer">${url}</a>`;
+            });
+        }).join('');
+
+        // 5. Newlines to <br>
+        return safeText.replace(/\n/g, '<br>');
+    }
+
     try {
-        // Send to Django backend
-        const response = await fetch(`${API_BASE_URL}/chat/message`, {
+        // Send to Django backend (the reply is streamed back token by token)
+        const response = await fetch(`${API_BASE_URL}/chat/message-stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -484,41 +516,31 @@ async function sendMessage() {
             })
         });
 
+        if (response.ok && (response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            const botMsg = document.createElement('div');
+            botMsg.classList.add('message', 'bot');
+            const fullText = await readChatStream(response, (textSoFar) => {
+                // First token replaces the typing indicator
+                if (!botMsg.isConnected) {
+                    typingMsg.remove();
+                    chatBody.appendChild(botMsg);
+                }
+                botMsg.innerHTML = formatMessage(textSoFar);
+                chatBody.scrollTop = chatBody.scrollHeight;
+            });
+            typingMsg.remove();
+            if (!fullText) {
+                botMsg.innerText = "Sorry, I couldn't process that. Please try again.";
+                chatBody.appendChild(botMsg);
+            }
+            return;
+        }
+
         // Remove typing indicator
         typingMsg.remove();
 
         const data = await response.json();
 
-        // Helper to format bot messages (Links, Bold, Newlines)
-        function formatMessage(text) {
-            // 1. Escape HTML (prevent XSS)
-            let safeText = text.replace(/&/g, "&amp;")
-                .replace(/</g, "&lt;")
-                .replace(/>/g, "&gt;")
-                .replace(/"/g, "&quot;")
-                .replace(/'/g, "&#039;");
-
-            // 2. Bold (**text**)
-            safeText = safeText.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
-
-            // 3. Markdown links [text](url)  must run BEFORE raw URL detection
-            safeText = safeText.replace(/\[([^\]]+)\]\((https?:\/\/[^\s)]+)\)/g, function (match, linkText, url) {
-                return `<a href="${url}" target="_blank" rel="noopener noreferrer">${linkText}</a>`;
-            });
-
-            // 4. Raw URLs  split by existing <a> tags so we don't double-link
-            const parts = safeText.split(/(<a\s[^>]*>.*?<\/a>)/g);
-            safeText = parts.map(part => {
-                if (part.startsWith('<a ')) return part; // Already a link, skip
-                return part.replace(/(https?:\/\/[^\s<]+)/g, function (url) {
-                    return `<a href="${url}" target="_blank" rel="noopener noreferrer">${url}</a>`;
-                });
-            }).join('');
-
-            // 5. Newlines to <br>
-            return safeText.replace(/\n/g, '<br>');
-        }
-
         // ... inside sendMessage ...
         if (data.status === 'success') {
             // Bot Response
@@ -566,6 +588,63 @@ async function sendMessage() {
     }
 }
 
+// Fill in the treatment plan of the latest scan once the backend has generated it
+async function prefetchTreatmentPlan(jobId) {
+    try {
+        let plan = null;
+        // ASGI holds each request up to `wait` seconds; WSGI answers at once with `poll_after`
+        for (let attempt = 0; attempt < 30 && !plan; attempt++) {
+            const response = await fetch(`${API_BASE_URL}/predict/treatment-plan/${jobId}?wait=20`, {
+                headers: { 'Authorization': `Bearer ${getAuthToken()}` }
+            });
+            if (!response.ok) return;
+            const data = await response.json();
+            if (data.data.treatment_status !== 'PENDING') {
+                plan = data.data;
+            } else {
+                await new Promise(resolve => setTimeout(resolve, (data.data.poll_after || 0) * 1000));
+            }
+        }
+        if (!plan || plan.treatment_status !== 'COMPLETED') return;
+
+        const stored = JSON.parse(localStorage.getItem('latest_scan_result') || 'null');
+        if (stored && stored.treatment_job_id === jobId) {
+            Object.assign(stored, plan);
+            localStorage.setItem('latest_scan_result', JSON.stringify(stored));
+        }
+    } catch (error) {
+        console.error('Treatment plan prefetch error:', error);
+    }
+}
+
+// Read the server-sent events from /chat/message-stream, calling onText with the text so far
+async function readChatStream(response, onText) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split('\n\n');
+        buffer = events.pop(); // Keep the incomplete event for the next chunk
+        for (const event of events) {
+            if (event.startsWith('event: done')) continue;
+            const dataLine = event.split('\n').find(line => line.startsWith('data:'));
+            if (!dataLine) continue;
+            const payload = JSON.parse(dataLine.slice(5));
+            if (payload.token) {
+                text += payload.token;
+                onText(text);
+            }
+        }
+    }
+    return text;
+}
+
 // ============================================
 // NAVIGATION & USER MENU LOGIC
 // ============================================
@@ -751,15 +830,20 @@ async function fetchNotifications() {
         });
         const data = await response.json();
         if (data.status === 'success') {
-            saveNotifications(data.data);
+            saveNotifications(data.data.notifications);
             renderNotifications();
         }
-    } catch (e) { console.error("Poll Error:", e); }
+    } catch (e) { console.error("Notification Error:", e); }
 }
 
 function startNotificationPolling() {
     fetchNotifications();
-    setInterval(fetchNotifications, 30000); // Poll every 30s
+    // New notifications are pushed by the server (notification-stream.js)
+    streamNotifications(API_BASE_URL, {
+        // Scan results already show their own toast on this page
+        onNotification: (n) => { if (n.type !== 'SCAN_COMPLETED') showNotificationToast(n.title, n.message, 'info'); },
+        onUnread: () => fetchNotifications()
+    });
 }
 
 function addNotification(title, message, type = 'info') {
@@ -1352,6 +1436,8 @@ async function changePassword() {
         const data = await response.json();
 
         if (data.status === 'success') {
+            // Every other session was signed out; keep this one on the fresh tokens
+            if (data.data && data.data.token) storeSessionTokens(data.data);
             alert('Password changed successfully!');
             document.getElementById('password-form').reset();
             const modal = document.getElementById('password-modal');
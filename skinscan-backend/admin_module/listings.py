@@ -0,0 +1,128 @@
+"""
+Admin user and doctor listings.
+
+Each page is one query: values() over users LEFT JOIN user_profiles /
+doctor_profiles, selecting only the columns the admin panel shows, keyset
+paginated on (created_at, id) (skinscan/pagination.py). Totals come from
+estimate_count, and only on the first page.
+
+Query parameters (all optional):
+    q              search in email and first / last name
+    status         ACTIVE, LOCKED, BANNED (comma separated)
+    role           patient, doctor, admin
+    verified       true / false (doctors' verification)
+    created_after  / created_before   ISO date or datetime
+    cursor, limit
+"""
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from authentication.models import User
+from skinscan.pagination import estimate_count, keyset_page, page_size
+
+STATUSES = ('ACTIVE', 'LOCKED', 'BANNED')
+ROLES = ('patient', 'doctor', 'admin')
+
+USER_COLUMNS = (
+    'id', 'email', 'first_name', 'last_name', 'profile__first_name', 'profile__last_name',
+    'account_status', 'is_admin', 'is_doctor', 'assigned_model', 'last_login', 'created_at',
+)
+DOCTOR_COLUMNS = USER_COLUMNS + (
+    'doctor_profile__medical_license_number', 'doctor_profile__specialization', 'doctor_profile__is_verified',
+)
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _flag(value, name):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise InvalidFilter(f'{name} must be true or false')
+
+
+def _moment(value, name, end_of_day=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise InvalidFilter(f'{name} must be an ISO date or datetime')
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def filter_users(queryset, params):
+    """Apply the listing filters in `params` (a QueryDict); raises InvalidFilter."""
+    search = (params.get('q') or '').strip()
+    if search:
+        queryset = queryset.filter(
+            Q(email__icontains=search)
+            | Q(profile__first_name__icontains=search) | Q(profile__last_name__icontains=search)
+            | Q(first_name__icontains=search) | Q(last_name__icontains=search)
+        )
+
+    if params.get('status'):
+        statuses = [s.strip().upper() for s in params['status'].split(',') if s.strip()]
+        if any(s not in STATUSES for s in statuses):
+            raise InvalidFilter(f"status must be one of {', '.join(STATUSES)}")
+        queryset = queryset.filter(account_status__in=statuses)
+
+    role = (params.get('role') or '').lower()
+    if role:
+        if role not in ROLES:
+            raise InvalidFilter(f"role must be one of {', '.join(ROLES)}")
+        queryset = {
+            'patient': lambda qs: qs.filter(is_doctor=False, is_admin=False),
+            'doctor': lambda qs: qs.filter(is_doctor=True),
+            'admin': lambda qs: qs.filter(is_admin=True),
+        }[role](queryset)
+
+    if params.get('verified'):
+        if _flag(params['verified'], 'verified'):
+            queryset = queryset.filter(doctor_profile__is_verified=True)
+        else:
+            queryset = queryset.filter(Q(doctor_profile__isnull=True) | Q(doctor_profile__is_verified=False))
+
+    if params.get('created_after'):
+        queryset = queryset.filter(created_at__gte=_moment(params['created_after'], 'created_after'))
+    if params.get('created_before'):
+        queryset = queryset.filter(created_at__lte=_moment(params['created_before'], 'created_before', end_of_day=True))
+    return queryset
+
+
+def _page(queryset, columns, params, key):
+    rows, next_cursor = keyset_page(
+        queryset.values(*columns), 'created_at', params.get('cursor'), page_size(params.get('limit'))
+    )
+    for row in rows:
+        # Names live on the profile; the user columns are the pre-profile fallback
+        row['first_name'] = row.pop('profile__first_name') or row['first_name']
+        row['last_name'] = row.pop('profile__last_name') or row['last_name']
+    data = {key: rows, 'next_cursor': next_cursor}
+    if not params.get('cursor'):
+        data['total'], data['total_is_estimate'] = estimate_count(queryset)
+    return data
+
+
+def list_users(params):
+    """One page of users; doctors are left out unless `role` asks for them."""
+    queryset = User.objects.all()
+    if not params.get('role'):
+        queryset = queryset.filter(is_doctor=False)
+    return _page(filter_users(queryset, params), USER_COLUMNS, params, 'users')
+
+
+def list_doctors(params):
+    """One page of doctors with their license / verification details."""
+    data = _page(filter_users(User.objects.filter(is_doctor=True), params), DOCTOR_COLUMNS, params, 'doctors')
+    for row in data['doctors']:
+        row['mrn'] = row.pop('doctor_profile__medical_license_number') or 'N/A'
+        row['specialization'] = row.pop('doctor_profile__specialization') or 'N/A'
+        row['is_verified'] = bool(row.pop('doctor_profile__is_verified'))
+    return data
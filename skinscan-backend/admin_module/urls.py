@@ -1,12 +1,24 @@
 from django.urls import path
-from .views import UserListView, UserDetailView, ModelModeratorView, ModelUploadView, AdminReportView, DiseaseInfoView, DoctorManagementView
+from .views import UserListView, UserDetailView, UserImportView, BroadcastView, ModelModeratorView, ModelUploadView, ShadowEvaluationView, CanaryRolloutView, TreatmentCacheView, ProviderHealthView, PasswordPoolView, ChatFAQCacheView, AdminReportView, DiseaseInfoView, DoctorManagementView
 
 urlpatterns = [
     path('users/', UserListView.as_view(), name='admin-user-list'),
+    path('users/import/', UserImportView.as_view(), name='admin-user-import'),
+    path('users/import/<str:job_id>/', UserImportView.as_view(), name='admin-user-import-job'),
     path('users/<int:pk>/', UserDetailView.as_view(), name='admin-user-detail'),
     path('users/<int:pk>/<str:action>/', UserDetailView.as_view(), name='admin-user-action'),
+    path('notifications/broadcast/', BroadcastView.as_view(), name='admin-broadcast'),
+    path('notifications/broadcast/<str:job_id>/', BroadcastView.as_view(), name='admin-broadcast-job'),
     path('models/', ModelModeratorView.as_view(), name='admin-model-moderation'),
     path('models/upload/', ModelUploadView.as_view(), name='admin-model-upload'),
+    path('models/shadow/', ShadowEvaluationView.as_view(), name='admin-model-shadow'),
+    path('models/canary/', CanaryRolloutView.as_view(), name='admin-model-canary'),
+    path('models/canary/<int:pk>/', CanaryRolloutView.as_view(), name='admin-model-canary-detail'),
+    path('treatment-cache/', TreatmentCacheView.as_view(), name='admin-treatment-cache'),
+    path('providers/', ProviderHealthView.as_view(), name='admin-provider-health'),
+    path('password-pool/', PasswordPoolView.as_view(), name='admin-password-pool'),
+    path('chat-cache/', ChatFAQCacheView.as_view(), name='admin-chat-cache'),
+    path('chat-cache/<int:pk>/', ChatFAQCacheView.as_view(), name='admin-chat-cache-entry'),
     path('reports/', AdminReportView.as_view(), name='admin-reports-all'),
     path('reports/<int:pk>/', AdminReportView.as_view(), name='admin-report-detail'),
     path('content/', DiseaseInfoView.as_view(), name='admin-content-list'),
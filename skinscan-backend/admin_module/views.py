@@ -2,6 +2,8 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from authentication.models import User
+from authentication.principal_cache import invalidate_principal
+from authentication.tokens import revoke_user_tokens
 from authentication.serializers import UserSerializer
 from .permissions import IsAdminUser
 import os
@@ -11,17 +13,23 @@ from django.conf import settings
 from prediction.models import PredictionResult, SkinImage, ScanHistory
 from .models import DiseaseInfo, AppSetting
 from .serializers import DiseaseInfoSerializer, AppSettingSerializer
+from .listings import InvalidFilter, list_doctors, list_users
+from skinscan.pagination import InvalidCursor
+
+logger = logging.getLogger(__name__)
 
 class UserListView(APIView):
+    """Users, newest first: filters, search and keyset pagination (see listings.py)"""
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        # Exclude doctors from the general user list
-        users = User.objects.filter(is_doctor=False).order_by('-created_at')
-        serializer = UserSerializer(users, many=True)
+        try:
+            data = list_users(request.query_params)
+        except (InvalidFilter, InvalidCursor) as e:
+            return Response({'status': 'error', 'message': str(e)}, status=400)
         return Response({
             'status': 'success',
-            'data': serializer.data
+            'data': data
         })
 
 class UserDetailView(APIView):
@@ -49,6 +57,8 @@ class UserDetailView(APIView):
                 if 'assigned_model' in request.data:
                     user.assigned_model = request.data['assigned_model']
                 serializer.save()
+                invalidate_principal(user.id)
+                revoke_user_tokens(user.id, refresh=user.account_status != 'ACTIVE')
                 return Response({
                     'status': 'success',
                     'message': 'User updated successfully',
@@ -78,6 +88,9 @@ class UserDetailView(APIView):
                 return Response({'error': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
             
             user.save()
+            # Lock / ban / role change applies to the user's very next request
+            invalidate_principal(user.id)
+            revoke_user_tokens(user.id, refresh=user.account_status != 'ACTIVE')
             return Response({
                 'status': 'success',
                 'message': f'User {action}ed successfully',
@@ -93,6 +106,8 @@ class UserDetailView(APIView):
         try:
             user = User.objects.get(pk=pk)
             user.delete()
+            invalidate_principal(pk)
+            revoke_user_tokens(pk)
             return Response({
                 'status': 'success',
                 'message': 'User deleted successfully'
@@ -100,6 +115,68 @@ class UserDetailView(APIView):
         except User.DoesNotExist:
             return Response({'status': 'error', 'message': 'User not found'}, status=404)
 
+class UserImportView(APIView):
+    """Bulk-import users from a CSV or NDJSON file (runs in the background)"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        import tempfile
+        from authentication.bulk_import import detect_format, start_import_job
+        file_obj = request.FILES.get('file')
+        if not file_obj:
+            return Response({'error': 'No file uploaded'}, status=400)
+        fmt = detect_format(file_obj.name, request.data.get('format'))
+        if not fmt:
+            return Response({'error': 'File must be .csv or .ndjson (or pass format=csv|ndjson)'}, status=400)
+
+        # The upload's temp file goes away with the request; keep a copy for the job
+        fd, path = tempfile.mkstemp(suffix=f'.{fmt}', prefix='user-import-')
+        with os.fdopen(fd, 'wb') as destination:
+            for chunk in file_obj.chunks():
+                destination.write(chunk)
+
+        job = start_import_job(path, fmt, request.user.id)
+        logger.info(f"User import {job['job_id']} ({file_obj.name}, {file_obj.size} bytes) started by {request.user.email}")
+        return Response({'status': 'success', 'message': 'Import started', 'data': job}, status=202)
+
+    def get(self, request, job_id):
+        from authentication.bulk_import import get_import_job
+        job = get_import_job(job_id)
+        if not job:
+            return Response({'error': 'Import job not found'}, status=404)
+        return Response({'status': 'success', 'data': job})
+
+class BroadcastView(APIView):
+    """SYSTEM announcement to all active users or a segment (fans out in the background)"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        from authentication.broadcasts import InvalidSegment, start_broadcast
+        title = str(request.data.get('title', '')).strip()
+        message = str(request.data.get('message', '')).strip()
+        if not title or not message:
+            return Response({'status': 'error', 'message': 'Title and message are required'}, status=400)
+        if len(title) > 255:
+            return Response({'status': 'error', 'message': 'Title must be at most 255 characters'}, status=400)
+        try:
+            job = start_broadcast(
+                title, message,
+                segment=request.data.get('segment') or 'all',
+                country=(request.data.get('country') or '').strip() or None,
+                admin_id=request.user.id
+            )
+        except InvalidSegment as e:
+            return Response({'status': 'error', 'message': str(e)}, status=400)
+        logger.info(f"Broadcast {job['job_id']} ({job['segment']}, {job['country'] or 'all countries'}) started by {request.user.email}")
+        return Response({'status': 'success', 'message': 'Broadcast queued', 'data': job}, status=202)
+
+    def get(self, request, job_id):
+        from authentication.broadcasts import get_broadcast
+        job = get_broadcast(job_id)
+        if not job:
+            return Response({'status': 'error', 'message': 'Broadcast not found'}, status=404)
+        return Response({'status': 'success', 'data': job})
+
 class ModelModeratorView(APIView):
     permission_classes = [IsAdminUser]
 
@@ -109,8 +186,12 @@ class ModelModeratorView(APIView):
             os.makedirs(model_dir)
             
         models_data = []
-        for filename in os.listdir(model_dir):
-            if filename.endswith('.pth'):
+        # Deployed models, then candidates mounted in CANDIDATE_MODEL_DIR
+        model_dirs = [d for d in dict.fromkeys([model_dir, settings.CANDIDATE_MODEL_DIR]) if os.path.isdir(d)]
+        listed = set()
+        for model_dir, filename in ((d, f) for d in model_dirs for f in sorted(os.listdir(d))):
+            if filename.endswith('.pth') and filename not in listed:
+                listed.add(filename)
                 file_path = os.path.join(model_dir, filename)
                 stats = os.stat(file_path)
                 
@@ -126,12 +207,26 @@ class ModelModeratorView(APIView):
                     'architecture': 'ConvNeXt Small'  # Known architecture from prediction module
                 })
         
+        from prediction.canary import get_active_rollout, rollout_status
+        from prediction.models import CanaryRollout
+        from prediction.cnn_inference import global_model_path
+        active_rollout = get_active_rollout(refresh=True)
+        
         return Response({
             'status': 'success',
             'data': {
                 'available_models': models_data,
-                'global_default': os.path.basename(str(getattr(settings, 'MODEL_PATH', ''))),
-                'disease_classes': getattr(settings, 'DISEASE_CLASSES', [])
+                'global_default': os.path.basename(global_model_path()),
+                'disease_classes': getattr(settings, 'DISEASE_CLASSES', []),
+                'canary': rollout_status(active_rollout) if active_rollout else None,
+                'canary_history': [{
+                    'id': r.id,
+                    'candidate_model': r.candidate_model,
+                    'status': r.status,
+                    'percentage': r.percentage,
+                    'created_at': r.created_at,
+                    'updated_at': r.updated_at
+                } for r in CanaryRollout.objects.exclude(status='ACTIVE')[:10]]
             }
         })
 
@@ -142,7 +237,8 @@ class ModelModeratorView(APIView):
             return Response({'error': 'model_name required'}, status=400)
             
         # Prevent deletion of active model
-        active_model = os.path.basename(str(getattr(settings, 'MODEL_PATH', '')))
+        from prediction.cnn_inference import global_model_path
+        active_model = os.path.basename(global_model_path())
         if model_name == active_model:
             return Response({'error': 'Cannot delete the active production model'}, status=400)
             
@@ -162,24 +258,218 @@ class ModelModeratorView(APIView):
         if not model_name:
             return Response({'error': 'model_name required'}, status=400)
         
-        model_path = os.path.join(settings.BASE_DIR, 'ml_models', model_name)
+        from prediction.cnn_inference import checkpoint_path, set_global_model
+        model_path = checkpoint_path(model_name)
         if not os.path.exists(model_path):
             return Response({'error': 'Model file not found'}, status=404)
         
-        # In a real app, we'd update settings.py or a DB config
-        # For this setup, we'll update the AppSetting model if it exists
-        setting, _ = AppSetting.objects.get_or_create(key='GLOBAL_MODEL_PATH')
-        setting.value = model_path
-        setting.save()
-        
-        # Also update the runtime setting if possible (volatile)
-        settings.MODEL_PATH = model_path
+        # Stored in AppSetting; every worker's predictor switches on its next request
+        set_global_model(model_path)
         
         return Response({
             'status': 'success',
             'message': f'Global default model set to {model_name}'
         })
 
+class CanaryRolloutView(APIView):
+    """Percentage-based canary rollout of a checkpoint with automatic rollback"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk=None):
+        from prediction.canary import get_active_rollout, rollout_status
+        from prediction.models import CanaryRollout
+        if pk:
+            try:
+                rollout = CanaryRollout.objects.get(pk=pk)
+            except CanaryRollout.DoesNotExist:
+                return Response({'status': 'error', 'message': 'Rollout not found'}, status=404)
+        else:
+            rollout = get_active_rollout(refresh=True)
+        return Response({'status': 'success', 'data': rollout_status(rollout) if rollout else None})
+
+    def post(self, request, pk=None):
+        """Actions: start (model_name, steps, margins), advance, rollback, promote"""
+        from prediction import canary
+        action = request.data.get('action', 'start')
+
+        if action == 'start':
+            model_name = request.data.get('model_name')
+            if not model_name:
+                return Response({'error': 'model_name required'}, status=400)
+            from prediction.cnn_inference import checkpoint_path, global_model_path
+            if not os.path.exists(checkpoint_path(model_name)):
+                return Response({'error': 'Model file not found'}, status=404)
+
+            baseline = os.path.basename(global_model_path())
+            if model_name == baseline:
+                return Response({'error': 'Model is already the global default'}, status=400)
+
+            thresholds = {}
+            try:
+                for field, cast in (('latency_margin', float), ('error_margin', float), ('min_samples', int)):
+                    if request.data.get(field) not in (None, ''):
+                        thresholds[field] = cast(request.data[field])
+                rollout = canary.start_rollout(
+                    model_name, baseline,
+                    steps=request.data.get('steps'),
+                    created_by=request.user,
+                    **thresholds
+                )
+            except (TypeError, ValueError) as e:
+                return Response({'error': f'Invalid rollout parameters: {e}'}, status=400)
+
+            return Response({
+                'status': 'success',
+                'message': f'Canary started: {model_name} on {rollout.percentage}% of users',
+                'data': canary.rollout_status(rollout)
+            }, status=201)
+
+        rollout = canary.get_active_rollout(refresh=True)
+        if not rollout:
+            return Response({'error': 'No active canary rollout'}, status=404)
+
+        if action == 'advance':
+            rollout, verdict = canary.advance_rollout(rollout)
+            message = {
+                'rolled_back': 'Canary failed its guard and was rolled back',
+                'at_final_step': f'Canary is already at its final step ({rollout.percentage}%)',
+            }.get(verdict['verdict'], f'Canary advanced to {rollout.percentage}% of users')
+        elif action == 'rollback':
+            rollout = canary.rollback(rollout, reason=request.data.get('reason') or 'Manual rollback')
+            message = 'Canary rolled back'
+        elif action == 'promote':
+            rollout = canary.promote(rollout)
+            message = f'{rollout.candidate_model} promoted to global default'
+        else:
+            return Response({'error': 'Invalid action'}, status=400)
+
+        return Response({'status': 'success', 'message': message, 'data': canary.rollout_status(rollout)})
+
+class ShadowEvaluationView(APIView):
+    """Run a candidate checkpoint in shadow mode and report how it compares to production"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from prediction.shadow import get_shadow_config, get_shadow_runtime_stats, shadow_report
+        config = get_shadow_config(refresh=True)
+        candidate = request.query_params.get('model_name') or config['model']
+        return Response({
+            'status': 'success',
+            'data': {
+                'config': config,
+                'runtime': get_shadow_runtime_stats(),
+                'report': shadow_report(candidate) if candidate else None
+            }
+        })
+
+    def post(self, request):
+        """Start (or update) shadowing of a model"""
+        from prediction.shadow import set_shadow_config
+        model_name = request.data.get('model_name')
+        if not model_name:
+            return Response({'error': 'model_name required'}, status=400)
+
+        from prediction.cnn_inference import checkpoint_path
+        model_path = checkpoint_path(model_name)
+        if not os.path.exists(model_path):
+            return Response({'error': 'Model file not found'}, status=404)
+
+        try:
+            sample_rate = float(request.data.get('sample_rate', 0.1))
+        except (TypeError, ValueError):
+            return Response({'error': 'sample_rate must be a number between 0 and 1'}, status=400)
+        if not 0 < sample_rate <= 1:
+            return Response({'error': 'sample_rate must be a number between 0 and 1'}, status=400)
+
+        config = set_shadow_config(model_name, sample_rate)
+        logger.info(f"Shadow evaluation started for {model_name} at {sample_rate:.0%} of uploads")
+        return Response({
+            'status': 'success',
+            'message': f'Shadowing {model_name} on {sample_rate:.0%} of uploads',
+            'data': config
+        })
+
+    def delete(self, request):
+        """Stop shadowing (recorded results are kept)"""
+        from prediction.shadow import set_shadow_config
+        set_shadow_config(None)
+        return Response({'status': 'success', 'message': 'Shadow evaluation stopped'})
+
+class TreatmentCacheView(APIView):
+    """Inspect, precompute and invalidate cached AI treatment plans"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from prediction.treatment_cache import cache_summary
+        return Response({'status': 'success', 'data': cache_summary()})
+
+    def post(self, request):
+        """Precompute plans for all disease classes in the background"""
+        from prediction.treatment_cache import start_precompute
+        force = str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+        if not start_precompute(force=force):
+            return Response({'error': 'Precompute is already running'}, status=409)
+        return Response({'status': 'success', 'message': 'Treatment plan precompute started'}, status=202)
+
+    def delete(self, request):
+        """Invalidate all plans, or only ?disease_name= and/or ?model="""
+        from prediction.treatment_cache import invalidate
+        deleted = invalidate(
+            disease_name=request.query_params.get('disease_name') or None,
+            model=request.query_params.get('model') or None
+        )
+        return Response({'status': 'success', 'message': f'{deleted} cached plans invalidated'})
+
+class ProviderHealthView(APIView):
+    """Circuit breaker state and call statistics for the LLM providers"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from skinscan.provider_health import breaker_states
+        from prediction.treatment_generator import get_provider_stats
+        return Response({
+            'status': 'success',
+            'data': {
+                'breakers': breaker_states(),
+                'treatment_calls': get_provider_stats()
+            }
+        })
+
+    def post(self, request):
+        """Reset (close) a provider's breaker"""
+        from skinscan.provider_health import PROVIDERS, get_breaker
+        provider = request.data.get('provider')
+        if provider not in PROVIDERS:
+            return Response({'error': f"provider must be one of {', '.join(PROVIDERS)}"}, status=400)
+        get_breaker(provider).reset()
+        logger.info(f"Circuit breaker for {provider} reset by {request.user.email}")
+        return Response({'status': 'success', 'message': f'{provider} circuit closed', 'data': get_breaker(provider).status()})
+
+class PasswordPoolView(APIView):
+    """Password hashing pool queue and latency metrics (this web process)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from authentication.password_pool import pool_stats
+        return Response({'status': 'success', 'data': pool_stats()})
+
+class ChatFAQCacheView(APIView):
+    """Most-hit cached chatbot answers, and purge"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from chatbot.faq_cache import cache_stats
+        return Response({'status': 'success', 'data': cache_stats()})
+
+    def delete(self, request, pk=None):
+        """Purge one entry (pk), expired entries (?expired=true) or everything"""
+        from chatbot.faq_cache import purge
+        expired_only = request.query_params.get('expired', '').lower() in ('1', 'true', 'yes')
+        deleted = purge(entry_id=pk, expired_only=expired_only)
+        if pk and not deleted:
+            return Response({'error': 'Entry not found'}, status=404)
+        return Response({'status': 'success', 'message': f'{deleted} cached answers purged'})
+
 class ModelUploadView(APIView):
     permission_classes = [IsAdminUser]
 
@@ -216,10 +506,9 @@ class AdminReportView(APIView):
 
     def get(self, request):
         user_id = request.query_params.get('user_id')
+        reports = PredictionResult.objects.select_related('user', 'image').order_by('-created_at')
         if user_id:
-            reports = PredictionResult.objects.filter(user_id=user_id).order_by('-created_at')
-        else:
-            reports = PredictionResult.objects.all().order_by('-created_at')
+            reports = reports.filter(user_id=user_id)
         
         # Simple serialization for demonstration
         data = [{
@@ -251,6 +540,12 @@ class AdminReportView(APIView):
         except PredictionResult.DoesNotExist:
             return Response({'status': 'error', 'message': 'Report not found'}, status=404)
 
+def _reindex_disease_content():
+    """Make every worker's chatbot knowledge base (chatbot/retrieval.py) pick up the edit"""
+    from chatbot.retrieval import mark_stale
+    mark_stale()
+
+
 class DiseaseInfoView(APIView):
     permission_classes = [IsAdminUser]
 
@@ -271,6 +566,7 @@ class DiseaseInfoView(APIView):
         serializer = DiseaseInfoSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            _reindex_disease_content()
             return Response({'status': 'success', 'data': serializer.data}, status=201)
         return Response({'status': 'error', 'errors': serializer.errors}, status=400)
 
@@ -280,6 +576,7 @@ class DiseaseInfoView(APIView):
             serializer = DiseaseInfoSerializer(disease, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
+                _reindex_disease_content()
                 return Response({'status': 'success', 'data': serializer.data})
             return Response({'status': 'error', 'errors': serializer.errors}, status=400)
         except DiseaseInfo.DoesNotExist:
@@ -289,6 +586,7 @@ class DiseaseInfoView(APIView):
         try:
             disease = DiseaseInfo.objects.get(pk=pk)
             disease.delete()
+            _reindex_disease_content()
             return Response({'status': 'success', 'message': 'Deleted successfully'})
         except DiseaseInfo.DoesNotExist:
             return Response({'status': 'error', 'message': 'Not found'}, status=404)
@@ -297,37 +595,14 @@ class DoctorManagementView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        """List pending and active doctors"""
-        # Fetch doctors (users with is_doctor=True)
-        doctors = User.objects.filter(is_doctor=True).select_related('doctor_profile').order_by('-created_at')
-        
-        pending = []
-        active = []
-        
-        for doc in doctors:
-            profile = getattr(doc, 'doctor_profile', None)
-            doc_data = {
-                'id': doc.id,
-                'email': doc.email,
-                'first_name': doc.first_name,
-                'last_name': doc.last_name,
-                'created_at': doc.created_at,
-                'mrn': profile.medical_license_number if profile else 'N/A',
-                'specialization': profile.specialization if profile else 'N/A',
-                'is_verified': profile.is_verified if profile else False
-            }
-            
-            if profile and profile.is_verified:
-                active.append(doc_data)
-            else:
-                pending.append(doc_data)
-                
+        """Doctors, newest first; ?verified=false for pending approvals, true for active (see listings.py)"""
+        try:
+            data = list_doctors(request.query_params)
+        except (InvalidFilter, InvalidCursor) as e:
+            return Response({'status': 'error', 'message': str(e)}, status=400)
         return Response({
             'status': 'success',
-            'data': {
-                'pending': pending,
-                'active': active
-            }
+            'data': data
         })
 
     def post(self, request, pk, action=None):
@@ -344,18 +619,16 @@ class DoctorManagementView(APIView):
                 # Activate user account if it was locked/inactive
                 user.account_status = 'ACTIVE'
                 user.save()
+                invalidate_principal(user.id)
                 
                 # Fire notification for the doctor
-                try:
-                    from authentication.models import Notification
-                    Notification.objects.create(
-                        user=user,
-                        title='Account Verified',
-                        message='Your doctor account has been verified by the administrator. You can now access all professional features.',
-                        type='DOCTOR_VERIFIED'
-                    )
-                except Exception as ne:
-                    logger.error(f"Failed to create notification: {ne}")
+                from authentication.notifications import notify
+                notify(
+                    user,
+                    title='Account Verified',
+                    message='Your doctor account has been verified by the administrator. You can now access all professional features.',
+                    type='DOCTOR_VERIFIED'
+                )
 
                 return Response({'status': 'success', 'message': 'Doctor approved successfully'})
                 
@@ -363,11 +636,15 @@ class DoctorManagementView(APIView):
                 # For rejection, we might want to delete the user or just ban them
                 # Deleting for now as per "reject" usually implying removing the application
                 user.delete()
+                invalidate_principal(pk)
+                revoke_user_tokens(pk)
                 return Response({'status': 'success', 'message': 'Doctor application rejected and removed'})
                 
             elif action == 'remove':
                 # Remove an existing doctor
                 user.delete()
+                invalidate_principal(pk)
+                revoke_user_tokens(pk)
                 return Response({'status': 'success', 'message': 'Doctor removed successfully'})
             
             return Response({'status': 'error', 'message': 'Invalid action'}, status=400)
@@ -4,6 +4,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from .models import User
+from .principal_cache import invalidate_principal
+from .tokens import revoke_user_tokens
 from .serializers import UserSerializer
 
 class IsAdminUser(IsAuthenticated):
@@ -18,10 +20,14 @@ class AdminUserListView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        # Exclude doctors from the general user list
-        users = User.objects.filter(is_doctor=False).order_by('-created_at')
-        serializer = UserSerializer(users, many=True)
-        return Response({'status': 'success', 'data': serializer.data})
+        # Same listing as /api/admin/users/ (filters, search, keyset pagination)
+        from admin_module.listings import InvalidFilter, list_users
+        from skinscan.pagination import InvalidCursor
+        try:
+            data = list_users(request.query_params)
+        except (InvalidFilter, InvalidCursor) as e:
+            return Response({'status': 'error', 'message': str(e)}, status=400)
+        return Response({'status': 'success', 'data': data})
 
 class AdminUserStateView(APIView):
     permission_classes = [IsAdminUser]
@@ -43,6 +49,9 @@ class AdminUserStateView(APIView):
             return Response({'error': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
         
         user.save()
+        # Lock / ban / role change applies to the user's very next request
+        invalidate_principal(user.id)
+        revoke_user_tokens(user.id, refresh=user.account_status != 'ACTIVE')
         return Response({'status': 'success', 'account_status': user.account_status, 'is_admin': user.is_admin})
 
 class AdminUserDetailView(APIView):
@@ -65,10 +74,14 @@ class AdminUserDetailView(APIView):
             user.assigned_model = data['assigned_model']
 
         user.save()
+        invalidate_principal(user.id)
+        revoke_user_tokens(user.id, refresh=user.account_status != 'ACTIVE')
         serializer = UserSerializer(user)
         return Response({'status': 'success', 'data': serializer.data})
 
     def delete(self, request, user_id):
         user = get_object_or_404(User, id=user_id)
         user.delete()
+        invalidate_principal(user_id)
+        revoke_user_tokens(user_id)
         return Response({'status': 'deleted'}, status=status.HTTP_204_NO_CONTENT)
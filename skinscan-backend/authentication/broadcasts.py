@@ -0,0 +1,133 @@
+"""
+SYSTEM announcements to every active user or to a segment (admin endpoint).
+
+A broadcast runs as a background job. Recipients are read CHUNK_SIZE user ids
+at a time, in id order. Each chunk gets one bulk_create of Notification rows
+and one cache write, whatever its size (notifications.broadcast_delivered):
+no per-recipient keys, which on the file cache were slow and culled the job's
+own progress key. The job then pauses
+CHUNK_PAUSE seconds so a 100k-user fan-out doesn't monopolise the database.
+Progress is kept in the cache like the user import jobs (bulk_import.py).
+
+Each recipient gets a regular Notification row, so broadcasts show up in the
+paginated list, the unread counter and the push stream like any other
+notification.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .models import Notification, User
+from .notifications import broadcast_delivered
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+CHUNK_PAUSE = 0.05  # Seconds between chunks
+SEGMENTS = ('all', 'patients', 'doctors')
+
+RUNNING, COMPLETED, FAILED = 'RUNNING', 'COMPLETED', 'FAILED'
+JOB_TTL = 24 * 3600
+JOB_STALE_SECONDS = 600  # A RUNNING job not updated for this long lost its worker
+_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='broadcast')
+
+
+class InvalidSegment(ValueError):
+    pass
+
+
+def recipients(segment='all', country=None):
+    """Active users in `segment`, optionally limited to a profile country."""
+    if segment not in SEGMENTS:
+        raise InvalidSegment(f"segment must be one of {', '.join(SEGMENTS)}")
+    queryset = User.objects.filter(account_status='ACTIVE')
+    if segment == 'patients':
+        queryset = queryset.filter(is_doctor=False, is_admin=False)
+    elif segment == 'doctors':
+        queryset = queryset.filter(is_doctor=True)
+    if country:
+        queryset = queryset.filter(profile__country__iexact=country)
+    return queryset
+
+
+def send_broadcast(title, message, segment='all', country=None, progress=None) -> Dict:
+    """Deliver to every recipient; `progress(report)` is called after each chunk."""
+    queryset = recipients(segment, country)
+    report = {'total': queryset.count(), 'delivered': 0, 'last_user_id': 0}
+    while True:
+        user_ids = list(
+            queryset.filter(id__gt=report['last_user_id']).order_by('id').values_list('id', flat=True)[:CHUNK_SIZE]
+        )
+        if not user_ids:
+            break
+        Notification.objects.bulk_create([
+            Notification(user_id=user_id, title=title, message=message, type='SYSTEM')
+            for user_id in user_ids
+        ])
+        broadcast_delivered()
+        report['delivered'] += len(user_ids)
+        report['last_user_id'] = user_ids[-1]
+        if progress:
+            progress(report)
+        time.sleep(CHUNK_PAUSE)
+    return report
+
+
+# ============================================
+# BACKGROUND JOBS (admin endpoint)
+# ============================================
+def _job_key(job_id):
+    return f'broadcast:{job_id}'
+
+
+def start_broadcast(title, message, segment, country, admin_id) -> Dict:
+    """Validate the segment and queue the fan-out; raises InvalidSegment."""
+    recipients(segment, country)
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'admin_id': admin_id,
+        'status': RUNNING,
+        'title': title,
+        'segment': segment,
+        'country': country,
+        'report': {'total': None, 'delivered': 0, 'last_user_id': 0},
+        'created_at': time.time(),
+        'updated_at': time.time(),
+    }
+    cache.set(_job_key(job_id), job, JOB_TTL)
+    _job_executor.submit(_run_broadcast, job_id, message)
+    return job
+
+
+def _run_broadcast(job_id, message):
+    job = cache.get(_job_key(job_id))
+    if not job:
+        return
+
+    def save(report, status=RUNNING):
+        job.update(report=dict(report), status=status, updated_at=time.time())
+        cache.set(_job_key(job_id), job, JOB_TTL)
+
+    try:
+        report = send_broadcast(job['title'], message, job['segment'], job['country'], progress=save)
+        save(report, COMPLETED)
+        logger.info(f"[Broadcast] Job {job_id}: delivered to {report['delivered']} users")
+    except Exception as e:
+        logger.error(f"[Broadcast] Job {job_id} failed: {e}")
+        job['error'] = str(e)
+        save(job['report'], FAILED)
+    finally:
+        close_old_connections()
+
+
+def get_broadcast(job_id) -> Optional[Dict]:
+    job = cache.get(_job_key(job_id))
+    if job and job['status'] == RUNNING and time.time() - job['updated_at'] > JOB_STALE_SECONDS:
+        job.update({'status': FAILED, 'error': 'Broadcast job was interrupted'})
+    return job
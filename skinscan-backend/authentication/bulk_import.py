@@ -0,0 +1,277 @@
+"""
+Bulk user import for clinic onboarding (admin endpoint and `manage.py import_users`).
+
+Rows are streamed from CSV (header row) or NDJSON (one object per line) and
+processed CHUNK_SIZE at a time:
+
+- each row is validated with the registration rules (UserRegistrationSerializer).
+  Email / license uniqueness is checked with one query per chunk instead of
+  one per row
+- passwords are hashed in parallel in a process pool of the import's own
+  (IMPORT_HASH_WORKERS, or the command's --workers), not the login pool
+- User, UserProfile and DoctorProfile rows are written with bulk_create in
+  one transaction per chunk. If a concurrent registration takes an email in
+  the meantime, that chunk is retried row by row
+
+Invalid rows are skipped and reported with their row number; the rest of the
+file is still imported. Doctors are created unverified, as with RegisterView.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from rest_framework import serializers
+
+from .models import DoctorProfile, User, UserProfile
+from .password_pool import import_pool, make_passwords
+from .serializers import UserRegistrationSerializer
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+FORMATS = ('csv', 'ndjson')
+PROFILE_FIELDS = ('first_name', 'last_name', 'phone', 'date_of_birth', 'gender', 'country')
+
+RUNNING, COMPLETED, FAILED = 'RUNNING', 'COMPLETED', 'FAILED'
+JOB_TTL = 24 * 3600
+JOB_STALE_SECONDS = 600  # A RUNNING job not updated for this long lost its worker
+_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='user-import')
+
+
+class ImportRowSerializer(UserRegistrationSerializer):
+    """Registration rules plus the optional profile columns of an import file."""
+    phone = serializers.CharField(required=False, allow_blank=True, max_length=15)
+    date_of_birth = serializers.DateField(required=False)
+    gender = serializers.CharField(required=False, allow_blank=True, max_length=10)
+    country = serializers.CharField(required=False, allow_blank=True, max_length=100)
+
+    def validate_email(self, value):
+        # Uniqueness is checked for the whole chunk at once
+        return value.lower()
+
+
+# ============================================
+# PARSING
+# ============================================
+def detect_format(filename: str, declared: Optional[str] = None) -> Optional[str]:
+    fmt = (declared or os.path.splitext(filename or '')[1].lstrip('.')).lower()
+    fmt = {'jsonl': 'ndjson', 'json': 'ndjson'}.get(fmt, fmt)
+    return fmt if fmt in FORMATS else None
+
+
+def iter_rows(stream, fmt) -> Iterator:
+    """(row_number, data, parse_error) for each record of a binary stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            # Empty cells mean "not provided"
+            yield number, {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}, None
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, None, 'Invalid JSON'
+            continue
+        if isinstance(data, dict):
+            yield number, data, None
+        else:
+            yield number, None, 'Expected a JSON object'
+
+
+# ============================================
+# IMPORT
+# ============================================
+def _messages(errors) -> Dict:
+    if isinstance(errors, dict):
+        return {field: [str(m) for m in (msgs if isinstance(msgs, list) else [msgs])] for field, msgs in errors.items()}
+    return {'non_field_errors': [str(m) for m in errors]}
+
+
+def _fail(report, number, data, errors):
+    report['failed'] += 1
+    report['errors'].append({
+        'row': number,
+        'email': data.get('email') if isinstance(data, dict) else None,
+        'errors': _messages(errors),
+    })
+
+
+def import_users(stream, fmt, chunk_size=CHUNK_SIZE, executor=None, progress=None) -> Dict:
+    """
+    Import every row of `stream`. Returns {'processed', 'created', 'failed',
+    'errors': [{'row', 'email', 'errors'}]}. `executor` is the import's hashing
+    pool (passwords are hashed in this thread otherwise); `progress(report)` is
+    called after each chunk.
+    """
+    report = {'processed': 0, 'created': 0, 'failed': 0, 'errors': []}
+    chunk = []
+    for row in iter_rows(stream, fmt):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, report, executor)
+            chunk = []
+            if progress:
+                progress(report)
+    if chunk:
+        _import_chunk(chunk, report, executor)
+    report['errors'].sort(key=lambda error: error['row'])
+    if progress:
+        progress(report)
+    return report
+
+
+def _import_chunk(rows, report, executor):
+    valid = []
+    for number, data, error in rows:
+        report['processed'] += 1
+        if error:
+            _fail(report, number, data, [error])
+            continue
+        serializer = ImportRowSerializer(data=data)
+        if serializer.is_valid():
+            valid.append((number, data, serializer.validated_data))
+        else:
+            _fail(report, number, data, serializer.errors)
+
+    emails = {row['email'] for _, _, row in valid}
+    licenses = {row['medical_license_number'] for _, _, row in valid if row.get('is_doctor')}
+    taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    taken_licenses = set(
+        DoctorProfile.objects.filter(medical_license_number__in=licenses).values_list('medical_license_number', flat=True)
+    )
+
+    accepted = []
+    for number, data, row in valid:
+        license_number = row.get('medical_license_number') if row.get('is_doctor') else None
+        if row['email'] in taken_emails:
+            _fail(report, number, data, {'email': ['Email already registered']})
+        elif license_number and license_number in taken_licenses:
+            _fail(report, number, data, {'medical_license_number': ['License number already registered']})
+        else:
+            taken_emails.add(row['email'])  # Later duplicates in the same file
+            if license_number:
+                taken_licenses.add(license_number)
+            accepted.append((number, data, row))
+    if not accepted:
+        return
+
+    hashes = make_passwords([row['password'] for _, _, row in accepted], executor)
+    items = [(number, data, row, encoded) for (number, data, row), encoded in zip(accepted, hashes)]
+    try:
+        with transaction.atomic():
+            _insert(items)
+        report['created'] += len(items)
+    except IntegrityError:
+        # Someone registered one of these emails since the check; isolate it
+        for item in items:
+            try:
+                with transaction.atomic():
+                    _insert([item])
+                report['created'] += 1
+            except IntegrityError:
+                _fail(report, item[0], item[1], ['Conflicts with an existing account'])
+
+
+def _insert(items):
+    users = User.objects.bulk_create([
+        User(
+            email=row['email'],
+            password_hash=encoded,
+            first_name=row.get('first_name', ''),
+            last_name=row.get('last_name', ''),
+            is_doctor=row.get('is_doctor', False),
+            account_status='ACTIVE',
+        )
+        for _, _, row, encoded in items
+    ])
+    if users and users[0].pk is None:
+        # Backend can't return ids from a bulk insert
+        ids = dict(User.objects.filter(email__in=[u.email for u in users]).values_list('email', 'id'))
+        for user in users:
+            user.pk = ids[user.email]
+
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, **{field: row[field] for field in PROFILE_FIELDS if field in row})
+        for user, (_, _, row, _) in zip(users, items)
+    ])
+    DoctorProfile.objects.bulk_create([
+        DoctorProfile(
+            user=user,
+            medical_license_number=row['medical_license_number'],
+            specialization=row.get('specialization') or 'General',
+        )
+        for user, (_, _, row, _) in zip(users, items) if row.get('is_doctor')
+    ])
+
+
+# ============================================
+# BACKGROUND JOBS (admin endpoint)
+# ============================================
+def _job_key(job_id):
+    return f'user_import:{job_id}'
+
+
+def start_import_job(path, fmt, admin_id) -> Dict:
+    """Import the file at `path` in the background; the file is deleted when done."""
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'admin_id': admin_id,
+        'status': RUNNING,
+        'format': fmt,
+        'report': {'processed': 0, 'created': 0, 'failed': 0, 'errors': []},
+        'created_at': time.time(),
+        'updated_at': time.time(),
+    }
+    cache.set(_job_key(job_id), job, JOB_TTL)
+    _job_executor.submit(_run_import_job, job_id, path, fmt)
+    return job
+
+
+def _run_import_job(job_id, path, fmt):
+    job = cache.get(_job_key(job_id))
+    if not job:
+        return
+
+    def save(report, status=RUNNING):
+        job.update(report=report, status=status, updated_at=time.time())
+        cache.set(_job_key(job_id), job, JOB_TTL)
+
+    pool = import_pool(getattr(settings, 'IMPORT_HASH_WORKERS', 1))
+    try:
+        with open(path, 'rb') as stream:
+            report = import_users(stream, fmt, executor=pool, progress=save)
+        save(report, COMPLETED)
+        logger.info(f"[Import] Job {job_id}: {report['created']} users created, {report['failed']} rows rejected")
+    except Exception as e:
+        logger.error(f"[Import] Job {job_id} failed: {e}")
+        job['error'] = str(e)
+        save(job['report'], FAILED)
+    finally:
+        if pool:
+            pool.shutdown()
+        close_old_connections()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_import_job(job_id) -> Optional[Dict]:
+    job = cache.get(_job_key(job_id))
+    if job and job['status'] == RUNNING and time.time() - job['updated_at'] > JOB_STALE_SECONDS:
+        job.update({'status': FAILED, 'error': 'Import job was interrupted'})
+    return job
@@ -0,0 +1,30 @@
+"""
+Functions run inside the password hashing pool (see password_pool.py).
+
+Kept free of app and DRF imports: spawned workers import this module to
+unpickle the task before Django is set up.
+"""
+import os
+import time
+from typing import Optional, Tuple
+
+
+def init_worker():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skinscan.settings')
+    django.setup()
+
+
+def hash_password(raw_password) -> Tuple[str, float]:
+    from django.contrib.auth import hashers
+    start = time.perf_counter()
+    return hashers.make_password(raw_password), time.perf_counter() - start
+
+
+def verify_password(raw_password, encoded) -> Tuple[bool, Optional[str], float]:
+    """(is_correct, new_hash_if_outdated, seconds)."""
+    from django.contrib.auth import hashers
+    start = time.perf_counter()
+    upgraded = []
+    is_correct = hashers.check_password(raw_password, encoded, setter=lambda raw: upgraded.append(hashers.make_password(raw)))
+    return is_correct, (upgraded[0] if upgraded else None), time.perf_counter() - start
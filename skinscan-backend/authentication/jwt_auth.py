@@ -1,52 +1,87 @@
 """
 JWT Authentication - Token generation and validation
+
+Access tokens are short-lived (JWT_EXPIRATION_DELTA) and carry the claims the
+views check on every request (role flags, account status), so authenticating
+one is signature + expiry + revocation filter, with no database access. Clients
+renew them with a rotating refresh token (see tokens.py).
 """
+import time
+import uuid
+
 import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from .models import User
+from .principal_cache import get_principal
+from .tokens import is_revoked, issue_refresh_token
+
+CLAIM_FIELDS = ('email', 'is_admin', 'is_doctor', 'account_status', 'first_name', 'last_name')
+
+
+class TokenUser(SimpleLazyObject):
+    """
+    request.user for a verified access token. The token claims are answered
+    directly; any other attribute, or passing it to the ORM, loads the full
+    User from the principal cache on first use.
+    """
+
+    def __init__(self, payload):
+        user_id = payload['user_id']
+        claims = {name: payload.get(name) for name in CLAIM_FIELDS}
+        claims.update(id=user_id, pk=user_id, is_authenticated=True, is_active=claims['account_status'] == 'ACTIVE')
+        self.__dict__['_claims'] = claims
+        super().__init__(lambda: _load_user(user_id))
+
+    def __getattr__(self, name):
+        claims = self.__dict__['_claims']
+        if name in claims:
+            return claims[name]
+        return super().__getattr__(name)
+
+
+def _load_user(user_id):
+    user = get_principal(user_id)
+    if user is None:
+        raise AuthenticationFailed('User not found')
+    return user
 
 
 class JWTAuthentication(BaseAuthentication):
     """Custom JWT authentication class"""
-    
+
     def authenticate(self, request):
         """Validate JWT token from Authorization header"""
         auth_header = request.headers.get('Authorization')
-        
+
         if not auth_header:
             return None
-        
+
         try:
             # Extract token from "Bearer <token>"
             prefix, token = auth_header.split(' ')
             if prefix.lower() != 'bearer':
                 raise AuthenticationFailed('Invalid token prefix')
-            
+
             # Decode and verify token
             payload = jwt.decode(
                 token,
                 settings.JWT_SECRET_KEY,
                 algorithms=[settings.JWT_ALGORITHM]
             )
-            
-            # Get user from payload
-            user_id = payload.get('user_id')
-            if not user_id:
+
+            if payload.get('type') != 'access' or not payload.get('user_id'):
                 raise AuthenticationFailed('Invalid token payload')
-            
-            # Fetch actual user from database
-            try:
-                user = User.objects.get(id=user_id)
-                if user.account_status != 'ACTIVE':
-                    raise AuthenticationFailed('Account is locked')
-            except User.DoesNotExist:
-                raise AuthenticationFailed('User not found')
-            
-            return (user, token)
-            
+            if payload.get('account_status') != 'ACTIVE':
+                raise AuthenticationFailed('Account is locked')
+            # Logout, admin lock/ban/role change
+            if is_revoked(payload):
+                raise AuthenticationFailed('Token has been revoked')
+
+            return (TokenUser(payload), token)
+
         except jwt.ExpiredSignatureError:
             raise AuthenticationFailed('Token has expired')
         except jwt.InvalidTokenError:
@@ -54,28 +89,45 @@ class JWTAuthentication(BaseAuthentication):
         except ValueError:
             raise AuthenticationFailed('Invalid authorization header format')
 
+    def authenticate_header(self, request):
+        # Makes DRF answer 401 (not 403) so clients know to refresh
+        return 'Bearer realm="api"'
+
 
 def generate_jwt_token(user):
-    """Generate JWT token for user"""
+    """Generate a short-lived access token for user"""
     payload = {
+        'type': 'access',
+        'jti': uuid.uuid4().hex,
         'user_id': user.id,
         'email': user.email,
         'is_admin': getattr(user, 'is_admin', False),
+        'is_doctor': getattr(user, 'is_doctor', False),
+        'account_status': getattr(user, 'account_status', 'ACTIVE'),
         'first_name': getattr(user, 'first_name', ''),
         'last_name': getattr(user, 'last_name', ''),
         'exp': datetime.utcnow() + settings.JWT_EXPIRATION_DELTA,
-        'iat': datetime.utcnow()
+        'iat': time.time(),  # Sub-second, compared against user-wide revocations
     }
-    
+
     token = jwt.encode(
         payload,
         settings.JWT_SECRET_KEY,
         algorithm=settings.JWT_ALGORITHM
     )
-    
+
     return token
 
 
+def issue_token_pair(user):
+    """Access token + new refresh token, as returned by login and register."""
+    return {
+        'token': generate_jwt_token(user),
+        'refresh_token': issue_refresh_token(user),
+        'expires_in': int(settings.JWT_EXPIRATION_DELTA.total_seconds()),
+    }
+
+
 def decode_jwt_token(token):
     """Decode and validate JWT token"""
     try:
@@ -0,0 +1,92 @@
+"""
+Benchmark login throughput with password hashing inline vs in the hashing pool.
+
+Creates a throwaway user, fires concurrent requests at LoginView (rate limiting
+disabled) and reports logins/s, latency percentiles and the CPU time spent on
+the request threads - the part that competes with inference in a web worker.
+The user is deleted afterwards.
+
+Usage:
+    python manage.py benchmark_login --logins 200 --concurrency 16
+    python manage.py benchmark_login --mode pool --workers 4
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from authentication.models import User
+from authentication.password_pool import pool_stats
+from authentication.views import LoginView
+from skinscan.utils import percentile
+
+BENCH_EMAIL = 'benchmark-login@skinscan.invalid'
+BENCH_PASSWORD = 'Benchmark-Login-1'
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput with password hashing inline and in the process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--mode', choices=['inline', 'pool', 'both'], default='both')
+        parser.add_argument('--workers', type=int, default=None, help='Pool size (default: PASSWORD_HASH_WORKERS)')
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        workers = options['workers'] or settings.PASSWORD_HASH_WORKERS or 2
+        modes = ['inline', 'pool'] if options['mode'] == 'both' else [options['mode']]
+
+        User.objects.filter(email=BENCH_EMAIL).delete()
+        user = User(email=BENCH_EMAIL, first_name='Benchmark', account_status='ACTIVE')
+        with override_settings(PASSWORD_HASH_WORKERS=0):
+            user.set_password(BENCH_PASSWORD)
+        user.save()
+
+        try:
+            for mode in modes:
+                with override_settings(PASSWORD_HASH_WORKERS=0 if mode == 'inline' else workers, RATELIMIT_ENABLE=False):
+                    self._run(mode, options['logins'], options['concurrency'], workers)
+        finally:
+            User.objects.filter(email=BENCH_EMAIL).delete()
+
+    def _run(self, mode, logins, concurrency, workers):
+        factory = RequestFactory()
+        view = LoginView.as_view()
+        body = json.dumps({'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+
+        def login(_):
+            request = factory.post('/api/auth/login', body, content_type='application/json')
+            cpu_start, start = time.thread_time(), time.perf_counter()
+            try:
+                response = view(request)
+                return response.status_code, time.perf_counter() - start, time.thread_time() - cpu_start
+            finally:
+                connection.close()
+
+        # Warm-up: start the pool processes and the DB connections
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(login, range(min(concurrency, workers * 2))))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(login, range(logins)))
+        elapsed = time.perf_counter() - started
+
+        latencies = [r[1] * 1000 for r in results]
+        cpu = [r[2] * 1000 for r in results]
+        failures = sum(1 for r in results if r[0] != 200)
+        label = 'inline' if mode == 'inline' else f'pool ({workers} workers)'
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{label}: {logins} logins, concurrency {concurrency}'))
+        self.stdout.write(f'  throughput        {logins / elapsed:8.1f} logins/s')
+        self.stdout.write(f'  latency p50 / p95 {percentile(latencies, 50):8.1f} / {percentile(latencies, 95):.1f} ms')
+        self.stdout.write(f'  request-thread CPU{percentile(cpu, 50):8.1f} ms per login (p50)')
+        self.stdout.write(f'  non-200 responses {failures:8d}')
+        if mode == 'pool':
+            stats = pool_stats()
+            self.stdout.write(f"  pool wait p50/p95 {stats['p50_wait_ms']} / {stats['p95_wait_ms']} ms, "
+                              f"max in flight {stats['max_in_flight']}, rejected {stats['rejected']}")
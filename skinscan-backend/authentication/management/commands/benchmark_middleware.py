@@ -0,0 +1,96 @@
+"""
+Benchmark per-request middleware overhead on API routes: the stock Django
+session/CSRF/auth/messages middleware vs the path-aware ones in
+skinscan/middleware.py.
+
+Each request goes through a Django handler built with the given MIDDLEWARE
+list and carries a Bearer token plus the csrftoken/sessionid cookies a
+browser that has opened the admin would send. Reports µs per request for an
+empty stack (the view alone) and each middleware stack, and the overhead the
+stack adds on top of the view.
+
+Usage:
+    python manage.py benchmark_middleware --requests 2000 --repeat 5
+    python manage.py benchmark_middleware --path /api/auth/notifications --email admin@x.com
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from django.utils.module_loading import import_string
+
+from authentication.jwt_auth import generate_jwt_token
+from authentication.models import User
+from skinscan.utils import percentile
+
+
+def _stock(middleware):
+    """MIDDLEWARE with every path-aware class replaced by the Django original."""
+    stock = []
+    for path in middleware:
+        wrapped = getattr(import_string(path), 'wrapped', None)
+        stock.append(f'{wrapped.__module__}.{wrapped.__name__}' if wrapped else path)
+    return stock
+
+
+class Command(BaseCommand):
+    help = 'Per-request cost of the middleware stack on API routes, stock vs path-aware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/auth/profile')
+        parser.add_argument('--email', default=None, help='Authenticate as this user (default: anonymous, answered 401)')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        headers = {'HTTP_COOKIE': 'csrftoken=' + 'c' * 32 + '; sessionid=' + 's' * 32}
+        if options['email']:
+            user = User.objects.filter(email=options['email']).first()
+            if user is None:
+                raise CommandError(f"No user {options['email']}")
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {generate_jwt_token(user)}'
+
+        stacks = [
+            ('view only', []),
+            ('stock', _stock(settings.MIDDLEWARE)),
+            ('path-aware', list(settings.MIDDLEWARE)),
+        ]
+        handlers = []
+        for name, middleware in stacks:
+            with override_settings(MIDDLEWARE=middleware):
+                handler = BaseHandler()
+                handler.load_middleware()
+            handlers.append((name, handler))
+
+        path, count = options['path'], options['requests']
+        factory = RequestFactory()
+        timings = {name: [] for name, _ in handlers}
+        statuses = {}
+        # 401s would otherwise log a warning per request
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(RATELIMIT_ENABLE=False):
+                for name, handler in handlers:
+                    handler.get_response(factory.get(path, **headers))  # Warm-up: URL resolver, imports
+                # Stacks take turns in every run, so drift (cache, DB) hits them alike
+                for _ in range(options['repeat']):
+                    for name, handler in handlers:
+                        requests = [factory.get(path, **headers) for _ in range(count)]
+                        started = time.perf_counter()
+                        for request in requests:
+                            statuses[name] = handler.get_response(request).status_code
+                        timings[name].append((time.perf_counter() - started) * 1e6 / count)
+        finally:
+            request_logger.setLevel(level)
+
+        self.stdout.write(f"GET {path}, {count} requests x {options['repeat']} runs")
+        self.stdout.write(f"{'stack':12} {'status':>6} {'µs/request':>11} {'overhead':>9}")
+        baseline = percentile(timings['view only'], 50)
+        for name, _ in handlers:
+            per_request = percentile(timings[name], 50)
+            self.stdout.write(f'{name:12} {statuses[name]:>6} {per_request:11.1f} {per_request - baseline:9.1f}')
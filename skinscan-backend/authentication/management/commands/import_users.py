@@ -0,0 +1,70 @@
+"""
+Bulk-import users from a CSV or NDJSON file.
+
+CSV needs a header row; NDJSON has one JSON object per line. Columns: email,
+password (required), first_name, last_name, phone, date_of_birth, gender,
+country, is_doctor, medical_license_number, specialization. Invalid rows are
+skipped and listed at the end (or written to --report).
+
+Usage:
+    python manage.py import_users patients.csv --workers 8
+    python manage.py import_users patients.ndjson --report import-errors.json
+"""
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.bulk_import import CHUNK_SIZE, detect_format, import_users
+from authentication.password_pool import import_pool
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import users from CSV / NDJSON with parallel password hashing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None, help='Default: from the file extension')
+        parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 2) - 1, 1),
+                            help='Hashing processes (0 = hash in this process)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--report', default=None, help='Write the per-row error report to this JSON file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        fmt = detect_format(path, options['format'])
+        if not fmt:
+            raise CommandError('Cannot tell the format; pass --format csv|ndjson')
+
+        pool = import_pool(options['workers'])
+
+        started = time.monotonic()
+
+        def progress(report):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {report['processed']} rows, {report['created']} created, "
+                              f"{report['failed']} rejected ({report['processed'] / max(elapsed, 1e-6):.0f} rows/s)")
+
+        try:
+            with open(path, 'rb') as stream:
+                report = import_users(stream, fmt, chunk_size=options['chunk_size'], executor=pool, progress=progress)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} users in {elapsed:.1f}s; {report['failed']} rows rejected"
+        ))
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report['errors'], f, indent=2)
+            self.stdout.write(f"Error report written to {options['report']}")
+        else:
+            for error in report['errors'][:50]:
+                self.stdout.write(f"  row {error['row']} ({error['email']}): {error['errors']}")
+            if len(report['errors']) > 50:
+                self.stdout.write(f"  ... {len(report['errors']) - 50} more (use --report)")
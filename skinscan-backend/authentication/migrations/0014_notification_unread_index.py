@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0013_refresh_and_revoked_tokens'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notifications_user_unread_idx'),
+        ),
+    ]
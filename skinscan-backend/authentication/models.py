@@ -2,7 +2,6 @@
 Authentication Models - User Management
 """
 from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
 
 
 class User(models.Model):
@@ -57,12 +56,18 @@ class User(models.Model):
         return f"{name or 'User'} ({self.email})"
     
     def set_password(self, raw_password):
-        """Hash and set password"""
+        """Hash and set password (in the password hashing pool)"""
+        from .password_pool import make_password
         self.password_hash = make_password(raw_password)
     
     def check_password(self, raw_password):
-        """Verify password"""
-        return check_password(raw_password, self.password_hash)
+        """Verify password; re-hashes it if PASSWORD_HASHERS changed since it was stored"""
+        from .password_pool import verify_password
+        is_correct, new_hash = verify_password(raw_password, self.password_hash)
+        if new_hash and self.pk:
+            self.password_hash = new_hash
+            self.save(update_fields=['password_hash'])
+        return is_correct
 
     @property
     def is_authenticated(self):
@@ -164,6 +169,10 @@ class Notification(models.Model):
     class Meta:
         db_table = 'notifications'
         ordering = ['-created_at']
+        indexes = [
+            # Unread list / counter per user, newest first (keyset order)
+            models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notifications_user_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} for {self.user.email} - Read: {self.is_read}"
@@ -186,3 +195,43 @@ class DoctorDocument(models.Model):
 
     def __str__(self):
         return f"Doc: {self.name} from {self.doctor.email} to {self.patient.email}"
+
+
+class RefreshToken(models.Model):
+    """
+    Long-lived refresh token (see authentication/tokens.py). Only the SHA-256
+    of the token is stored. Each refresh revokes the presented token and issues
+    a new one in the same family; presenting a revoked token revokes the family.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    family = models.UUIDField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'refresh_tokens'
+        indexes = [
+            models.Index(fields=['user', 'revoked_at'], name='idx_refresh_user_revoked'),
+        ]
+
+    def __str__(self):
+        return f"Refresh token {self.family} for user {self.user_id}"
+
+
+class RevokedToken(models.Model):
+    """
+    Revoked access tokens, kept until the tokens would have expired anyway.
+    `key` is either a token id ('jti:<id>') or 'user:<id>', which revokes every
+    access token of that user issued before `revoked_at`.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    revoked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'revoked_tokens'
+
+    def __str__(self):
+        return f"{self.key} (until {self.expires_at})"
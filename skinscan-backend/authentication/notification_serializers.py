@@ -1,7 +1,19 @@
 from rest_framework import serializers
+from skinscan.fast_serializers import Projection, iso_datetime
 from .models import Notification
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'title', 'message', 'type', 'is_read', 'created_at']
+
+
+# Read path of the notification list and stream: the JSON of NotificationSerializer from values() rows
+NOTIFICATION_ROWS = Projection(
+    id='id',
+    title='title',
+    message='message',
+    type='type',
+    is_read='is_read',
+    created_at=('created_at', iso_datetime),
+)
@@ -1,32 +1,83 @@
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from skinscan.async_views import AsyncAPIView, api_error
+from skinscan.pagination import InvalidCursor, keyset_page, page_size
+from . import notifications
 from .models import Notification
-from .notification_serializers import NotificationSerializer
+from .notification_serializers import NOTIFICATION_ROWS
 
 class NotificationView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        """List unread notifications for the user"""
-        notifications = Notification.objects.filter(user=request.user, is_read=False)
-        serializer = NotificationSerializer(notifications, many=True)
+        """List the user's notifications, newest first (unread only unless ?all=true; ?limit=, ?cursor=)"""
+        queryset = Notification.objects.filter(user=request.user)
+        if request.query_params.get('all', '').lower() not in ('1', 'true', 'yes'):
+            queryset = queryset.filter(is_read=False)
+        try:
+            rows, next_cursor = keyset_page(
+                NOTIFICATION_ROWS.values(queryset), 'created_at', request.query_params.get('cursor'),
+                page_size(request.query_params.get('limit'), default=20)
+            )
+        except InvalidCursor:
+            return Response({'status': 'error', 'error_code': 'INVALID_CURSOR', 'message': 'Invalid cursor'}, status=400)
         return Response({
             'status': 'success',
-            'data': serializer.data
+            'data': {
+                'notifications': NOTIFICATION_ROWS.dump(rows),
+                'unread_count': notifications.unread_count(request.user.id),
+                'next_cursor': next_cursor
+            }
         })
 
     def post(self, request, pk=None):
         """Mark notification as read"""
         if pk:
-            try:
-                notification = Notification.objects.get(pk=pk, user=request.user)
-                notification.is_read = True
-                notification.save()
+            if notifications.mark_read(request.user.id, pk):
                 return Response({'status': 'success', 'message': 'Notification marked as read'})
-            except Notification.DoesNotExist:
-                return Response({'status': 'error', 'message': 'Notification not found'}, status=404)
-        
+            if Notification.objects.filter(pk=pk, user=request.user).exists():
+                return Response({'status': 'success', 'message': 'Notification already read'})
+            return Response({'status': 'error', 'message': 'Notification not found'}, status=404)
+
         # Mark all as read
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        notifications.mark_read(request.user.id)
         return Response({'status': 'success', 'message': 'All notifications marked as read'})
+
+
+class NotificationStreamView(AsyncAPIView):
+    """
+    Push channel for new notifications (server-sent events, see
+    authentication/notifications.py). The stream ends after
+    NOTIFICATION_STREAM_SECONDS and the client reconnects with Last-Event-ID,
+    which also re-checks its token. Served through WSGI, where the stream would
+    hold a worker per open tab, it answers at once with the unread counter and
+    the client polls again after NOTIFICATION_SHORT_POLL_SECONDS.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            response = HttpResponse(
+                await sync_to_async(notifications.unread_snapshot)(request.user.id),
+                content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        last_id = request.headers.get('Last-Event-ID') or request.GET.get('after')
+        if last_id is not None:
+            try:
+                last_id = int(last_id)
+            except ValueError:
+                return api_error('Invalid Last-Event-ID', 'INVALID_EVENT_ID', 400)
+
+        response = StreamingHttpResponse(
+            notifications.event_stream(request.user.id, last_id),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+        return response
@@ -0,0 +1,197 @@
+"""
+In-app notifications: creation, the cached unread counter and the push channel.
+
+- notify() creates single notifications (scan completed, appointment
+  requested, doctor verified). After the row commits, it bumps the user's
+  unread counter and change marker in the shared cache.
+- announcements to many users go through broadcasts.py. Writing a key per
+  recipient would be slow on the file cache and would cull other entries, so
+  each chunk only bumps one shared broadcast version (broadcast_delivered).
+  Unread counters are keyed by that version, so every counter is recounted
+  on its next read.
+- unread_count() reads the counter and only falls back to a COUNT query when
+  the counter is missing. mark_read() adjusts it. A counter that drifts
+  because of a race is corrected within UNREAD_TTL.
+- event_stream() drives the server-sent events endpoint under ASGI. It
+  watches the user's change marker and the broadcast version in the cache
+  (no DB query while nothing happens). When either changes, it fetches the
+  notifications newer than the last one sent with a single indexed query.
+- unread_snapshot() answers the same endpoint under WSGI. Django buffers a
+  stream there until it ends, and a held connection would tie up a worker per
+  open tab, so the client short-polls instead: each request reads the unread
+  counter once and tells the browser to come back after
+  NOTIFICATION_SHORT_POLL_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+from .notification_serializers import NOTIFICATION_ROWS
+
+logger = logging.getLogger(__name__)
+
+UNREAD_TTL = 3600
+HEARTBEAT_SECONDS = 15  # Keeps proxies from closing an idle stream
+RETRY_MS = 3000  # Client reconnect delay after the stream ends
+BATCH = 50
+
+
+BROADCAST_KEY = 'notifications:broadcast'
+
+
+def _unread_key(user_id, broadcast):
+    return f'notifications:unread:{user_id}:{broadcast}'
+
+
+def _marker_key(user_id):
+    return f'notifications:marker:{user_id}'
+
+
+def _broadcast_version() -> int:
+    """Current broadcast version; a lost one is replaced, which only forces recounts."""
+    version = cache.get(BROADCAST_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(BROADCAST_KEY, version, None):
+            version = cache.get(BROADCAST_KEY, version)
+    return version
+
+
+def broadcast_delivered():
+    """A broadcast chunk committed: one cache write invalidates every unread counter and wakes every stream."""
+    cache.set(BROADCAST_KEY, time.time_ns(), None)
+
+
+def _changed(user_id, delta=None):
+    """Adjust the unread counter by `delta` (None = recount on next read) and wake the streams."""
+    key = _unread_key(user_id, _broadcast_version())
+    if delta is None:
+        cache.delete(key)
+    else:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass  # Not cached; the next read counts
+    cache.set(_marker_key(user_id), time.time_ns(), UNREAD_TTL)
+
+
+# ============================================
+# WRITES
+# ============================================
+def notify(user, title, message, type) -> Optional[Notification]:
+    """Create a notification; failures are logged, never raised into the caller's request."""
+    try:
+        notification = Notification.objects.create(user=user, title=title, message=message, type=type)
+    except Exception as e:
+        logger.error(f"Failed to create notification: {e}")
+        return None
+    transaction.on_commit(lambda: _changed(notification.user_id, 1))
+    return notification
+
+
+def mark_read(user_id, pk=None) -> int:
+    """Mark one notification (or all of them) read; returns how many changed."""
+    queryset = Notification.objects.filter(user_id=user_id, is_read=False)
+    if pk is not None:
+        queryset = queryset.filter(pk=pk)
+    updated = queryset.update(is_read=True)
+    if updated:
+        _changed(user_id, -updated if pk is not None else None)
+    return updated
+
+
+# ============================================
+# READS
+# ============================================
+def unread_count(user_id) -> int:
+    key = _unread_key(user_id, _broadcast_version())
+    count = cache.get(key)
+    if count is None or count < 0:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(key, count, UNREAD_TTL)
+    return count
+
+
+def _newer_than(user_id, last_id):
+    rows = NOTIFICATION_ROWS.values(Notification.objects.filter(user_id=user_id, id__gt=last_id).order_by('id'))[:BATCH]
+    return NOTIFICATION_ROWS.dump(rows)
+
+
+def _latest_id(user_id) -> int:
+    return Notification.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+# ============================================
+# PUSH CHANNEL
+# ============================================
+def _event(name, data, event_id=None) -> str:
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {name}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def unread_snapshot(user_id) -> str:
+    """The `unread` event alone, for a WSGI short poll; the `retry` field sets the poll interval."""
+    retry_ms = getattr(settings, 'NOTIFICATION_SHORT_POLL_SECONDS', 15) * 1000
+    return f'retry: {retry_ms}\n\n' + _event('unread', {'unread_count': unread_count(user_id)})
+
+
+async def event_stream(user_id, last_id=None):
+    """
+    Server-sent events for one user until NOTIFICATION_STREAM_SECONDS elapse:
+
+        event: unread          data: {"unread_count": n}     (on connect and on every change)
+        id: <pk>
+        event: notification    data: {...notification...}
+
+    Resumes after `last_id` (the browser's Last-Event-ID) so nothing is lost
+    across reconnects; without it only notifications created from now on are sent.
+    """
+    poll = getattr(settings, 'NOTIFICATION_POLL_INTERVAL', 1.0)
+    lifetime = getattr(settings, 'NOTIFICATION_STREAM_SECONDS', 300)
+    deadline = time.monotonic() + lifetime
+    if last_id is None:
+        last_id = await sync_to_async(_latest_id)(user_id)
+    keys = (_marker_key(user_id), BROADCAST_KEY)
+    markers = await cache.aget_many(keys)
+
+    yield f'retry: {RETRY_MS}\n\n'
+    yield _event('unread', {'unread_count': await sync_to_async(unread_count)(user_id)})
+    pending = True  # Deliver anything created since `last_id` first
+    recount = False  # A broadcast may or may not have reached this user
+    last_write = time.monotonic()
+    while True:
+        if pending:
+            rows = await sync_to_async(_newer_than)(user_id, last_id)
+            for row in rows:
+                last_id = row['id']
+                yield _event('notification', row, event_id=last_id)
+            if rows:
+                if recount:
+                    yield _event('unread', {'unread_count': await sync_to_async(unread_count)(user_id)})
+                last_write = time.monotonic()
+            pending = len(rows) == BATCH
+            recount = False
+        if time.monotonic() >= deadline:
+            return
+
+        await asyncio.sleep(poll)
+        current = await cache.aget_many(keys)
+        if current.get(keys[0]) != markers.get(keys[0]):
+            markers = current
+            pending = True
+            yield _event('unread', {'unread_count': await sync_to_async(unread_count)(user_id)})
+            last_write = time.monotonic()
+        elif current.get(keys[1]) != markers.get(keys[1]):
+            markers = current
+            pending = recount = True
+        elif time.monotonic() - last_write >= HEARTBEAT_SECONDS:
+            yield ': keep-alive\n\n'
+            last_write = time.monotonic()
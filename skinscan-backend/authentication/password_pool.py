@@ -0,0 +1,186 @@
+"""
+Password hashing off the request threads.
+
+PBKDF2 is deliberately CPU-heavy. Run inline, a burst of logins pins every web
+worker's cores and starves inference. make_password / check_password calls made
+through User.set_password and User.check_password run instead in a small
+process pool:
+
+- PASSWORD_HASH_WORKERS processes (0 = hash inline, e.g. for tests) cap how many
+  cores hashing can use
+- at most PASSWORD_HASH_MAX_PENDING hashes are queued or running per web
+  process. A request that can't get a slot within PASSWORD_HASH_QUEUE_TIMEOUT
+  seconds fails fast with PasswordPoolBusy (503) instead of piling up
+- verification also reports whether the stored hash uses an outdated hasher
+  or iteration count. The worker then returns a fresh hash and
+  User.check_password saves it (rehash-on-login)
+
+Bulk imports hash in a pool of their own (import_pool, IMPORT_HASH_WORKERS for
+the admin endpoint), never in this one.
+
+pool_stats() reports queue depth, waits and hash times for the admin dashboard.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+
+from skinscan.utils import percentile
+
+from . import hashing_worker
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WINDOW = 500
+
+
+class PasswordPoolBusy(APIException):
+    status_code = 503
+    default_detail = 'Too many sign-ins in progress, please retry shortly'
+    default_code = 'password_hashing_busy'
+    wait = 1  # Retry-After
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_slots: Optional[threading.BoundedSemaphore] = None
+_stats_lock = threading.Lock()
+_stats = {
+    'submitted': 0, 'completed': 0, 'rejected': 0, 'rehashed': 0, 'pool_restarts': 0,
+    'in_flight': 0, 'max_in_flight': 0,
+    'waits': deque(maxlen=SAMPLE_WINDOW), 'durations': deque(maxlen=SAMPLE_WINDOW),
+}
+
+
+# ============================================
+# POOL
+# ============================================
+def _workers() -> int:
+    return max(getattr(settings, 'PASSWORD_HASH_WORKERS', 2), 0)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn (not fork) so workers don't inherit the web process' torch threads and DB connections
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=hashing_worker.init_worker,
+            )
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+            _stats['pool_restarts'] += 1
+    broken.shutdown(wait=False)
+
+
+def _get_slots() -> threading.BoundedSemaphore:
+    global _slots
+    with _pool_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(max(getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 16), 1))
+        return _slots
+
+
+def _run(fn, *args):
+    """Run fn in the pool (or inline when disabled); returns its result."""
+    if not _workers():
+        return fn(*args)
+
+    slots = _get_slots()
+    queued_at = time.monotonic()
+    if not slots.acquire(timeout=getattr(settings, 'PASSWORD_HASH_QUEUE_TIMEOUT', 5.0)):
+        with _stats_lock:
+            _stats['rejected'] += 1
+        raise PasswordPoolBusy()
+
+    with _stats_lock:
+        _stats['submitted'] += 1
+        _stats['in_flight'] += 1
+        _stats['max_in_flight'] = max(_stats['max_in_flight'], _stats['in_flight'])
+    try:
+        pool = _get_pool()
+        try:
+            result = pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            logger.error("[Auth] Password hashing pool died; restarting it")
+            _reset_pool(pool)
+            result = _get_pool().submit(fn, *args).result()
+        with _stats_lock:
+            _stats['completed'] += 1
+            _stats['waits'].append(time.monotonic() - queued_at - result[-1])
+            _stats['durations'].append(result[-1])
+        return result
+    finally:
+        with _stats_lock:
+            _stats['in_flight'] -= 1
+        slots.release()
+
+
+def make_password(raw_password) -> str:
+    return _run(hashing_worker.hash_password, raw_password)[0]
+
+
+def make_passwords(raw_passwords, executor=None) -> List[str]:
+    """
+    Hash many passwords (bulk import) in `executor`, the import's own pool
+    (see import_pool), or in the calling thread without one. Never in the
+    login pool: an import would hold its slots and turn concurrent sign-ins
+    into PasswordPoolBusy.
+    """
+    if executor is None:
+        return [hashing_worker.hash_password(raw)[0] for raw in raw_passwords]
+    return [encoded for encoded, _ in executor.map(hashing_worker.hash_password, raw_passwords, chunksize=8)]
+
+
+def import_pool(workers) -> Optional[ProcessPoolExecutor]:
+    """A hashing pool for one bulk import (None for workers <= 0); shut it down when done."""
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=hashing_worker.init_worker,
+    )
+
+
+def verify_password(raw_password, encoded) -> Tuple[bool, Optional[str]]:
+    """(is_correct, new_hash); new_hash is set when the stored hash should be upgraded."""
+    is_correct, new_hash, _ = _run(hashing_worker.verify_password, raw_password, encoded)
+    if new_hash:
+        with _stats_lock:
+            _stats['rehashed'] += 1
+    return is_correct, new_hash
+
+
+def pool_stats():
+    """Queue and latency figures since this process started (per web process)."""
+    with _stats_lock:
+        snapshot = {**_stats, 'waits': list(_stats['waits']), 'durations': list(_stats['durations'])}
+    waits = [w * 1000 for w in snapshot.pop('waits')]
+    durations = [d * 1000 for d in snapshot.pop('durations')]
+    return {
+        **snapshot,
+        'workers': _workers(),
+        'max_pending': getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 16),
+        'hasher': hashers.get_hasher().algorithm,
+        'p50_wait_ms': percentile(waits, 50),
+        'p95_wait_ms': percentile(waits, 95),
+        'p50_hash_ms': percentile(durations, 50),
+        'p95_hash_ms': percentile(durations, 95),
+    }
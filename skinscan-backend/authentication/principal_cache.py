@@ -0,0 +1,84 @@
+"""
+Short-lived cache of authenticated principals for JWTAuthentication.
+
+Without it every API request costs a users query (plus profile / doctor_profile
+queries in the views that read them). get_principal() keeps the user row and
+both profile rows in the shared Django cache for AUTH_PRINCIPAL_TTL seconds and
+rebuilds model instances from them, so views still receive a regular User.
+
+- password_hash is never cached; it is a deferred field on cached users and
+  loads on first access. save() on such a user only writes the loaded fields.
+- Every code path that changes a user's status, role flags or profile calls
+  invalidate_principal(), so a lock, ban or demotion applies to the user's next
+  request. The TTL bounds staleness for writes made elsewhere (Django admin,
+  shell, raw SQL).
+"""
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.fields.files import FieldFile
+
+from .models import DoctorProfile, User, UserProfile
+
+logger = logging.getLogger(__name__)
+
+EXCLUDED_FIELDS = {'password_hash'}
+
+
+def _key(user_id):
+    return f'principal:{user_id}'
+
+
+def _row(instance, exclude=()):
+    row = {}
+    for field in instance._meta.concrete_fields:
+        if field.attname in exclude:
+            continue
+        value = getattr(instance, field.attname)
+        row[field.attname] = value.name if isinstance(value, FieldFile) else value
+    return row
+
+
+def _instance(model, row):
+    return model.from_db('default', list(row), list(row.values()))
+
+
+def _load(user_id) -> Optional[dict]:
+    user = User.objects.select_related('profile', 'doctor_profile').filter(id=user_id).first()
+    if user is None:
+        return None
+    profile = user.profile if hasattr(user, 'profile') else None
+    doctor_profile = user.doctor_profile if hasattr(user, 'doctor_profile') else None
+    return {
+        'user': _row(user, EXCLUDED_FIELDS),
+        'profile': _row(profile) if profile else None,
+        'doctor_profile': _row(doctor_profile) if doctor_profile else None,
+    }
+
+
+def get_principal(user_id) -> Optional[User]:
+    """User with `profile` and `doctor_profile` already attached, or None if it doesn't exist."""
+    key = _key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        entry = _load(user_id)
+        if entry is None:
+            return None
+        cache.set(key, entry, getattr(settings, 'AUTH_PRINCIPAL_TTL', 60))
+
+    user = _instance(User, entry['user'])
+    for name, model in (('profile', UserProfile), ('doctor_profile', DoctorProfile)):
+        related = None
+        if entry[name]:
+            related = _instance(model, entry[name])
+            related._state.fields_cache['user'] = user
+        # None makes the accessor raise DoesNotExist, like a DB miss would
+        user._state.fields_cache[name] = related
+    return user
+
+
+def invalidate_principal(user_id):
+    """Drop the cached principal so the next request re-reads the user."""
+    cache.delete(_key(user_id))
@@ -2,7 +2,8 @@
 Authentication Serializers - Data validation
 """
 from rest_framework import serializers
-from .models import User
+from skinscan.fast_serializers import Projection, age_from, file_url, iso_date, iso_datetime
+from .models import User, UserProfile
 from .validators import validate_password_strength
 import logging
 
@@ -135,6 +136,31 @@ class UserSerializer(serializers.ModelSerializer):
 
         return instance
 
+# Read path of ProfileView.get: the JSON of UserSerializer(user), built from one values() row
+USER_PROFILE_ROW = Projection(
+    id='id',
+    first_name='profile__first_name',
+    last_name='profile__last_name',
+    email='email',
+    phone='profile__phone',
+    date_of_birth=('profile__date_of_birth', iso_date),
+    age=(('profile__date_of_birth', 'date_of_birth'), age_from),
+    gender='profile__gender',
+    country='profile__country',
+    address='profile__address',
+    avatar=('profile__avatar', file_url(UserProfile._meta.get_field('avatar').storage)),
+    skin_type='profile__skin_type',
+    skin_tone='profile__skin_tone',
+    is_admin='is_admin',
+    is_doctor='is_doctor',
+    specialty='specialty',
+    assigned_model='assigned_model',
+    account_status='account_status',
+    last_login=('last_login', iso_datetime),
+    created_at=('created_at', iso_datetime),
+)
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     """Validate password change request"""
     old_password = serializers.CharField(required=True)
@@ -0,0 +1,510 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import broadcasts, bulk_import, notifications, password_pool, principal_cache, tokens
+from .jwt_auth import decode_jwt_token, generate_jwt_token, issue_token_pair
+from .models import DoctorProfile, Notification, RefreshToken, RevokedToken, User, UserProfile
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'authentication-tests'}}
+
+
+# ============================================
+# REFRESH TOKENS
+# ============================================
+@override_settings(CACHES=LOCMEM, RATELIMIT_ENABLE=False)
+class RefreshTokenTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='refresh@test.com', account_status='ACTIVE')
+
+    def test_rotation_revokes_the_presented_token(self):
+        first = tokens.issue_refresh_token(self.user)
+        user, second = tokens.rotate_refresh_token(first)
+        self.assertEqual(user, self.user)
+        self.assertNotEqual(first, second)
+        self.assertEqual(RefreshToken.objects.values('family').distinct().count(), 1)
+        self.assertEqual(RefreshToken.objects.filter(revoked_at__isnull=True).count(), 1)
+
+    def test_reuse_revokes_the_whole_family(self):
+        stolen = tokens.issue_refresh_token(self.user)
+        _, current = tokens.rotate_refresh_token(stolen)
+        other_device = tokens.issue_refresh_token(self.user)
+
+        with self.assertLogs('authentication.tokens', 'WARNING'):
+            with self.assertRaisesMessage(tokens.InvalidRefreshToken, 'revoked'):
+                tokens.rotate_refresh_token(stolen)
+        with self.assertRaises(tokens.InvalidRefreshToken):
+            tokens.rotate_refresh_token(current)
+        self.assertEqual(tokens.rotate_refresh_token(other_device)[0], self.user)
+
+    def test_expired_unknown_and_locked_tokens_are_refused(self):
+        expired = tokens.issue_refresh_token(self.user)
+        RefreshToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        for raw, message in ((expired, 'expired'), ('made-up', 'Invalid'), (None, 'Invalid')):
+            with self.assertRaisesMessage(tokens.InvalidRefreshToken, message):
+                tokens.rotate_refresh_token(raw)
+
+        locked = tokens.issue_refresh_token(self.user)
+        User.objects.filter(id=self.user.id).update(account_status='LOCKED')
+        with self.assertRaisesMessage(tokens.InvalidRefreshToken, 'locked'):
+            tokens.rotate_refresh_token(locked)
+
+    def test_refresh_endpoint_rotates_and_rejects_replay(self):
+        client = APIClient()
+        raw = tokens.issue_refresh_token(self.user)
+        response = client.post('/api/auth/token/refresh', {'refresh_token': raw}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['data']['refresh_token'], raw)
+
+        with self.assertLogs('authentication.tokens', 'WARNING'):
+            response = client.post('/api/auth/token/refresh', {'refresh_token': raw}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+# ============================================
+# ACCESS-TOKEN REVOCATION
+# ============================================
+class BloomFilterTests(TestCase):
+
+    def test_added_keys_are_always_found(self):
+        bloom = tokens.BloomFilter(1000)
+        keys = [f'jti:{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+        false_positives = sum(f'jti:other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)  # Sized for 1%
+
+    def test_round_trip_through_the_cache_format(self):
+        bloom = tokens.BloomFilter(10)
+        bloom.add('user:7')
+        copy = tokens.BloomFilter.from_dict(bloom.to_dict())
+        self.assertIn('user:7', copy)
+        self.assertNotIn('user:8', copy)
+
+
+@override_settings(CACHES=LOCMEM)
+class RevocationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        tokens._local.update(filter=None, version=None, checked_at=0.0)
+        self.user = User.objects.create(email='revoke@test.com', account_status='ACTIVE')
+
+    def access(self):
+        return decode_jwt_token(generate_jwt_token(self.user))
+
+    def test_logout_revokes_only_that_access_token(self):
+        payload, other = self.access(), self.access()
+        tokens.revoke_access_token(payload)
+        self.assertTrue(tokens.is_revoked(payload))
+        self.assertFalse(tokens.is_revoked(other))
+
+    def test_user_revocation_spares_tokens_issued_afterwards(self):
+        before = self.access()
+        tokens.issue_refresh_token(self.user)
+        time.sleep(0.01)
+        tokens.revoke_user_tokens(self.user.id)
+        time.sleep(0.01)
+
+        self.assertTrue(tokens.is_revoked(before))
+        self.assertFalse(tokens.is_revoked(self.access()))
+        self.assertFalse(RefreshToken.objects.filter(revoked_at__isnull=True).exists())
+
+    def test_filter_miss_needs_no_query_and_a_false_positive_is_confirmed(self):
+        payload = self.access()
+        tokens.is_revoked(payload)  # Builds the filter
+        with self.assertNumQueries(0):
+            self.assertFalse(tokens.is_revoked(payload))
+
+        tokens._local['filter'].add(f"jti:{payload['jti']}")  # Collides, but no row
+        with self.assertNumQueries(1):
+            self.assertFalse(tokens.is_revoked(payload))
+
+    def test_revocation_by_another_worker_is_seen_after_sync_interval(self):
+        payload = self.access()
+        tokens.is_revoked(payload)
+        stale = dict(tokens._local)
+
+        tokens.revoke_access_token(payload)  # "Another worker": bumps the shared version and filter
+        tokens._local.update(stale)
+        self.assertFalse(tokens.is_revoked(payload))
+
+        tokens._local['checked_at'] = 0.0
+        with self.assertNumQueries(1):  # Filter comes from the cache; only the hit is confirmed
+            self.assertTrue(tokens.is_revoked(payload))
+        self.assertTrue(RevokedToken.objects.filter(key=f"jti:{payload['jti']}").exists())
+
+    def signed_in(self):
+        self.user.set_password('Old-Passw0rd!')
+        self.user.save()
+        pair = issue_token_pair(self.user)
+        time.sleep(0.01)
+        return pair
+
+    def test_password_change_signs_out_other_sessions_and_renews_this_one(self):
+        other_device, this_device = self.signed_in(), self.signed_in()
+        response = self.client.post('/api/auth/change-password', {
+            'old_password': 'Old-Passw0rd!', 'new_password': 'New-Passw0rd!', 'confirm_password': 'New-Passw0rd!'
+        }, content_type='application/json', headers={'Authorization': f"Bearer {this_device['token']}"})
+        self.assertEqual(response.status_code, 200)
+        fresh = response.json()['data']
+
+        for pair in (other_device, this_device):
+            self.assertTrue(tokens.is_revoked(decode_jwt_token(pair['token'])))
+            with self.assertRaises(tokens.InvalidRefreshToken):
+                tokens.rotate_refresh_token(pair['refresh_token'])
+        self.assertFalse(tokens.is_revoked(decode_jwt_token(fresh['token'])))
+        self.assertEqual(tokens.rotate_refresh_token(fresh['refresh_token'])[0], self.user)
+
+    @override_settings(RATELIMIT_ENABLE=False)
+    def test_password_reset_signs_out_every_session(self):
+        pair = self.signed_in()
+        response = self.client.post('/api/auth/reset-password', {
+            'email': self.user.email, 'otp_code': '123456', 'new_password': 'New-Passw0rd!'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/auth/validate-token', headers={'Authorization': f"Bearer {pair['token']}"})
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(RefreshToken.objects.filter(user=self.user, revoked_at__isnull=True).exists())
+
+
+# ============================================
+# PRINCIPAL CACHE
+# ============================================
+@override_settings(CACHES=LOCMEM, AUTH_PRINCIPAL_TTL=3600)
+class PrincipalCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        tokens._local.update(filter=None, version=None, checked_at=0.0)
+        self.admin = User.objects.create(email='admin@test.com', account_status='ACTIVE', is_admin=True)
+        self.user = User.objects.create(email='member@test.com', account_status='ACTIVE', assigned_model='v1')
+        UserProfile.objects.create(user=self.user, first_name='Old')
+
+    def as_admin(self):
+        return {'Authorization': f'Bearer {generate_jwt_token(self.admin)}'}
+
+    def test_principal_is_served_from_the_cache(self):
+        principal_cache.get_principal(self.user.id)
+        with self.assertNumQueries(0):
+            user = principal_cache.get_principal(self.user.id)
+            self.assertEqual((user.assigned_model, user.profile.first_name), ('v1', 'Old'))
+        with self.assertRaises(DoctorProfile.DoesNotExist):
+            user.doctor_profile
+
+    def test_profile_update_is_seen_on_the_next_request(self):
+        principal_cache.get_principal(self.user.id)
+        response = self.client.put('/api/auth/profile', encode_multipart(BOUNDARY, {'first_name': 'New'}),
+                                   content_type=MULTIPART_CONTENT,
+                                   headers={'Authorization': f'Bearer {generate_jwt_token(self.user)}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(principal_cache.get_principal(self.user.id).profile.first_name, 'New')
+
+    def test_admin_edits_are_seen_on_the_next_request(self):
+        edits = [
+            ('patch', '/api/admin/users/{}/', {'assigned_model': 'v2'}, 'assigned_model', 'v2'),
+            ('patch', '/api/auth/admin/users/{}/', {'assigned_model': 'v3'}, 'assigned_model', 'v3'),
+            ('post', '/api/admin/users/{}/lock/', None, 'account_status', 'LOCKED'),
+            ('post', '/api/auth/admin/users/{}/unlock/', None, 'account_status', 'ACTIVE'),
+            ('post', '/api/admin/users/{}/promote/', None, 'is_admin', True),
+            ('post', '/api/auth/admin/users/{}/demote/', None, 'is_admin', False),
+        ]
+        for method, url, data, field, expected in edits:
+            with self.subTest(url=url, field=field):
+                principal_cache.get_principal(self.user.id)
+                response = getattr(self.client, method)(url.format(self.user.id), data or {},
+                                                       content_type='application/json', headers=self.as_admin())
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(getattr(principal_cache.get_principal(self.user.id), field), expected)
+
+    def test_doctor_approval_is_seen_on_the_next_request(self):
+        self.user.is_doctor = True
+        self.user.save()
+        DoctorProfile.objects.create(user=self.user, medical_license_number='MRN-1', specialization='Dermatology')
+        self.assertFalse(principal_cache.get_principal(self.user.id).doctor_profile.is_verified)
+
+        response = self.client.post(f'/api/admin/doctors/{self.user.id}/approve/', headers=self.as_admin())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(principal_cache.get_principal(self.user.id).doctor_profile.is_verified)
+
+    def test_deleted_user_is_not_served_from_the_cache(self):
+        principal_cache.get_principal(self.user.id)
+        response = self.client.delete(f'/api/auth/admin/users/{self.user.id}/', headers=self.as_admin())
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(principal_cache.get_principal(self.user.id))
+
+
+# ============================================
+# NOTIFICATION PUSH CHANNEL
+# ============================================
+@override_settings(CACHES=LOCMEM, NOTIFICATION_SHORT_POLL_SECONDS=15)
+class NotificationStreamTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='stream@test.com', account_status='ACTIVE')
+        self.headers = {'Authorization': f'Bearer {generate_jwt_token(self.user)}'}
+        tokens.is_revoked(decode_jwt_token(generate_jwt_token(self.user)))  # Builds the revocation filter
+
+    def test_wsgi_request_gets_the_counter_and_returns(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.notify(self.user, 'Scan ready', 'Your result is in', 'SCAN_COMPLETED')
+        notifications.unread_count(self.user.id)
+
+        with self.assertNumQueries(0):  # Counter from the cache, no stream held open
+            response = self.client.get('/api/auth/notifications/stream', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content.decode(), 'retry: 15000\n\nevent: unread\ndata: {"unread_count": 1}\n\n')
+
+    @override_settings(NOTIFICATION_STREAM_SECONDS=0)
+    async def test_asgi_request_streams_missed_notifications(self):
+        first = await Notification.objects.acreate(user=self.user, title='a', message='-', type='SYSTEM')
+        second = await Notification.objects.acreate(user=self.user, title='b', message='-', type='SYSTEM')
+
+        response = await AsyncClient().get(
+            '/api/auth/notifications/stream', headers={**self.headers, 'Last-Event-ID': str(first.id)}
+        )
+        self.assertTrue(response.streaming)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertTrue(body.startswith(f'retry: {notifications.RETRY_MS}'))
+        self.assertIn(f'id: {second.id}\nevent: notification', body)
+        self.assertNotIn(f'id: {first.id}\n', body)
+
+        response = await AsyncClient().get('/api/auth/notifications/stream', headers={**self.headers, 'Last-Event-ID': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================
+# BULK USER IMPORT
+# ============================================
+FAST_HASHER = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def _ndjson(*rows):
+    return io.BytesIO('\n'.join(json.dumps(row) for row in rows).encode())
+
+
+def _row(email, **extra):
+    return {'email': email, 'password': 'Str0ng-Pass!', 'first_name': 'A', 'last_name': 'B', **extra}
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHER, PASSWORD_HASH_WORKERS=2)
+@mock.patch('authentication.password_pool._run', side_effect=AssertionError('import used the login pool'))
+class BulkImportTests(TestCase):
+
+    def test_duplicates_are_rejected_and_the_rest_imported(self, _):
+        User.objects.create(email='taken@test.com', account_status='ACTIVE')
+        stream = _ndjson(
+            _row('new@test.com'),
+            _row('TAKEN@test.com'),
+            _row('new@test.com'),  # Same file
+            _row('doc1@test.com', is_doctor=True, medical_license_number='LIC-1'),
+            _row('doc2@test.com', is_doctor=True, medical_license_number='LIC-1'),
+            {'email': 'bad'},
+        )
+        report = bulk_import.import_users(stream, 'ndjson', chunk_size=2)
+
+        self.assertEqual((report['processed'], report['created'], report['failed']), (6, 2, 4))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3, 5, 6])
+        self.assertIn('email', report['errors'][0]['errors'])
+        self.assertIn('medical_license_number', report['errors'][2]['errors'])
+        self.assertEqual(UserProfile.objects.filter(user__email__in=['new@test.com', 'doc1@test.com']).count(), 2)
+        self.assertFalse(DoctorProfile.objects.get().is_verified)
+        self.assertTrue(User.objects.get(email='new@test.com').password_hash.startswith('md5$'))
+
+    def test_chunk_is_retried_row_by_row_after_a_concurrent_registration(self, _):
+        real_make_passwords = bulk_import.make_passwords
+
+        def register_meanwhile(passwords, executor):
+            # Someone signs up with one of the emails after the chunk's uniqueness check
+            User.objects.create(email='b@test.com', account_status='ACTIVE')
+            return real_make_passwords(passwords, executor)
+
+        with mock.patch('authentication.bulk_import.make_passwords', side_effect=register_meanwhile):
+            report = bulk_import.import_users(_ndjson(_row('a@test.com'), _row('b@test.com'), _row('c@test.com')), 'ndjson')
+
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertEqual(report['errors'][0]['email'], 'b@test.com')
+        self.assertEqual(report['errors'][0]['errors'], {'non_field_errors': ['Conflicts with an existing account']})
+        self.assertEqual(User.objects.filter(email__in=['a@test.com', 'c@test.com']).count(), 2)
+        self.assertFalse(UserProfile.objects.filter(user__email='b@test.com').exists())
+
+    @override_settings(CACHES=LOCMEM, IMPORT_HASH_WORKERS=3)
+    def test_admin_job_hashes_in_its_own_pool(self, _):
+        pool = mock.Mock()
+        pool.map.side_effect = lambda fn, items, chunksize: [fn(item) for item in items]
+        fd, path = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_ndjson(_row('job@test.com')).getvalue())
+
+        with mock.patch('authentication.bulk_import.import_pool', return_value=pool) as import_pool, \
+                mock.patch.object(bulk_import._job_executor, 'submit', lambda fn, *args: fn(*args)), \
+                self.assertLogs('authentication.bulk_import', 'INFO'):
+            job = bulk_import.start_import_job(path, 'ndjson', admin_id=1)
+
+        import_pool.assert_called_once_with(3)
+        pool.shutdown.assert_called_once()
+        job = bulk_import.get_import_job(job['job_id'])
+        self.assertEqual((job['status'], job['report']['created']), (bulk_import.COMPLETED, 1))
+        self.assertFalse(os.path.exists(path))  # The upload is removed once imported
+
+
+# ============================================
+# PASSWORD HASHING POOL
+# ============================================
+@override_settings(PASSWORD_HASHERS=FAST_HASHER, PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_TIMEOUT=0.05,
+                   RATELIMIT_ENABLE=False)
+class PasswordPoolTests(TestCase):
+
+    def setUp(self):
+        with override_settings(PASSWORD_HASH_WORKERS=0):
+            user = User(email='pool@test.com', account_status='ACTIVE')
+            user.set_password('Str0ng-Pass!')
+            user.save()
+        # One slot, and threads standing in for the worker processes
+        self.slots = threading.BoundedSemaphore(1)
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        for name, value in (('_slots', self.slots), ('_pool', executor)):
+            patcher = mock.patch.object(password_pool, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def login(self):
+        return self.client.post('/api/auth/login', {'email': 'pool@test.com', 'password': 'Str0ng-Pass!'},
+                                content_type='application/json')
+
+    def test_login_without_a_free_slot_is_503_with_retry_after(self):
+        rejected = password_pool.pool_stats()['rejected']
+        self.slots.acquire()
+        try:
+            with self.assertLogs('django.request', 'ERROR'):
+                response = self.login()
+        finally:
+            self.slots.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json()['error_code'], 'password_hashing_busy')
+        self.assertEqual(password_pool.pool_stats()['rejected'], rejected + 1)
+
+    def test_slot_is_released_after_each_login(self):
+        with self.assertLogs('authentication', 'INFO'):
+            for _ in range(2):
+                self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(password_pool.pool_stats()['in_flight'], 0)
+        self.assertTrue(self.slots.acquire(blocking=False))
+        self.slots.release()
+
+
+# ============================================
+# BROADCASTS
+# ============================================
+@override_settings(CACHES=LOCMEM)
+@mock.patch('authentication.broadcasts.CHUNK_PAUSE', 0)
+class BroadcastTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.patients = [
+            User.objects.create(email=f'patient{i}@test.com', account_status='ACTIVE') for i in range(4)
+        ]
+        self.doctor = User.objects.create(email='doctor@test.com', account_status='ACTIVE', is_doctor=True)
+        User.objects.create(email='locked@test.com', account_status='LOCKED')
+        User.objects.create(email='admin@test.com', account_status='ACTIVE', is_admin=True)
+        UserProfile.objects.create(user=self.patients[0], country='Kenya')
+        UserProfile.objects.create(user=self.doctor, country='kenya')
+
+    def test_segments_pick_active_users(self):
+        emails = lambda segment, country=None: sorted(broadcasts.recipients(segment, country).values_list('email', flat=True))
+        self.assertEqual(len(emails('all')), 6)
+        self.assertNotIn('locked@test.com', emails('all'))
+        self.assertEqual(emails('patients'), [f'patient{i}@test.com' for i in range(4)])
+        self.assertEqual(emails('doctors'), ['doctor@test.com'])
+        self.assertEqual(emails('all', 'KENYA'), ['doctor@test.com', 'patient0@test.com'])
+        with self.assertRaises(broadcasts.InvalidSegment):
+            broadcasts.recipients('everyone')
+
+    @mock.patch('authentication.broadcasts.CHUNK_SIZE', 3)
+    def test_chunks_write_one_cache_key_not_one_per_user(self):
+        reports = []
+        with mock.patch('authentication.notifications.cache.set', wraps=cache.set) as cache_set:
+            report = broadcasts.send_broadcast('Maintenance', 'Tonight', 'patients',
+                                               progress=lambda r: reports.append(dict(r)))
+
+        self.assertEqual([r['delivered'] for r in reports], [3, 4])
+        self.assertEqual(report, {'total': 4, 'delivered': 4, 'last_user_id': self.patients[-1].id})
+        self.assertEqual(cache_set.call_count, 2)  # One broadcast version bump per chunk
+        self.assertEqual(Notification.objects.filter(type='SYSTEM').count(), 4)
+        self.assertFalse(Notification.objects.filter(user=self.doctor).exists())
+
+    def test_cached_unread_counters_see_the_broadcast(self):
+        patient = self.patients[0]
+        self.assertEqual(notifications.unread_count(patient.id), 0)
+        broadcasts.send_broadcast('Maintenance', 'Tonight', 'patients')
+        self.assertEqual(notifications.unread_count(patient.id), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(patient.id), 1)
+
+        cache.delete(notifications.BROADCAST_KEY)  # Evicted: counters are recounted, never served stale
+        with self.assertNumQueries(1):
+            self.assertEqual(notifications.unread_count(patient.id), 1)
+
+    def test_job_reports_progress_and_completion(self):
+        with mock.patch.object(broadcasts._job_executor, 'submit', lambda fn, *args: fn(*args)), \
+                self.assertLogs('authentication.broadcasts', 'INFO'):
+            job = broadcasts.start_broadcast('Hello', 'Welcome', 'doctors', None, admin_id=1)
+
+        job = broadcasts.get_broadcast(job['job_id'])
+        self.assertEqual(job['status'], broadcasts.COMPLETED)
+        self.assertEqual((job['report']['total'], job['report']['delivered']), (1, 1))
+
+        with self.assertRaises(broadcasts.InvalidSegment):
+            broadcasts.start_broadcast('Hello', 'Welcome', 'nobody', None, admin_id=1)
+
+    def test_job_without_progress_for_too_long_is_failed(self):
+        with mock.patch.object(broadcasts._job_executor, 'submit'):
+            job = broadcasts.start_broadcast('Hello', 'Welcome', 'all', None, admin_id=1)
+        self.assertEqual(broadcasts.get_broadcast(job['job_id'])['status'], broadcasts.RUNNING)
+
+        stale = cache.get(broadcasts._job_key(job['job_id']))
+        stale['updated_at'] -= broadcasts.JOB_STALE_SECONDS + 1
+        cache.set(broadcasts._job_key(job['job_id']), stale)
+        self.assertEqual(broadcasts.get_broadcast(job['job_id'])['status'], broadcasts.FAILED)
+        self.assertIsNone(broadcasts.get_broadcast('unknown'))
+
+    @override_settings(NOTIFICATION_STREAM_SECONDS=0.5, NOTIFICATION_POLL_INTERVAL=0.05)
+    async def test_open_stream_delivers_the_broadcast(self):
+        patient = self.patients[1]
+        token = await sync_to_async(generate_jwt_token)(patient)
+        response = await AsyncClient().get('/api/auth/notifications/stream', headers={'Authorization': f'Bearer {token}'})
+        events = response.streaming_content
+        await events.__anext__()  # retry
+        await events.__anext__()  # unread 0
+
+        following = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0.1)  # The stream is idle, watching the cache
+        await sync_to_async(broadcasts.send_broadcast)('Maintenance', 'Tonight', 'patients')
+        body = (await following + b''.join([chunk async for chunk in events])).decode()
+        self.assertIn('event: notification', body)
+        self.assertIn('"title": "Maintenance"', body)
+        self.assertIn('data: {"unread_count": 1}', body)
@@ -0,0 +1,224 @@
+"""
+Refresh tokens and access-token revocation.
+
+Access tokens (jwt_auth.generate_jwt_token) are short-lived and carry the
+user's role and status claims, so JWTAuthentication verifies them without a
+database hit. This module provides the two pieces that make that safe:
+
+- Refresh tokens: opaque random strings, stored as SHA-256 hashes. Every
+  refresh revokes the presented token and issues a new one in the same family.
+  Presenting an already-revoked token (a stolen copy being replayed, or the
+  legitimate one after the thief used it) revokes the whole family.
+- Revocation: logout revokes one access token ('jti:<id>'); admin locks, bans,
+  role changes and deletions revoke every access token of the user issued
+  before that moment ('user:<id>'). Rows live in RevokedToken until the tokens
+  would have expired anyway. Each process keeps a bloom filter of the live
+  keys, shared through the Django cache and re-checked at most every
+  SYNC_INTERVAL seconds. A miss (the common case) is definitive and costs only
+  a few hashes. A hit is confirmed against the table, which also absorbs false
+  positives.
+"""
+import hashlib
+import logging
+import math
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RefreshToken, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'token_revocations:version'
+FILTER_KEY = 'token_revocations:filter'
+SYNC_INTERVAL = 1.0  # Max seconds before a revocation made by another worker is seen
+ERROR_RATE = 0.01
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+# ============================================
+# BLOOM FILTER
+# ============================================
+class BloomFilter:
+    def __init__(self, capacity, error_rate=ERROR_RATE, size=None, hashes=None, bits=None):
+        capacity = max(capacity, 1)
+        self.size = size or max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def to_dict(self):
+        return {'size': self.size, 'hashes': self.hashes, 'bits': bytes(self.bits)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(1, size=data['size'], hashes=data['hashes'], bits=data['bits'])
+
+
+# ============================================
+# REVOCATION
+# ============================================
+_local = {'filter': None, 'version': None, 'checked_at': 0.0}
+_lock = threading.Lock()
+
+
+def _build_filter() -> BloomFilter:
+    now = timezone.now()
+    RevokedToken.objects.filter(expires_at__lte=now).delete()
+    keys = list(RevokedToken.objects.values_list('key', flat=True))
+    bloom = BloomFilter(max(getattr(settings, 'TOKEN_REVOCATION_CAPACITY', 10000), len(keys)))
+    for key in keys:
+        bloom.add(key)
+    return bloom
+
+
+def _store(bloom, version):
+    cache.set(FILTER_KEY, dict(bloom.to_dict(), version=version), None)
+    _local.update(filter=bloom, version=version, checked_at=time.monotonic())
+
+
+def _current_filter() -> BloomFilter:
+    now = time.monotonic()
+    if _local['filter'] is not None and now - _local['checked_at'] < SYNC_INTERVAL:
+        return _local['filter']
+
+    with _lock:
+        if _local['filter'] is not None and now - _local['checked_at'] < SYNC_INTERVAL:
+            return _local['filter']
+        version = cache.get(VERSION_KEY, 0)
+        if _local['filter'] is None or version != _local['version']:
+            stored = cache.get(FILTER_KEY)
+            if stored and stored['version'] == version:
+                _local.update(filter=BloomFilter.from_dict(stored), version=version)
+            else:
+                _store(_build_filter(), version)
+        _local['checked_at'] = now
+    return _local['filter']
+
+
+def _publish():
+    """Rebuild the filter after a revocation and hand it to every worker."""
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        version = 1
+        cache.set(VERSION_KEY, version, None)
+    with _lock:
+        _store(_build_filter(), version)
+
+
+def is_revoked(payload) -> bool:
+    """True if the (already signature-checked) access token payload has been revoked."""
+    bloom = _current_filter()
+    candidates = [key for key in (f"jti:{payload.get('jti')}", f"user:{payload['user_id']}") if key in bloom]
+    if not candidates:
+        return False
+
+    rows = RevokedToken.objects.filter(key__in=candidates, expires_at__gt=timezone.now())
+    for row in rows:
+        if row.key.startswith('jti:') or payload['iat'] < row.revoked_at.timestamp():
+            return True
+    return False
+
+
+def revoke_access_token(payload):
+    """Revoke a single access token until it expires (logout)."""
+    RevokedToken.objects.update_or_create(
+        key=f"jti:{payload['jti']}",
+        defaults={
+            'revoked_at': timezone.now(),
+            'expires_at': datetime.fromtimestamp(payload['exp'], tz=dt_timezone.utc),
+        },
+    )
+    _publish()
+
+
+def revoke_user_tokens(user_id, refresh=True):
+    """
+    Revoke every access token issued to the user so far, and with `refresh`
+    their refresh tokens too (lock, ban, delete, password change or reset).
+    Role changes keep the refresh
+    tokens so the client can pick up a token with the new claims.
+    """
+    now = timezone.now()
+    RevokedToken.objects.update_or_create(
+        key=f'user:{user_id}',
+        defaults={'revoked_at': now, 'expires_at': now + settings.JWT_EXPIRATION_DELTA},
+    )
+    if refresh:
+        RefreshToken.objects.filter(user_id=user_id, revoked_at__isnull=True).update(revoked_at=now)
+    _publish()
+
+
+# ============================================
+# REFRESH TOKENS
+# ============================================
+def _hash(raw):
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def issue_refresh_token(user, family=None) -> str:
+    raw = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash(raw),
+        family=family or uuid.uuid4(),
+        expires_at=timezone.now() + settings.JWT_REFRESH_EXPIRATION_DELTA,
+    )
+    return raw
+
+
+def rotate_refresh_token(raw):
+    """(user, new_refresh_token) for a valid refresh token; the presented one is revoked."""
+    reused = None
+    with transaction.atomic():
+        token = RefreshToken.objects.select_for_update().select_related('user').filter(token_hash=_hash(raw or '')).first()
+        if token is None:
+            raise InvalidRefreshToken('Invalid refresh token')
+        now = timezone.now()
+        if token.revoked_at:
+            reused = token
+        else:
+            if token.expires_at <= now:
+                raise InvalidRefreshToken('Refresh token has expired')
+            if token.user.account_status != 'ACTIVE':
+                raise InvalidRefreshToken('Account is locked')
+            token.revoked_at = now
+            token.save(update_fields=['revoked_at'])
+            return token.user, issue_refresh_token(token.user, token.family)
+
+    # Outside the transaction so the family revocation isn't rolled back
+    revoked = RefreshToken.objects.filter(family=reused.family, revoked_at__isnull=True).update(revoked_at=timezone.now())
+    if revoked:
+        logger.warning(f"[Auth] Refresh token reuse for user {reused.user_id}; revoked family {reused.family}")
+    raise InvalidRefreshToken('Refresh token has been revoked')
+
+
+def revoke_refresh_token(raw):
+    """Revoke the token's whole family (logout). Unknown tokens are ignored."""
+    token = RefreshToken.objects.filter(token_hash=_hash(raw or '')).first()
+    if token:
+        RefreshToken.objects.filter(family=token.family, revoked_at__isnull=True).update(revoked_at=timezone.now())
@@ -5,6 +5,8 @@ from django.urls import path
 from .views import (
     RegisterView,
     LoginView,
+    TokenRefreshView,
+    LogoutView,
     ForgotPasswordView,
     VerifyOTPView,
     ResetPasswordView,
@@ -13,7 +15,7 @@ from .views import (
     ChangePasswordView,
     check_profile_completion,
 )
-from .notification_views import NotificationView
+from .notification_views import NotificationView, NotificationStreamView
 from .admin_views import (
     AdminUserListView,
     AdminUserStateView,
@@ -23,6 +25,8 @@ from .admin_views import (
 urlpatterns = [
     path('register', RegisterView.as_view(), name='register'),
     path('login', LoginView.as_view(), name='login'),
+    path('token/refresh', TokenRefreshView.as_view(), name='token_refresh'),
+    path('logout', LogoutView.as_view(), name='logout'),
     path('profile', ProfileView.as_view(), name='profile'),
     path('change-password', ChangePasswordView.as_view(), name='change_password'),
     path('forgot-password', ForgotPasswordView.as_view(), name='forgot_password'),
@@ -33,6 +37,7 @@ urlpatterns = [
     
     # Notifications
     path('notifications', NotificationView.as_view(), name='notifications'),
+    path('notifications/stream', NotificationStreamView.as_view(), name='notification_stream'),
     path('notifications/<int:pk>', NotificationView.as_view(), name='notification_detail'),
     
     # Admin Routes
@@ -10,6 +10,7 @@ import logging
 logger = logging.getLogger(__name__)
 logger.info("SERVER RELOADING - VIEWS MODULE IMPORTED")
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.utils import timezone
 from django.utils.decorators import method_decorator
@@ -21,9 +22,13 @@ from .models import User
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer,
     ForgotPasswordSerializer, VerifyOTPSerializer,
-    ResetPasswordSerializer, UserSerializer
+    ResetPasswordSerializer, UserSerializer, USER_PROFILE_ROW
 )
-from .jwt_auth import generate_jwt_token
+from .jwt_auth import generate_jwt_token, issue_token_pair, decode_jwt_token
+from .tokens import (
+    InvalidRefreshToken, revoke_access_token, revoke_refresh_token, revoke_user_tokens, rotate_refresh_token
+)
+from .principal_cache import invalidate_principal
 
 logger = logging.getLogger('authentication')
 
@@ -43,8 +48,8 @@ class RegisterView(APIView):
                 'errors': serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create user in database
-        user = User.objects.create(
+        # Create user in database (hash first: hashing can be refused when the pool is busy)
+        user = User(
             email=serializer.validated_data['email'],
             first_name=serializer.validated_data.get('first_name', ''),
             last_name=serializer.validated_data.get('last_name', ''),
@@ -68,14 +73,12 @@ class RegisterView(APIView):
         
         logger.info(f"New user registered: {user.email} (ID: {user.id}) IsDoctor: {user.is_doctor}")
 
-        token = generate_jwt_token(user)
-        
         return Response({
             'status': 'success',
             'message': 'Registration successful',
             'data': {
                 'user': UserSerializer(user).data,
-                'token': token
+                **issue_token_pair(user)
             }
         }, status=status.HTTP_201_CREATED)
 
@@ -138,18 +141,57 @@ class LoginView(APIView):
         
         logger.info(f"Successful login: {user.email} (ID: {user.id})")
         
-        token = generate_jwt_token(user)
-        
         return Response({
             'status': 'success',
             'message': 'Login successful',
             'data': {
                 'user': UserSerializer(user).data,
-                'token': token
+                **issue_token_pair(user)
             }
         }, status=status.HTTP_200_OK)
 
 
+class TokenRefreshView(APIView):
+    """Exchange a refresh token for a new access token (the refresh token rotates)"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        try:
+            user, refresh_token = rotate_refresh_token(request.data.get('refresh_token'))
+        except InvalidRefreshToken as e:
+            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        return Response({
+            'status': 'success',
+            'data': {
+                'token': generate_jwt_token(user),
+                'refresh_token': refresh_token,
+                'expires_in': int(settings.JWT_EXPIRATION_DELTA.total_seconds()),
+            }
+        })
+
+
+class LogoutView(APIView):
+    """Revoke the refresh token family and the presented access token"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        revoke_refresh_token(request.data.get('refresh_token'))
+
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            try:
+                payload = decode_jwt_token(auth_header.split(' ', 1)[1])
+                if payload.get('jti'):
+                    revoke_access_token(payload)
+            except AuthenticationFailed:
+                pass  # Already expired or invalid: nothing to revoke
+
+        return Response({'status': 'success', 'message': 'Logged out'})
+
+
 class ForgotPasswordView(APIView):
     """Send OTP for password reset"""
     permission_classes = [AllowAny]
@@ -201,6 +243,8 @@ class ResetPasswordView(APIView):
             user = User.objects.get(email=serializer.validated_data['email'])
             user.set_password(serializer.validated_data['new_password'])
             user.save()
+            # Sign out every session that used the old password
+            revoke_user_tokens(user.id)
             
             return Response({
                 'status': 'success',
@@ -234,15 +278,13 @@ class ProfileView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
     def get(self, request):
-        try:
-            user = User.objects.get(id=request.user.id)
-            serializer = UserSerializer(user)
-            return Response({
-                'status': 'success',
-                'data': serializer.data
-            })
-        except User.DoesNotExist:
+        data = USER_PROFILE_ROW.one(User.objects.filter(id=request.user.id))
+        if data is None:
             return Response({'status': 'error', 'message': 'User not found'}, status=404)
+        return Response({
+            'status': 'success',
+            'data': data
+        })
 
     def put(self, request):
         logger.info(f"DEBUG: ProfileView.put called")
@@ -276,6 +318,7 @@ class ProfileView(APIView):
                     file_name = getattr(avatar_file, 'name', 'avatar.jpg')
                     profile.avatar.save(file_name, avatar_file, save=True)
                     logger.info(f"DEBUG: Avatar saved as {file_name}")
+                invalidate_principal(user.id)
                 
                 # Re-fetch from DB for clean serialization
                 user.refresh_from_db()
@@ -330,10 +373,13 @@ class ChangePasswordView(APIView):
             # Set new password
             user.set_password(serializer.validated_data['new_password'])
             user.save()
+            # Sign out every other session; this one continues on a fresh pair
+            revoke_user_tokens(user.id)
             
             return Response({
                 'status': 'success',
-                'message': 'Password changed successfully'
+                'message': 'Password changed successfully',
+                'data': issue_token_pair(user)
             })
         except User.DoesNotExist:
             return Response({'status': 'error', 'message': 'User not found'}, status=404)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatHistory
+from .models import ChatHistory, ChatFAQEntry, ChatSession, ChatSessionMemory
 
 
 @admin.register(ChatHistory)
@@ -7,3 +7,21 @@ class ChatHistoryAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'role', 'session_id', 'created_at']
     list_filter = ['role', 'created_at']
     search_fields = ['user__email', 'message']
+
+
+@admin.register(ChatFAQEntry)
+class ChatFAQEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'question', 'hits', 'last_hit_at', 'expires_at']
+    search_fields = ['question', 'normalized']
+
+
+@admin.register(ChatSession)
+class ChatSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'session_id', 'title', 'message_count', 'last_message_at']
+    search_fields = ['user__email', 'session_id', 'title']
+
+
+@admin.register(ChatSessionMemory)
+class ChatSessionMemoryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'session_id', 'summarized_until', 'updated_at']
+    search_fields = ['user__email', 'session_id', 'summary']
@@ -0,0 +1,183 @@
+"""
+Semantic FAQ cache for context-free chatbot questions.
+
+Questions are normalized (lowercase, punctuation and stop words removed, light
+suffix stripping) and compared with TF-IDF cosine similarity against earlier
+questions that Gemini answered. A match at or above CHAT_FAQ_SIMILARITY is
+answered from ChatFAQEntry without an LLM call, provided the cached question
+contains every term of the new one: "treat eczema child" scores ~0.82 against
+"treat eczema" but asks something the generic answer does not cover.
+
+Each process keeps the vectors in memory and rebuilds them when another
+process adds or purges entries (a version number in the shared cache) or
+after INDEX_TTL seconds. Questions that come with scan context never use the
+cache, because their answer depends on that context.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import ChatFAQEntry
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'chat_faq:version'
+INDEX_TTL = 60.0
+
+# Deliberately keeps negations ("not", "no") and question-defining words
+STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'am', 'do', 'does', 'did',
+    'i', 'me', 'my', 'you', 'your', 'we', 'it', 'its', 'this', 'that', 'these', 'those',
+    'to', 'of', 'in', 'on', 'for', 'with', 'about', 'and', 'or', 'so', 'at', 'by', 'from',
+    'can', 'could', 'should', 'would', 'will', 'please', 'tell', 'know', 'want', 'help',
+    'how', 'what', 'which', 'hi', 'hello', 'hey', 'thanks', 'thank', 'there', 'some', 'any',
+}
+_WORD = re.compile(r"[a-z0-9]+")
+
+_index = {'version': None, 'built_at': 0.0, 'entries': [], 'idf': {}}
+_index_lock = threading.Lock()
+
+
+def tokenize(text: str):
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 5 and word.endswith('ing'):
+            word = word[:-3]
+        elif len(word) > 4 and word.endswith('ed'):
+            word = word[:-2]
+        elif len(word) > 4 and word.endswith('es') and not word.endswith('ses'):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def normalize(text: str) -> str:
+    return ' '.join(tokenize(text))[:500]
+
+
+# ============================================
+# IN-MEMORY INDEX
+# ============================================
+def _vector(counts: Counter, idf: Dict[str, float]):
+    vec = {term: tf * idf.get(term, 1.0) for term, tf in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return vec, norm
+
+
+def _load_index():
+    version = cache.get(VERSION_KEY, 0)
+    now = time.monotonic()
+    with _index_lock:
+        if _index['version'] == version and now - _index['built_at'] < INDEX_TTL:
+            return _index
+
+    rows = list(ChatFAQEntry.objects.filter(expires_at__gt=timezone.now()).values_list('id', 'normalized'))
+    docs = [(entry_id, Counter(text.split())) for entry_id, text in rows if text]
+    df = Counter(term for _, counts in docs for term in counts)
+    total = len(docs)
+    # Smoothed IDF so a tiny corpus still gives sensible weights
+    idf = {term: math.log((1 + total) / (1 + freq)) + 1 for term, freq in df.items()}
+    entries = [(entry_id, *_vector(counts, idf)) for entry_id, counts in docs]
+
+    with _index_lock:
+        _index.update({'version': version, 'built_at': now, 'entries': entries, 'idf': idf})
+        return _index
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+# ============================================
+# PUBLIC API
+# ============================================
+def lookup(question: str) -> Optional[Dict]:
+    """Cached answer for a similar question, or None. Records the hit."""
+    normalized = normalize(question)
+    if not normalized:
+        return None
+
+    threshold = getattr(settings, 'CHAT_FAQ_SIMILARITY', 0.8)
+    index = _load_index()
+    query, query_norm = _vector(Counter(normalized.split()), index['idf'])
+
+    best_id, best_score = None, 0.0
+    for entry_id, vec, norm in index['entries']:
+        if not query.keys() <= vec.keys():
+            continue  # The new question adds a qualifier the cached one lacks
+        dot = sum(weight * vec.get(term, 0.0) for term, weight in query.items())
+        score = dot / (query_norm * norm)
+        if score > best_score:
+            best_id, best_score = entry_id, score
+    if best_id is None or best_score < threshold:
+        return None
+
+    entry = ChatFAQEntry.objects.filter(id=best_id, expires_at__gt=timezone.now()).only('id', 'answer').first()
+    if not entry:
+        return None
+    ChatFAQEntry.objects.filter(id=entry.id).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+    return {'id': entry.id, 'answer': entry.answer, 'similarity': round(best_score, 3)}
+
+
+def remember(question: str, answer: str) -> Optional[int]:
+    """Store a Gemini answer for a context-free question."""
+    normalized = normalize(question)
+    if not normalized or not answer:
+        return None
+
+    ttl = timedelta(seconds=getattr(settings, 'CHAT_FAQ_TTL', 3 * 24 * 3600))
+    entry, created = ChatFAQEntry.objects.update_or_create(
+        normalized=normalized,
+        defaults={'question': question[:1000], 'answer': answer, 'expires_at': timezone.now() + ttl}
+    )
+
+    # Keep the table (and every process' index) bounded; only a new row can overflow it
+    max_entries = getattr(settings, 'CHAT_FAQ_MAX_ENTRIES', 5000)
+    if created and ChatFAQEntry.objects.count() > max_entries:
+        stale = ChatFAQEntry.objects.order_by('-hits', '-created_at').values_list('id', flat=True)[max_entries:]
+        ChatFAQEntry.objects.filter(id__in=list(stale)).delete()
+    _bump_version()
+    return entry.id
+
+
+def purge(entry_id: Optional[int] = None, expired_only: bool = False) -> int:
+    """Delete one entry, all expired entries, or everything. Returns rows deleted."""
+    entries = ChatFAQEntry.objects.all()
+    if entry_id:
+        entries = entries.filter(id=entry_id)
+    elif expired_only:
+        entries = entries.filter(expires_at__lte=timezone.now())
+    deleted, _ = entries.delete()
+    _bump_version()
+    logger.info(f"[FAQ CACHE] Purged {deleted} entries")
+    return deleted
+
+
+def cache_stats(limit: int = 50) -> Dict:
+    totals = ChatFAQEntry.objects.aggregate(entries=Count('id'), hits=Sum('hits'))
+    return {
+        'entries': totals['entries'],
+        'hits': totals['hits'] or 0,
+        'expired': ChatFAQEntry.objects.filter(expires_at__lte=timezone.now()).count(),
+        'similarity_threshold': getattr(settings, 'CHAT_FAQ_SIMILARITY', 0.8),
+        'top': list(ChatFAQEntry.objects.order_by('-hits').values(
+            'id', 'question', 'hits', 'last_hit_at', 'created_at', 'expires_at'
+        )[:limit]),
+    }
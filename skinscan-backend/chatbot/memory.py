@@ -0,0 +1,203 @@
+"""
+Token-budgeted conversation memory for chat sessions.
+
+The prompt for a new message carries:
+- the session's rolling summary (ChatSessionMemory.summary, at most
+  CHAT_MEMORY_SUMMARY_TOKENS), covering every turn up to summarized_until
+- the most recent turns after that, newest first, until CHAT_MEMORY_TOKEN_BUDGET
+  is used up
+
+After each reply, fold_overflow() moves turns that no longer fit the budget,
+or fall outside the MAX_TURNS newest, into the summary (Gemini rewrites the
+summary; without Gemini, an extractive summary is used). It runs on a small
+shared thread pool so the reply is never delayed, and takes a lease
+(skinscan/leases.py) so one worker process at a time folds a session. Prompt size is therefore bounded no matter how long a session runs.
+
+Token counts are estimated at ~4 characters per token.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from skinscan import llm_client
+from skinscan.leases import acquire_lease, new_owner, release_lease
+
+from .models import ChatHistory, ChatSessionMemory
+
+logger = logging.getLogger(__name__)
+
+MAX_TURNS = 40  # Rows considered per prompt, whatever their size
+FOLD_LEASE_SECONDS = 120
+
+# Folds are queued per session: a burst of messages schedules one fold, not one per message
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-memory')
+_pending = set()
+_pending_lock = threading.Lock()
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and SkinScan AI, a dermatology assistant.
+Update the summary with the new turns. Keep skin conditions, body locations, symptoms, treatments discussed and open questions.
+Write at most {max_words} words of plain text, no preamble.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW TURNS:
+{turns}
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or '') // 4 + 1
+
+
+def _budget():
+    return getattr(settings, 'CHAT_MEMORY_TOKEN_BUDGET', 1200)
+
+
+def _summary_tokens():
+    return getattr(settings, 'CHAT_MEMORY_SUMMARY_TOKENS', 250)
+
+
+# ============================================
+# PROMPT ASSEMBLY (request path)
+# ============================================
+def build_history(user, session_id, before_id=None):
+    """
+    {'summary': str, 'turns': [{'role': 'user'|'bot', 'message': str}, ...]} for the
+    prompt of the next message. `before_id` excludes the message being answered.
+    """
+    memory = ChatSessionMemory.objects.filter(user=user, session_id=session_id).only(
+        'summary', 'summarized_until'
+    ).first()
+    summarized_until = memory.summarized_until if memory else 0
+
+    rows = ChatHistory.objects.filter(user=user, session_id=session_id, id__gt=summarized_until)
+    if before_id:
+        rows = rows.filter(id__lt=before_id)
+    recent = rows.order_by('-id').values('role', 'message')[:MAX_TURNS]
+
+    turns, used = [], 0
+    for row in recent:
+        cost = estimate_tokens(row['message'])
+        if used + cost > _budget():
+            break
+        turns.append(row)
+        used += cost
+    turns.reverse()
+    # Gemini expects the conversation to open with a user turn
+    while turns and turns[0]['role'] != 'user':
+        turns.pop(0)
+
+    return {'summary': memory.summary if memory else '', 'turns': turns}
+
+
+# ============================================
+# ROLLING SUMMARY (background)
+# ============================================
+def schedule_fold(user_id, session_id):
+    """Fold overflowing turns into the summary without blocking the response."""
+    with _pending_lock:
+        if (user_id, session_id) in _pending:
+            return  # The queued fold will see this message too
+        _pending.add((user_id, session_id))
+    _executor.submit(_fold_in_thread, user_id, session_id)
+
+
+def _fold_in_thread(user_id, session_id):
+    with _pending_lock:
+        _pending.discard((user_id, session_id))
+    try:
+        fold_overflow(user_id, session_id)
+    except Exception as e:
+        logger.error(f"[MEMORY] Summary update failed for {session_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def _lease_key(user_id, session_id):
+    return f'chat_memory:{user_id}:{session_id}'
+
+
+def fold_overflow(user_id, session_id) -> bool:
+    """
+    Summarize turns that build_history() would no longer send: past the token
+    budget or the MAX_TURNS cap. Returns True if the summary changed.
+    """
+    lease_key, owner = _lease_key(user_id, session_id), new_owner()
+    if not acquire_lease(lease_key, owner, FOLD_LEASE_SECONDS):
+        return False  # Another worker is already updating this session
+    try:
+        memory, _ = ChatSessionMemory.objects.get_or_create(user_id=user_id, session_id=session_id)
+        rows = list(
+            ChatHistory.objects.filter(user_id=user_id, session_id=session_id, id__gt=memory.summarized_until)
+            .order_by('-id').values('id', 'role', 'message')
+        )
+
+        used, overflow = 0, []
+        for i, row in enumerate(rows):
+            used += estimate_tokens(row['message'])
+            if used > _budget() or i >= MAX_TURNS:
+                overflow = list(reversed(rows[i:]))
+                break
+        if not overflow:
+            return False
+
+        memory.summary = summarize(memory.summary, overflow)
+        memory.summarized_until = overflow[-1]['id']
+        memory.save(update_fields=['summary', 'summarized_until', 'updated_at'])
+        logger.info(f"[MEMORY] Folded {len(overflow)} turns into summary of {session_id}")
+        return True
+    finally:
+        release_lease(lease_key, owner)
+
+
+def summarize(summary, turns) -> str:
+    """New summary covering `summary` plus `turns` (chronological), within the summary budget."""
+    text = _gemini_summary(summary, turns)
+    if not text:
+        text = _extractive_summary(summary, turns)
+    max_chars = _summary_tokens() * 4
+    return text if len(text) <= max_chars else '...' + text[-max_chars:]
+
+
+def _format_turns(turns):
+    return '\n'.join(f"{'Patient' if t['role'] == 'user' else 'Assistant'}: {t['message']}" for t in turns)
+
+
+def _gemini_summary(summary, turns):
+    api_key = (getattr(settings, 'GOOGLE_API_KEY', '') or '').strip()
+    if not api_key:
+        return None
+    model_name = settings.GEMINI_MODEL_NAME or 'gemini-1.5-flash'
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
+    prompt = SUMMARY_PROMPT.format(
+        max_words=int(_summary_tokens() * 0.7),
+        summary=summary or '(none yet)',
+        turns=_format_turns(turns)
+    )
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": 0.2, "maxOutputTokens": _summary_tokens()},
+    }
+    try:
+        response = llm_client.post('gemini', url, payload, timeout=15)
+        if response.status_code == 200:
+            return response.json()['candidates'][0]['content']['parts'][0]['text'].strip()
+        logger.warning(f"[MEMORY] Gemini summary failed with HTTP {response.status_code}")
+    except llm_client.ProviderUnavailable:
+        pass
+    except Exception as e:
+        logger.warning(f"[MEMORY] Gemini summary failed: {e}")
+    return None
+
+
+def _extractive_summary(summary, turns):
+    """Offline fallback: keep the first sentence of every folded turn."""
+    lines = [summary] if summary else []
+    for turn in turns:
+        first = turn['message'].strip().split('\n')[0].split('. ')[0][:200]
+        lines.append(f"{'Patient' if turn['role'] == 'user' else 'Assistant'}: {first}")
+    return '\n'.join(lines)
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatFAQEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('normalized', models.CharField(db_index=True, max_length=500)),
+                ('answer', models.TextField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'chat_faq_cache',
+                'ordering': ['-hits'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_doctorprofile_bio'),
+        ('chatbot', '0002_chatfaqentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSessionMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('summarized_until', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memories', to='authentication.user')),
+            ],
+            options={
+                'db_table': 'chat_session_memory',
+                'unique_together': {('user', 'session_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_sessions(apps, schema_editor):
+    """One ChatSession per existing (user, session_id) conversation."""
+    ChatHistory = apps.get_model('chatbot', 'ChatHistory')
+    ChatSession = apps.get_model('chatbot', 'ChatSession')
+    groups = ChatHistory.objects.values('user_id', 'session_id').annotate(
+        count=models.Count('id'), started=models.Min('created_at'), last_id=models.Max('id')
+    )
+    sessions = []
+    for group in groups.iterator():
+        last = ChatHistory.objects.only('message', 'role', 'created_at').get(id=group['last_id'])
+        first_question = ChatHistory.objects.filter(
+            user_id=group['user_id'], session_id=group['session_id'], role='user'
+        ).order_by('id').values_list('message', flat=True).first() or ''
+        sessions.append(ChatSession(
+            user_id=group['user_id'],
+            session_id=group['session_id'],
+            title=first_question[:100],
+            message_count=group['count'],
+            last_message=last.message[:200],
+            last_role=last.role,
+            started_at=group['started'],
+            last_message_at=last.created_at,
+        ))
+        if len(sessions) >= 500:
+            ChatSession.objects.bulk_create(sessions)
+            sessions = []
+    ChatSession.objects.bulk_create(sessions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_doctorprofile_bio'),
+        ('chatbot', '0003_chatsessionmemory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100)),
+                ('title', models.CharField(blank=True, default='', max_length=100)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_message', models.CharField(blank=True, default='', max_length=200)),
+                ('last_role', models.CharField(blank=True, default='', max_length=10)),
+                ('started_at', models.DateTimeField()),
+                ('last_message_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'chat_sessions',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='chathistory',
+            index=models.Index(fields=['user', 'session_id', 'created_at'], name='idx_chat_user_session_time'),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_sessions', to='authentication.user'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', '-last_message_at'], name='idx_chat_session_recent'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chatsession',
+            unique_together={('user', 'session_id')},
+        ),
+        migrations.RunPython(backfill_sessions, migrations.RunPython.noop),
+    ]
@@ -21,6 +21,75 @@ class ChatHistory(models.Model):
     class Meta:
         db_table = 'chat_history'
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of one conversation (chatbot/sessions.py)
+            models.Index(fields=['user', 'session_id', 'created_at'], name='idx_chat_user_session_time'),
+        ]
     
     def __str__(self):
         return f"{self.role}: {self.message[:50]}... (Session: {self.session_id})"
+
+
+class ChatFAQEntry(models.Model):
+    """
+    Cached bot answer to a context-free question (see chatbot/faq_cache.py).
+    Similar future questions are answered from here instead of calling Gemini.
+    """
+    question = models.TextField()
+    normalized = models.CharField(max_length=500, db_index=True)  # Lowercased, stop words removed
+    answer = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    last_hit_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        db_table = 'chat_faq_cache'
+        ordering = ['-hits']
+    
+    def __str__(self):
+        return f"{self.question[:50]} ({self.hits} hits)"
+
+
+class ChatSessionMemory(models.Model):
+    """
+    Rolling summary of the older turns of one chat session (see chatbot/memory.py).
+    Messages up to `summarized_until` are represented only by `summary`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_memories')
+    session_id = models.CharField(max_length=100)
+    summary = models.TextField(blank=True, default='')
+    summarized_until = models.BigIntegerField(default=0)  # Last ChatHistory id folded into the summary
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'chat_session_memory'
+        unique_together = ('user', 'session_id')
+    
+    def __str__(self):
+        return f"Memory for {self.session_id} (until #{self.summarized_until})"
+
+
+class ChatSession(models.Model):
+    """
+    Per-session summary row, updated with every stored message (see
+    chatbot/sessions.py) so the sessions list never scans chat_history.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_sessions')
+    session_id = models.CharField(max_length=100)
+    title = models.CharField(max_length=100, blank=True, default='')  # Start of the first user message
+    message_count = models.PositiveIntegerField(default=0)
+    last_message = models.CharField(max_length=200, blank=True, default='')  # Preview
+    last_role = models.CharField(max_length=10, blank=True, default='')
+    started_at = models.DateTimeField()
+    last_message_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'chat_sessions'
+        unique_together = ('user', 'session_id')
+        indexes = [
+            models.Index(fields=['user', '-last_message_at'], name='idx_chat_session_recent'),
+        ]
+    
+    def __str__(self):
+        return f"{self.session_id} ({self.message_count} messages)"
@@ -0,0 +1,262 @@
+"""
+BM25 retrieval over the curated DiseaseInfo content (admin_module).
+
+Each disease is split into passages (description, symptoms, prevention) that
+are indexed in an in-memory inverted index per process. The chatbot uses it in
+three ways:
+
+- direct answers: a question that names a disease and asks for one of the
+  curated fields ("what are the symptoms of eczema?") is answered from that
+  field without calling Gemini
+- grounding: the top passages are added to the Gemini prompt
+- offline fallback: when Gemini is unavailable the best passage is returned
+  instead of a canned apology
+
+The index is updated incrementally: DiseaseInfo rows changed since the last
+sync (updated_at) are re-indexed and deleted rows dropped. A sync runs when
+the admin content endpoints bump the shared version key, or at most every
+SYNC_INTERVAL seconds to pick up edits made elsewhere (Django admin, shell).
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .faq_cache import tokenize
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'disease_kb:version'
+SYNC_INTERVAL = 60.0
+K1, B = 1.5, 0.75
+NAME_BOOST = 3  # Disease name tokens are repeated in every passage of that disease
+
+FIELDS = ('description', 'symptoms', 'prevention')
+FIELD_LABELS = {'description': 'Overview', 'symptoms': 'Symptoms', 'prevention': 'Prevention'}
+# Words that ask for a specific field; they are satisfied by the field itself, not its text
+INTENT_TERMS = {
+    'symptoms': {'symptom', 'sign', 'look', 'like', 'feel', 'recognize', 'identify', 'appear'},
+    'prevention': {'prevent', 'prevention', 'avoid', 'stop', 'protect', 'reduce'},
+    'description': {'mean', 'definition', 'explain', 'overview', 'describe', 'caus', 'cause', 'type'},
+}
+
+
+class _Index:
+    def __init__(self):
+        self.passages = {}  # (disease_id, field) -> {'name', 'field', 'text', 'url', 'terms': Counter, 'length'}
+        self.postings = {}  # term -> set of passage keys
+        self.name_terms = {}  # disease_id -> set of name tokens
+        self.total_length = 0
+        self.synced_at = 0.0
+        self.version = None
+        self.last_updated = None  # Newest DiseaseInfo.updated_at indexed
+
+    def remove_disease(self, disease_id):
+        for field in FIELDS:
+            passage = self.passages.pop((disease_id, field), None)
+            if not passage:
+                continue
+            self.total_length -= passage['length']
+            for term in passage['terms']:
+                keys = self.postings.get(term)
+                if keys:
+                    keys.discard((disease_id, field))
+                    if not keys:
+                        del self.postings[term]
+        self.name_terms.pop(disease_id, None)
+
+    def add_disease(self, disease):
+        name_tokens = tokenize(disease.name)
+        self.name_terms[disease.id] = set(name_tokens)
+        for field in FIELDS:
+            text = (getattr(disease, field) or '').strip()
+            if not text:
+                continue
+            terms = Counter(tokenize(f'{disease.category} {text}') + name_tokens * NAME_BOOST)
+            key = (disease.id, field)
+            self.passages[key] = {
+                'name': disease.name,
+                'field': field,
+                'text': text,
+                'url': disease.learn_more_url,
+                'terms': terms,
+                'length': sum(terms.values()),
+            }
+            self.total_length += self.passages[key]['length']
+            for term in terms:
+                self.postings.setdefault(term, set()).add(key)
+
+
+_index = _Index()
+_index_lock = threading.RLock()
+
+
+# ============================================
+# INDEX MAINTENANCE
+# ============================================
+def mark_stale():
+    """Tell every process to re-sync (called after content is edited through the API)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def _sync():
+    """Bring the index up to date with DiseaseInfo if it may be stale."""
+    from admin_module.models import DiseaseInfo
+    version = cache.get(VERSION_KEY, 0)
+    now = time.monotonic()
+    if _index.version == version and now - _index.synced_at < SYNC_INTERVAL:
+        return
+
+    with _index_lock:
+        if _index.version == version and now - _index.synced_at < SYNC_INTERVAL:
+            return
+        current_ids = set(DiseaseInfo.objects.values_list('id', flat=True))
+        changed = DiseaseInfo.objects.all()
+        if _index.last_updated:
+            changed = changed.filter(updated_at__gt=_index.last_updated)
+
+        removed = set(_index.name_terms) - current_ids
+        for disease_id in removed:
+            _index.remove_disease(disease_id)
+        updated = 0
+        for disease in changed:
+            _index.remove_disease(disease.id)
+            _index.add_disease(disease)
+            updated += 1
+            if not _index.last_updated or disease.updated_at > _index.last_updated:
+                _index.last_updated = disease.updated_at
+
+        _index.version = version
+        _index.synced_at = now
+        if updated or removed:
+            logger.info(f"[KB] Re-indexed {updated} diseases, dropped {len(removed)} ({len(_index.passages)} passages)")
+
+
+# ============================================
+# SEARCH
+# ============================================
+def search(query: str, limit: int = 3) -> List[Dict]:
+    """Top passages for `query`: [{'name', 'field', 'text', 'url', 'score', 'disease_id'}]."""
+    try:
+        _sync()
+    except Exception as e:
+        logger.error(f"[KB] Index sync failed: {e}")
+
+    terms = set(tokenize(query))
+    with _index_lock:
+        return _rank(terms, limit)
+
+
+def _rank(terms, limit):
+    count = len(_index.passages)
+    if not terms or not count:
+        return []
+    avg_length = _index.total_length / count
+
+    scores = Counter()
+    for term in terms:
+        keys = _index.postings.get(term)
+        if not keys:
+            continue
+        idf = math.log(1 + (count - len(keys) + 0.5) / (len(keys) + 0.5))
+        for key in keys:
+            passage = _index.passages[key]
+            tf = passage['terms'][term]
+            scores[key] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * passage['length'] / avg_length))
+
+    # Field asked for by the question wins ties between passages of the same disease
+    intent = _intent(terms)
+    results = []
+    for key, score in scores.most_common(limit * 3):
+        passage = _index.passages[key]
+        if passage['field'] == intent:
+            score *= 1.5
+        results.append({
+            'disease_id': key[0],
+            'name': passage['name'],
+            'field': passage['field'],
+            'text': passage['text'],
+            'url': passage['url'],
+            'score': round(score, 3),
+        })
+    results.sort(key=lambda r: r['score'], reverse=True)
+    return results[:limit]
+
+
+def _intent(terms) -> Optional[str]:
+    for field in ('symptoms', 'prevention', 'description'):
+        if terms & INTENT_TERMS[field]:
+            return field
+    return None
+
+
+def direct_answer(query: str) -> Optional[Dict]:
+    """
+    The passage that fully answers `query`, or None. Requires the question to
+    name exactly one indexed disease and every remaining word to be either a
+    field intent word or found in that passage.
+    """
+    if not getattr(settings, 'CHAT_KB_DIRECT_ANSWERS', True):
+        return None
+    try:
+        _sync()
+    except Exception as e:
+        logger.error(f"[KB] Index sync failed: {e}")
+
+    terms = set(tokenize(query))
+    with _index_lock:
+        return _match_field(terms)
+
+
+def _match_field(terms):
+    named = {disease_id for disease_id, name in _index.name_terms.items() if name and name <= terms}
+    if len(named) != 1:
+        return None
+    disease_id = named.pop()
+    intent = _intent(terms) or 'description'
+    passage = _index.passages.get((disease_id, intent))
+    if not passage:
+        return None
+
+    residual = terms - _index.name_terms[disease_id] - INTENT_TERMS[intent]
+    if any(term not in passage['terms'] for term in residual):
+        return None  # Asks about something the curated text doesn't cover
+    return {
+        'disease_id': disease_id,
+        'name': passage['name'],
+        'field': intent,
+        'text': passage['text'],
+        'url': passage['url'],
+    }
+
+
+def format_passage(passage: Dict) -> str:
+    """Curated passage as a chat answer (markdown, same link convention as the Gemini answers)."""
+    url = passage['url'] or f"https://dermnetnz.org/topics/{passage['name'].lower().replace(' ', '-')}"
+    return (
+        f"**{passage['name']} - {FIELD_LABELS[passage['field']]}**\n\n"
+        f"{passage['text']}\n\n"
+        f"[Learn More ->]({url})"
+    )
+
+
+def grounding_block(passages: List[Dict]) -> str:
+    """Reference text appended to the Gemini system instruction."""
+    return '\n\n'.join(f"[{p['name']} - {FIELD_LABELS[p['field']]}]\n{p['text']}" for p in passages)
+
+
+def index_stats() -> Dict:
+    return {
+        'diseases': len(_index.name_terms),
+        'passages': len(_index.passages),
+        'terms': len(_index.postings),
+        'last_updated': _index.last_updated,
+    }
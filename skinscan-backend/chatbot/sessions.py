@@ -0,0 +1,87 @@
+"""
+Chat sessions: message storage, the per-session summary table and keyset
+pagination.
+
+Every chat message is stored through record_message(), which also bumps the
+session's ChatSession row (count, preview, last activity) in the same
+transaction. The sessions list reads only that table.
+
+Pages are keyset-paginated newest first (skinscan/pagination.py). Message
+pages of one session use the (user, session_id, created_at) index on
+chat_history.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from skinscan.pagination import InvalidCursor, keyset_page, page_size
+
+from .models import ChatHistory, ChatSession, ChatSessionMemory
+
+PREVIEW_CHARS = 200
+TITLE_CHARS = 100
+
+
+# ============================================
+# WRITES
+# ============================================
+def record_message(user, role, message, session_id) -> ChatHistory:
+    """Store one chat message and update its session summary."""
+    with transaction.atomic():
+        entry = ChatHistory.objects.create(user=user, role=role, message=message, session_id=session_id)
+        changes = {
+            'message_count': F('message_count') + 1,
+            'last_message': message[:PREVIEW_CHARS],
+            'last_role': role,
+            'last_message_at': entry.created_at,
+        }
+        if ChatSession.objects.filter(user=user, session_id=session_id).update(**changes):
+            return entry
+        try:
+            with transaction.atomic():
+                ChatSession.objects.create(
+                    user=user,
+                    session_id=session_id,
+                    title=message[:TITLE_CHARS] if role == 'user' else '',
+                    message_count=1,
+                    last_message=message[:PREVIEW_CHARS],
+                    last_role=role,
+                    started_at=entry.created_at,
+                    last_message_at=entry.created_at,
+                )
+        except IntegrityError:
+            # Another request opened the same session first
+            ChatSession.objects.filter(user=user, session_id=session_id).update(**changes)
+    return entry
+
+
+def clear_sessions(user, session_id=None) -> int:
+    """Delete messages, summaries and memory of one session (or all). Returns messages deleted."""
+    scope = {'user': user} if session_id is None else {'user': user, 'session_id': session_id}
+    with transaction.atomic():
+        deleted, _ = ChatHistory.objects.filter(**scope).delete()
+        ChatSession.objects.filter(**scope).delete()
+        ChatSessionMemory.objects.filter(**scope).delete()
+    return deleted
+
+
+# ============================================
+# PAGES
+# ============================================
+def session_page(user, cursor=None, limit=20):
+    """(sessions, next_cursor), most recently active first."""
+    return keyset_page(ChatSession.objects.filter(user=user), 'last_message_at', cursor, limit)
+
+
+def message_page(user, session_id=None, cursor=None, limit=50):
+    """(messages, next_cursor): the newest page, then older ones via the cursor."""
+    messages = ChatHistory.objects.filter(user=user)
+    if session_id:
+        messages = messages.filter(session_id=session_id)
+    return keyset_page(messages, 'created_at', cursor, limit)
+
+
+def total_messages(user, session_id=None) -> int:
+    sessions = ChatSession.objects.filter(user=user)
+    if session_id:
+        sessions = sessions.filter(session_id=session_id)
+    return sessions.aggregate(total=Sum('message_count'))['total'] or 0
@@ -0,0 +1,373 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+
+from admin_module.models import DiseaseInfo
+from authentication.jwt_auth import generate_jwt_token
+from authentication.models import User
+from skinscan.leases import acquire_lease
+
+from . import faq_cache, memory, retrieval, sessions
+from .models import ChatFAQEntry, ChatHistory, ChatSession, ChatSessionMemory
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chatbot-tests'}}
+
+
+# ============================================
+# FAQ CACHE
+# ============================================
+@override_settings(CACHES=LOCMEM, CHAT_FAQ_SIMILARITY=0.8)
+class FAQCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        faq_cache._index['version'] = None
+        self.entry_id = faq_cache.remember('How do I treat eczema?', 'Moisturise twice a day.')
+        faq_cache.remember('What causes acne?', 'Clogged pores.')
+
+    def test_rephrased_question_is_answered_from_cache(self):
+        hit = faq_cache.lookup('how to treat eczema')
+        self.assertEqual((hit['id'], hit['answer']), (self.entry_id, 'Moisturise twice a day.'))
+        self.assertEqual(ChatFAQEntry.objects.get(id=self.entry_id).hits, 1)
+
+    def test_added_qualifier_is_a_miss(self):
+        self.assertIsNone(faq_cache.lookup('how to treat eczema in my child'))
+        self.assertIsNone(faq_cache.lookup('how to treat acne'))
+
+    @override_settings(CHAT_FAQ_MAX_ENTRIES=2)
+    def test_eviction_runs_only_on_overflow(self):
+        # Refreshing an existing answer neither grows the table nor checks its size
+        with self.assertNumQueries(4):
+            faq_cache.remember('how do I treat eczema', 'Use emollients.')
+        self.assertEqual(ChatFAQEntry.objects.count(), 2)
+
+        ChatFAQEntry.objects.filter(id=self.entry_id).update(hits=3)
+        faq_cache.remember('Does sunscreen prevent melasma?', 'It helps.')
+        self.assertEqual(ChatFAQEntry.objects.count(), 2)
+        self.assertTrue(ChatFAQEntry.objects.filter(id=self.entry_id).exists())
+        self.assertFalse(ChatFAQEntry.objects.filter(normalized='cause acne').exists())
+
+
+# ============================================
+# CONVERSATION MEMORY
+# ============================================
+@override_settings(GOOGLE_API_KEY='', CHAT_MEMORY_TOKEN_BUDGET=1200)
+class MemoryFoldingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='memory@test.com', account_status='ACTIVE')
+
+    def add_turns(self, count, text='short turn'):
+        return [
+            ChatHistory.objects.create(user=self.user, session_id='s1', role='user' if i % 2 == 0 else 'bot',
+                                       message=f'{text} {i}').id
+            for i in range(count)
+        ]
+
+    def test_turns_past_the_turn_cap_are_folded(self):
+        ids = self.add_turns(memory.MAX_TURNS + 6)
+        self.assertTrue(memory.fold_overflow(self.user.id, 's1'))
+
+        state = ChatSessionMemory.objects.get(user=self.user, session_id='s1')
+        self.assertEqual(state.summarized_until, ids[5])
+        self.assertIn('short turn 0', state.summary)
+        turns = memory.build_history(self.user, 's1')['turns']
+        self.assertEqual(turns[0]['message'], 'short turn 6')
+        self.assertEqual(len(turns), memory.MAX_TURNS)
+        self.assertFalse(memory.fold_overflow(self.user.id, 's1'))
+
+    @override_settings(CHAT_MEMORY_TOKEN_BUDGET=30)
+    def test_turns_past_the_token_budget_are_folded(self):
+        ids = self.add_turns(4, text='x' * 50)  # 13 tokens each, two fit
+        self.assertTrue(memory.fold_overflow(self.user.id, 's1'))
+        self.assertEqual(ChatSessionMemory.objects.get(user=self.user).summarized_until, ids[1])
+        self.assertEqual(len(memory.build_history(self.user, 's1')['turns']), 2)
+
+    def test_fold_skips_a_session_another_worker_holds(self):
+        self.add_turns(memory.MAX_TURNS + 2)
+        self.assertTrue(acquire_lease(memory._lease_key(self.user.id, 's1'), 'other-worker', 60))
+        self.assertFalse(memory.fold_overflow(self.user.id, 's1'))
+        self.assertFalse(ChatSessionMemory.objects.exists())
+
+    @mock.patch('chatbot.memory._executor')
+    def test_burst_of_messages_queues_one_fold(self, executor):
+        memory.schedule_fold(self.user.id, 's1')
+        memory.schedule_fold(self.user.id, 's1')
+        memory.schedule_fold(self.user.id, 's2')
+        self.assertEqual(executor.submit.call_count, 2)
+
+        with mock.patch('chatbot.memory.fold_overflow'), mock.patch('chatbot.memory.close_old_connections'):
+            memory._fold_in_thread(self.user.id, 's1')
+            memory._fold_in_thread(self.user.id, 's2')
+        memory.schedule_fold(self.user.id, 's1')
+        self.assertEqual(executor.submit.call_count, 3)
+        memory._pending.clear()
+
+
+# ============================================
+# KNOWLEDGE BASE (BM25)
+# ============================================
+def _diseases():
+    DiseaseInfo.objects.create(
+        name='Eczema', category='Inflammatory',
+        description='A chronic condition that makes skin dry and inflamed.',
+        symptoms='Itchy, dry, red patches on the skin, often in skin folds.',
+        prevention='Moisturise daily and avoid harsh soaps.',
+    )
+    DiseaseInfo.objects.create(
+        name='Acne', category='Inflammatory',
+        description='Blocked hair follicles under the skin.',
+        symptoms='Whiteheads, blackheads and pimples on the face.',
+        prevention='Wash the face gently twice a day.',
+    )
+
+
+@override_settings(CACHES=LOCMEM, CHAT_KB_DIRECT_ANSWERS=True)
+class RetrievalTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(retrieval, '_index', retrieval._Index())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        _diseases()
+
+    def test_question_about_one_field_is_answered_directly(self):
+        passage = retrieval.direct_answer('What are the symptoms of eczema?')
+        self.assertEqual((passage['name'], passage['field']), ('Eczema', 'symptoms'))
+        self.assertEqual(retrieval.direct_answer('eczema')['field'], 'description')
+
+    def test_question_beyond_the_curated_text_is_not(self):
+        self.assertIsNone(retrieval.direct_answer('What are the symptoms of eczema in babies?'))
+        self.assertIsNone(retrieval.direct_answer('Is acne worse than eczema?'))  # Two diseases
+        with override_settings(CHAT_KB_DIRECT_ANSWERS=False):
+            self.assertIsNone(retrieval.direct_answer('What are the symptoms of eczema?'))
+
+    def test_search_ranks_the_matching_passage_first(self):
+        results = retrieval.search('itchy red patches in skin folds', limit=2)
+        self.assertEqual((results[0]['name'], results[0]['field']), ('Eczema', 'symptoms'))
+        self.assertEqual(retrieval.search('how to prevent pimples')[0]['name'], 'Acne')
+        self.assertEqual(retrieval.search('sunburn'), [])
+
+    def test_edited_content_is_reindexed_after_mark_stale(self):
+        retrieval.search('eczema')
+        disease = DiseaseInfo.objects.get(name='Eczema')
+        disease.symptoms = 'Scaly plaques on elbows.'
+        disease.save()
+        DiseaseInfo.objects.filter(name='Acne').delete()
+        retrieval.mark_stale()
+
+        self.assertEqual(retrieval.direct_answer('symptoms of eczema')['text'], 'Scaly plaques on elbows.')
+        self.assertEqual(retrieval.index_stats()['diseases'], 1)
+
+
+# ============================================
+# ASYNC CHAT VIEW
+# ============================================
+@override_settings(CACHES=LOCMEM, GOOGLE_API_KEY='test-key', CHAT_KB_DIRECT_ANSWERS=True)
+@mock.patch('chatbot.views.memory.schedule_fold')
+class AsyncChatViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        faq_cache._index['version'] = None
+        patcher = mock.patch.object(retrieval, '_index', retrieval._Index())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        _diseases()
+        self.user = User.objects.create(email='async-chat@test.com', account_status='ACTIVE')
+        self.headers = {'Authorization': f'Bearer {generate_jwt_token(self.user)}'}
+
+    async def send(self, message, session_id='s1'):
+        return await AsyncClient().post(
+            '/api/chat/message-async', {'message': message, 'session_id': session_id},
+            content_type='application/json', headers=self.headers
+        )
+
+    @mock.patch('chatbot.views.llm_client.apost', new_callable=mock.AsyncMock)
+    async def test_gemini_answer_is_grounded_and_stored(self, apost, schedule_fold):
+        apost.return_value = mock.Mock(status_code=200, json=lambda: {
+            'candidates': [{'content': {'parts': [{'text': 'Try an emollient.'}]}}]
+        })
+        response = await self.send('Which cream helps itchy red patches?')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'bot_message': 'Try an emollient.', 'session_id': 's1'})
+        instruction = apost.call_args.args[2]['systemInstruction']['parts'][0]['text']
+        self.assertIn('[Eczema - Symptoms]', instruction)
+        self.assertEqual(await ChatHistory.objects.filter(session_id='s1').acount(), 2)
+        self.assertTrue(await ChatFAQEntry.objects.filter(answer='Try an emollient.').aexists())
+        schedule_fold.assert_called_once_with(self.user.id, 's1')
+
+    @mock.patch('chatbot.views.llm_client.apost', new_callable=mock.AsyncMock)
+    async def test_curated_question_skips_gemini(self, apost, _):
+        response = await self.send('What are the symptoms of eczema?')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Itchy, dry, red patches', response.json()['data']['bot_message'])
+        apost.assert_not_called()
+
+    async def test_empty_message_and_missing_token_are_rejected(self, _):
+        self.assertEqual((await self.send('  ')).status_code, 400)
+        response = await AsyncClient().post('/api/chat/message-async', {'message': 'hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+
+# ============================================
+# STREAMING CHAT VIEW
+# ============================================
+def _sse_line(text):
+    return 'data: ' + json.dumps({'candidates': [{'content': {'parts': [{'text': text}]}}]})
+
+
+class _GatedGeminiStream:
+    """httpx-style streaming response that holds its second chunk until `release` is set"""
+    status_code = 200
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.closed = False
+
+    async def aiter_lines(self):
+        yield _sse_line('Try an ')
+        await self.release.wait()
+        yield _sse_line('emollient.')
+
+    async def aclose(self):
+        self.closed = True
+
+
+@override_settings(CACHES=LOCMEM, GOOGLE_API_KEY='test-key')
+@mock.patch('chatbot.views.memory.schedule_fold')
+class ChatStreamViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        faq_cache._index['version'] = None
+        self.user = User.objects.create(email='stream-chat@test.com', account_status='ACTIVE')
+        self.headers = {'Authorization': f'Bearer {generate_jwt_token(self.user)}'}
+
+    async def test_asgi_sends_the_first_token_before_gemini_finishes(self, schedule_fold):
+        gemini = _GatedGeminiStream()
+        with mock.patch('chatbot.views.llm_client.apost', new=mock.AsyncMock(return_value=gemini)) as apost:
+            response = await AsyncClient().post(
+                '/api/chat/message-stream', {'message': 'Which cream helps?', 'session_id': 's1'},
+                content_type='application/json', headers=self.headers
+            )
+            self.assertTrue(response.is_async)
+            events = response.streaming_content
+
+            first = await asyncio.wait_for(events.__anext__(), timeout=2)
+            self.assertEqual(first, b'data: {"token": "Try an "}\n\n')
+            self.assertFalse(gemini.release.is_set())  # Gemini is still generating
+
+            gemini.release.set()
+            rest = b''.join([chunk async for chunk in events]).decode()
+
+        self.assertIn('"token": "emollient."', rest)
+        self.assertTrue(rest.endswith('event: done\ndata: {"session_id": "s1"}\n\n'))
+        self.assertTrue(apost.call_args.kwargs['stream'])
+        self.assertTrue(gemini.closed)
+        bot = await ChatHistory.objects.aget(session_id='s1', role='bot')
+        self.assertEqual(bot.message, 'Try an emollient.')
+        schedule_fold.assert_called_once_with(self.user.id, 's1')
+
+    @mock.patch('chatbot.views.llm_client.post')
+    def test_wsgi_streams_from_a_sync_generator(self, post, schedule_fold):
+        post.return_value = mock.MagicMock(status_code=200, iter_lines=lambda decode_unicode: iter([
+            _sse_line('Moisturise '), '', _sse_line('daily.')
+        ]))
+        response = self.client.post('/api/chat/message-stream', {'message': 'Help?', 'session_id': 's2'},
+                                    content_type='application/json', headers=self.headers)
+
+        self.assertFalse(response.is_async)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('"token": "Moisturise "', body)
+        self.assertTrue(post.call_args.kwargs['stream'])
+        self.assertEqual(ChatHistory.objects.get(session_id='s2', role='bot').message, 'Moisturise daily.')
+
+    async def test_empty_message_is_rejected(self, _):
+        response = await AsyncClient().post('/api/chat/message-stream', {'message': ' '},
+                                            content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================
+# SESSIONS & HISTORY PAGINATION
+# ============================================
+class ChatSessionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='sessions@test.com', account_status='ACTIVE')
+        self.headers = {'Authorization': f'Bearer {generate_jwt_token(self.user)}'}
+
+    def get(self, url, params=None):
+        return self.client.get(url, params or {}, headers=self.headers)
+
+    def add_messages(self, session_id, count, user=None):
+        for i in range(count):
+            sessions.record_message(user or self.user, 'user' if i % 2 == 0 else 'bot', f'{session_id} message {i}', session_id)
+
+    def test_record_message_keeps_the_session_summary(self):
+        sessions.record_message(self.user, 'bot', 'Welcome!', 's1')
+        sessions.record_message(self.user, 'user', 'x' * 300, 's1')
+
+        row = ChatSession.objects.get(user=self.user, session_id='s1')
+        self.assertEqual((row.title, row.message_count, row.last_role), ('', 2, 'user'))
+        self.assertEqual(row.last_message, 'x' * sessions.PREVIEW_CHARS)
+        self.assertEqual(row.last_message_at, ChatHistory.objects.latest('id').created_at)
+        self.assertLess(row.started_at, row.last_message_at)
+
+        sessions.record_message(self.user, 'user', 'Is this eczema?', 's2')
+        self.assertEqual(ChatSession.objects.get(session_id='s2').title, 'Is this eczema?')
+
+    def test_sessions_are_listed_most_recent_first_in_pages(self):
+        for session_id in ('s1', 's2', 's3'):
+            self.add_messages(session_id, 2)
+        self.add_messages('s1', 1)  # s1 becomes the most recent
+        self.add_messages('other', 1, user=User.objects.create(email='other@test.com', account_status='ACTIVE'))
+
+        first = self.get('/api/chat/sessions', {'limit': 2}).json()['data']
+        self.assertEqual([s['session_id'] for s in first['sessions']], ['s1', 's3'])
+        self.assertEqual(first['sessions'][0]['message_count'], 3)
+        second = self.get('/api/chat/sessions', {'limit': 2, 'cursor': first['next_cursor']}).json()['data']
+        self.assertEqual(([s['session_id'] for s in second['sessions']], second['next_cursor']), (['s2'], None))
+
+    def test_history_pages_walk_back_without_gaps_or_repeats(self):
+        self.add_messages('s1', 7)
+        self.add_messages('s2', 3)
+
+        seen, cursor = [], None
+        while True:
+            params = {'session_id': 's1', 'limit': 3, **({'cursor': cursor} if cursor else {})}
+            data = self.get('/api/chat/history', params).json()['data']
+            self.assertEqual(data['total_messages'], 7)
+            page = [m['message'] for m in data['messages']]
+            self.assertEqual(page, sorted(page, key=lambda m: int(m.rsplit(' ', 1)[1])))  # Chronological
+            seen = page + seen
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [f's1 message {i}' for i in range(7)])
+
+        everything = self.get('/api/chat/history', {'limit': 100}).json()['data']
+        self.assertEqual((everything['total_messages'], len(everything['messages'])), (10, 10))
+
+    def test_invalid_cursor_is_400(self):
+        for url in ('/api/chat/history', '/api/chat/sessions'):
+            with self.subTest(url=url):
+                with self.assertLogs('django.request', 'WARNING'):
+                    response = self.get(url, {'cursor': 'not-a-cursor'})
+                self.assertEqual((response.status_code, response.json()['error_code']), (400, 'INVALID_CURSOR'))
+
+    def test_clearing_a_session_drops_its_summary(self):
+        self.add_messages('s1', 2)
+        self.add_messages('s2', 2)
+        response = self.client.delete('/api/chat/clear-history?session_id=s1', headers=self.headers)
+
+        self.assertEqual(response.json()['message'], 'Deleted 2 messages')
+        self.assertEqual(list(ChatSession.objects.values_list('session_id', flat=True)), ['s2'])
+        self.assertEqual(self.get('/api/chat/history').json()['data']['total_messages'], 2)
@@ -4,12 +4,18 @@ Chatbot URL Routes
 from django.urls import path
 from .views import (
     ChatMessageView,
+    AsyncChatMessageView,
+    ChatStreamView,
+    ChatSessionListView,
     ChatHistoryView,
     ClearChatHistoryView
 )
 
 urlpatterns = [
     path('message', ChatMessageView.as_view(), name='chat_message'),
+    path('message-stream', ChatStreamView.as_view(), name='chat_message_stream'),
+    path('message-async', AsyncChatMessageView.as_view(), name='chat_message_async'),  # Serve via skinscan/asgi.py
+    path('sessions', ChatSessionListView.as_view(), name='chat_sessions'),
     path('history', ChatHistoryView.as_view(), name='chat_history'),
     path('clear-history', ClearChatHistoryView.as_view(), name='clear_chat_history'),
 ]
@@ -1,17 +1,24 @@
 """
 Chatbot Views - Message handling and chat history
 """
-import requests
 import json
+import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from .models import ChatHistory # Correct model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from . import faq_cache, memory, retrieval, sessions
 import uuid
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from skinscan import llm_client
+from skinscan.async_views import AsyncAPIView, api_error, api_response
 # from .serializers import ChatMessageSerializer # Removed as it doesn't exist
 
+logger = logging.getLogger(__name__)
+
 SKINSCAN_SYSTEM_INSTRUCTION = """
 You are SkinScan AI, a specialized dermatologist assistant.
 Your goal is to provide accurate, helpful, and safety-conscious information about skin health.
@@ -29,7 +36,172 @@ FORMATTING:
 - Keep responses concise but informative.
 """
 
-class ChatMessageView(APIView):
+DISCLAIMER = "\n\n⚠️ Disclaimer: I provide general information only. Always consult a dermatologist for medical advice."
+
+
+class GeminiChatMixin:
+    """Request building, response parsing and offline answers shared by the sync and async chat views"""
+    answered_by_llm = False  # Set once Gemini produced a real answer for this request
+
+    def _load_history(self, user, session_id, before_id):
+        """Summary and recent turns of this session, excluding the message being answered"""
+        try:
+            return memory.build_history(user, session_id, before_id)
+        except Exception as e:
+            logger.error(f"Chat memory lookup failed: {e}")
+            return None
+
+    def _instant_answer(self, user_message, context=None, history=None):
+        """
+        Answer that needs no LLM call: curated DiseaseInfo content for questions it fully
+        covers, then the FAQ cache for context-free questions (scan context or earlier turns
+        bypass the cache)
+        """
+        try:
+            passage = retrieval.direct_answer(user_message)
+            if passage:
+                return retrieval.format_passage(passage) + DISCLAIMER
+        except Exception as e:
+            logger.error(f"Knowledge base lookup failed: {e}")
+
+        if context or (history and (history['turns'] or history['summary'])):
+            return None
+        try:
+            hit = faq_cache.lookup(user_message)
+        except Exception as e:
+            logger.error(f"FAQ cache lookup failed: {e}")
+            return None
+        return hit['answer'] if hit else None
+
+    def _reference_passages(self, user_message, context=None):
+        """Curated passages relevant to the question, for grounding and the offline fallback"""
+        try:
+            return retrieval.search(f"{user_message} {context or ''}", limit=getattr(settings, 'CHAT_KB_TOP_K', 3))
+        except Exception as e:
+            logger.error(f"Knowledge base search failed: {e}")
+            return []
+
+    def _remember_answer(self, user_message, context, answer, history=None):
+        if context or not self.answered_by_llm or (history and (history['turns'] or history['summary'])):
+            return
+        try:
+            faq_cache.remember(user_message, answer)
+        except Exception as e:
+            logger.error(f"FAQ cache store failed: {e}")
+
+    def _build_gemini_request(self, user_message, context=None, stream=False, history=None, passages=None):
+        """(url, payload, headers) for a Gemini chat call, or None if no API key is configured"""
+        # 1. Check for API Key
+        api_key = settings.GOOGLE_API_KEY
+        if api_key:
+            api_key = api_key.strip()
+            
+        if not api_key:
+             if settings.DEBUG: print("❌ Log: Missing API Key")
+             return None
+
+        # Prepend context to user message if available
+        full_prompt = user_message
+        if context:
+            full_prompt = f"CONTEXT: {context}\n\nUSER QUESTION: {user_message}"
+
+        # 2. Prepare REST Request
+        model_name = settings.GEMINI_MODEL_NAME or 'gemini-1.5-flash'
+        if stream:
+            # Server-sent events, one partial candidate per event
+            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:streamGenerateContent?alt=sse&key={api_key}"
+        else:
+            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
+        
+        headers = {'Content-Type': 'application/json'}
+
+        # Earlier turns of the session (token-budgeted, see chatbot/memory.py)
+        contents = []
+        system_instruction = SKINSCAN_SYSTEM_INSTRUCTION
+        if history:
+            contents = [{
+                "role": 'user' if turn['role'] == 'user' else 'model',
+                "parts": [{"text": turn['message']}]
+            } for turn in history['turns']]
+            if history['summary']:
+                system_instruction += f"\nCONVERSATION SUMMARY (earlier in this chat):\n{history['summary']}\n"
+        if passages:
+            system_instruction += (
+                "\nREFERENCE (curated SkinScan content; prefer it over general knowledge where relevant):\n"
+                f"{retrieval.grounding_block(passages)}\n"
+            )
+        contents.append({"role": "user", "parts": [{"text": full_prompt}]})
+        
+        payload = {
+            "contents": contents,
+            "systemInstruction": {
+                "parts": [{"text": system_instruction}]
+            },
+            "generationConfig": {
+                "temperature": 0.7,
+                "maxOutputTokens": 800,
+            }
+        }
+        return url, payload, headers
+
+    def _parse_gemini_response(self, response):
+        """Bot text from a Gemini response (requests or httpx)"""
+        if response.status_code == 200:
+            data = response.json()
+            # Parse response
+            try:
+                bot_text = data['candidates'][0]['content']['parts'][0]['text']
+                self.answered_by_llm = True
+                return bot_text
+            except (KeyError, IndexError):
+                 if settings.DEBUG: print(f"❌ Parse Error: {data}")
+                 return "I'm having trouble formulating a response. Please try again."
+        else:
+            if settings.DEBUG: print(f"❌ API Error {response.status_code}: {response.text}")
+            return "I'm having trouble connecting to my AI services. Please try again later."
+
+    def _iter_gemini_stream(self, response):
+        """Yield text chunks from a streamGenerateContent (alt=sse) response"""
+        for line in response.iter_lines(decode_unicode=True):
+            yield from self._stream_line_text(line)
+
+    async def _aiter_gemini_stream(self, response):
+        """_iter_gemini_stream() for an httpx streaming response"""
+        async for line in response.aiter_lines():
+            for text in self._stream_line_text(line):
+                yield text
+
+    def _stream_line_text(self, line):
+        if not line or not line.startswith('data:'):
+            return []
+        try:
+            data = json.loads(line[5:].strip())
+            parts = data['candidates'][0]['content']['parts']
+        except (ValueError, KeyError, IndexError):
+            return []
+        return [part['text'] for part in parts if part.get('text')]
+
+    def _fallback_response(self, user_message, debug_info=None, passages=None):
+        """Rule-based fallback if AI fails; answers from curated content when it has a match"""
+        message_lower = user_message.lower()
+        disclaimer = DISCLAIMER
+        
+        if debug_info and settings.DEBUG:
+             print(f"Fallback triggered: {debug_info}")
+
+        if passages:
+            return retrieval.format_passage(passages[0]) + disclaimer
+
+        if any(word in message_lower for word in ['hello', 'hi', 'hey']):
+            return "Hello! I'm your SkinCare Assistant. I'm currently running in offline mode. How can I help you?" + disclaimer
+        
+        elif 'accuracy' in message_lower:
+             return "Our AI model uses advanced computer vision for preliminary screening. Accuracy depends on image quality." + disclaimer
+             
+        return "I am currently experiencing connection issues with my AI brain. Please try again later, or ask me about 'accuracy' or saying 'hello'." + disclaimer
+
+
+class ChatMessageView(GeminiChatMixin, APIView):
     """Handle chatbot messages using Google Gemini AI (REST API)"""
     permission_classes = [IsAuthenticated]
     
@@ -48,23 +220,19 @@ class ChatMessageView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Save User Message
-        ChatHistory.objects.create(
-            user=request.user,
-            role='user',
-            message=message,
-            session_id=session_id
-        )
+        user_entry = sessions.record_message(request.user, 'user', message, session_id)
+        history = self._load_history(request.user, session_id, user_entry.id)
         
-        # Generate Bot Response (With Context Injection)
-        bot_response = self.generate_bot_response(message, context_data)
+        # Generate Bot Response (With Context Injection); general questions may come from the FAQ cache
+        bot_response = self._instant_answer(message, context_data, history)
+        if bot_response is None:
+            passages = self._reference_passages(message, context_data)
+            bot_response = self.generate_bot_response(message, context_data, history, passages)
+            self._remember_answer(message, context_data, bot_response, history)
         
         # Save Bot Response
-        ChatHistory.objects.create(
-            user=request.user,
-            role='bot',
-            message=bot_response,
-            session_id=session_id
-        )
+        sessions.record_message(request.user, 'bot', bot_response, session_id)
+        memory.schedule_fold(request.user.id, session_id)
         
         return Response({
             'status': 'success',
@@ -74,113 +242,309 @@ class ChatMessageView(APIView):
             }
         }, status=status.HTTP_200_OK)
     
-    def generate_bot_response(self, user_message, context=None):
+    def generate_bot_response(self, user_message, context=None, history=None, passages=None):
         """Generate chatbot response using Gemini REST API"""
-        
-        # 1. Check for API Key
-        api_key = settings.GOOGLE_API_KEY
-        if api_key:
-            api_key = api_key.strip()
-            
-        if not api_key:
-             if settings.DEBUG: print("❌ Log: Missing API Key")
-             return self._fallback_response(user_message, "Config Error: No Google API Key found.")
-
-        # Prepend context to user message if available
-        full_prompt = user_message
-        if context:
-            full_prompt = f"CONTEXT: {context}\n\nUSER QUESTION: {user_message}"
+        request = self._build_gemini_request(user_message, context, history=history, passages=passages)
+        if not request:
+            return self._fallback_response(user_message, "Config Error: No Google API Key found.", passages)
+        url, payload, headers = request
 
         try:
-            # 2. Prepare REST Request
-            model_name = settings.GEMINI_MODEL_NAME or 'gemini-1.5-flash'
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
-            
-            headers = {'Content-Type': 'application/json'}
-            
-            payload = {
-                "contents": [{
-                    "parts": [{"text": full_prompt}]
-                }],
-                "systemInstruction": {
-                    "parts": [{"text": SKINSCAN_SYSTEM_INSTRUCTION}]
-                },
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "maxOutputTokens": 800,
-                }
-            }
-            
             # 3. Call API
             if settings.DEBUG: print(f"⏳ Calling Gemini REST API: {url[:60]}...")
             
-            response = requests.post(url, headers=headers, json=payload, timeout=15)
-            
-            if response.status_code == 200:
-                data = response.json()
-                # Parse response
-                try:
-                    bot_text = data['candidates'][0]['content']['parts'][0]['text']
-                    return bot_text
-                except (KeyError, IndexError):
-                     if settings.DEBUG: print(f"❌ Parse Error: {data}")
-                     return "I'm having trouble formulating a response. Please try again."
-            else:
-                if settings.DEBUG: print(f"❌ API Error {response.status_code}: {response.text}")
-                return "I'm having trouble connecting to my AI services. Please try again later."
+            response = llm_client.post('gemini', url, payload, headers=headers, timeout=15)
+            return self._parse_gemini_response(response)
 
+        except llm_client.ProviderUnavailable:
+            # Skip straight to the offline answers while Gemini is failing
+            return self._fallback_response(user_message, "Gemini circuit is open", passages)
         except Exception as e:
             if settings.DEBUG: print(f"❌ Exception: {str(e)}")
-            return self._fallback_response(user_message, f"Exception: {str(e)}")
+            return self._fallback_response(user_message, f"Exception: {str(e)}", passages)
 
-    def _fallback_response(self, user_message, debug_info=None):
-        """Rule-based fallback if AI fails"""
-        message_lower = user_message.lower()
-        disclaimer = "\n\n⚠️ Disclaimer: I provide general information only. Always consult a dermatologist for medical advice."
-        
-        if debug_info and settings.DEBUG:
-             print(f"Fallback triggered: {debug_info}")
 
-        if any(word in message_lower for word in ['hello', 'hi', 'hey']):
-            return "Hello! I'm your SkinCare Assistant. I'm currently running in offline mode. How can I help you?" + disclaimer
-        
-        elif 'accuracy' in message_lower:
-             return "Our AI model uses advanced computer vision for preliminary screening. Accuracy depends on image quality." + disclaimer
-             
-        return "I am currently experiencing connection issues with my AI brain. Please try again later, or ask me about 'accuracy' or saying 'hello'." + disclaimer
+class ChatStreamView(GeminiChatMixin, AsyncAPIView):
+    """
+    Same as ChatMessageView, but relays Gemini's tokens to the browser as
+    server-sent events while they are generated:
 
+        data: {"token": "..."}            (repeated)
+        event: done
+        data: {"session_id": "..."}
+
+    The user message is stored before streaming starts; the bot message is
+    stored once, when the stream ends (or is cut off by the client).
+
+    Under ASGI the events come from an async generator over the pooled httpx
+    client (Django would buffer a sync one with sync_to_async(list) before
+    sending a byte); under WSGI the server iterates a sync generator.
+    """
+
+    async def post(self, request):
+        message = str(request.data.get('message', '')).strip()
+        context_data = str(request.data.get('context', '')).strip()
+        session_id = request.data.get('session_id') or str(uuid.uuid4())
+
+        if not message:
+            return api_error('Message cannot be empty', 'MESSAGE_REQUIRED', 400)
+
+        user_entry = await sync_to_async(sessions.record_message)(request.user, 'user', message, session_id)
+        history = await sync_to_async(self._load_history)(request.user, session_id, user_entry.id)
+
+        if isinstance(request, ASGIRequest):
+            events = self._aevent_stream(request.user, message, context_data, session_id, history)
+        else:
+            events = self._event_stream(request.user, message, context_data, session_id, history)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+        return response
+
+    def _event_stream(self, user, message, context, session_id, history=None):
+        chunks = []
+        cached = self._instant_answer(message, context, history)
+        if cached is not None:
+            tokens = [cached]
+        else:
+            tokens = self._stream_tokens(message, context, history, self._reference_passages(message, context))
+        try:
+            for token in tokens:
+                chunks.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        finally:
+            # Runs on normal completion and when the client disconnects mid-stream
+            self._finish_stream(user, message, context, session_id, history, chunks, cached is None)
+
+    async def _aevent_stream(self, user, message, context, session_id, history=None):
+        chunks = []
+        cached = await sync_to_async(self._instant_answer)(message, context, history)
+        try:
+            if cached is not None:
+                chunks.append(cached)
+                yield f"data: {json.dumps({'token': cached})}\n\n"
+            else:
+                passages = await sync_to_async(self._reference_passages)(message, context)
+                async for token in self._astream_tokens(message, context, history, passages):
+                    chunks.append(token)
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        finally:
+            await sync_to_async(self._finish_stream)(user, message, context, session_id, history, chunks, cached is None)
+
+    def _finish_stream(self, user, message, context, session_id, history, chunks, from_llm):
+        if not chunks:
+            return
+        sessions.record_message(user, 'bot', ''.join(chunks), session_id)
+        if from_llm:
+            self._remember_answer(message, context, ''.join(chunks), history)
+        memory.schedule_fold(user.id, session_id)
+
+    def _stream_tokens(self, user_message, context, history=None, passages=None):
+        request = self._build_gemini_request(user_message, context, stream=True, history=history, passages=passages)
+        if not request:
+            yield self._fallback_response(user_message, "Config Error: No Google API Key found.", passages)
+            return
+        url, payload, headers = request
+
+        try:
+            response = llm_client.post('gemini', url, payload, headers=headers, timeout=15, stream=True)
+        except llm_client.ProviderUnavailable:
+            yield self._fallback_response(user_message, "Gemini circuit is open", passages)
+            return
+        except Exception as e:
+            yield self._fallback_response(user_message, f"Exception: {str(e)}", passages)
+            return
+
+        with response:
+            if response.status_code != 200:
+                yield self._parse_gemini_response(response)
+                return
+            produced = False
+            try:
+                for text in self._iter_gemini_stream(response):
+                    produced = True
+                    yield text
+                self.answered_by_llm = produced
+            except Exception as e:
+                if not produced:
+                    yield self._fallback_response(user_message, f"Stream error: {str(e)}", passages)
+                    return
+                logger.warning(f"Gemini stream interrupted: {e}")
+            if not produced:
+                yield "I'm having trouble formulating a response. Please try again."
+
+    async def _astream_tokens(self, user_message, context, history=None, passages=None):
+        request = self._build_gemini_request(user_message, context, stream=True, history=history, passages=passages)
+        if not request:
+            yield self._fallback_response(user_message, "Config Error: No Google API Key found.", passages)
+            return
+        url, payload, headers = request
+
+        try:
+            response = await llm_client.apost('gemini', url, payload, headers=headers, timeout=15, stream=True)
+        except llm_client.ProviderUnavailable:
+            yield self._fallback_response(user_message, "Gemini circuit is open", passages)
+            return
+        except Exception as e:
+            yield self._fallback_response(user_message, f"Exception: {str(e)}", passages)
+            return
+
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                yield self._parse_gemini_response(response)
+                return
+            produced = False
+            try:
+                async for text in self._aiter_gemini_stream(response):
+                    produced = True
+                    yield text
+                self.answered_by_llm = produced
+            except Exception as e:
+                if not produced:
+                    yield self._fallback_response(user_message, f"Stream error: {str(e)}", passages)
+                    return
+                logger.warning(f"Gemini stream interrupted: {e}")
+            if not produced:
+                yield "I'm having trouble formulating a response. Please try again."
+        finally:
+            await response.aclose()
+
+
+class AsyncChatMessageView(GeminiChatMixin, AsyncAPIView):
+    """
+    ChatMessageView for ASGI: the Gemini call is awaited on the pooled async
+    client, so a waiting conversation does not hold a worker thread.
+    """
+
+    async def post(self, request):
+        message = str(request.data.get('message', '')).strip()
+        context_data = str(request.data.get('context', '')).strip()
+        session_id = request.data.get('session_id') or str(uuid.uuid4())
+
+        if not message:
+            return api_error('Message cannot be empty', 'MESSAGE_REQUIRED', 400)
+
+        user_entry = await sync_to_async(sessions.record_message)(request.user, 'user', message, session_id)
+        history = await sync_to_async(self._load_history)(request.user, session_id, user_entry.id)
+
+        bot_response = await sync_to_async(self._instant_answer)(message, context_data, history)
+        if bot_response is None:
+            passages = await sync_to_async(self._reference_passages)(message, context_data)
+            bot_response = await self.agenerate_bot_response(message, context_data, history, passages)
+            await sync_to_async(self._remember_answer)(message, context_data, bot_response, history)
+
+        await sync_to_async(sessions.record_message)(request.user, 'bot', bot_response, session_id)
+        memory.schedule_fold(request.user.id, session_id)
+
+        return api_response({
+            'status': 'success',
+            'data': {
+                'bot_message': bot_response,
+                'session_id': session_id
+            }
+        })
+
+    async def agenerate_bot_response(self, user_message, context=None, history=None, passages=None):
+        request = self._build_gemini_request(user_message, context, history=history, passages=passages)
+        if not request:
+            return self._fallback_response(user_message, "Config Error: No Google API Key found.", passages)
+        url, payload, headers = request
+
+        try:
+            response = await llm_client.apost('gemini', url, payload, headers=headers, timeout=15)
+            return self._parse_gemini_response(response)
+        except llm_client.ProviderUnavailable:
+            return self._fallback_response(user_message, "Gemini circuit is open", passages)
+        except Exception as e:
+            return self._fallback_response(user_message, f"Exception: {str(e)}", passages)
+
+
+class ChatSessionListView(APIView):
+    """List the user's conversations, most recent first (?limit=, ?cursor=)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            rows, next_cursor = sessions.session_page(
+                request.user,
+                cursor=request.query_params.get('cursor'),
+                limit=sessions.page_size(request.query_params.get('limit'), default=20)
+            )
+        except sessions.InvalidCursor:
+            return _invalid_cursor()
+
+        return Response({
+            'status': 'success',
+            'data': {
+                'sessions': [{
+                    'session_id': s.session_id,
+                    'title': s.title,
+                    'message_count': s.message_count,
+                    'last_message': s.last_message,
+                    'last_role': s.last_role,
+                    'started_at': s.started_at,
+                    'last_message_at': s.last_message_at
+                } for s in rows],
+                'next_cursor': next_cursor
+            }
+        }, status=status.HTTP_200_OK)
 
 
 class ChatHistoryView(APIView):
-    """Retrieve user's chat history"""
+    """
+    Retrieve user's chat history, newest page first (?session_id=, ?limit=, ?cursor=).
+    Messages within a page are in chronological order; next_cursor fetches older ones.
+    """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        """Get all chat messages for current user"""
-        history = ChatHistory.objects.filter(user=request.user)
+        """Get one page of chat messages for current user"""
+        session_id = request.query_params.get('session_id')
+        try:
+            history, next_cursor = sessions.message_page(
+                request.user,
+                session_id=session_id,
+                cursor=request.query_params.get('cursor'),
+                limit=sessions.page_size(request.query_params.get('limit'))
+            )
+        except sessions.InvalidCursor:
+            return _invalid_cursor()
+
         messages = [{
             'role': h.role,
             'message': h.message,
             'session_id': h.session_id,
             'created_at': h.created_at
-        } for h in history]
+        } for h in reversed(history)]
         
         return Response({
             'status': 'success',
             'data': {
-                'total_messages': len(messages),
-                'messages': messages
+                'total_messages': sessions.total_messages(request.user, session_id),
+                'messages': messages,
+                'next_cursor': next_cursor
             }
         }, status=status.HTTP_200_OK)
 
 
 class ClearChatHistoryView(APIView):
-    """Delete chat history"""
+    """Delete chat history (all of it, or one conversation with ?session_id=)"""
     permission_classes = [IsAuthenticated]
     
     def delete(self, request):
-        deleted_count, _ = ChatHistory.objects.filter(user=request.user).delete()
+        deleted_count = sessions.clear_sessions(request.user, request.query_params.get('session_id'))
         return Response({
             'status': 'success',
             'message': f'Deleted {deleted_count} messages'
         }, status=status.HTTP_200_OK)
+
+
+def _invalid_cursor():
+    return Response({
+        'status': 'error',
+        'error_code': 'INVALID_CURSOR',
+        'message': 'Invalid pagination cursor'
+    }, status=status.HTTP_400_BAD_REQUEST)
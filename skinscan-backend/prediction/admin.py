@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SkinImage, PredictionResult, ScanHistory
+from .models import SkinImage, PredictionResult, ScanHistory, RescoreResult, ShadowPrediction, CanaryRollout, TreatmentPlanCache
 
 
 @admin.register(SkinImage)
@@ -22,3 +22,30 @@ class ScanHistoryAdmin(admin.ModelAdmin):
     list_filter = ['severity_tag', 'body_location', 'is_bookmarked', 'created_at']
     search_fields = ['title', 'user__email']
 
+
+
+@admin.register(RescoreResult)
+class RescoreResultAdmin(admin.ModelAdmin):
+    list_display = ['id', 'checkpoint', 'prediction', 'stored_disease', 'new_disease', 'agrees', 'created_at']
+    list_filter = ['checkpoint', 'agrees']
+    search_fields = ['checkpoint', 'stored_disease', 'new_disease']
+
+
+@admin.register(ShadowPrediction)
+class ShadowPredictionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'candidate_model', 'production_disease', 'shadow_disease', 'agrees',
+                    'production_latency_ms', 'shadow_latency_ms', 'created_at']
+    list_filter = ['candidate_model', 'agrees']
+
+
+@admin.register(CanaryRollout)
+class CanaryRolloutAdmin(admin.ModelAdmin):
+    list_display = ['id', 'candidate_model', 'baseline_model', 'percentage', 'status', 'created_at', 'updated_at']
+    list_filter = ['status']
+
+
+@admin.register(TreatmentPlanCache)
+class TreatmentPlanCacheAdmin(admin.ModelAdmin):
+    list_display = ['id', 'disease_name', 'confidence_bucket', 'model', 'prompt_version', 'hits', 'expires_at']
+    list_filter = ['model', 'confidence_bucket', 'prompt_version']
+    search_fields = ['disease_name']
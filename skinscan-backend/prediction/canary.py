@@ -0,0 +1,226 @@
+"""
+Canary rollout of CNN checkpoints.
+
+A deterministic share of users (bucketed by a hash of candidate + user id, so a
+user keeps the same arm while the percentage grows) is routed to the candidate
+checkpoint. Every routed inference records a CanarySample; every
+EVALUATE_EVERY samples the guard compares the canary arm with the baseline arm
+on the current step and rolls the rollout back automatically when its p95
+latency or error rate is worse than the configured margins.
+
+Users with a hand-assigned model (User.assigned_model) are never part of a canary.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from django.db import close_old_connections, transaction
+
+from skinscan.utils import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STEPS = [5, 25, 50, 100]
+CACHE_TTL = 15.0  # Seconds a worker may keep routing with a stale rollout
+EVALUATE_EVERY = 20  # Samples recorded by this process between guard evaluations
+WINDOW = 500  # Most recent samples per arm considered by the guard
+
+_cache = {'rollout': None, 'expires': 0.0}
+_cache_lock = threading.Lock()
+_recorded = {'count': 0}
+# Sample writes and guard evaluation run off the request thread
+_recorder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='canary')
+
+
+def get_active_rollout(refresh: bool = False):
+    """The ACTIVE CanaryRollout (or None), cached per process for CACHE_TTL seconds."""
+    now = time.monotonic()
+    with _cache_lock:
+        if not refresh and now < _cache['expires']:
+            return _cache['rollout']
+
+    from .models import CanaryRollout
+    rollout = CanaryRollout.objects.filter(status='ACTIVE').order_by('-created_at').first()
+    with _cache_lock:
+        _cache['rollout'] = rollout
+        _cache['expires'] = now + CACHE_TTL
+    return rollout
+
+
+def user_bucket(candidate_model: str, user_id) -> int:
+    """Stable 0-99 bucket for a user within one candidate's rollout."""
+    digest = hashlib.sha256(f"{candidate_model}:{user_id}".encode()).hexdigest()
+    return int(digest[:8], 16) % 100
+
+
+def route_model(user) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+    """
+    Decide which checkpoint serves this user's prediction.
+
+    Returns (user_model_path, arm, rollout_id). user_model_path is None for the
+    global default; arm/rollout_id are None when no canary applies.
+    """
+    assigned = getattr(user, 'assigned_model', None)
+    if assigned:
+        return assigned, None, None
+
+    rollout = get_active_rollout()
+    if not rollout:
+        return None, None, None
+    if user_bucket(rollout.candidate_model, user.id) < rollout.percentage:
+        return rollout.candidate_model, 'canary', rollout.id
+    return None, 'baseline', rollout.id
+
+
+def record_outcome(rollout_id: Optional[int], arm: Optional[str], latency_ms: float, is_error: bool = False):
+    """Queue a CanarySample; never blocks or raises on the request path."""
+    if not rollout_id or not arm:
+        return
+    try:
+        _recorder.submit(_store_sample, rollout_id, arm, latency_ms, is_error)
+    except RuntimeError:
+        pass  # Interpreter shutting down
+
+
+def _store_sample(rollout_id, arm, latency_ms, is_error):
+    from .models import CanarySample, CanaryRollout
+    close_old_connections()
+    try:
+        CanarySample.objects.create(rollout_id=rollout_id, arm=arm, latency_ms=latency_ms, is_error=is_error)
+        _recorded['count'] += 1
+        if _recorded['count'] % EVALUATE_EVERY == 0:
+            rollout = CanaryRollout.objects.filter(id=rollout_id, status='ACTIVE').first()
+            if rollout:
+                evaluate_rollout(rollout)
+    except Exception as e:
+        logger.error(f"[CANARY] Failed to record sample: {e}")
+    finally:
+        close_old_connections()
+
+
+def _step_started_at(rollout):
+    last = rollout.events.filter(action__in=['STARTED', 'ADVANCED']).order_by('-created_at').first()
+    return last.created_at if last else rollout.created_at
+
+
+def arm_metrics(rollout, since=None) -> Dict:
+    """p95 latency and error rate per arm over the last WINDOW samples since `since`."""
+    metrics = {}
+    for arm in ('baseline', 'canary'):
+        samples = rollout.samples.filter(arm=arm)
+        if since:
+            samples = samples.filter(created_at__gte=since)
+        rows = list(samples.order_by('-created_at').values_list('latency_ms', 'is_error')[:WINDOW])
+        latencies = [latency for latency, failed in rows if not failed]
+        errors = sum(1 for _, failed in rows if failed)
+        metrics[arm] = {
+            'samples': len(rows),
+            'p95_latency_ms': percentile(latencies, 95),
+            'error_rate': round(errors / len(rows), 4) if rows else None,
+        }
+    return metrics
+
+
+def evaluate_rollout(rollout) -> Dict:
+    """Compare arms on the current step and roll back if the canary breaches a margin."""
+    metrics = arm_metrics(rollout, since=_step_started_at(rollout))
+    baseline, canary = metrics['baseline'], metrics['canary']
+    if min(baseline['samples'], canary['samples']) < max(rollout.min_samples, 1):
+        return {'metrics': metrics, 'verdict': 'insufficient_samples'}
+
+    reasons = []
+    if baseline['p95_latency_ms'] and canary['p95_latency_ms'] is not None:
+        limit = baseline['p95_latency_ms'] * (1 + rollout.latency_margin)
+        if canary['p95_latency_ms'] > limit:
+            reasons.append(f"p95 latency {canary['p95_latency_ms']}ms > {round(limit, 2)}ms")
+    if canary['error_rate'] > baseline['error_rate'] + rollout.error_margin:
+        reasons.append(f"error rate {canary['error_rate']:.2%} > baseline {baseline['error_rate']:.2%} + {rollout.error_margin:.2%}")
+
+    if reasons:
+        rollback(rollout, reason='; '.join(reasons), metrics=metrics)
+        return {'metrics': metrics, 'verdict': 'rolled_back', 'reasons': reasons}
+    return {'metrics': metrics, 'verdict': 'healthy'}
+
+
+# ============================================
+# STATE TRANSITIONS (admin model moderator)
+# ============================================
+def _transition(rollout, action, detail=None, **fields):
+    from .models import CanaryEvent
+    with transaction.atomic():
+        for name, value in fields.items():
+            setattr(rollout, name, value)
+        rollout.save()
+        CanaryEvent.objects.create(rollout=rollout, action=action, percentage=rollout.percentage, detail=detail or {})
+    get_active_rollout(refresh=True)
+    logger.info(f"[CANARY] {rollout.candidate_model}: {action} at {rollout.percentage}%")
+    return rollout
+
+
+def start_rollout(candidate_model: str, baseline_model: str, steps=None, created_by=None, **thresholds):
+    from .models import CanaryRollout
+    if isinstance(steps, str):
+        steps = [s for s in steps.split(',') if s.strip()]
+    steps = sorted({int(s) for s in (steps or DEFAULT_STEPS) if 0 < int(s) <= 100})
+    if not steps:
+        raise ValueError('steps must contain percentages between 1 and 100')
+
+    for active in CanaryRollout.objects.filter(status='ACTIVE'):
+        _transition(active, 'ABORTED', {'reason': f'Superseded by {candidate_model}'}, status='ABORTED', percentage=0)
+
+    rollout = CanaryRollout(
+        candidate_model=candidate_model,
+        baseline_model=baseline_model,
+        steps=steps,
+        created_by=created_by,
+        **thresholds
+    )
+    return _transition(rollout, 'STARTED', {'steps': steps}, percentage=steps[0])
+
+
+def advance_rollout(rollout):
+    """Move to the next configured step (the guard must not be failing on this one)."""
+    verdict = evaluate_rollout(rollout)
+    if verdict['verdict'] == 'rolled_back':
+        return rollout, verdict
+    next_steps = [s for s in rollout.steps if s > rollout.percentage]
+    if not next_steps:
+        return rollout, {**verdict, 'verdict': 'at_final_step'}
+    return _transition(rollout, 'ADVANCED', {'metrics': verdict['metrics']}, percentage=next_steps[0]), verdict
+
+
+def rollback(rollout, reason='Manual rollback', metrics=None):
+    return _transition(rollout, 'ROLLED_BACK', {'reason': reason, 'metrics': metrics or {}},
+                       status='ROLLED_BACK', percentage=0)
+
+
+def promote(rollout):
+    """Make the candidate the global default (same mechanism as ModelModeratorView.post)."""
+    from .cnn_inference import checkpoint_path, set_global_model
+    set_global_model(checkpoint_path(rollout.candidate_model))
+    return _transition(rollout, 'PROMOTED', {'metrics': arm_metrics(rollout)}, status='PROMOTED', percentage=100)
+
+
+def rollout_status(rollout) -> Dict:
+    return {
+        'id': rollout.id,
+        'candidate_model': rollout.candidate_model,
+        'baseline_model': rollout.baseline_model,
+        'status': rollout.status,
+        'percentage': rollout.percentage,
+        'steps': rollout.steps,
+        'latency_margin': rollout.latency_margin,
+        'error_margin': rollout.error_margin,
+        'min_samples': rollout.min_samples,
+        'created_at': rollout.created_at,
+        'metrics': arm_metrics(rollout, since=_step_started_at(rollout)),
+        'history': [{
+            'action': e.action,
+            'percentage': e.percentage,
+            'detail': e.detail,
+            'created_at': e.created_at,
+        } for e in rollout.events.order_by('-created_at')[:50]],
+    }
@@ -6,6 +6,8 @@ import logging
 import time
 
 import io
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Union
 
@@ -16,6 +18,7 @@ import timm
 from torchvision import transforms
 from PIL import Image
 from django.conf import settings
+from django.core.cache import cache
 
 from .exceptions import ModelUnavailableError
 
@@ -26,6 +29,15 @@ INCONCLUSIVE_THRESHOLD: float = 60.0
 MODERATE_CONFIDENCE_THRESHOLD: float = 60.0
 HIGH_CONFIDENCE_THRESHOLD: float = 80.0
 
+# Non-default checkpoints kept in memory at once (assigned models, canary)
+MAX_ALTERNATE_MODELS: int = 2
+
+# Global default checkpoint: AppSetting written by the admin and canary promotion,
+# mirrored in the shared cache so every worker checks it cheaply per request
+GLOBAL_MODEL_KEY = 'GLOBAL_MODEL_PATH'
+GLOBAL_MODEL_CACHE_KEY = 'cnn:global_model_path'
+FAILED_RELOAD_RETRY_SECONDS = 60.0
+
 @dataclass
 class PredictionOutput:
     disease_name: str
@@ -34,6 +46,20 @@ class PredictionOutput:
     recommendation: str
     processing_time: float
     is_inconclusive: bool
+    model_name: str = ''
+
+
+def checkpoint_path(model_name: str) -> str:
+    """
+    Absolute path of a checkpoint by filename: CANDIDATE_MODEL_DIR (where candidate
+    checkpoints are mounted from the artifact store) first, then ml_models/.
+    """
+    if os.path.isabs(model_name):
+        return model_name
+    candidate = os.path.join(settings.CANDIDATE_MODEL_DIR, model_name)
+    if os.path.exists(candidate):
+        return candidate
+    return os.path.join(settings.BASE_DIR, 'ml_models', model_name)
 
 # --- Model Architecture from Notebook ---
 
@@ -89,12 +115,22 @@ class ImageClassifier(nn.Module):
 
 # ----------------------------------------
 
+def build_transform():
+    """Preprocessing pipeline shared by live inference and offline loaders."""
+    # Notebook uses 256x256
+    return transforms.Compose([
+        transforms.Resize((256, 256)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+
 class CNNPredictor:
     """
     CNN model wrapper using ConvNeXt Small.
     """
     
-    def __init__(self):
+    def __init__(self, model_path=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
         self.model_load_error = None
@@ -103,14 +139,13 @@ class CNNPredictor:
         self.disease_classes = settings.DISEASE_CLASSES
         self.model_version = "2.0.0" # ConvNeXt
         
-        # Notebook uses 256x256
-        self.transform = transforms.Compose([
-            transforms.Resize((256, 256)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-        ])
+        self.transform = build_transform()
         
-        self._load_model()
+        # Other checkpoints kept warm for per-user/canary routing (LRU)
+        self._alternate_predictors: "OrderedDict[str, CNNPredictor]" = OrderedDict()
+        self._alternate_lock = threading.Lock()
+        
+        self._load_model(model_path)
 
     def _load_model(self, model_path=None):
         import traceback as tb
@@ -232,19 +267,47 @@ class CNNPredictor:
             print(tb.format_exc())
             self.model_load_error = str(e)
 
-    def predict(self, image_input: Union[bytes, Image.Image], user_model_path: Optional[str] = None) -> PredictionOutput:
+    def _predictor_for(self, user_model_path: str, fallback: bool = True) -> "CNNPredictor":
+        """
+        Return the predictor that owns `user_model_path`, loading it once if needed.
+        A missing or unloadable checkpoint falls back to this (default) predictor,
+        or raises ModelUnavailableError when `fallback` is False (canary traffic).
+        """
+        full_path = checkpoint_path(user_model_path)
+        if full_path == getattr(self, 'active_model_path', ''):
+            return self
+
+        with self._alternate_lock:
+            predictor = self._alternate_predictors.get(full_path)
+            if predictor is None:
+                if not os.path.exists(full_path):
+                    if not fallback:
+                        raise ModelUnavailableError(message=f"Model {user_model_path} not found")
+                    logger.warning(f"User specific model {user_model_path} not found. Using current.")
+                    return self
+                predictor = CNNPredictor(model_path=full_path)
+                if not predictor.model:
+                    if not fallback:
+                        raise ModelUnavailableError(
+                            message=f"Model {user_model_path} failed to load: {predictor.model_load_error}"
+                        )
+                    logger.warning(f"User specific model {user_model_path} failed to load. Using current.")
+                    return self
+                self._alternate_predictors[full_path] = predictor
+                while len(self._alternate_predictors) > MAX_ALTERNATE_MODELS:
+                    self._alternate_predictors.popitem(last=False)
+            self._alternate_predictors.move_to_end(full_path)
+            return predictor
+
+    def predict(self, image_input: Union[bytes, Image.Image], user_model_path: Optional[str] = None,
+                fallback: bool = True) -> PredictionOutput:
         start_time = time.time()
         
-        # Switch model if user has a specific one assigned and it's not the current one
-        if user_model_path and user_model_path != getattr(self, 'active_model_path', ''):
-             full_path = os.path.join(settings.BASE_DIR, 'ml_models', user_model_path)
-             if os.path.exists(full_path):
-                 self._load_model(full_path)
-             else:
-                 logger.warning(f"User specific model {user_model_path} not found. Using current.")
-                 # Fallback to default if everything else fails
-                 if not self.model:
-                     self._load_model()
+        # Serve from the user's assigned (or canary) checkpoint without replacing the default model
+        if user_model_path:
+            delegate = self._predictor_for(user_model_path, fallback)
+            if delegate is not self:
+                return delegate.predict(image_input)
 
         if not self.model:
             raise ModelUnavailableError(
@@ -280,15 +343,51 @@ class CNNPredictor:
                 all_probabilities=all_probs,
                 recommendation=self._get_recommendation(predicted_class, confidence_score),
                 processing_time=time.time() - start_time,
-                is_inconclusive=is_inconclusive
+                is_inconclusive=is_inconclusive,
+                model_name=os.path.basename(getattr(self, 'active_model_path', ''))
             )
 
         except Exception as e:
             logger.error(f"Prediction Error: {e}")
             raise ModelUnavailableError(message=f"Prediction failed: {str(e)}")
 
-    def predict_multi(self, images: List[any]) -> PredictionOutput:
-        return self.predict(images[0])
+    def predict_multi(self, images: List[any], user_model_path: Optional[str] = None,
+                      fallback: bool = True) -> PredictionOutput:
+        return self.predict(images[0], user_model_path=user_model_path, fallback=fallback)
+
+    def predict_batch(self, batch: torch.Tensor) -> List[PredictionOutput]:
+        """
+        Run a single forward pass over an already-transformed batch (N, 3, H, W).
+        Used by offline jobs; the live path keeps calling predict().
+        """
+        if not self.model:
+            raise ModelUnavailableError(
+                message=f"CNN model is not loaded: {self.model_load_error or 'Unknown error'}"
+            )
+
+        start_time = time.time()
+        with torch.no_grad():
+            probabilities = F.softmax(self.model(batch.to(self.device)), dim=1).cpu()
+        per_image_time = (time.time() - start_time) / max(len(batch), 1)
+
+        outputs = []
+        for row in probabilities:
+            idx = int(torch.argmax(row).item())
+            confidence_score = float(row[idx].item()) * 100
+            predicted_class = self.disease_classes[idx]
+            outputs.append(PredictionOutput(
+                disease_name=predicted_class,
+                confidence=round(confidence_score, 2),
+                all_probabilities={
+                    self.disease_classes[i]: float(row[i].item()) * 100
+                    for i in range(len(self.disease_classes))
+                },
+                recommendation=self._get_recommendation(predicted_class, confidence_score),
+                processing_time=per_image_time,
+                is_inconclusive=confidence_score < INCONCLUSIVE_THRESHOLD,
+                model_name=os.path.basename(getattr(self, 'active_model_path', ''))
+            ))
+        return outputs
 
     def _prepare_image(self, image_input):
         if isinstance(image_input, bytes):
@@ -305,11 +404,64 @@ class CNNPredictor:
 
 
 
-# Singleton
+# ============================================
+# GLOBAL DEFAULT MODEL
+# ============================================
+def global_model_path() -> str:
+    """The configured default checkpoint: shared cache, then the AppSetting, then settings.MODEL_PATH."""
+    path = cache.get(GLOBAL_MODEL_CACHE_KEY)
+    if path is None:
+        from admin_module.models import AppSetting
+        path = AppSetting.objects.filter(key=GLOBAL_MODEL_KEY).values_list('value', flat=True).first()
+        path = str(path or settings.MODEL_PATH)
+        cache.set(GLOBAL_MODEL_CACHE_KEY, path, None)
+    return path
+
+
+def set_global_model(model_path: str):
+    """Make `model_path` the default checkpoint; every worker swaps to it on its next request."""
+    from admin_module.models import AppSetting
+    AppSetting.objects.update_or_create(key=GLOBAL_MODEL_KEY, defaults={'value': str(model_path)})
+    cache.set(GLOBAL_MODEL_CACHE_KEY, str(model_path), None)
+
+
+# Singleton, replaced when the global default changes
 _predictor: Optional[CNNPredictor] = None
+_predictor_lock = threading.Lock()
+_failed_reload = (None, 0.0)  # (path, monotonic time) of the last checkpoint that failed to load
 
 def get_predictor() -> CNNPredictor:
-    global _predictor
-    if _predictor is None:
-        _predictor = CNNPredictor()
-    return _predictor
+    global _predictor, _failed_reload
+    try:
+        wanted = global_model_path()
+    except Exception as e:
+        logger.warning(f"[MODEL LOAD] Could not read the global model setting: {e}")
+        wanted = None
+
+    current = _predictor
+    if current is None:
+        with _predictor_lock:
+            if _predictor is None:
+                _predictor = CNNPredictor(model_path=wanted)
+            return _predictor
+    if wanted is None or wanted == getattr(current, 'active_model_path', None):
+        return current
+    failed_path, failed_at = _failed_reload
+    if wanted == failed_path and time.monotonic() - failed_at < FAILED_RELOAD_RETRY_SECONDS:
+        return current
+
+    # One thread loads the new checkpoint; the others keep serving the current one meanwhile
+    if not _predictor_lock.acquire(blocking=False):
+        return current
+    try:
+        if _predictor is current:
+            replacement = CNNPredictor(model_path=wanted)
+            if replacement.model:
+                _predictor = replacement
+                logger.info(f"[MODEL LOAD] Global model switched to {os.path.basename(wanted)}")
+            else:
+                _failed_reload = (wanted, time.monotonic())
+                logger.error(f"[MODEL LOAD] Keeping the current model, {wanted} failed to load")
+        return _predictor
+    finally:
+        _predictor_lock.release()
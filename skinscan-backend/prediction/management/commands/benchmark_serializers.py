@@ -0,0 +1,118 @@
+"""
+Micro-benchmark of the read-path serializers (skinscan/fast_serializers.py)
+against the DRF serializers they replace, per row, without the database.
+
+For each endpoint it times serialization and JSON rendering of the same rows
+through both paths, checks that the JSON is identical, and reports µs per row:
+
+    DRF path   model instances / dicts -> Serializer(many=True).data -> JSONRenderer
+    fast path  values() rows -> Projection.dump -> FastJSONRenderer (orjson if installed)
+
+Usage:
+    python manage.py benchmark_serializers --rows 1000 --repeat 20
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from authentication.models import Notification, User, UserProfile
+from authentication.notification_serializers import NOTIFICATION_ROWS, NotificationSerializer
+from authentication.serializers import USER_PROFILE_ROW, UserSerializer
+from prediction.serializers import SCAN_HISTORY_ROWS, ScanHistorySerializer
+from skinscan.renderers import ORJSON_AVAILABLE, FastJSONRenderer
+from skinscan.utils import percentile
+
+
+def _scan_rows(count):
+    now = timezone.now()
+    drf, fast = [], []
+    for i in range(count):
+        created = now - datetime.timedelta(minutes=i)
+        drf.append({
+            'id': i, 'title': f'Scan {i}', 'body_location': 'left_arm', 'disease_name': 'Eczema',
+            'confidence': 87.5, 'image_url': f'https://storage/scans/{i}.jpg', 'date': created,
+            'severity': 'Mild', 'notes': 'Itchy after swimming', 'is_bookmarked': i % 3 == 0,
+        })
+        fast.append({
+            'id': i, 'title': f'Scan {i}', 'body_location': 'left_arm', 'result__disease_name': 'Eczema',
+            'result__confidence_score': 87.5, 'image__image_url': f'https://storage/scans/{i}.jpg',
+            'created_at': created, 'severity_tag': 'Mild', 'notes': 'Itchy after swimming', 'is_bookmarked': i % 3 == 0,
+        })
+    return (lambda: ScanHistorySerializer(drf, many=True).data), (lambda: SCAN_HISTORY_ROWS.dump(fast))
+
+
+def _notification_rows(count):
+    now = timezone.now()
+    fields = [
+        {'id': i, 'title': 'Skin Analysis Complete', 'message': f'Analysis finished for scan {i}',
+         'type': 'SCAN_COMPLETED', 'is_read': False, 'created_at': now - datetime.timedelta(minutes=i)}
+        for i in range(count)
+    ]
+    instances = [Notification(user_id=1, **row) for row in fields]
+    return (lambda: NotificationSerializer(instances, many=True).data), (lambda: NOTIFICATION_ROWS.dump(fields))
+
+
+def _profile_rows(count):
+    now = timezone.now()
+    users, rows = [], []
+    for i in range(count):
+        user = User(id=i, email=f'user{i}@example.com', account_status='ACTIVE', last_login=now, created_at=now)
+        profile = UserProfile(first_name='Ana', last_name=f'Lee {i}', phone='555-0100', date_of_birth=datetime.date(1990, 5, 17),
+                              gender='F', country='PT', avatar=f'avatars/{i}.png', skin_type='Dry', skin_tone='III')
+        user.profile = profile
+        users.append(user)
+        rows.append({
+            'id': i, 'email': user.email, 'date_of_birth': None, 'is_admin': False, 'is_doctor': False,
+            'specialty': '', 'assigned_model': None, 'account_status': 'ACTIVE', 'last_login': now, 'created_at': now,
+            **{f'profile__{name}': getattr(profile, name) for name in (
+                'first_name', 'last_name', 'phone', 'date_of_birth', 'gender', 'country', 'address', 'skin_type', 'skin_tone')},
+            'profile__avatar': profile.avatar.name,
+        })
+    return (lambda: [UserSerializer(user).data for user in users]), (lambda: USER_PROFILE_ROW.dump(rows))
+
+
+CASES = [
+    ('scan-history', _scan_rows),
+    ('notifications', _notification_rows),
+    ('profile', _profile_rows),
+]
+
+
+class Command(BaseCommand):
+    help = 'Per-row cost of the values()-based read serializers vs DRF serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        renderers = {'drf': JSONRenderer(), 'fast': FastJSONRenderer()}
+        self.stdout.write(f"{rows} rows x {repeat} runs, orjson {'installed' if ORJSON_AVAILABLE else 'NOT installed'}")
+        self.stdout.write(f"{'endpoint':14} {'path':5} {'serialize':>10} {'render':>8} {'total':>8}  µs/row (p50)")
+
+        for name, build in CASES:
+            serializers = dict(zip(('drf', 'fast'), build(rows)))
+            outputs = {}
+            for path in ('drf', 'fast'):
+                serialize, renderer = serializers[path], renderers[path]
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    data = serialize()
+                    serialized = time.perf_counter()
+                    outputs[path] = renderer.render({'status': 'success', 'data': data})
+                    timings.append((serialized - started, time.perf_counter() - serialized))
+                per_row = lambda values: percentile([v * 1e6 / rows for v in values], 50)
+                serialize_us = per_row([t[0] for t in timings])
+                render_us = per_row([t[1] for t in timings])
+                total_us = per_row([t[0] + t[1] for t in timings])
+                self.stdout.write(f'{name:14} {path:5} {serialize_us:10.2f} {render_us:8.2f} {total_us:8.2f}')
+
+            if outputs['drf'] == outputs['fast']:
+                self.stdout.write(self.style.SUCCESS(f'{name:14} identical JSON'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{name:14} JSON differs'))
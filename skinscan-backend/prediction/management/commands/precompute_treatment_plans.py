@@ -0,0 +1,41 @@
+"""
+Fill the treatment-plan cache for every disease class.
+
+Generates a plan for each DISEASE_CLASSES entry, confidence bucket and model
+that is missing or expired under the current PROMPT_VERSION. Safe to run from
+cron; a second run only regenerates what has expired.
+
+Usage:
+    python manage.py precompute_treatment_plans
+    python manage.py precompute_treatment_plans --model gemini --force
+    python manage.py precompute_treatment_plans --invalidate
+"""
+from django.core.management.base import BaseCommand
+
+from prediction import treatment_cache
+
+
+class Command(BaseCommand):
+    help = 'Precompute cached treatment plans for all disease classes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=treatment_cache.MODELS, action='append',
+                            help='Only this provider (repeatable; default: all)')
+        parser.add_argument('--force', action='store_true', help='Regenerate plans that are still fresh')
+        parser.add_argument('--invalidate', action='store_true', help='Delete cached plans before precomputing')
+
+    def handle(self, *args, **options):
+        models = options['model'] or treatment_cache.MODELS
+        if options['invalidate']:
+            deleted = sum(treatment_cache.invalidate(model=model) for model in models)
+            self.stdout.write(f'Deleted {deleted} cached plans')
+
+        result = treatment_cache.precompute_plans(models=models, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {result['stored']}/{result['total']} plans ({result['failed']} fell back and were not cached)"
+        ))
+        summary = treatment_cache.cache_summary()
+        self.stdout.write(
+            f"Cache now holds {summary['entries']}/{summary['expected_entries']} plans "
+            f"for prompt {summary['prompt_version']}"
+        )
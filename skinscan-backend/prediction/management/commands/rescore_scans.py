@@ -0,0 +1,224 @@
+"""
+Re-score stored scans with another checkpoint.
+
+Streams PredictionResult rows (with their SkinImage) in id order, decodes the
+images in a process pool, runs batched inference with the chosen .pth and writes
+one RescoreResult row per scan. Re-running the command resumes after the last
+scored prediction for that checkpoint.
+
+Usage:
+    python manage.py rescore_scans skinscan2.pth --batch-size 32 --workers 4
+    python manage.py rescore_scans skinscan2.pth --report-only
+"""
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+from PIL import Image
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Max
+
+from prediction.cnn_inference import CNNPredictor, build_transform, checkpoint_path as resolve_checkpoint
+from prediction.models import PredictionResult, RescoreResult
+
+_worker_transform = None
+
+
+def _decode_image(item):
+    """Process-pool worker: load one stored image and return its input tensor."""
+    global _worker_transform
+    prediction_id, file_path = item
+    if not file_path:
+        return prediction_id, None, 'Image is not stored locally'
+    try:
+        if _worker_transform is None:
+            _worker_transform = build_transform()
+        with Image.open(file_path) as img:
+            return prediction_id, _worker_transform(img.convert('RGB')).numpy(), ''
+    except Exception as e:
+        return prediction_id, None, str(e)
+
+
+def _local_path(image_url):
+    """Map a SkinImage.image_url to a filesystem path, or None if it isn't on local storage."""
+    if not image_url or '://' in image_url or image_url == 'placeholder.jpg':
+        return None
+    try:
+        path = default_storage.path(image_url)
+    except NotImplementedError:
+        return None
+    return path if os.path.exists(path) else None
+
+
+class Command(BaseCommand):
+    help = 'Re-classify stored scans with a candidate checkpoint and report agreement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('checkpoint', help='Checkpoint filename in CANDIDATE_MODEL_DIR or ml_models/ (or an absolute path)')
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 2) - 1, 1),
+                            help='Decoder processes (0 = decode in the main process)')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many scans')
+        parser.add_argument('--restart', action='store_true', help='Discard earlier results for this checkpoint')
+        parser.add_argument('--report-only', action='store_true', help='Only print the agreement matrix')
+
+    def handle(self, *args, **options):
+        checkpoint_path = resolve_checkpoint(options['checkpoint'])
+        checkpoint = os.path.basename(checkpoint_path)
+
+        if not options['report_only']:
+            if not os.path.exists(checkpoint_path):
+                raise CommandError(f'Checkpoint not found: {checkpoint_path}')
+            if options['restart']:
+                deleted, _ = RescoreResult.objects.filter(checkpoint=checkpoint).delete()
+                self.stdout.write(f'Discarded {deleted} earlier results for {checkpoint}')
+            self._rescore(checkpoint, checkpoint_path, options)
+
+        self._print_agreement(checkpoint)
+
+    def _rescore(self, checkpoint, checkpoint_path, options):
+        predictor = CNNPredictor(model_path=checkpoint_path)
+        if not predictor.model:
+            raise CommandError(f'Failed to load {checkpoint}: {predictor.model_load_error}')
+
+        # Resume after the last prediction scored with this checkpoint
+        last_id = RescoreResult.objects.filter(checkpoint=checkpoint).aggregate(m=Max('prediction_id'))['m'] or 0
+        rows = PredictionResult.objects.filter(id__gt=last_id).order_by('id')
+        total = rows.count()
+        if options['limit']:
+            total = min(total, options['limit'])
+        if not total:
+            self.stdout.write(f'Nothing to score for {checkpoint} (resumed after prediction {last_id})')
+            return
+        self.stdout.write(f'Scoring {total} scans with {checkpoint} (resuming after prediction {last_id})')
+
+        stream = rows.values_list(
+            'id', 'disease_name', 'confidence_score', 'image__image_url'
+        ).iterator(chunk_size=options['batch_size'] * 4)
+
+        workers = options['workers']
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        processed = 0
+        started = time.time()
+        try:
+            pending = self._submit(pool, self._next_batch(stream, options['batch_size'], total))
+            while pending:
+                batch_rows, decoded = pending
+                # Decode the next batch while this one runs through the model
+                remaining = total - processed - len(batch_rows)
+                next_rows = self._next_batch(stream, options['batch_size'], remaining) if remaining > 0 else []
+                pending = self._submit(pool, next_rows) if next_rows else None
+
+                self._score_batch(predictor, checkpoint, batch_rows, list(decoded))
+                processed += len(batch_rows)
+
+                elapsed = time.time() - started
+                rate = processed / elapsed if elapsed else 0
+                eta = (total - processed) / rate if rate else 0
+                self.stdout.write(
+                    f'  {processed}/{total} ({processed * 100 // total}%)  '
+                    f'{rate:.1f} img/s  ETA {eta:.0f}s'
+                )
+        finally:
+            if pool:
+                pool.shutdown()
+
+        elapsed = time.time() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {processed} scans in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} img/s)'
+        ))
+
+    @staticmethod
+    def _next_batch(stream, batch_size, remaining):
+        batch = []
+        for row in stream:
+            batch.append(row)
+            if len(batch) >= min(batch_size, remaining):
+                break
+        return batch
+
+    @staticmethod
+    def _submit(pool, batch_rows):
+        if not batch_rows:
+            return None
+        items = [(row[0], _local_path(row[3])) for row in batch_rows]
+        if pool:
+            return batch_rows, pool.map(_decode_image, items)
+        return batch_rows, map(_decode_image, items)
+
+    @staticmethod
+    def _score_batch(predictor, checkpoint, batch_rows, decoded):
+        stored = {row[0]: row for row in batch_rows}
+        results = []
+        tensors, tensor_ids = [], []
+        for prediction_id, array, error in decoded:
+            if array is None:
+                _, disease, confidence, _ = stored[prediction_id]
+                results.append(RescoreResult(
+                    prediction_id=prediction_id,
+                    checkpoint=checkpoint,
+                    stored_disease=disease,
+                    stored_confidence=confidence or 0,
+                    error=error[:500]
+                ))
+            else:
+                tensors.append(torch.from_numpy(array))
+                tensor_ids.append(prediction_id)
+
+        if tensors:
+            outputs = predictor.predict_batch(torch.stack(tensors))
+            for prediction_id, output in zip(tensor_ids, outputs):
+                _, disease, confidence, _ = stored[prediction_id]
+                results.append(RescoreResult(
+                    prediction_id=prediction_id,
+                    checkpoint=checkpoint,
+                    stored_disease=disease,
+                    stored_confidence=confidence or 0,
+                    new_disease=output.disease_name,
+                    new_confidence=output.confidence,
+                    agrees=output.disease_name == disease
+                ))
+
+        RescoreResult.objects.bulk_create(results, ignore_conflicts=True)
+
+    def _print_agreement(self, checkpoint):
+        scored = RescoreResult.objects.filter(checkpoint=checkpoint)
+        failed = scored.exclude(error='').count()
+        cells = scored.filter(error='').values('stored_disease', 'new_disease').annotate(n=Count('id'))
+
+        matrix = defaultdict(dict)
+        for cell in cells:
+            matrix[cell['stored_disease'] or 'Unknown'][cell['new_disease']] = cell['n']
+        if not matrix:
+            self.stdout.write(f'No results recorded for {checkpoint}')
+            return
+
+        classes = list(settings.DISEASE_CLASSES)
+        for label in sorted(set(matrix) | {d for row in matrix.values() for d in row}):
+            if label not in classes:
+                classes.append(label)
+
+        self.stdout.write(f'\nAgreement matrix for {checkpoint} (rows = stored, columns = re-scored)')
+        for i, name in enumerate(classes):
+            self.stdout.write(f'  [{i}] {name}')
+        self.stdout.write('      ' + ''.join(f'{i:>6}' for i in range(len(classes))) + '   agree')
+
+        total = agreed = 0
+        for i, stored_name in enumerate(classes):
+            row = matrix.get(stored_name, {})
+            row_total = sum(row.values())
+            if not row_total:
+                continue
+            row_agree = row.get(stored_name, 0)
+            total += row_total
+            agreed += row_agree
+            counts = ''.join(f'{row.get(name, 0):>6}' for name in classes)
+            self.stdout.write(f'  [{i:>2}]{counts}  {row_agree * 100 / row_total:5.1f}%')
+
+        self.stdout.write(f'\nOverall agreement: {agreed}/{total} ({agreed * 100 / total:.1f}%)')
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} scans could not be decoded'))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0008_appointment_sharedreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RescoreResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checkpoint', models.CharField(max_length=255)),
+                ('stored_disease', models.CharField(blank=True, max_length=100, null=True)),
+                ('stored_confidence', models.FloatField(default=0)),
+                ('new_disease', models.CharField(blank=True, max_length=100)),
+                ('new_confidence', models.FloatField(default=0)),
+                ('agrees', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('prediction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rescores', to='prediction.predictionresult')),
+            ],
+            options={
+                'db_table': 'rescore_results',
+                'ordering': ['prediction_id'],
+                'unique_together': {('checkpoint', 'prediction')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_doctorprofile_bio'),
+        ('prediction', '0009_rescoreresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShadowPrediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candidate_model', models.CharField(max_length=255)),
+                ('production_model', models.CharField(blank=True, max_length=255)),
+                ('production_disease', models.CharField(max_length=100)),
+                ('production_confidence', models.FloatField()),
+                ('production_latency_ms', models.FloatField()),
+                ('shadow_disease', models.CharField(blank=True, max_length=100)),
+                ('shadow_confidence', models.FloatField(default=0)),
+                ('shadow_latency_ms', models.FloatField(default=0)),
+                ('agrees', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shadow_predictions', to='authentication.user')),
+            ],
+            options={
+                'db_table': 'shadow_predictions',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['candidate_model', '-created_at'], name='idx_shadow_model_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_doctorprofile_bio'),
+        ('prediction', '0010_shadowprediction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanaryRollout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candidate_model', models.CharField(max_length=255)),
+                ('baseline_model', models.CharField(blank=True, max_length=255)),
+                ('percentage', models.PositiveSmallIntegerField(default=0)),
+                ('steps', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('PROMOTED', 'Promoted'), ('ROLLED_BACK', 'Rolled Back'), ('ABORTED', 'Aborted')], default='ACTIVE', max_length=20)),
+                ('latency_margin', models.FloatField(default=0.2)),
+                ('error_margin', models.FloatField(default=0.02)),
+                ('min_samples', models.PositiveIntegerField(default=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='canary_rollouts', to='authentication.user')),
+            ],
+            options={
+                'db_table': 'canary_rollouts',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CanaryEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=20)),
+                ('percentage', models.PositiveSmallIntegerField(default=0)),
+                ('detail', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('rollout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='prediction.canaryrollout')),
+            ],
+            options={
+                'db_table': 'canary_events',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CanarySample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arm', models.CharField(choices=[('baseline', 'Baseline'), ('canary', 'Canary')], max_length=10)),
+                ('latency_ms', models.FloatField(default=0)),
+                ('is_error', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('rollout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='samples', to='prediction.canaryrollout')),
+            ],
+            options={
+                'db_table': 'canary_samples',
+                'indexes': [models.Index(fields=['rollout', 'arm', '-created_at'], name='idx_canary_sample_arm')],
+            },
+        ),
+    ]
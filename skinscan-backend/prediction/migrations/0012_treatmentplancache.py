@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0011_canary_rollout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreatmentPlanCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('disease_name', models.CharField(max_length=100)),
+                ('confidence_bucket', models.CharField(max_length=10)),
+                ('model', models.CharField(max_length=20)),
+                ('prompt_version', models.CharField(max_length=20)),
+                ('plan', models.JSONField(default=dict)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'treatment_plan_cache',
+                'unique_together': {('disease_name', 'confidence_bucket', 'model', 'prompt_version')},
+            },
+        ),
+    ]
@@ -151,3 +151,172 @@ class SharedReport(models.Model):
         return f"Report {self.report.id} shared with {self.doctor.email}"
 
 
+
+
+class RescoreResult(models.Model):
+    """
+    Offline re-classification of a stored prediction with another checkpoint.
+    Filled by the `rescore_scans` management command.
+    """
+    prediction = models.ForeignKey(PredictionResult, on_delete=models.CASCADE, related_name='rescores')
+    checkpoint = models.CharField(max_length=255)  # .pth filename under ml_models/
+    stored_disease = models.CharField(max_length=100, blank=True, null=True)
+    stored_confidence = models.FloatField(default=0)
+    new_disease = models.CharField(max_length=100, blank=True)
+    new_confidence = models.FloatField(default=0)
+    agrees = models.BooleanField(default=False)
+    error = models.TextField(blank=True)  # Set when the stored image could not be decoded
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'rescore_results'
+        ordering = ['prediction_id']
+        unique_together = ('checkpoint', 'prediction')
+        
+    def __str__(self):
+        return f"{self.checkpoint}: {self.stored_disease} -> {self.new_disease}"
+
+
+class ShadowPrediction(models.Model):
+    """
+    Candidate-model result for a mirrored live upload, stored next to the
+    production answer. Written by prediction.shadow off the request path.
+    """
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='shadow_predictions')
+    candidate_model = models.CharField(max_length=255)
+    production_model = models.CharField(max_length=255, blank=True)
+    production_disease = models.CharField(max_length=100)
+    production_confidence = models.FloatField()
+    production_latency_ms = models.FloatField()
+    shadow_disease = models.CharField(max_length=100, blank=True)
+    shadow_confidence = models.FloatField(default=0)
+    shadow_latency_ms = models.FloatField(default=0)
+    agrees = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'shadow_predictions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['candidate_model', '-created_at'], name='idx_shadow_model_date'),
+        ]
+        
+    def __str__(self):
+        return f"{self.candidate_model}: {self.production_disease} vs {self.shadow_disease}"
+
+
+class CanaryRollout(models.Model):
+    """
+    Percentage-based rollout of a candidate checkpoint (see prediction/canary.py).
+    At most one rollout is ACTIVE at a time.
+    """
+    STATUS_CHOICES = [
+        ('ACTIVE', 'Active'),
+        ('PROMOTED', 'Promoted'),
+        ('ROLLED_BACK', 'Rolled Back'),
+        ('ABORTED', 'Aborted'),
+    ]
+
+    candidate_model = models.CharField(max_length=255)  # .pth filename under ml_models/
+    baseline_model = models.CharField(max_length=255, blank=True)
+    percentage = models.PositiveSmallIntegerField(default=0)  # Share of users routed to the candidate
+    steps = models.JSONField(default=list)  # e.g. [5, 25, 50, 100]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
+    
+    # Automatic rollback thresholds
+    latency_margin = models.FloatField(default=0.2)  # Canary p95 may exceed baseline p95 by 20%
+    error_margin = models.FloatField(default=0.02)  # Canary error rate may exceed baseline by 2 points
+    min_samples = models.PositiveIntegerField(default=50)  # Per arm, before the guard is evaluated
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='canary_rollouts')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'canary_rollouts'
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"Canary {self.candidate_model} @ {self.percentage}% ({self.status})"
+
+
+class CanaryEvent(models.Model):
+    """History of a rollout: start, each step, rollback/promotion with the metrics that caused it."""
+    rollout = models.ForeignKey(CanaryRollout, on_delete=models.CASCADE, related_name='events')
+    action = models.CharField(max_length=20)  # STARTED, ADVANCED, ROLLED_BACK, PROMOTED, ABORTED
+    percentage = models.PositiveSmallIntegerField(default=0)
+    detail = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'canary_events'
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"{self.action} -> {self.percentage}% ({self.rollout.candidate_model})"
+
+
+class CanarySample(models.Model):
+    """One routed inference: which arm served it, how long it took and whether it failed."""
+    rollout = models.ForeignKey(CanaryRollout, on_delete=models.CASCADE, related_name='samples')
+    arm = models.CharField(max_length=10, choices=[('baseline', 'Baseline'), ('canary', 'Canary')])
+    latency_ms = models.FloatField(default=0)
+    is_error = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'canary_samples'
+        indexes = [
+            models.Index(fields=['rollout', 'arm', '-created_at'], name='idx_canary_sample_arm'),
+        ]
+
+
+class TreatmentPlanCache(models.Model):
+    """
+    Generated treatment plans, shared by every scan with the same key.
+    The prompt only depends on disease and confidence bucket, so one plan per
+    (disease, bucket, requested model, prompt version) is enough.
+    """
+    disease_name = models.CharField(max_length=100)
+    confidence_bucket = models.CharField(max_length=10)  # low / moderate / high
+    model = models.CharField(max_length=20)  # Requested provider: gemini / llama
+    prompt_version = models.CharField(max_length=20)
+    plan = models.JSONField(default=dict)  # steps, severity, tip, model_used
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'treatment_plan_cache'
+        unique_together = ('disease_name', 'confidence_bucket', 'model', 'prompt_version')
+        
+    def __str__(self):
+        return f"{self.disease_name} [{self.confidence_bucket}] via {self.model} ({self.prompt_version})"
+
+
+class LLMRequestLock(models.Model):
+    """
+    Lease on an in-flight LLM call, shared by identical requests in every worker
+    process (see prediction/singleflight.py). The owner stores the outcome in
+    the row; waiters in other processes poll it.
+    """
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    key = models.CharField(max_length=64, unique=True)  # sha256 of model + normalized prompt
+    owner = models.CharField(max_length=100)  # host:pid:thread of the process-level leader
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='RUNNING')
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)  # Lease end while RUNNING, result expiry after
+    
+    class Meta:
+        db_table = 'llm_request_locks'
+        
+    def __str__(self):
+        return f"{self.key[:12]} {self.status} ({self.owner})"
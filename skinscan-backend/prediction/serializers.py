@@ -9,6 +9,8 @@ Phase 2 v2.0 Compliant:
 from rest_framework import serializers
 from typing import List
 
+from skinscan.fast_serializers import Projection, iso_datetime
+
 
 class ImageUploadSerializer(serializers.Serializer):
     """
@@ -142,4 +144,19 @@ class ScanHistorySerializer(serializers.Serializer):
     is_bookmarked = serializers.BooleanField()
 
 
+# Read path of ScanHistoryView: the JSON of ScanHistorySerializer, built from values() rows
+SCAN_HISTORY_ROWS = Projection(
+    id='id',
+    title='title',
+    body_location='body_location',
+    disease_name='result__disease_name',
+    confidence='result__confidence_score',
+    image_url='image__image_url',
+    date=('created_at', iso_datetime),
+    severity='severity_tag',
+    notes='notes',
+    is_bookmarked='is_bookmarked',
+)
+
+
 
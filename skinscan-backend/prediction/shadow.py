@@ -0,0 +1,343 @@
+"""
+Shadow-mode evaluation of a candidate checkpoint on mirrored live traffic.
+
+A configurable sample of uploads is copied onto a bounded in-memory queue after
+the production prediction has been made. A dispatcher thread batches the queue
+and sends each batch to a single low-priority worker process that runs the
+candidate model, then records the outcome as ShadowPrediction rows. The worker
+scores each image with the same single-image predict() as production, so the
+two latencies are measured the same way. If the worker dies (e.g. killed for
+memory) a new one is started for the next batch.
+
+The shadow path can never slow production inference:
+- the request thread only does a non-blocking queue put (full queue = sample dropped)
+- inference happens in a separate process pinned to SHADOW_CPU_THREADS threads
+  (and one core where the OS supports affinity) at lowered priority
+- the dispatcher sleeps between batches so the worker stays within SHADOW_CPU_BUDGET
+
+Configuration lives in AppSetting (SHADOW_MODEL_PATH, SHADOW_SAMPLE_RATE) so it is
+shared by every worker; it is re-read at most every CONFIG_TTL seconds.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from skinscan.utils import percentile
+
+logger = logging.getLogger(__name__)
+
+SHADOW_MODEL_KEY = 'SHADOW_MODEL_PATH'
+SHADOW_RATE_KEY = 'SHADOW_SAMPLE_RATE'
+CONFIG_TTL = 30.0
+
+_config = {'model': None, 'rate': 0.0, 'expires': 0.0}
+_config_lock = threading.Lock()
+_queue: Optional[queue.Queue] = None
+_dispatcher: Optional[threading.Thread] = None
+_dispatcher_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_stats = {'mirrored': 0, 'dropped': 0, 'failed_batches': 0, 'worker_restarts': 0}
+
+
+# ============================================
+# CONFIGURATION
+# ============================================
+def get_shadow_config(refresh: bool = False) -> Dict:
+    """Return {'model': <filename or None>, 'rate': <0..1>} with a short in-process cache."""
+    now = time.monotonic()
+    with _config_lock:
+        if not refresh and now < _config['expires']:
+            return {'model': _config['model'], 'rate': _config['rate']}
+
+    from admin_module.models import AppSetting
+    values = dict(
+        AppSetting.objects.filter(key__in=[SHADOW_MODEL_KEY, SHADOW_RATE_KEY]).values_list('key', 'value')
+    )
+    try:
+        rate = min(max(float(values.get(SHADOW_RATE_KEY) or 0), 0.0), 1.0)
+    except ValueError:
+        rate = 0.0
+
+    with _config_lock:
+        _config['model'] = values.get(SHADOW_MODEL_KEY) or None
+        _config['rate'] = rate
+        _config['expires'] = now + CONFIG_TTL
+        return {'model': _config['model'], 'rate': _config['rate']}
+
+
+def set_shadow_config(model_name: Optional[str], sample_rate: float = 0.0) -> Dict:
+    """Persist the shadow candidate (None disables shadowing)."""
+    from admin_module.models import AppSetting
+    if model_name:
+        AppSetting.objects.update_or_create(
+            key=SHADOW_MODEL_KEY,
+            defaults={'value': model_name, 'description': 'Candidate checkpoint evaluated in shadow mode'}
+        )
+        AppSetting.objects.update_or_create(
+            key=SHADOW_RATE_KEY,
+            defaults={'value': str(sample_rate), 'description': 'Fraction of uploads mirrored to the shadow model'}
+        )
+    else:
+        AppSetting.objects.filter(key__in=[SHADOW_MODEL_KEY, SHADOW_RATE_KEY]).delete()
+    return get_shadow_config(refresh=True)
+
+
+# ============================================
+# REQUEST PATH (must stay non-blocking)
+# ============================================
+def mirror_to_shadow(user, image_bytes: bytes, production_output, production_model: str = '') -> bool:
+    """
+    Offer one live upload to the shadow model. Returns True if it was queued.
+    Never raises and never waits: failures only cost a log line.
+    """
+    try:
+        config = get_shadow_config()
+        if not config['model'] or random.random() >= config['rate']:
+            return False
+
+        _ensure_dispatcher()
+        _queue.put_nowait({
+            'user_id': getattr(user, 'id', None),
+            'image': image_bytes,
+            'candidate_model': config['model'],
+            'production_model': os.path.basename(production_model or ''),
+            'production_disease': production_output.disease_name,
+            'production_confidence': production_output.confidence,
+            'production_latency_ms': production_output.processing_time * 1000,
+        })
+        _stats['mirrored'] += 1
+        return True
+    except queue.Full:
+        _stats['dropped'] += 1
+        return False
+    except Exception as e:
+        logger.error(f"[SHADOW] Failed to mirror upload: {e}")
+        return False
+
+
+def get_shadow_runtime_stats() -> Dict:
+    return {
+        **_stats,
+        'queued': _queue.qsize() if _queue else 0,
+        'cpu_budget': getattr(settings, 'SHADOW_CPU_BUDGET', 0.25),
+        'cpu_threads': getattr(settings, 'SHADOW_CPU_THREADS', 1),
+    }
+
+
+# ============================================
+# DISPATCHER (background thread in the web process)
+# ============================================
+def _ensure_dispatcher():
+    global _queue, _dispatcher
+    if _dispatcher and _dispatcher.is_alive():
+        return
+    with _dispatcher_lock:
+        if _dispatcher and _dispatcher.is_alive():
+            return
+        if _queue is None:
+            _queue = queue.Queue(maxsize=getattr(settings, 'SHADOW_QUEUE_SIZE', 64))
+        _dispatcher = threading.Thread(target=_dispatch_loop, name='shadow-dispatcher', daemon=True)
+        _dispatcher.start()
+
+
+def _collect_batch(batch_size: int, max_wait: float):
+    batch = [_queue.get()]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _get_pool(threads: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn (not fork) so the worker never inherits the web process' torch thread pools
+        _pool = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_shadow_worker,
+            initargs=(threads,)
+        )
+    return _pool
+
+
+def _score(model_name: str, items, threads: int) -> float:
+    """Score one model's items in the worker and record them. Returns the worker's busy seconds."""
+    global _pool
+    try:
+        outputs, busy = _get_pool(threads).submit(
+            _shadow_infer, model_name, [item['image'] for item in items]
+        ).result()
+        _record(items, outputs)
+        return busy
+    except BrokenProcessPool as e:
+        # The worker died; drop the pool so the next batch starts a new one
+        _pool.shutdown(wait=False)
+        _pool = None
+        _stats['failed_batches'] += 1
+        _stats['worker_restarts'] += 1
+        logger.error(f"[SHADOW] Worker died scoring {len(items)} images for {model_name}: {e}")
+        _record(items, [{'error': f'Shadow worker died: {e}'}] * len(items))
+    except Exception as e:
+        _stats['failed_batches'] += 1
+        logger.error(f"[SHADOW] Batch of {len(items)} failed for {model_name}: {e}")
+        _record(items, [{'error': str(e)}] * len(items))
+    return 0.0
+
+
+def _dispatch_loop():
+    batch_size = getattr(settings, 'SHADOW_BATCH_SIZE', 8)
+    max_wait = getattr(settings, 'SHADOW_BATCH_WAIT', 2.0)
+    budget = min(max(getattr(settings, 'SHADOW_CPU_BUDGET', 0.25), 0.01), 1.0)
+    threads = getattr(settings, 'SHADOW_CPU_THREADS', 1)
+
+    while True:
+        batch = _collect_batch(batch_size, max_wait)
+        by_model = {}
+        for item in batch:
+            by_model.setdefault(item['candidate_model'], []).append(item)
+
+        for model_name, items in by_model.items():
+            busy = _score(model_name, items, threads)
+            # Duty cycle: busy for `busy` seconds -> idle long enough to stay within budget
+            if busy:
+                time.sleep(busy * (1.0 / budget - 1.0))
+
+
+def _record(items, outputs):
+    from .models import ShadowPrediction
+    close_old_connections()
+    rows = []
+    for item, output in zip(items, outputs):
+        shadow_disease = output.get('disease_name', '')
+        rows.append(ShadowPrediction(
+            user_id=item['user_id'],
+            candidate_model=item['candidate_model'],
+            production_model=item['production_model'],
+            production_disease=item['production_disease'],
+            production_confidence=item['production_confidence'],
+            production_latency_ms=item['production_latency_ms'],
+            shadow_disease=shadow_disease,
+            shadow_confidence=output.get('confidence', 0),
+            shadow_latency_ms=output.get('latency_ms', 0),
+            agrees=bool(shadow_disease) and shadow_disease == item['production_disease'],
+            error=output.get('error', '')[:500],
+        ))
+    try:
+        ShadowPrediction.objects.bulk_create(rows)
+    except Exception as e:
+        logger.error(f"[SHADOW] Failed to store {len(rows)} shadow results: {e}")
+    finally:
+        close_old_connections()
+
+
+# ============================================
+# WORKER PROCESS
+# ============================================
+_worker_predictor = None
+
+
+def _init_shadow_worker(threads: int):
+    """Lower priority and cap CPU use before any model is loaded."""
+    import django
+    import torch
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skinscan.settings')
+    django.setup()
+
+    torch.set_num_threads(max(int(threads), 1))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    if hasattr(os, 'nice'):
+        os.nice(10)
+    if hasattr(os, 'sched_setaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, set(cpus[-max(int(threads), 1):]))
+
+
+def _shadow_infer(model_name: str, images):
+    """Run the candidate over one batch. Returns (per-image results, busy seconds)."""
+    global _worker_predictor
+    from .cnn_inference import CNNPredictor, checkpoint_path
+
+    started = time.process_time()
+    model_path = checkpoint_path(model_name)
+    if _worker_predictor is None or getattr(_worker_predictor, 'active_model_path', None) != model_path:
+        _worker_predictor = CNNPredictor(model_path=model_path)
+
+    results = []
+    for image_bytes in images:
+        # One image per forward pass, like production, so processing_time is comparable
+        try:
+            output = _worker_predictor.predict(image_bytes)
+        except Exception as e:
+            results.append({'error': str(e)})
+            continue
+        results.append({
+            'disease_name': output.disease_name,
+            'confidence': output.confidence,
+            'latency_ms': output.processing_time * 1000,
+        })
+
+    return results, time.process_time() - started
+
+
+# ============================================
+# REPORTING
+# ============================================
+def shadow_report(candidate_model: str, limit: int = 5000) -> Dict:
+    """Agreement and latency-delta summary over the most recent shadow results."""
+    from .models import ShadowPrediction
+    rows = list(
+        ShadowPrediction.objects.filter(candidate_model=candidate_model, error='')
+        .order_by('-created_at')
+        .values('production_disease', 'shadow_disease', 'agrees',
+                'production_latency_ms', 'shadow_latency_ms')[:limit]
+    )
+    errors = ShadowPrediction.objects.filter(candidate_model=candidate_model).exclude(error='').count()
+    if not rows:
+        return {'candidate_model': candidate_model, 'samples': 0, 'errors': errors}
+
+    production_ms = [r['production_latency_ms'] for r in rows]
+    shadow_ms = [r['shadow_latency_ms'] for r in rows]
+    per_class = {}
+    for r in rows:
+        entry = per_class.setdefault(r['production_disease'], {'samples': 0, 'agreed': 0})
+        entry['samples'] += 1
+        entry['agreed'] += int(r['agrees'])
+    for entry in per_class.values():
+        entry['agreement'] = round(entry['agreed'] * 100 / entry['samples'], 1)
+
+    agreed = sum(1 for r in rows if r['agrees'])
+    return {
+        'candidate_model': candidate_model,
+        'samples': len(rows),
+        'errors': errors,
+        'agreement': round(agreed * 100 / len(rows), 1),
+        'latency_ms': {
+            'production_mean': round(sum(production_ms) / len(rows), 2),
+            'shadow_mean': round(sum(shadow_ms) / len(rows), 2),
+            'production_p95': percentile(production_ms, 95),
+            'shadow_p95': percentile(shadow_ms, 95),
+            'mean_delta': round((sum(shadow_ms) - sum(production_ms)) / len(rows), 2),
+        },
+        'per_class': per_class,
+    }
@@ -0,0 +1,223 @@
+"""
+Single-flight coalescing of identical LLM calls.
+
+do(key, fn, timeout) runs fn() once for all concurrent callers with the same key:
+
+- inside a process, followers wait on the leader's call and receive its return
+  value or re-raise its exception
+- across processes, each process-level leader tries to claim the key in
+  LLMRequestLock (unique row). The one that gets it calls the provider and
+  stores the JSON result (or the error) in the row; the others poll the row
+  and share that outcome.
+
+A RUNNING row is a lease of `timeout` seconds: if its owner died or hung, the
+next caller takes it over once it expires. Finished rows stay readable for
+RESULT_TTL seconds so late arrivals still share the result, then are purged.
+If the lock table is unreachable, calls are coalesced per process only.
+
+ado() is the asyncio equivalent for the ASGI views.
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+import weakref
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+RUNNING, DONE, FAILED = 'RUNNING', 'DONE', 'FAILED'
+POLL_INTERVAL = 0.2  # Seconds between lock-row reads while another process owns the call
+RESULT_TTL = 5  # Seconds a finished outcome is shared with late arrivals
+
+
+class SingleFlightError(Exception):
+    """The shared call failed in another process (message carries its error)."""
+
+
+class SingleFlightTimeout(SingleFlightError):
+    """The shared call did not finish within the caller's timeout."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}  # key -> _Call led by a thread of this process
+_calls_lock = threading.Lock()
+_async_calls = weakref.WeakKeyDictionary()  # event loop -> {key: Task}
+
+
+def _new_owner():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'[-100:]
+
+
+# ============================================
+# LOCK TABLE (cross-process)
+# ============================================
+def _claim(key, owner, lease):
+    """None if `owner` now owns `key`, else the current row {'status', 'result', 'error'}."""
+    from .models import LLMRequestLock
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            LLMRequestLock.objects.create(
+                key=key, owner=owner, created_at=now, expires_at=now + timedelta(seconds=lease)
+            )
+        return None
+    except IntegrityError:
+        pass
+
+    # Lease of a dead/stuck owner, or a finished outcome that is too old to share
+    taken = LLMRequestLock.objects.filter(key=key, expires_at__lte=now).update(
+        owner=owner, status=RUNNING, result=None, error='',
+        created_at=now, expires_at=now + timedelta(seconds=lease)
+    )
+    if taken:
+        return None
+    # Deleted in between: report it as running so the caller polls and claims again
+    return LLMRequestLock.objects.filter(key=key).values('status', 'result', 'error').first() or {'status': RUNNING}
+
+
+def _finish(key, owner, status, result=None, error=''):
+    from .models import LLMRequestLock
+    now = timezone.now()
+    # Only if nobody took the lease over in the meantime
+    LLMRequestLock.objects.filter(key=key, owner=owner).update(
+        status=status, result=result, error=error, expires_at=now + timedelta(seconds=RESULT_TTL)
+    )
+    LLMRequestLock.objects.filter(expires_at__lt=now - timedelta(minutes=5)).delete()
+
+
+def _outcome(row):
+    if row['status'] == DONE:
+        return row['result']
+    raise SingleFlightError(row['error'] or 'Shared LLM call failed')
+
+
+# ============================================
+# THREADS (WSGI)
+# ============================================
+def do(key, fn, timeout):
+    """fn() shared with every concurrent caller of `key`; waits at most `timeout` seconds."""
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        if not call.done.wait(timeout):
+            raise SingleFlightTimeout(f'Shared call {key[:12]} still running after {timeout}s')
+        if call.error:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _run_shared(key, fn, timeout)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.done.set()
+
+
+def _run_shared(key, fn, timeout):
+    deadline = time.monotonic() + timeout
+    owner = _new_owner()
+    try:
+        while True:
+            row = _claim(key, owner, timeout)
+            if row is None:
+                break
+            if row['status'] != RUNNING:
+                return _outcome(row)
+            if time.monotonic() >= deadline:
+                raise SingleFlightTimeout(f'Shared call {key[:12]} still running after {timeout}s')
+            time.sleep(POLL_INTERVAL)
+    except DatabaseError as e:
+        logger.warning(f"[SINGLEFLIGHT] Lock table unavailable, calling without it: {e}")
+        return fn()
+
+    try:
+        result = fn()
+    except Exception as e:
+        _finish_quietly(key, owner, FAILED, error=f'{type(e).__name__}: {e}')
+        raise
+    _finish_quietly(key, owner, DONE, result=result)
+    return result
+
+
+def _finish_quietly(key, owner, status, result=None, error=''):
+    try:
+        _finish(key, owner, status, result, error)
+    except DatabaseError as e:
+        # Waiters fall back to taking over the lease when it expires
+        logger.warning(f"[SINGLEFLIGHT] Could not publish outcome of {key[:12]}: {e}")
+
+
+# ============================================
+# ASYNCIO (ASGI)
+# ============================================
+async def ado(key, afn, timeout):
+    """Async do(): `afn()` is a coroutine function; callers on one event loop share one task."""
+    loop = asyncio.get_running_loop()
+    tasks = _async_calls.setdefault(loop, {})
+    task = tasks.get(key)
+    if task is None:
+        task = loop.create_task(_arun_shared(key, afn, timeout))
+        tasks[key] = task
+        task.add_done_callback(lambda done: _forget_task(tasks, key, done))
+    try:
+        # shield: a caller that gives up (or disconnects) doesn't cancel the others' call
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        raise SingleFlightTimeout(f'Shared call {key[:12]} still running after {timeout}s')
+
+
+def _forget_task(tasks, key, task):
+    tasks.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # Retrieved here in case every caller already gave up
+
+
+async def _arun_shared(key, afn, timeout):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    owner = _new_owner()
+    claim = sync_to_async(_claim, thread_sensitive=False)
+    try:
+        while True:
+            row = await claim(key, owner, timeout)
+            if row is None:
+                break
+            if row['status'] != RUNNING:
+                return _outcome(row)
+            if loop.time() >= deadline:
+                raise SingleFlightTimeout(f'Shared call {key[:12]} still running after {timeout}s')
+            await asyncio.sleep(POLL_INTERVAL)
+    except DatabaseError as e:
+        logger.warning(f"[SINGLEFLIGHT] Lock table unavailable, calling without it: {e}")
+        return await afn()
+
+    finish = sync_to_async(_finish_quietly, thread_sensitive=False)
+    try:
+        result = await afn()
+    except Exception as e:
+        await finish(key, owner, FAILED, error=f'{type(e).__name__}: {e}')
+        raise
+    await finish(key, owner, DONE, result=result)
+    return result
@@ -0,0 +1,545 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import timedelta
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.jwt_auth import generate_jwt_token
+from authentication.models import User
+
+from . import canary, cnn_inference, shadow, singleflight, treatment_cache, treatment_generator
+from .cnn_inference import CNNPredictor, PredictionOutput
+from .exceptions import ModelUnavailableError
+from .models import CanarySample, LLMRequestLock, ShadowPrediction, TreatmentPlanCache
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'prediction-tests'}}
+
+
+def _output(disease='Eczema', confidence=91.0, seconds=0.05, model='skinscan1.pth'):
+    return PredictionOutput(
+        disease_name=disease, confidence=confidence, all_probabilities={}, recommendation='-',
+        processing_time=seconds, is_inconclusive=False, model_name=model,
+    )
+
+
+class _FakePool:
+    """ProcessPoolExecutor stand-in: runs the call inline or fails like a dead worker."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool('worker killed'))
+        else:
+            future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+def _item(user_id=None, disease='Eczema'):
+    return {
+        'user_id': user_id, 'image': b'img', 'candidate_model': 'cand.pth', 'production_model': 'skinscan1.pth',
+        'production_disease': disease, 'production_confidence': 90.0, 'production_latency_ms': 40.0,
+    }
+
+
+# ============================================
+# SHADOW MODE
+# ============================================
+@mock.patch('prediction.shadow.close_old_connections', lambda: None)
+class ShadowDispatchTests(TestCase):
+
+    def setUp(self):
+        self._saved = (shadow._queue, shadow._pool, shadow._worker_predictor, dict(shadow._stats))
+        shadow._queue = queue.Queue(maxsize=1)
+        shadow._pool = None
+        shadow._worker_predictor = None
+
+    def tearDown(self):
+        shadow._queue, shadow._pool, shadow._worker_predictor, stats = self._saved
+        shadow._stats.clear()
+        shadow._stats.update(stats)
+        shadow.get_shadow_config(refresh=True)
+
+    @mock.patch('prediction.shadow._ensure_dispatcher')
+    def test_mirror_queues_a_sample_and_drops_when_full(self, ensure_dispatcher):
+        shadow.set_shadow_config('cand.pth', 1.0)
+        self.assertTrue(shadow.mirror_to_shadow(None, b'img', _output(), '/models/skinscan1.pth'))
+        item = shadow._queue.get_nowait()
+        self.assertEqual(item['candidate_model'], 'cand.pth')
+        self.assertEqual(item['production_model'], 'skinscan1.pth')
+        self.assertEqual(item['production_latency_ms'], 50.0)
+
+        dropped = shadow._stats['dropped']
+        shadow._queue.put_nowait(item)
+        self.assertFalse(shadow.mirror_to_shadow(None, b'img', _output()))
+        self.assertEqual(shadow._stats['dropped'], dropped + 1)
+
+    @mock.patch('prediction.shadow._ensure_dispatcher')
+    def test_nothing_is_mirrored_when_disabled(self, ensure_dispatcher):
+        shadow.set_shadow_config(None)
+        self.assertFalse(shadow.mirror_to_shadow(None, b'img', _output()))
+        self.assertTrue(shadow._queue.empty())
+
+    def test_worker_scores_images_one_at_a_time(self):
+        predictor = mock.Mock(active_model_path=None)
+        predictor.predict.side_effect = [_output(seconds=0.03), ValueError('not an image')]
+        with mock.patch('prediction.cnn_inference.CNNPredictor', return_value=predictor):
+            results, _ = shadow._shadow_infer('cand.pth', [b'one', b'two'])
+
+        self.assertEqual([c.args for c in predictor.predict.call_args_list], [(b'one',), (b'two',)])
+        self.assertEqual(results[0]['latency_ms'], 30.0)
+        self.assertEqual(results[1], {'error': 'not an image'})
+
+    def test_dead_worker_is_replaced_on_next_batch(self):
+        dead = _FakePool(broken=True)
+        shadow._pool = dead
+        with self.assertLogs('prediction.shadow', 'ERROR'):
+            self.assertEqual(shadow._score('cand.pth', [_item()], threads=1), 0.0)
+        self.assertTrue(dead.shut_down)
+        self.assertIsNone(shadow._pool)
+        self.assertIn('worker died', ShadowPrediction.objects.get().error)
+
+        scored = ([{'disease_name': 'Eczema', 'confidence': 88.0, 'latency_ms': 45.0}], 0.2)
+        with mock.patch('prediction.shadow.ProcessPoolExecutor', return_value=_FakePool()) as new_pool, \
+                mock.patch('prediction.shadow._shadow_infer', return_value=scored):
+            self.assertEqual(shadow._score('cand.pth', [_item()], threads=1), 0.2)
+        new_pool.assert_called_once()
+        self.assertTrue(ShadowPrediction.objects.filter(agrees=True, shadow_latency_ms=45.0).exists())
+
+
+# ============================================
+# CANARY ROLLOUT
+# ============================================
+class CanaryRoutingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='canary@test.com', account_status='ACTIVE')
+
+    def tearDown(self):
+        canary.get_active_rollout(refresh=True)
+
+    def test_assigned_model_is_never_in_a_canary(self):
+        canary.start_rollout('cand.pth', 'skinscan1.pth', steps=[100])
+        self.user.assigned_model = 'custom.pth'
+        self.assertEqual(canary.route_model(self.user), ('custom.pth', None, None))
+
+    def test_users_keep_their_arm_as_the_percentage_grows(self):
+        rollout = canary.start_rollout('cand.pth', 'skinscan1.pth', steps=[5, 100])
+        bucket = canary.user_bucket('cand.pth', self.user.id)
+        self.assertEqual(bucket, canary.user_bucket('cand.pth', self.user.id))
+        self.assertEqual(canary.route_model(self.user)[1], 'canary' if bucket < 5 else 'baseline')
+
+        canary.advance_rollout(rollout)
+        self.assertEqual(canary.route_model(self.user), ('cand.pth', 'canary', rollout.id))
+
+    def test_failing_canary_is_rolled_back(self):
+        rollout = canary.start_rollout('cand.pth', 'skinscan1.pth', steps=[50], min_samples=5)
+        for _ in range(5):
+            CanarySample.objects.create(rollout=rollout, arm='baseline', latency_ms=40)
+            CanarySample.objects.create(rollout=rollout, arm='canary', latency_ms=0, is_error=True)
+
+        self.assertEqual(canary.evaluate_rollout(rollout)['verdict'], 'rolled_back')
+        rollout.refresh_from_db()
+        self.assertEqual((rollout.status, rollout.percentage), ('ROLLED_BACK', 0))
+        self.assertIsNone(canary.route_model(self.user)[1])
+
+    def test_healthy_canary_stays(self):
+        rollout = canary.start_rollout('cand.pth', 'skinscan1.pth', steps=[50], min_samples=5)
+        for latency in (40, 41, 42, 43, 44):
+            CanarySample.objects.create(rollout=rollout, arm='baseline', latency_ms=latency)
+            CanarySample.objects.create(rollout=rollout, arm='canary', latency_ms=latency)
+        self.assertEqual(canary.evaluate_rollout(rollout)['verdict'], 'healthy')
+
+
+class CandidateLoadingTests(TestCase):
+
+    def setUp(self):
+        # The default predictor, without loading a checkpoint
+        self.predictor = CNNPredictor.__new__(CNNPredictor)
+        self.predictor.active_model_path = '/models/skinscan1.pth'
+        self.predictor._alternate_predictors = OrderedDict()
+        self.predictor._alternate_lock = threading.Lock()
+
+    def test_missing_assigned_model_falls_back(self):
+        with self.assertLogs('prediction.cnn_inference', 'WARNING'):
+            self.assertIs(self.predictor._predictor_for('missing.pth'), self.predictor)
+
+    def test_missing_canary_candidate_raises(self):
+        with self.assertRaises(ModelUnavailableError):
+            self.predictor._predictor_for('missing.pth', fallback=False)
+
+
+def _fake_predictor(model_path=None):
+    """CNNPredictor stand-in that 'loads' any path except broken.pth."""
+    loaded = not str(model_path).endswith('broken.pth')
+    return mock.Mock(model=object() if loaded else None, active_model_path=str(model_path) if loaded else None)
+
+
+@override_settings(CACHES=LOCMEM, MODEL_PATH='/models/skinscan1.pth')
+@mock.patch('prediction.cnn_inference.CNNPredictor', side_effect=_fake_predictor)
+class GlobalModelTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self._saved = (cnn_inference._predictor, cnn_inference._failed_reload)
+        cnn_inference._predictor, cnn_inference._failed_reload = None, (None, 0.0)
+
+    def tearDown(self):
+        cnn_inference._predictor, cnn_inference._failed_reload = self._saved
+
+    def test_default_comes_from_the_app_setting(self, _):
+        from admin_module.models import AppSetting
+        AppSetting.objects.create(key='GLOBAL_MODEL_PATH', value='/models/v2.pth')
+        self.assertEqual(cnn_inference.get_predictor().active_model_path, '/models/v2.pth')
+        with self.assertNumQueries(0):  # Later requests only read the shared cache
+            cnn_inference.get_predictor()
+
+    def test_promotion_in_another_worker_swaps_the_model(self, predictor_class):
+        old = cnn_inference.get_predictor()
+        self.assertIs(cnn_inference.get_predictor(), old)
+
+        rollout = canary.start_rollout('cand.pth', 'skinscan1.pth', steps=[100])
+        with mock.patch('prediction.cnn_inference.checkpoint_path', return_value='/models/cand.pth'):
+            canary.promote(rollout)
+        cnn_inference._predictor = old  # This worker still holds the previous model
+
+        new = cnn_inference.get_predictor()
+        self.assertEqual(new.active_model_path, '/models/cand.pth')
+        self.assertIs(cnn_inference.get_predictor(), new)
+        self.assertEqual(predictor_class.call_count, 2)
+        canary.get_active_rollout(refresh=True)
+
+    def test_broken_checkpoint_keeps_the_current_model(self, predictor_class):
+        old = cnn_inference.get_predictor()
+        cnn_inference.set_global_model('/models/broken.pth')
+        with self.assertLogs('prediction.cnn_inference', 'ERROR'):
+            self.assertIs(cnn_inference.get_predictor(), old)
+        self.assertIs(cnn_inference.get_predictor(), old)  # Not retried on every request
+        self.assertEqual(predictor_class.call_count, 2)
+
+
+@override_settings(CACHES=LOCMEM)
+@mock.patch('prediction.views.mirror_to_shadow')
+@mock.patch('prediction.views.request_plan', return_value={'status': 'PENDING', 'job_id': 'job', 'plan': None})
+@mock.patch('prediction.views.ImageQualityValidator.validate_image')
+class CanaryUploadTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(email='upload@test.com', account_status='ACTIVE'))
+        self.predictor = mock.Mock(model_version='2.0.0')
+
+    def upload(self, count=1):
+        images = [SimpleUploadedFile(f'{i}.png', b'png', content_type='image/png') for i in range(count)]
+        with mock.patch('prediction.views.get_predictor', return_value=self.predictor):
+            return self.client.post('/api/predict/upload', {'images': images}, format='multipart')
+
+    @mock.patch('prediction.views.route_model', return_value=('cand.pth', 'canary', 7))
+    @mock.patch('prediction.views.record_outcome')
+    def test_broken_candidate_counts_as_canary_error(self, record_outcome, *_):
+        self.predictor.predict.side_effect = ModelUnavailableError('Model cand.pth not found')
+        self.predictor.predict_multi.return_value = _output()
+
+        response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['disease_name'], 'Eczema')
+        self.assertEqual(self.predictor.predict.call_args.kwargs, {'user_model_path': 'cand.pth', 'fallback': False})
+        record_outcome.assert_called_once_with(7, 'canary', 0, is_error=True)
+
+    @mock.patch('prediction.views.route_model', return_value=('cand.pth', 'canary', 7))
+    @mock.patch('prediction.views.record_outcome')
+    def test_multi_image_upload_is_served_by_the_canary(self, record_outcome, *_):
+        self.predictor.predict_multi.return_value = _output(seconds=0.2, model='cand.pth')
+
+        self.assertEqual(self.upload(count=2).status_code, 200)
+        self.assertEqual(self.predictor.predict_multi.call_args.kwargs, {'user_model_path': 'cand.pth', 'fallback': False})
+        record_outcome.assert_called_once_with(7, 'canary', 200.0)
+
+
+# ============================================
+# TREATMENT PLAN CACHE
+# ============================================
+class TreatmentCacheTests(TestCase):
+    PLAN = {'steps': ['Moisturise'], 'severity': 'Mild', 'tip': '-', 'model_used': 'gemini'}
+
+    def setUp(self):
+        treatment_cache._hits.clear()
+        treatment_cache.store_plan('Eczema', 90, 'gemini', self.PLAN)
+
+    def test_cache_read_does_not_write(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(treatment_cache.get_cached_plan('Eczema', 92, 'gemini'), self.PLAN)
+        treatment_cache.get_cached_plan('Eczema', 95, 'gemini')
+
+        self.assertEqual(treatment_cache.flush_hits(), 1)
+        self.assertEqual(TreatmentPlanCache.objects.get().hits, 2)
+        self.assertEqual(treatment_cache.flush_hits(), 0)
+
+    def test_refreshing_a_plan_keeps_its_hits(self):
+        TreatmentPlanCache.objects.update(hits=5)
+        treatment_cache.store_plan('Eczema', 90, 'gemini', {**self.PLAN, 'tip': 'new'})
+        entry = TreatmentPlanCache.objects.get()
+        self.assertEqual((entry.hits, entry.plan['tip']), (5, 'new'))
+
+    def test_fallback_plans_are_not_cached(self):
+        self.assertFalse(treatment_cache.store_plan('Psoriasis', 90, 'gemini', {**self.PLAN, 'model_used': 'fallback'}))
+
+    def test_upload_rejects_unknown_model(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(email='model@test.com', account_status='ACTIVE'))
+        image = SimpleUploadedFile('a.png', b'png', content_type='image/png')
+        with mock.patch('prediction.views.get_predictor') as get_predictor:
+            response = client.post('/api/predict/upload', {'images': [image], 'ai_model': 'gpt-4'}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        get_predictor.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM)
+@mock.patch('prediction.treatment_cache._job_executor')
+class TreatmentPlanJobTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='plan-job@test.com', account_status='ACTIVE')
+        self.headers = {'Authorization': f'Bearer {generate_jwt_token(self.user)}'}
+
+    def pending_job(self):
+        with mock.patch('prediction.treatment_cache.get_cached_plan', return_value=None):
+            return treatment_cache.request_plan(self.user.id, 'Eczema', 90)['job_id']
+
+    def finish(self, job_id):
+        job = cache.get(treatment_cache._job_key(job_id))
+        job.update(status='COMPLETED', plan=TreatmentCacheTests.PLAN)
+        cache.set(treatment_cache._job_key(job_id), job)
+
+    def test_wsgi_answers_at_once_with_a_poll_hint(self, _):
+        job_id = self.pending_job()
+        started = time.monotonic()
+        response = self.client.get(f'/api/predict/treatment-plan/{job_id}?wait=20', headers=self.headers)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['treatment_status'], 'PENDING')
+        self.assertEqual(response.json()['data']['poll_after'], treatment_cache.JOB_POLL_SECONDS)
+        self.assertEqual(response['Retry-After'], str(treatment_cache.JOB_POLL_SECONDS))
+
+        self.finish(job_id)
+        response = self.client.get(f'/api/predict/treatment-plan/{job_id}', headers=self.headers)
+        self.assertEqual(response.json()['data']['treatment'], ['Moisturise'])
+        self.assertNotIn('poll_after', response.json()['data'])
+        self.assertFalse(response.has_header('Retry-After'))
+
+    async def test_asgi_waits_without_blocking_the_loop(self, _):
+        job_id = await sync_to_async(self.pending_job)()
+
+        async def finish_soon():
+            await asyncio.sleep(0.3)  # Runs only if the view yields the event loop while waiting
+            await sync_to_async(self.finish)(job_id)
+
+        finisher = asyncio.ensure_future(finish_soon())
+        response = await AsyncClient().get(f'/api/predict/treatment-plan/{job_id}?wait=5', headers=self.headers)
+        await finisher
+        self.assertEqual(response.json()['data']['treatment_status'], 'COMPLETED')
+
+        response = await AsyncClient().get(f'/api/predict/treatment-plan/{job_id}x?wait=1', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_job_of_another_user_is_not_found(self, _):
+        job_id = self.pending_job()
+        other = User.objects.create(email='other-plan@test.com', account_status='ACTIVE')
+        response = self.client.get(f'/api/predict/treatment-plan/{job_id}',
+                                   headers={'Authorization': f'Bearer {generate_jwt_token(other)}'})
+        self.assertEqual(response.status_code, 404)
+
+
+# ============================================
+# SINGLE-FLIGHT
+# ============================================
+class SingleFlightTests(TestCase):
+
+    def lock(self, status, seconds=60, **fields):
+        now = timezone.now()
+        return LLMRequestLock.objects.create(
+            key='k', owner='other-process', status=status, created_at=now,
+            expires_at=now + timedelta(seconds=seconds), **fields
+        )
+
+    def test_concurrent_callers_in_a_process_share_one_call(self):
+        release, calls, results = threading.Event(), [], []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return {'plan': 'shared'}
+
+        # The lock table is covered below; threads here have no test transaction to see it
+        with mock.patch('prediction.singleflight._run_shared', lambda key, fn, timeout: fn()):
+            threads = [threading.Thread(target=lambda: results.append(singleflight.do('k', fn, 5))) for _ in range(3)]
+            threads[0].start()
+            while 'k' not in singleflight._calls:
+                time.sleep(0.01)
+            for thread in threads[1:]:
+                thread.start()
+            time.sleep(0.1)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'plan': 'shared'}] * 3)
+
+    def test_outcome_of_another_process_is_shared(self):
+        self.lock('DONE', result={'plan': 'theirs'})
+        fn = mock.Mock()
+        self.assertEqual(singleflight.do('k', fn, 1), {'plan': 'theirs'})
+        fn.assert_not_called()
+
+        LLMRequestLock.objects.update(status='FAILED', error='HTTP 503')
+        with self.assertRaisesMessage(singleflight.SingleFlightError, 'HTTP 503'):
+            singleflight.do('k', fn, 1)
+
+    def test_leader_publishes_its_result(self):
+        self.assertEqual(singleflight.do('k', lambda: {'plan': 'mine'}, 1), {'plan': 'mine'})
+        row = LLMRequestLock.objects.get(key='k')
+        self.assertEqual((row.status, row.result), ('DONE', {'plan': 'mine'}))
+
+    @mock.patch('prediction.singleflight.POLL_INTERVAL', 0.05)
+    def test_live_lease_times_out_and_expired_lease_is_taken_over(self):
+        self.lock('RUNNING')
+        with self.assertRaises(singleflight.SingleFlightTimeout):
+            singleflight.do('k', mock.Mock(), 0.2)
+
+        LLMRequestLock.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(singleflight.do('k', lambda: 'retried', 1), 'retried')
+
+    @mock.patch('prediction.singleflight._finish_quietly')
+    @mock.patch('prediction.singleflight._claim', return_value=None)
+    def test_async_callers_share_one_task(self, *_):
+        calls = []
+
+        async def afn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'shared'
+
+        async def burst():
+            return await asyncio.gather(*(singleflight.ado('k', afn, 1) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(burst()), ['shared'] * 3)
+        self.assertEqual(len(calls), 1)
+
+
+# ============================================
+# HEDGED PROVIDER CALLS
+# ============================================
+def _plan(provider):
+    return {'steps': ['Moisturise'], 'severity': 'Mild', 'tip': '-', 'model_used': provider}
+
+
+@override_settings(LLM_HEDGE_DELAY=0.05, LLM_DEADLINE=2.0)
+class HedgingTests(TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        fresh = {name: {**stats, 'latencies': type(stats['latencies'])(maxlen=treatment_generator.LATENCY_WINDOW)}
+                 for name, stats in treatment_generator._stats.items()}
+        for counters in fresh.values():
+            counters.update(calls=0, successes=0, failures=0, wins=0, hedged=0, abandoned=0)
+        patcher = mock.patch.object(treatment_generator, '_stats', fresh)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def providers(self, gemini, llama):
+        return mock.patch.dict(treatment_generator.PROVIDERS, {
+            'gemini': (gemini, None, 15), 'llama': (llama, None, 20),
+        })
+
+    def slow(self, provider):
+        def call(disease_name, confidence, timeout):
+            self.release.wait(5)
+            return _plan(provider)
+        return mock.Mock(side_effect=call)
+
+    def test_slow_primary_is_hedged_and_abandoned(self):
+        gemini, llama = self.slow('gemini'), mock.Mock(return_value=_plan('llama'))
+        with self.providers(gemini, llama), self.assertLogs('prediction.treatment_generator', 'INFO'):
+            result = treatment_generator._hedged_generate('Eczema', 90, ['gemini', 'llama'])
+        self.assertEqual(result['model_used'], 'llama')
+
+        self.release.set()
+        time.sleep(0.05)
+        stats = treatment_generator._stats
+        self.assertEqual((stats['llama']['hedged'], stats['llama']['wins']), (1, 1))
+        self.assertEqual(stats['gemini']['abandoned'], 1)
+
+    def test_fast_primary_is_not_hedged(self):
+        gemini, llama = mock.Mock(return_value=_plan('gemini')), mock.Mock()
+        with self.providers(gemini, llama):
+            result = treatment_generator._hedged_generate('Eczema', 90, ['gemini', 'llama'])
+        self.assertEqual(result['model_used'], 'gemini')
+        llama.assert_not_called()
+
+    @override_settings(LLM_HEDGE_DELAY=5.0)
+    def test_failed_primary_hedges_without_waiting(self):
+        gemini, llama = mock.Mock(return_value=None), mock.Mock(return_value=_plan('llama'))
+        started = time.monotonic()
+        with self.providers(gemini, llama), self.assertLogs('prediction.treatment_generator', 'INFO'):
+            result = treatment_generator._hedged_generate('Eczema', 90, ['gemini', 'llama'])
+        self.assertEqual(result['model_used'], 'llama')
+        self.assertLess(time.monotonic() - started, 1)
+
+    @override_settings(LLM_DEADLINE=0.2)
+    def test_deadline_gives_up_on_every_provider(self):
+        with self.providers(self.slow('gemini'), self.slow('llama')), \
+                self.assertLogs('prediction.treatment_generator', 'WARNING'):
+            self.assertIsNone(treatment_generator._hedged_generate('Eczema', 90, ['gemini', 'llama']))
+
+    @override_settings(LLM_HEDGE_DELAY=0, LLM_HEDGE_MIN_SAMPLES=10, LLM_HEDGE_DEFAULT_DELAY=5.0)
+    def test_delay_is_the_observed_p90_once_there_are_enough_samples(self):
+        self.assertEqual(treatment_generator.hedge_delay('gemini'), 5.0)
+        treatment_generator._stats['gemini']['latencies'].extend(i / 10 for i in range(1, 11))
+        self.assertAlmostEqual(treatment_generator.hedge_delay('gemini'), 0.9, places=1)
+
+    def test_async_hedge_cancels_the_loser(self):
+        cancelled = []
+
+        async def slow_gemini(disease_name, confidence, timeout):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append('gemini')
+                raise
+
+        async def llama(disease_name, confidence, timeout):
+            return _plan('llama')
+
+        async def generate():
+            result = await treatment_generator._ahedged_generate('Eczema', 90, ['gemini', 'llama'])
+            await asyncio.sleep(0)  # Let the cancellation land before the loop closes
+            return result, list(cancelled)
+
+        with mock.patch.dict(treatment_generator.PROVIDERS, {
+            'gemini': (None, slow_gemini, 15), 'llama': (None, llama, 20),
+        }), self.assertLogs('prediction.treatment_generator', 'INFO'):
+            result, cancelled_before_return = asyncio.run(generate())
+
+        self.assertEqual(result['model_used'], 'llama')
+        self.assertEqual(cancelled_before_return, ['gemini'])
+        self.assertEqual(treatment_generator._stats['gemini']['abandoned'], 1)
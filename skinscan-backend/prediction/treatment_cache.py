@@ -0,0 +1,364 @@
+"""
+Persistent treatment-plan cache.
+
+Plans are stored in TreatmentPlanCache keyed by disease, confidence bucket,
+requested model and PROMPT_VERSION, so an upload only has to look up a row.
+Entries live for TREATMENT_CACHE_TTL seconds; an expired entry is still served
+while a background refresh replaces it. precompute_treatment_plans (command or
+admin trigger) fills every DISEASE_CLASSES x bucket x model combination ahead of
+traffic. Static fallback plans are never cached. Hits are counted in memory and
+written to the hits column at most every HITS_FLUSH_SECONDS, so a cache read
+does not write to the database.
+
+Uploads do not wait for generation: request_plan() returns the cached plan
+when there is one, otherwise a job handle whose state lives in the shared
+Django cache (so any worker can answer a poll) while a background thread
+generates the plan.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .treatment_generator import (
+    CONFIDENCE_BUCKETS,
+    PROMPT_VERSION,
+    agenerate_treatment_plan,
+    confidence_bucket,
+    generate_treatment_plan,
+    get_provider_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+MODELS = ('gemini', 'llama')
+
+_refreshing = set()  # Keys being refreshed by this process
+_refresh_lock = threading.Lock()
+_precompute = {'thread': None, 'progress': {}}
+
+PENDING, COMPLETED, FAILED = 'PENDING', 'COMPLETED', 'FAILED'
+JOB_TTL = 3600  # Seconds a finished job can still be fetched
+JOB_STALE_SECONDS = 120  # A PENDING job this old lost its worker (e.g. a restart)
+JOB_POLL_SECONDS = 2  # Retry-After for clients short-polling a PENDING job
+_job_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='treatment-job')
+
+HITS_FLUSH_SECONDS = 60.0
+_hits = Counter()  # TreatmentPlanCache id -> hits not yet written by this process
+_hits_lock = threading.Lock()
+_hits_state = {'flushed_at': time.monotonic()}
+
+
+def _ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'TREATMENT_CACHE_TTL', 7 * 24 * 3600))
+
+
+def get_cached_plan(disease_name, confidence, model='gemini') -> Optional[Dict]:
+    """Return the stored plan for this key (even if expired) or None."""
+    from .models import TreatmentPlanCache
+    entry = TreatmentPlanCache.objects.filter(
+        disease_name=disease_name,
+        confidence_bucket=confidence_bucket(confidence),
+        model=model,
+        prompt_version=PROMPT_VERSION
+    ).only('id', 'plan', 'expires_at').first()
+    if not entry:
+        return None
+
+    _count_hit(entry.id)
+    if entry.expires_at <= timezone.now():
+        _refresh_in_background(disease_name, confidence, model)
+    return entry.plan
+
+
+def store_plan(disease_name, confidence, model, plan) -> bool:
+    """Persist a generated plan. Returns False for fallback plans, which are not cached."""
+    from .models import TreatmentPlanCache
+    if not plan or plan.get('model_used') == 'fallback':
+        return False
+    TreatmentPlanCache.objects.update_or_create(
+        disease_name=disease_name,
+        confidence_bucket=confidence_bucket(confidence),
+        model=model,
+        prompt_version=PROMPT_VERSION,
+        defaults={'plan': plan, 'expires_at': timezone.now() + _ttl()}
+    )
+    return True
+
+
+def _count_hit(entry_id):
+    with _hits_lock:
+        _hits[entry_id] += 1
+        now = time.monotonic()
+        due = now - _hits_state['flushed_at'] >= HITS_FLUSH_SECONDS
+        if due:
+            _hits_state['flushed_at'] = now
+    if due:
+        _job_executor.submit(_flush_hits_in_background)
+
+
+def flush_hits() -> int:
+    """Add this process' pending hit counts to TreatmentPlanCache.hits. Returns entries updated."""
+    from .models import TreatmentPlanCache
+    with _hits_lock:
+        pending = dict(_hits)
+        _hits.clear()
+    by_count = defaultdict(list)
+    for entry_id, count in pending.items():
+        by_count[count].append(entry_id)
+    for count, ids in by_count.items():
+        TreatmentPlanCache.objects.filter(id__in=ids).update(hits=F('hits') + count)
+    return len(pending)
+
+
+def _flush_hits_in_background():
+    try:
+        flush_hits()
+    except Exception as e:
+        logger.error(f"[TREATMENT CACHE] Hit count flush failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def cached_treatment_plan(disease_name, confidence, model='gemini') -> Dict:
+    """Drop-in replacement for generate_treatment_plan that goes through the cache."""
+    try:
+        plan = get_cached_plan(disease_name, confidence, model)
+        if plan:
+            return plan
+    except Exception as e:
+        logger.error(f"[TREATMENT CACHE] Lookup failed: {e}")
+
+    plan = generate_treatment_plan(disease_name, confidence, model=model)
+    try:
+        store_plan(disease_name, confidence, model, plan)
+    except Exception as e:
+        logger.error(f"[TREATMENT CACHE] Store failed: {e}")
+    return plan
+
+
+async def acached_treatment_plan(disease_name, confidence, model='gemini') -> Dict:
+    """Async cached_treatment_plan: cache reads/writes run in a thread, generation is awaited."""
+    try:
+        plan = await sync_to_async(get_cached_plan)(disease_name, confidence, model)
+        if plan:
+            return plan
+    except Exception as e:
+        logger.error(f"[TREATMENT CACHE] Lookup failed: {e}")
+
+    plan = await agenerate_treatment_plan(disease_name, confidence, model=model)
+    try:
+        await sync_to_async(store_plan)(disease_name, confidence, model, plan)
+    except Exception as e:
+        logger.error(f"[TREATMENT CACHE] Store failed: {e}")
+    return plan
+
+
+def invalidate(disease_name: Optional[str] = None, model: Optional[str] = None) -> int:
+    """Delete cached plans (all, or only one disease and/or model). Returns rows deleted."""
+    from .models import TreatmentPlanCache
+    entries = TreatmentPlanCache.objects.all()
+    if disease_name:
+        entries = entries.filter(disease_name=disease_name)
+    if model:
+        entries = entries.filter(model=model)
+    deleted, _ = entries.delete()
+    logger.info(f"[TREATMENT CACHE] Invalidated {deleted} plans (disease={disease_name}, model={model})")
+    return deleted
+
+
+def cache_summary() -> Dict:
+    from .models import TreatmentPlanCache
+    flush_hits()
+    entries = TreatmentPlanCache.objects.filter(prompt_version=PROMPT_VERSION)
+    totals = entries.aggregate(count=Count('id'), hits=Sum('hits'))
+    expected = len(settings.DISEASE_CLASSES) * len(CONFIDENCE_BUCKETS) * len(MODELS)
+    return {
+        'prompt_version': PROMPT_VERSION,
+        'entries': totals['count'],
+        'expected_entries': expected,
+        'expired': entries.filter(expires_at__lte=timezone.now()).count(),
+        'stale_versions': TreatmentPlanCache.objects.exclude(prompt_version=PROMPT_VERSION).count(),
+        'hits': totals['hits'] or 0,
+        'ttl_seconds': int(_ttl().total_seconds()),
+        'precompute': get_precompute_status(),
+        'providers': get_provider_stats(),
+    }
+
+
+# ============================================
+# BACKGROUND REFRESH / PRECOMPUTE
+# ============================================
+def _representative_confidence(bucket):
+    """A confidence inside the bucket, used when generating a plan for the bucket itself."""
+    low, high = next((lo, hi) for name, lo, hi in CONFIDENCE_BUCKETS if name == bucket)
+    return (low + high) / 2
+
+
+def _refresh_in_background(disease_name, confidence, model):
+    key = (disease_name, confidence_bucket(confidence), model)
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            plan = generate_treatment_plan(disease_name, confidence, model=model)
+            store_plan(disease_name, confidence, model, plan)
+        except Exception as e:
+            logger.error(f"[TREATMENT CACHE] Refresh of {key} failed: {e}")
+        finally:
+            close_old_connections()
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name='treatment-refresh', daemon=True).start()
+
+
+def precompute_plans(models: Iterable[str] = MODELS, force: bool = False, progress: Optional[Dict] = None) -> Dict:
+    """
+    Generate missing or expired plans for every disease class, bucket and model.
+    With force=True every plan is regenerated. Returns counts.
+    """
+    from .models import TreatmentPlanCache
+    progress = progress if progress is not None else {}
+    now = timezone.now()
+    fresh = set()
+    if not force:
+        fresh = set(TreatmentPlanCache.objects.filter(
+            prompt_version=PROMPT_VERSION, expires_at__gt=now
+        ).values_list('disease_name', 'confidence_bucket', 'model'))
+
+    todo = [
+        (disease, bucket, model)
+        for disease in settings.DISEASE_CLASSES
+        for bucket, _, _ in CONFIDENCE_BUCKETS
+        for model in models
+        if (disease, bucket, model) not in fresh
+    ]
+    progress.update({'total': len(todo), 'done': 0, 'stored': 0, 'failed': 0})
+
+    for disease, bucket, model in todo:
+        confidence = _representative_confidence(bucket)
+        plan = generate_treatment_plan(disease, confidence, model=model)
+        if store_plan(disease, confidence, model, plan):
+            progress['stored'] += 1
+        else:
+            progress['failed'] += 1
+        progress['done'] += 1
+
+    return progress
+
+
+def start_precompute(force: bool = False) -> bool:
+    """Run precompute_plans in a background thread. Returns False if one is already running."""
+    thread = _precompute['thread']
+    if thread and thread.is_alive():
+        return False
+
+    progress = {'started_at': timezone.now().isoformat(), 'running': True}
+    _precompute['progress'] = progress
+
+    def run():
+        try:
+            precompute_plans(force=force, progress=progress)
+        except Exception as e:
+            progress['error'] = str(e)
+            logger.error(f"[TREATMENT CACHE] Precompute failed: {e}")
+        finally:
+            progress['running'] = False
+            close_old_connections()
+
+    _precompute['thread'] = threading.Thread(target=run, name='treatment-precompute', daemon=True)
+    _precompute['thread'].start()
+    return True
+
+
+def get_precompute_status() -> Dict:
+    return dict(_precompute['progress'])
+
+
+# ============================================
+# PLAN JOBS (upload response does not wait)
+# ============================================
+def _job_key(job_id):
+    return f'treatment_job:{job_id}'
+
+
+def request_plan(user_id, disease_name, confidence, model='gemini') -> Dict:
+    """
+    Treatment plan handle for a scan result: {'status': COMPLETED, 'plan': ...}
+    straight from the cache, or {'status': PENDING, 'job_id': ...} while the
+    plan is generated in the background (see get_plan_job).
+    """
+    try:
+        plan = get_cached_plan(disease_name, confidence, model)
+        if plan:
+            return {'status': COMPLETED, 'job_id': None, 'plan': plan}
+    except Exception as e:
+        logger.error(f"[TREATMENT CACHE] Lookup failed: {e}")
+
+    job_id = uuid.uuid4().hex
+    cache.set(_job_key(job_id), {
+        'job_id': job_id,
+        'user_id': user_id,
+        'status': PENDING,
+        'disease_name': disease_name,
+        'confidence': confidence,
+        'model': model,
+        'plan': None,
+        'created_at': time.time(),
+    }, JOB_TTL)
+    _job_executor.submit(_run_plan_job, job_id)
+    return {'status': PENDING, 'job_id': job_id, 'plan': None}
+
+
+def _run_plan_job(job_id):
+    job = cache.get(_job_key(job_id))
+    if not job:
+        return
+    try:
+        job['plan'] = cached_treatment_plan(job['disease_name'], job['confidence'], model=job['model'])
+        job['status'] = COMPLETED
+    except Exception as e:
+        logger.error(f"[TREATMENT CACHE] Plan job {job_id} failed: {e}")
+        job['status'] = FAILED
+        job['error'] = str(e)
+    finally:
+        close_old_connections()
+    job['completed_at'] = time.time()
+    cache.set(_job_key(job_id), job, JOB_TTL)
+
+
+def get_plan_job(job_id, user_id=None) -> Optional[Dict]:
+    """The job, or None if unknown, expired or owned by another user."""
+    job = cache.get(_job_key(job_id))
+    if not job or (user_id is not None and job['user_id'] != user_id):
+        return None
+    if job['status'] == PENDING and time.time() - job['created_at'] > JOB_STALE_SECONDS:
+        job.update({'status': FAILED, 'error': 'Treatment plan job was interrupted'})
+    return job
+
+
+async def aget_plan_job(job_id, user_id=None, wait: float = 0) -> Optional[Dict]:
+    """get_plan_job() that awaits up to `wait` seconds for a PENDING job to finish."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        job = await sync_to_async(get_plan_job, thread_sensitive=False)(job_id, user_id)
+        if not job or job['status'] != PENDING or loop.time() >= deadline:
+            return job
+        await asyncio.sleep(0.25)
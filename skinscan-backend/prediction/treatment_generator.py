@@ -2,16 +2,36 @@
 Treatment Plan Generator - Dual Model Support (Gemini + Meta LLaMA via NVIDIA)
 Generates structured, AI-powered treatment plans after disease detection.
 """
-import requests
+import asyncio
+import hashlib
 import json
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from django.conf import settings
 
+from skinscan import llm_client
+from skinscan.utils import percentile
+
+from . import singleflight
+
 logger = logging.getLogger(__name__)
 
+# Bump whenever the template changes so cached plans (treatment_cache.py) are regenerated
+PROMPT_VERSION = 'v2'
+
+# The prompt only sees the confidence bucket, so plans can be shared across scans
+CONFIDENCE_BUCKETS = [
+    ('low', 0, 50),
+    ('moderate', 50, 80),
+    ('high', 80, 100),
+]
+
 # Shared prompt template for both models
 TREATMENT_PROMPT_TEMPLATE = """You are a board-certified dermatologist AI assistant.
-A patient has been diagnosed with "{disease_name}" with {confidence}% AI confidence.
+A patient has been diagnosed with "{disease_name}" with {confidence} AI confidence.
 
 Generate a structured treatment plan. You MUST respond with ONLY valid JSON, no markdown, no extra text.
 
@@ -37,6 +57,27 @@ Rules:
 - Include a disclaimer that this is AI-generated and not a substitute for professional medical advice
 """
 
+def confidence_bucket(confidence):
+    """Map a 0-100 confidence score to its bucket name."""
+    try:
+        confidence = float(confidence)
+    except (TypeError, ValueError):
+        confidence = 0
+    for name, low, high in CONFIDENCE_BUCKETS:
+        if confidence < high:
+            return name
+    return CONFIDENCE_BUCKETS[-1][0]
+
+
+def build_prompt(disease_name, confidence):
+    bucket = confidence_bucket(confidence)
+    low, high = next((lo, hi) for name, lo, hi in CONFIDENCE_BUCKETS if name == bucket)
+    return TREATMENT_PROMPT_TEMPLATE.format(
+        disease_name=disease_name,
+        confidence=f"{bucket} ({low}-{high}%)"
+    )
+
+
 # ============================================
 # FALLBACK (used when both APIs fail)
 # ============================================
@@ -127,8 +168,8 @@ def _parse_ai_response(text, model_name):
 # ============================================
 # GEMINI PROVIDER
 # ============================================
-def generate_with_gemini(disease_name, confidence):
-    """Generate treatment plan using Google Gemini."""
+def _gemini_request(disease_name, confidence):
+    """(url, payload, headers) for a Gemini treatment request, or None without an API key."""
     api_key = getattr(settings, 'GOOGLE_API_KEY', None)
     if not api_key:
         logger.warning("Gemini API key not configured")
@@ -138,10 +179,7 @@ def generate_with_gemini(disease_name, confidence):
     model_name = getattr(settings, 'GEMINI_MODEL_NAME', 'gemini-2.5-flash')
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
     
-    prompt = TREATMENT_PROMPT_TEMPLATE.format(
-        disease_name=disease_name,
-        confidence=confidence
-    )
+    prompt = build_prompt(disease_name, confidence)
     
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
@@ -150,29 +188,28 @@ def generate_with_gemini(disease_name, confidence):
             "maxOutputTokens": 1000,
         }
     }
-    
-    try:
-        logger.info(f"Calling Gemini for treatment plan: {disease_name}")
-        response = requests.post(url, json=payload, headers={'Content-Type': 'application/json'}, timeout=15)
-        
-        if response.status_code == 200:
-            data = response.json()
-            text = data['candidates'][0]['content']['parts'][0]['text']
-            return _parse_ai_response(text, 'gemini')
-        else:
-            logger.error(f"Gemini API error {response.status_code}: {response.text[:200]}")
-            return None
-            
-    except Exception as e:
-        logger.error(f"Gemini treatment generation failed: {e}")
-        return None
+    return url, payload, None
+
+
+def _gemini_text(data):
+    return data['candidates'][0]['content']['parts'][0]['text']
+
+
+def generate_with_gemini(disease_name, confidence, timeout=15):
+    """Generate treatment plan using Google Gemini."""
+    return _call_provider('gemini', disease_name, confidence, timeout)
+
+
+async def agenerate_with_gemini(disease_name, confidence, timeout=15):
+    """Async variant of generate_with_gemini."""
+    return await _acall_provider('gemini', disease_name, confidence, timeout)
 
 
 # ============================================
 # META LLAMA PROVIDER (NVIDIA NIM)
 # ============================================
-def generate_with_llama(disease_name, confidence):
-    """Generate treatment plan using Meta LLaMA via NVIDIA API."""
+def _llama_request(disease_name, confidence):
+    """(url, payload, headers) for an NVIDIA LLaMA treatment request, or None without an API key."""
     api_key = getattr(settings, 'NVIDIA_API_KEY', None)
     if not api_key:
         logger.warning("NVIDIA API key not configured")
@@ -182,10 +219,7 @@ def generate_with_llama(disease_name, confidence):
     model_name = getattr(settings, 'NVIDIA_MODEL_NAME', 'meta/llama-3.1-8b-instruct')
     url = "https://integrate.api.nvidia.com/v1/chat/completions"
     
-    prompt = TREATMENT_PROMPT_TEMPLATE.format(
-        disease_name=disease_name,
-        confidence=confidence
-    )
+    prompt = build_prompt(disease_name, confidence)
     
     headers = {
         'Content-Type': 'application/json',
@@ -207,27 +241,291 @@ def generate_with_llama(disease_name, confidence):
         "temperature": 0.4,
         "max_tokens": 1000,
     }
+    return url, payload, headers
+
+
+def _llama_text(data):
+    return data['choices'][0]['message']['content']
+
+
+def generate_with_llama(disease_name, confidence, timeout=20):
+    """Generate treatment plan using Meta LLaMA via NVIDIA API."""
+    return _call_provider('llama', disease_name, confidence, timeout)
+
+
+async def agenerate_with_llama(disease_name, confidence, timeout=20):
+    """Async variant of generate_with_llama."""
+    return await _acall_provider('llama', disease_name, confidence, timeout)
+
+
+# ============================================
+# PROVIDER CALLS (sync and async share request building and parsing)
+# ============================================
+PROVIDER_SPECS = {
+    # name: (label, request builder, response text extractor)
+    'gemini': ('Gemini', _gemini_request, _gemini_text),
+    'llama': ('NVIDIA LLaMA', _llama_request, _llama_text),
+}
+
+
+def _handle_response(provider, response):
+    label, _, extract_text = PROVIDER_SPECS[provider]
+    if response.status_code == 200:
+        return _parse_ai_response(extract_text(response.json()), provider)
+    logger.error(f"{label} API error {response.status_code}: {response.text[:200]}")
+    return None
+
+
+def _call_provider(provider, disease_name, confidence, timeout):
+    label, build_request, _ = PROVIDER_SPECS[provider]
+    request = build_request(disease_name, confidence)
+    if not request:
+        return None
+    url, payload, headers = request
     
     try:
-        logger.info(f"Calling NVIDIA LLaMA for treatment plan: {disease_name}")
-        response = requests.post(url, json=payload, headers=headers, timeout=20)
-        
-        if response.status_code == 200:
-            data = response.json()
-            text = data['choices'][0]['message']['content']
-            return _parse_ai_response(text, 'llama')
-        else:
-            logger.error(f"NVIDIA API error {response.status_code}: {response.text[:200]}")
-            return None
-            
+        logger.info(f"Calling {label} for treatment plan: {disease_name}")
+        response = llm_client.post(provider, url, payload, headers=headers, timeout=timeout)
+        return _handle_response(provider, response)
+    except llm_client.ProviderUnavailable:
+        logger.warning(f"{label} circuit is open, skipping")
+        return None
+    except Exception as e:
+        logger.error(f"{label} treatment generation failed: {e}")
+        return None
+
+
+async def _acall_provider(provider, disease_name, confidence, timeout):
+    label, build_request, _ = PROVIDER_SPECS[provider]
+    request = build_request(disease_name, confidence)
+    if not request:
+        return None
+    url, payload, headers = request
+    
+    try:
+        logger.info(f"Calling {label} (async) for treatment plan: {disease_name}")
+        response = await llm_client.apost(provider, url, payload, headers=headers, timeout=timeout)
+        return _handle_response(provider, response)
+    except llm_client.ProviderUnavailable:
+        logger.warning(f"{label} circuit is open, skipping")
+        return None
     except Exception as e:
-        logger.error(f"LLaMA treatment generation failed: {e}")
+        logger.error(f"{label} treatment generation failed: {e}")
         return None
 
 
+# ============================================
+# HEDGED DISPATCH
+# ============================================
+PROVIDERS = {
+    # name: (sync call, async call, max timeout)
+    'gemini': (generate_with_gemini, agenerate_with_gemini, 15),
+    'llama': (generate_with_llama, agenerate_with_llama, 20),
+}
+LATENCY_WINDOW = 200  # Successful calls per provider kept for the p90 hedge delay
+
+# Provider calls run here so a slow loser never holds up the request thread
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='llm-hedge')
+_stats_lock = threading.Lock()
+_stats = {
+    name: {'calls': 0, 'successes': 0, 'failures': 0, 'wins': 0, 'hedged': 0, 'abandoned': 0,
+           'latencies': deque(maxlen=LATENCY_WINDOW)}
+    for name in PROVIDERS
+}
+
+
+def hedge_delay(provider):
+    """
+    Seconds to wait for `provider` before launching the next one: LLM_HEDGE_DELAY
+    if set, otherwise the provider's observed p90 latency.
+    """
+    configured = getattr(settings, 'LLM_HEDGE_DELAY', 0)
+    if configured:
+        return configured
+    with _stats_lock:
+        latencies = list(_stats[provider]['latencies'])
+    if len(latencies) < getattr(settings, 'LLM_HEDGE_MIN_SAMPLES', 20):
+        return getattr(settings, 'LLM_HEDGE_DEFAULT_DELAY', 5.0)
+    return percentile(latencies, 90)
+
+
+def _record_call(provider, result, elapsed, abandoned):
+    with _stats_lock:
+        stats = _stats[provider]
+        stats['calls'] += 1
+        if result:
+            stats['successes'] += 1
+            stats['latencies'].append(elapsed)
+        else:
+            stats['failures'] += 1
+        if abandoned:
+            stats['abandoned'] += 1
+
+
+def _timed_call(provider, disease_name, confidence, timeout, abandoned):
+    func, _, _ = PROVIDERS[provider]
+    started = time.monotonic()
+    try:
+        result = func(disease_name, confidence, timeout=timeout)
+    except Exception as e:
+        logger.error(f"{provider} treatment generation raised: {e}")
+        result = None
+    _record_call(provider, result, time.monotonic() - started, abandoned.is_set())
+    return result
+
+
+def _hedged_generate(disease_name, confidence, order):
+    """
+    Call order[0]; if it has not answered after its hedge delay (or fails), launch
+    the next provider too. The first valid plan wins. Returns None if every
+    provider fails or LLM_DEADLINE passes.
+    """
+    deadline = time.monotonic() + getattr(settings, 'LLM_DEADLINE', 20.0)
+    abandoned = threading.Event()
+    launched = {}
+
+    def launch(provider):
+        _, _, max_timeout = PROVIDERS[provider]
+        timeout = max(min(max_timeout, deadline - time.monotonic()), 0.1)
+        future = _executor.submit(_timed_call, provider, disease_name, confidence, timeout, abandoned)
+        launched[future] = provider
+        return future
+
+    pending = {launch(order[0])}
+    hedge_at = time.monotonic() + hedge_delay(order[0])
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                logger.warning(f"Treatment generation missed its deadline ({', '.join(launched.values())})")
+                return None
+
+            more = len(launched) < len(order)
+            if more and (now >= hedge_at or not pending):
+                # Preferred provider is slow (past its p90) or already failed
+                provider = order[len(launched)]
+                logger.info(f"Hedging treatment request to {provider}")
+                with _stats_lock:
+                    _stats[provider]['hedged'] += 1
+                pending.add(launch(provider))
+                hedge_at = time.monotonic() + hedge_delay(provider)
+                continue
+            if not pending:
+                return None
+
+            wake_at = min(hedge_at, deadline) if more else deadline
+            done, pending = wait(pending, timeout=max(wake_at - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result:
+                    with _stats_lock:
+                        _stats[launched[future]]['wins'] += 1
+                    return result
+    finally:
+        # Losers are abandoned: not-yet-started calls are cancelled, running ones are ignored
+        abandoned.set()
+        for future in launched:
+            future.cancel()
+
+
+async def _atimed_call(provider, disease_name, confidence, timeout):
+    _, afunc, _ = PROVIDERS[provider]
+    started = time.monotonic()
+    try:
+        result = await afunc(disease_name, confidence, timeout=timeout)
+    except asyncio.CancelledError:
+        _record_call(provider, None, time.monotonic() - started, True)
+        raise
+    except Exception as e:
+        logger.error(f"{provider} treatment generation raised: {e}")
+        result = None
+    _record_call(provider, result, time.monotonic() - started, False)
+    return result
+
+
+async def _ahedged_generate(disease_name, confidence, order):
+    """Async _hedged_generate: same policy, but losing calls are really cancelled."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'LLM_DEADLINE', 20.0)
+    launched = {}
+
+    def launch(provider):
+        _, _, max_timeout = PROVIDERS[provider]
+        timeout = max(min(max_timeout, deadline - loop.time()), 0.1)
+        task = asyncio.ensure_future(_atimed_call(provider, disease_name, confidence, timeout))
+        launched[task] = provider
+        return task
+
+    pending = {launch(order[0])}
+    hedge_at = loop.time() + hedge_delay(order[0])
+
+    try:
+        while True:
+            now = loop.time()
+            if now >= deadline:
+                logger.warning(f"Treatment generation missed its deadline ({', '.join(launched.values())})")
+                return None
+
+            more = len(launched) < len(order)
+            if more and (now >= hedge_at or not pending):
+                provider = order[len(launched)]
+                logger.info(f"Hedging treatment request to {provider}")
+                with _stats_lock:
+                    _stats[provider]['hedged'] += 1
+                pending.add(launch(provider))
+                hedge_at = loop.time() + hedge_delay(provider)
+                continue
+            if not pending:
+                return None
+
+            wake_at = min(hedge_at, deadline) if more else deadline
+            done, pending = await asyncio.wait(pending, timeout=max(wake_at - now, 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result:
+                    with _stats_lock:
+                        _stats[launched[task]]['wins'] += 1
+                    return result
+    finally:
+        for task in launched:
+            task.cancel()
+
+
+def get_provider_stats():
+    """Per-provider latency and win rates since this process started."""
+    with _stats_lock:
+        snapshot = {name: {**stats, 'latencies': list(stats['latencies'])} for name, stats in _stats.items()}
+    total_wins = sum(stats['wins'] for stats in snapshot.values())
+    report = {}
+    for name, stats in snapshot.items():
+        latencies = stats.pop('latencies')
+        report[name] = {
+            **stats,
+            'win_rate': round(stats['wins'] / total_wins, 3) if total_wins else None,
+            'success_rate': round(stats['successes'] / stats['calls'], 3) if stats['calls'] else None,
+            'p50_latency_s': percentile(latencies, 50),
+            'p90_latency_s': percentile(latencies, 90),
+            'hedge_delay_s': hedge_delay(name),
+        }
+    return report
+
+
 # ============================================
 # MAIN DISPATCHER
 # ============================================
+def _flight_key(disease_name, confidence, model):
+    """Identical requests: same provider order and the same prompt (up to whitespace)."""
+    prompt = ' '.join(build_prompt(disease_name, confidence).split())
+    return hashlib.sha256(f'{model}|{PROMPT_VERSION}|{prompt}'.encode()).hexdigest()
+
+
+def _flight_timeout():
+    # The shared call itself gives up at LLM_DEADLINE; allow for lock-table round trips
+    return getattr(settings, 'LLM_DEADLINE', 20.0) + 5
+
+
 def generate_treatment_plan(disease_name, confidence, model='gemini'):
     """
     Generate a structured treatment plan using the specified AI model.
@@ -240,18 +538,17 @@ def generate_treatment_plan(disease_name, confidence, model='gemini'):
     Returns:
         dict with keys: steps, severity, tip, model_used
     """
-    result = None
-    
-    if model == 'llama':
-        result = generate_with_llama(disease_name, confidence)
-        if not result:
-            logger.info("LLaMA failed, falling back to Gemini")
-            result = generate_with_gemini(disease_name, confidence)
-    else:
-        result = generate_with_gemini(disease_name, confidence)
-        if not result:
-            logger.info("Gemini failed, falling back to LLaMA")
-            result = generate_with_llama(disease_name, confidence)
+    order = ['llama', 'gemini'] if model == 'llama' else ['gemini', 'llama']
+    try:
+        # Concurrent scans of the same condition share one provider call
+        result = singleflight.do(
+            _flight_key(disease_name, confidence, model),
+            lambda: _hedged_generate(disease_name, confidence, order),
+            timeout=_flight_timeout()
+        )
+    except singleflight.SingleFlightError as e:
+        logger.warning(f"Shared treatment request failed: {e}")
+        result = None
     
     # Ultimate fallback
     if not result:
@@ -259,3 +556,23 @@ def generate_treatment_plan(disease_name, confidence, model='gemini'):
         result = _fallback_plan(disease_name, confidence)
     
     return result
+
+
+async def agenerate_treatment_plan(disease_name, confidence, model='gemini'):
+    """Async variant of generate_treatment_plan for the ASGI views."""
+    order = ['llama', 'gemini'] if model == 'llama' else ['gemini', 'llama']
+    try:
+        result = await singleflight.ado(
+            _flight_key(disease_name, confidence, model),
+            lambda: _ahedged_generate(disease_name, confidence, order),
+            timeout=_flight_timeout()
+        )
+    except singleflight.SingleFlightError as e:
+        logger.warning(f"Shared treatment request failed: {e}")
+        result = None
+    
+    if not result:
+        logger.warning("All AI providers failed, using static fallback")
+        result = _fallback_plan(disease_name, confidence)
+    
+    return result
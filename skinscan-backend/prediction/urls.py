@@ -7,6 +7,7 @@ Phase 2 v2.0 Endpoints:
 - GET /history - User's prediction history
 - GET /result/<prediction_id> - Detailed prediction result
 - POST /feedback/<prediction_id> - Submit user feedback
+- GET /treatment-plan/<job_id> - Treatment plan generated after the upload returned
 """
 from django.urls import path
 from .views import (
@@ -20,6 +21,8 @@ from .views import (
     ScanHistoryView,
     DeleteScanView,
     GenerateTreatmentView,
+    TreatmentPlanJobView,
+    AsyncGenerateTreatmentView,
     ImageUploadAndPredictView,  # Legacy compatibility
 )
 from .views_doctor import (
@@ -53,6 +56,8 @@ urlpatterns = [
     path('feedback/<int:prediction_id>', PredictionFeedbackView.as_view(), name='prediction_feedback'),
     # AI Treatment Plan Regeneration
     path('generate-treatment', GenerateTreatmentView.as_view(), name='generate_treatment'),
+    path('treatment-plan/<str:job_id>', TreatmentPlanJobView.as_view(), name='treatment_plan_job'),
+    path('generate-treatment-async', AsyncGenerateTreatmentView.as_view(), name='generate_treatment_async'),  # Serve via skinscan/asgi.py
     
     # Doctor Module Endpoints
     path('doctor-status', DoctorStatusView.as_view(), name='doctor_status'),
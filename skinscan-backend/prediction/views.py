@@ -9,6 +9,7 @@ import uuid
 import time
 from datetime import datetime
 
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
@@ -22,7 +23,13 @@ from .models import PredictionResult, SkinImage
 from .image_validator import ImageQualityValidator, ValidationResult
 from .cnn_inference import get_predictor, PredictionOutput
 from .storage_service import get_storage_service
-from .treatment_generator import generate_treatment_plan
+from .treatment_cache import (
+    JOB_POLL_SECONDS, cached_treatment_plan, acached_treatment_plan, request_plan, aget_plan_job
+)
+from .treatment_generator import PROVIDER_SPECS
+from skinscan.async_views import AsyncAPIView, api_error, api_response
+from .shadow import mirror_to_shadow
+from .canary import route_model, record_outcome
 from .exceptions import (
     ImageValidationError,
     ModelUnavailableError,
@@ -34,7 +41,7 @@ from .serializers import (
     JobStatusSerializer,
     PredictionResultSerializer,
     PredictionFeedbackSerializer,
-    ScanHistorySerializer
+    SCAN_HISTORY_ROWS
 )
 
 logger = logging.getLogger(__name__)
@@ -208,7 +215,7 @@ def _process_prediction_job_in_memory(job_id: str, image_bytes_list: List[bytes]
         if len(preprocessed_images) == 1:
             prediction_output = predictor.predict(preprocessed_images[0], user_model_path=user_model)
         else:
-            prediction_output = predictor.predict_multi(preprocessed_images) # Multi not yet updated
+            prediction_output = predictor.predict_multi(preprocessed_images, user_model_path=user_model)
         
         # Create result object (dict)
         result = {
@@ -237,6 +244,17 @@ def _process_prediction_job_in_memory(job_id: str, image_bytes_list: List[bytes]
             job['error_message'] = str(e)
 
 
+def _treatment_fields(plan: Optional[Dict], model_choice: str) -> Dict:
+    """Treatment keys of a scan result (placeholders while the plan is pending)"""
+    plan = plan or {}
+    return {
+        'treatment': plan.get('steps', []),
+        'severity': plan.get('severity', 'Moderate'),
+        'lifestyle_tip': plan.get('tip', ''),
+        'ai_model_used': plan.get('model_used', model_choice),
+    }
+
+
 class ImageUploadView(APIView):
     """
     Upload images and create prediction job.
@@ -251,6 +269,13 @@ class ImageUploadView(APIView):
         if not images:
             return Response({'status': 'error', 'message': 'No images provided'}, status=400)
 
+        model_choice = request.data.get('ai_model', 'gemini')
+        if model_choice not in PROVIDER_SPECS:
+            return Response({
+                'status': 'error',
+                'message': f"Unknown ai_model '{model_choice}'. Use one of: {', '.join(PROVIDER_SPECS)}"
+            }, status=400)
+
         # Validate images (simplified)
         validated_bytes = []
         for img in images:
@@ -273,12 +298,26 @@ class ImageUploadView(APIView):
                 preprocessed = ImageQualityValidator.preprocess_bytes_for_cnn(img_bytes)
                 preprocessed_images.append(preprocessed)
             
-            # Run prediction
-            user_model = getattr(request.user, 'assigned_model', None)
-            if len(preprocessed_images) == 1:
-                prediction_output = predictor.predict(preprocessed_images[0], user_model_path=user_model)
-            else:
+            # Run prediction (assigned model, canary candidate or global default)
+            user_model, canary_arm, rollout_id = route_model(request.user)
+            # A canary candidate that can't serve must count as a canary failure, not fall back silently
+            on_canary = canary_arm == 'canary'
+            try:
+                if len(preprocessed_images) == 1:
+                    prediction_output = predictor.predict(preprocessed_images[0], user_model_path=user_model, fallback=not on_canary)
+                else:
+                    prediction_output = predictor.predict_multi(preprocessed_images, user_model_path=user_model, fallback=not on_canary)
+            except Exception:
+                record_outcome(rollout_id, canary_arm, 0, is_error=True)
+                if not on_canary:
+                    raise
+                # The user still gets a result, from the default model
                 prediction_output = predictor.predict_multi(preprocessed_images)
+            else:
+                record_outcome(rollout_id, canary_arm, prediction_output.processing_time * 1000)
+            
+            # Mirror a sample of uploads to the shadow candidate (non-blocking)
+            mirror_to_shadow(request.user, validated_bytes[0], prediction_output, prediction_output.model_name)
             
             # Create result object (dict)
             result = {
@@ -294,37 +333,33 @@ class ImageUploadView(APIView):
                 'images': [] # Simplified
             }
 
-            # Generate AI Treatment Plan
-            model_choice = request.data.get('ai_model', 'gemini')
+            # AI Treatment Plan: inline if cached, otherwise a job to poll
+            # (GET treatment-plan/<treatment_job_id>) so the scan result isn't held back
             try:
-                treatment = generate_treatment_plan(
+                handle = request_plan(
+                    request.user.id,
                     prediction_output.disease_name,
                     prediction_output.confidence,
                     model=model_choice
                 )
-                result['treatment'] = treatment.get('steps', [])
-                result['severity'] = treatment.get('severity', 'Moderate')
-                result['lifestyle_tip'] = treatment.get('tip', '')
-                result['ai_model_used'] = treatment.get('model_used', model_choice)
+                result['treatment_status'] = handle['status']
+                result['treatment_job_id'] = handle['job_id']
+                result.update(_treatment_fields(handle['plan'], model_choice))
             except Exception as e:
                 logger.error(f"Treatment generation failed: {e}")
-                result['treatment'] = []
-                result['severity'] = 'Moderate'
-                result['lifestyle_tip'] = ''
-                result['ai_model_used'] = 'fallback'
+                result['treatment_status'] = 'FAILED'
+                result['treatment_job_id'] = None
+                result.update(_treatment_fields(None, 'fallback'))
 
             # Fire scan-complete notification for the user (only if recognized)
             if not prediction_output.is_inconclusive:
-                try:
-                    from authentication.models import Notification
-                    Notification.objects.create(
-                        user=request.user,
-                        title='Skin Analysis Complete',
-                        message=f'Analysis finished for your scan: {prediction_output.disease_name} ({prediction_output.confidence}% confidence)',
-                        type='SCAN_COMPLETED'
-                    )
-                except Exception as ne:
-                    logger.error(f"Failed to create notification: {ne}")
+                from authentication.notifications import notify
+                notify(
+                    request.user,
+                    title='Skin Analysis Complete',
+                    message=f'Analysis finished for your scan: {prediction_output.disease_name} ({prediction_output.confidence}% confidence)',
+                    type='SCAN_COMPLETED'
+                )
 
             # Return DIRECTLY to frontend (matches script.js expectation)
             return Response({
@@ -468,39 +503,21 @@ class ScanHistoryView(APIView):
             
             # Get all scan history for the user
             # Robustly filter by ID since request.user might be SimpleUser or User model
-            scan_history = ScanHistory.objects.filter(user_id=request.user.id).select_related(
-                'image', 'result'
-            )
+            scan_history = ScanHistory.objects.filter(user_id=request.user.id)
             
             # Optional: Filter by body location
             body_location = request.query_params.get('body_location')
             if body_location:
                 scan_history = scan_history.filter(body_location=body_location)
             
-            # Prepare data for serializer
-            scan_data = []
-            for scan in scan_history:
-                scan_data.append({
-                    'id': scan.id,
-                    'title': scan.title,
-                    'body_location': scan.body_location,
-                    'disease_name': scan.result.disease_name,
-                    'confidence': scan.result.confidence_score,
-                    'image_url': scan.image.image_url,
-                    'date': scan.created_at,  # Frontend expects 'date'
-                    'severity': scan.severity_tag,  # Frontend expects 'severity'
-                    'notes': scan.notes,
-                    'is_bookmarked': scan.is_bookmarked
-                })
-            
-            # Serialize the data
-            serializer = ScanHistorySerializer(scan_data, many=True)
+            # One values() query joined to image and result; 'date' / 'severity' are the frontend's names
+            scans = SCAN_HISTORY_ROWS.many(scan_history)
             
             return Response({
                 'status': 'success',
                 'data': {
-                    'scans': serializer.data,
-                    'total': len(serializer.data)
+                    'scans': scans,
+                    'total': len(scans)
                 }
             }, status=status.HTTP_200_OK)
             
@@ -569,7 +586,7 @@ class GenerateTreatmentView(APIView):
             model = 'gemini'
 
         try:
-            treatment = generate_treatment_plan(disease_name, confidence, model=model)
+            treatment = cached_treatment_plan(disease_name, confidence, model=model)
             return Response({
                 'status': 'success',
                 'data': treatment
@@ -582,6 +599,74 @@ class GenerateTreatmentView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class TreatmentPlanJobView(AsyncAPIView):
+    """
+    Treatment plan of a scan whose upload returned treatment_status=PENDING.
+
+    Under ASGI, ?wait=<seconds> (max 20) holds the request until the plan is
+    ready without tying up a worker. Under WSGI it would hold a worker thread,
+    so `wait` is ignored and a PENDING answer carries `poll_after` (and
+    Retry-After) for the client to short-poll with.
+    """
+
+    async def get(self, request, job_id):
+        wait = 0
+        if isinstance(request, ASGIRequest):
+            try:
+                wait = min(max(float(request.GET.get('wait', 0)), 0), 20)
+            except ValueError:
+                wait = 0
+
+        job = await aget_plan_job(job_id, user_id=request.user.id, wait=wait)
+        if not job:
+            return api_error('Treatment plan job not found or expired', 'JOB_NOT_FOUND', 404)
+
+        data = {'treatment_job_id': job_id, 'treatment_status': job['status']}
+        data.update(_treatment_fields(job['plan'], job['model']))
+        if job['status'] == 'FAILED':
+            data['error_message'] = job.get('error')
+        poll_after = None
+        if job['status'] == 'PENDING':
+            # A held request that timed out can be repeated straight away
+            poll_after = 0 if wait else JOB_POLL_SECONDS
+            data['poll_after'] = poll_after
+
+        response = api_response({'status': 'success', 'data': data})
+        if poll_after:
+            response['Retry-After'] = str(poll_after)
+        return response
+
+
+class AsyncGenerateTreatmentView(AsyncAPIView):
+    """
+    GenerateTreatmentView for ASGI: provider calls are awaited (and the losing
+    hedge is cancelled) instead of blocking a worker thread.
+    """
+
+    async def post(self, request):
+        disease_name = request.data.get('disease_name')
+        confidence = request.data.get('confidence', 0)
+        model = request.data.get('model', 'gemini')
+
+        if not disease_name:
+            return api_error('disease_name is required', 'DISEASE_REQUIRED', 400)
+
+        try:
+            confidence = float(confidence)
+        except (ValueError, TypeError):
+            confidence = 0
+
+        if model not in ('gemini', 'llama'):
+            model = 'gemini'
+
+        try:
+            treatment = await acached_treatment_plan(disease_name, confidence, model=model)
+            return api_response({'status': 'success', 'data': treatment})
+        except Exception as e:
+            logger.error(f"Treatment regeneration failed: {e}")
+            return api_error('Failed to generate treatment plan', 'TREATMENT_FAILED', 500)
+
+
 # Legacy
 class ImageUploadAndPredictView(ImageUploadView):
     pass
@@ -2,8 +2,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.db.models import Q
+from django.db.models import OuterRef, Q, Subquery
 from authentication.models import User, DoctorProfile, DoctorDocument
+from authentication.notifications import notify
+from authentication.principal_cache import invalidate_principal
 from authentication.serializers import UserSerializer
 from .models import Appointment, SharedReport, PredictionResult
 from .serializers import PredictionResultSerializer
@@ -20,7 +22,7 @@ class DoctorDocumentListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        documents = DoctorDocument.objects.filter(patient=request.user).select_related('doctor')
+        documents = DoctorDocument.objects.filter(patient=request.user).select_related('doctor', 'doctor__doctor_profile')
         data = []
         for doc in documents:
             data.append({
@@ -113,6 +115,7 @@ class DoctorStatusView(APIView):
             if 'available_days' in data: profile.available_days = data['available_days'] # Expecting list
             
             profile.save()
+            invalidate_principal(user.id)
 
             return Response({'status': 'success', 'message': 'Profile updated successfully'})
         except Exception as e:
@@ -184,6 +187,13 @@ class BookAppointmentView(APIView):
                 time_slot=time_slot,
                 status='PENDING'
             )
+            patient_name = f"{request.user.first_name or ''} {request.user.last_name or ''}".strip() or request.user.email
+            notify(
+                doctor,
+                title='New Appointment Request',
+                message=f'{patient_name} requested an appointment on {date_str} at {time_slot}',
+                type='APPOINTMENT_REQUEST'
+            )
             
             return Response({
                 'status': 'success',
@@ -212,9 +222,10 @@ class UserAppointmentsView(APIView):
         role = request.query_params.get('role', 'patient')
         
         if role == 'doctor' and request.user.is_doctor:
-            appointments = Appointment.objects.filter(doctor=request.user).order_by('date', 'time_slot')
+            appointments = Appointment.objects.filter(doctor=request.user)
         else:
-            appointments = Appointment.objects.filter(patient=request.user).order_by('date', 'time_slot')
+            appointments = Appointment.objects.filter(patient=request.user)
+        appointments = appointments.select_related('patient', 'doctor', 'doctor__doctor_profile').order_by('date', 'time_slot')
             
         data = []
         for appt in appointments:
@@ -301,7 +312,9 @@ class DoctorSharedReportsView(APIView):
         if not request.user.is_doctor:
              return Response({'status': 'error', 'message': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
              
-        shared = SharedReport.objects.filter(doctor=request.user).select_related('report', 'report__user')
+        shared = SharedReport.objects.filter(doctor=request.user).select_related(
+            'report', 'report__user', 'report__user__profile', 'report__image'
+        )
         data = []
         for item in shared:
             data.append({
@@ -370,25 +383,21 @@ class DoctorPatientsView(APIView):
         if not request.user.is_doctor:
             return Response({'status': 'error', 'message': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
 
-        # Get unique patient IDs from appointments
-        patient_ids = Appointment.objects.filter(
-            doctor=request.user
-        ).values_list('patient', flat=True).distinct()
-
-        patients = User.objects.filter(id__in=patient_ids)
+        # Patients with an appointment, their last visit and latest shared diagnosis in one query
+        appointments = Appointment.objects.filter(doctor=request.user)
+        last_visit = appointments.filter(patient=OuterRef('pk')).order_by('-date').values('date')[:1]
+        latest_condition = SharedReport.objects.filter(
+            doctor=request.user, report__user=OuterRef('pk')
+        ).order_by('-shared_at').values('report__disease_name')[:1]
+
+        patients = User.objects.filter(
+            id__in=appointments.values('patient')
+        ).select_related('profile').annotate(
+            last_visit=Subquery(last_visit), condition=Subquery(latest_condition)
+        )
         
         data = []
         for patient in patients:
-            # Get last appointment with this doctor
-            last_appt = Appointment.objects.filter(
-                doctor=request.user, patient=patient
-            ).order_by('-date').first()
-            
-            # Get latest shared report diagnosis
-            latest_shared = SharedReport.objects.filter(
-                doctor=request.user, report__user=patient
-            ).select_related('report').order_by('-shared_at').first()
-            
             # Get profile data (gender is stored on UserProfile, not User)
             profile = getattr(patient, 'profile', None)
             first_name = getattr(profile, 'first_name', '') or patient.first_name or ''
@@ -400,8 +409,8 @@ class DoctorPatientsView(APIView):
                 'name': f"{first_name} {last_name}".strip() or patient.email,
                 'email': patient.email,
                 'gender': gender,
-                'last_visit': last_appt.date.strftime('%b %d, %Y') if last_appt else 'N/A',
-                'condition': latest_shared.report.disease_name if latest_shared else 'N/A',
+                'last_visit': patient.last_visit.strftime('%b %d, %Y') if patient.last_visit else 'N/A',
+                'condition': patient.condition or 'N/A',
             })
 
         return Response({'status': 'success', 'data': data})
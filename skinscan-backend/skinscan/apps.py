@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class SkinscanConfig(AppConfig):
+    """Project-level models shared by the apps (cross-process leases)."""
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'skinscan'
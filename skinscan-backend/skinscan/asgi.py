@@ -1,5 +1,11 @@
 """
 ASGI config for SkinScan AI project.
+
+Required for the async LLM endpoints (chat/message-async,
+predict/generate-treatment-async), for chat/message-stream to send tokens
+as they arrive rather than all at once, and for predict/treatment-plan to
+honour ?wait=, e.g.:
+    gunicorn skinscan.asgi:application -k uvicorn.workers.UvicornWorker
 """
 import os
 from django.core.asgi import get_asgi_application
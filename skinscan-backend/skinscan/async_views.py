@@ -0,0 +1,69 @@
+"""
+Base class for async API views served by skinscan/asgi.py.
+
+DRF's APIView only runs synchronous handlers, so views that spend most of
+their time waiting on an LLM are plain Django async views instead. This base
+class reproduces the parts of DRF they rely on: JWT authentication (the same
+JWTAuthentication class, run off the event loop), a parsed `request.data` and
+the {'status': 'error', 'message', 'error_code'} error format of
+skinscan.utils.custom_exception_handler.
+
+Under WSGI these views still work (Django runs them in a one-off event loop),
+but they only free the worker while waiting when served through ASGI, e.g.
+    gunicorn skinscan.asgi:application -k uvicorn.workers.UvicornWorker
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+
+from authentication.jwt_auth import JWTAuthentication
+
+
+def api_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False)
+
+
+def api_error(message, error_code, status):
+    return api_response({'status': 'error', 'message': message, 'error_code': error_code}, status=status)
+
+
+class AsyncAPIView(View):
+    """Authenticated async view; subclasses implement `async def post/get(self, request)`."""
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated API, same as DRF's APIView
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as e:
+            return api_error(str(e.detail), 'authentication_failed', 401)
+        if not auth:
+            return api_error('Authentication credentials were not provided.', 'not_authenticated', 401)
+        request.user, request.auth = auth
+
+        try:
+            request.data = self._parse_body(request)
+        except ValueError:
+            return api_error('JSON parse error', 'parse_error', 400)
+
+        response = super().dispatch(request, *args, **kwargs)
+        return await response if hasattr(response, '__await__') else response
+
+    @staticmethod
+    def _parse_body(request):
+        if request.method in ('GET', 'HEAD', 'OPTIONS', 'DELETE') or not request.body:
+            return {}
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+            if not isinstance(data, dict):
+                raise ValueError('Expected a JSON object')
+            return data
+        return request.POST.dict()
@@ -0,0 +1,43 @@
+"""
+Cross-process leases on the Lease table.
+
+A lease is a mutex that every worker process sees, for code that must not rely
+on the cache backend's add() being atomic (it is not with FileBasedCache). The
+unique key makes acquiring it a single INSERT; a holder that died or hung is
+taken over once its lease expires, so a lease is never held forever.
+"""
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Lease
+
+
+def acquire_lease(key, owner, seconds) -> bool:
+    """Take `key` for `seconds` unless a live lease holds it. An expired lease is taken over."""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=seconds)
+    try:
+        with transaction.atomic():
+            Lease.objects.create(key=key, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        pass
+    return Lease.objects.filter(key=key, expires_at__lte=now).update(owner=owner, expires_at=expires_at) == 1
+
+
+def release_lease(key, owner=None):
+    """End a lease early; owner=None releases it whoever holds it."""
+    leases = Lease.objects.filter(key=key)
+    if owner is not None:
+        leases = leases.filter(owner=owner)
+    leases.delete()
+
+
+def new_owner() -> str:
+    """Unique lease owner id for this call (host:pid:random)."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'[-100:]
@@ -0,0 +1,216 @@
+"""
+Shared HTTP client for the LLM providers (Gemini, NVIDIA LLaMA).
+
+Every LLM call in the treatment generator and the chatbot goes through post():
+
+- one pooled keep-alive requests.Session per provider and process, so TLS
+  connections to the provider are reused instead of opened per call
+- at most LLM_POOL_SIZE connections per provider and process
+- (LLM_CONNECT_TIMEOUT, read timeout) on every call
+- retries with exponential backoff and full jitter on failures that are safe
+  to repeat: connection errors (including connect timeouts) and 429 / 502 /
+  503 / 504 answers. Generation calls have no side effects, but a read timeout
+  is never retried because the provider may still be working on it.
+- the provider's circuit breaker (skinscan/provider_health.py) is checked
+  before the call and told the final outcome
+
+apost() is the asyncio equivalent for the ASGI views: one httpx.AsyncClient per
+provider and event loop, with LLM_ASYNC_POOL_SIZE connections so a single
+process can keep hundreds of LLM calls in flight.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Optional
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .provider_health import get_breaker
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_URLS = {
+    'gemini': 'https://generativelanguage.googleapis.com',
+    'llama': 'https://integrate.api.nvidia.com',
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {provider: AsyncClient}
+
+
+class ProviderUnavailable(Exception):
+    """The provider's circuit is open; the caller should move on without waiting."""
+
+
+def get_session(provider: str) -> requests.Session:
+    """Pooled session for `provider`, created once per process (sessions are not shared across fork)."""
+    key = (provider, os.getpid())
+    session = _sessions.get(key)
+    if session:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            pool_size = getattr(settings, 'LLM_POOL_SIZE', 10)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session = requests.Session()
+            session.mount(PROVIDER_URLS.get(provider, 'https://'), adapter)
+            session.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+            _sessions[key] = session
+    return session
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform(0, base * 2^attempt)."""
+    return random.uniform(0, getattr(settings, 'LLM_RETRY_BACKOFF', 0.5) * (2 ** attempt))
+
+
+def post(provider: str, url: str, payload: dict, headers: Optional[dict] = None,
+         timeout: float = 15, retries: Optional[int] = None, stream: bool = False) -> requests.Response:
+    """
+    POST to an LLM provider. Returns the final response (any status) or raises
+    ProviderUnavailable / requests.RequestException. `timeout` is the read
+    timeout and also bounds the total time spent on retries.
+    """
+    breaker = get_breaker(provider)
+    ticket = breaker.allow_request()
+    if not ticket:
+        raise ProviderUnavailable(f'{provider} circuit is open')
+
+    session = get_session(provider)
+    retries = getattr(settings, 'LLM_MAX_RETRIES', 2) if retries is None else retries
+    connect_timeout = getattr(settings, 'LLM_CONNECT_TIMEOUT', 5.0)
+    deadline = time.monotonic() + timeout
+    started = time.monotonic()
+    attempt = 0
+
+    while True:
+        remaining = max(deadline - time.monotonic(), 0.1)
+        try:
+            response = session.post(
+                url, json=payload, headers=headers,
+                timeout=(min(connect_timeout, remaining), remaining),
+                stream=stream
+            )
+        except requests.ConnectionError as e:
+            # ConnectTimeout is a ConnectionError; ReadTimeout is not and is never retried
+            if attempt < retries and _sleep_before_retry(provider, attempt, deadline, str(e)):
+                attempt += 1
+                continue
+            breaker.record_failure(time.monotonic() - started, str(e), ticket)
+            raise
+        except requests.RequestException as e:
+            breaker.record_failure(time.monotonic() - started, str(e), ticket)
+            raise
+
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            if _sleep_before_retry(provider, attempt, deadline, f'HTTP {response.status_code}'):
+                response.close()
+                attempt += 1
+                continue
+
+        breaker.record_response(response.status_code, time.monotonic() - started, ticket)
+        return response
+
+
+def _sleep_before_retry(provider, attempt, deadline, reason) -> bool:
+    delay = _backoff(attempt)
+    if time.monotonic() + delay >= deadline:
+        return False
+    logger.info(f"[LLM] {provider} retry {attempt + 1} in {delay:.2f}s after {reason}")
+    time.sleep(delay)
+    return True
+
+
+# ============================================
+# ASYNC CLIENT (ASGI views)
+# ============================================
+def get_async_client(provider: str) -> httpx.AsyncClient:
+    """Pooled AsyncClient for `provider` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(provider)
+    if client is None or client.is_closed:
+        pool_size = getattr(settings, 'LLM_ASYNC_POOL_SIZE', 200)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            headers={'Content-Type': 'application/json'},
+        )
+        clients[provider] = client
+    return client
+
+
+async def apost(provider: str, url: str, payload: dict, headers: Optional[dict] = None,
+                timeout: float = 15, retries: Optional[int] = None, stream: bool = False) -> httpx.Response:
+    """
+    Async post(): same retry policy and breaker bookkeeping, raises httpx.HTTPError.
+    With stream=True the body is left unread; the caller reads it with
+    aiter_lines() and must `await response.aclose()`.
+    """
+    breaker = get_breaker(provider)
+    # Breaker state lives in the cache backend, which may do blocking I/O
+    ticket = await sync_to_async(breaker.allow_request, thread_sensitive=False)()
+    if not ticket:
+        raise ProviderUnavailable(f'{provider} circuit is open')
+
+    client = get_async_client(provider)
+    retries = getattr(settings, 'LLM_MAX_RETRIES', 2) if retries is None else retries
+    connect_timeout = getattr(settings, 'LLM_CONNECT_TIMEOUT', 5.0)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    started = loop.time()
+    attempt = 0
+
+    try:
+        while True:
+            remaining = max(deadline - loop.time(), 0.1)
+            try:
+                request = client.build_request(
+                    'POST', url, json=payload, headers=headers,
+                    timeout=httpx.Timeout(remaining, connect=min(connect_timeout, remaining))
+                )
+                response = await client.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if attempt < retries and await _asleep_before_retry(provider, attempt, deadline, str(e)):
+                    attempt += 1
+                    continue
+                await sync_to_async(breaker.record_failure, thread_sensitive=False)(loop.time() - started, str(e), ticket)
+                raise
+            except httpx.HTTPError as e:
+                await sync_to_async(breaker.record_failure, thread_sensitive=False)(loop.time() - started, str(e), ticket)
+                raise
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                if await _asleep_before_retry(provider, attempt, deadline, f'HTTP {response.status_code}'):
+                    await response.aclose()
+                    attempt += 1
+                    continue
+
+            await sync_to_async(breaker.record_response, thread_sensitive=False)(
+                response.status_code, loop.time() - started, ticket
+            )
+            return response
+    except asyncio.CancelledError:
+        # A hedge cancelled this call: a half-open probe must not stay claimed until it expires
+        await asyncio.shield(sync_to_async(breaker.abandon, thread_sensitive=False)(ticket))
+        raise
+
+
+async def _asleep_before_retry(provider, attempt, deadline, reason) -> bool:
+    loop = asyncio.get_running_loop()
+    delay = _backoff(attempt)
+    if loop.time() + delay >= deadline:
+        return False
+    logger.info(f"[LLM] {provider} retry {attempt + 1} in {delay:.2f}s after {reason}")
+    await asyncio.sleep(delay)
+    return True
@@ -0,0 +1,52 @@
+"""
+Path-aware versions of the session, CSRF, auth and messages middleware.
+
+The API under API_PATH_PREFIX authenticates with a Bearer JWT
+(authentication/jwt_auth.py) and never uses the session, the CSRF cookie or
+the messages framework: DRF views are csrf-exempt and DRF sets request.user
+itself, as does AsyncAPIView. Each class below is the Django middleware of the
+same name, except that requests to the API go straight through it (including
+process_view, where CSRF is checked). The Django admin and the HTML pages get
+the full behaviour.
+
+Being subclasses, they still satisfy the admin's system checks for
+SessionMiddleware / AuthenticationMiddleware / MessageMiddleware.
+"""
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import csrf
+
+
+def web_only(middleware_class):
+    """`middleware_class`, skipped for requests to the API."""
+
+    class WebOnly(middleware_class):
+        wrapped = middleware_class
+
+        def __init__(self, get_response):
+            super().__init__(get_response)
+            self.api_prefix = settings.API_PATH_PREFIX
+
+        def __call__(self, request):
+            if request.path_info.startswith(self.api_prefix):
+                # Sync or async alike: the next handler's result is passed up as-is
+                return self.get_response(request)
+            return super().__call__(request)
+
+        if hasattr(middleware_class, 'process_view'):
+            def process_view(self, request, callback, callback_args, callback_kwargs):
+                if request.path_info.startswith(self.api_prefix):
+                    return None
+                return super().process_view(request, callback, callback_args, callback_kwargs)
+
+    WebOnly.__name__ = WebOnly.__qualname__ = middleware_class.__name__
+    WebOnly.__module__ = __name__
+    return WebOnly
+
+
+SessionMiddleware = web_only(sessions_middleware.SessionMiddleware)
+CsrfViewMiddleware = web_only(csrf.CsrfViewMiddleware)
+AuthenticationMiddleware = web_only(auth_middleware.AuthenticationMiddleware)
+MessageMiddleware = web_only(messages_middleware.MessageMiddleware)
@@ -0,0 +1,20 @@
+"""
+Project-level models used by more than one app.
+"""
+from django.db import models
+
+
+class Lease(models.Model):
+    """
+    Cross-process mutex held until `expires_at` (see skinscan/leases.py):
+    the circuit-breaker probe, conversation-summary folds.
+    """
+    key = models.CharField(max_length=200, unique=True)
+    owner = models.CharField(max_length=100)  # host:pid:random of the holder
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'leases'
+
+    def __str__(self):
+        return f"{self.key} ({self.owner})"
@@ -0,0 +1,76 @@
+"""
+Keyset pagination shared by the list endpoints (chat history, admin listings).
+
+Pages are fetched newest first with an opaque cursor encoding the
+(timestamp, id) of the last row returned, so page N costs the same as page 1
+(no OFFSET). Rows may be model instances or values() dicts.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db import connections
+from django.db.models import Q
+
+MAX_PAGE_SIZE = 100
+EXACT_COUNT_BELOW = 10000  # Planner estimates under this are replaced by a real COUNT
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f'{timestamp.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def page_size(value, default=50) -> int:
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(queryset, field, cursor, limit):
+    """Rows strictly older than the cursor, newest first, plus the next cursor (or None)."""
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': row_id}))
+    rows = list(queryset.order_by(f'-{field}', '-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last[field], last['id']) if isinstance(last, dict) else encode_cursor(getattr(last, field), last.id)
+    return rows, next_cursor
+
+
+def estimate_count(queryset):
+    """
+    (count, is_estimate). On PostgreSQL large results use the planner's row
+    estimate (EXPLAIN, no scan); small ones and other backends are counted.
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= EXACT_COUNT_BELOW:
+            return estimate, True
+    return queryset.count(), False
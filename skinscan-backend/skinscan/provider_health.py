@@ -0,0 +1,206 @@
+"""
+Circuit breakers for external LLM providers (Gemini, NVIDIA LLaMA).
+
+Each provider has one breaker whose state lives in the shared Django cache, so
+every worker process sees the same state:
+
+- CLOSED: calls go through. Outcomes from the last PROVIDER_WINDOW_SECONDS are
+  kept; once PROVIDER_MIN_CALLS are recorded the breaker opens if the error
+  rate (exceptions, timeouts, 429, 5xx) or the share of calls slower than
+  PROVIDER_SLOW_CALL_SECONDS crosses its threshold.
+- OPEN: calls are refused immediately until open_until. Each consecutive
+  opening doubles the wait (PROVIDER_OPEN_SECONDS .. PROVIDER_MAX_OPEN_SECONDS).
+- HALF_OPEN: after the wait one probe call is let through. Success closes the
+  breaker; failure opens it again with a longer wait.
+
+The probe is guarded by a lease (skinscan/leases.py), so exactly one worker
+probes even with a cache backend whose add() is not atomic (FileBasedCache).
+The probe gets a token from allow_request(); in HALF_OPEN only the outcome
+carrying that token decides, so late outcomes of calls admitted before the
+breaker opened can't close or reopen it. A probe whose call is cancelled
+before it finishes is given up with abandon(), so the next call can probe.
+
+Other updates are read-modify-write on one cache key; a lost update under
+heavy concurrency only drops a sample from the window.
+"""
+import logging
+import time
+from typing import Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from .leases import acquire_lease, new_owner, release_lease
+from .utils import percentile
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'CLOSED', 'OPEN', 'HALF_OPEN'
+PROVIDERS = ('gemini', 'llama')
+STATE_TTL = 24 * 3600  # Idle breakers are forgotten (= closed) after a day
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_failure_status(status_code: int) -> bool:
+    """Responses that mean the provider is unhealthy (other 4xx are the caller's fault)."""
+    return status_code == 429 or status_code >= 500
+
+
+class CircuitBreaker:
+    """Cache-backed breaker for one provider. Cheap to construct; holds no local state."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.key = f'provider_health:{name}'
+        self.probe_key = f'provider_health:{name}:probe'
+
+    def _load(self) -> Dict:
+        return cache.get(self.key) or {'state': CLOSED, 'open_until': 0, 'opened': 0, 'window': []}
+
+    def _save(self, data: Dict):
+        cache.set(self.key, data, STATE_TTL)
+
+    # ----------------------------------------
+    # Call gating
+    # ----------------------------------------
+    def allow_request(self):
+        """
+        False if the caller should skip this provider right now. Otherwise a
+        ticket to pass to record_*(): True, or a probe token when this call is
+        the half-open probe.
+        """
+        data = self._load()
+        now = time.time()
+        if data['state'] == CLOSED:
+            return True
+        if now < data['open_until'] or now < data.get('probe_until', 0):
+            return False
+
+        # Wait is over: exactly one worker gets to send the probe
+        token = new_owner()
+        timeout = _setting('PROVIDER_PROBE_TIMEOUT', 30)
+        try:
+            if not acquire_lease(self.probe_key, token, timeout):
+                return False
+        except DatabaseError as e:
+            logger.warning(f"[BREAKER] {self.name} probe lease unavailable, staying open: {e}")
+            return False
+        data.update({'state': HALF_OPEN, 'probe': token, 'probe_until': now + timeout})
+        self._save(data)
+        logger.info(f"[BREAKER] {self.name} half-open, sending probe")
+        return token
+
+    # ----------------------------------------
+    # Outcome recording
+    # ----------------------------------------
+    def record_success(self, latency: float, ticket=True):
+        self._record(True, latency, ticket=ticket)
+
+    def record_failure(self, latency: float = 0.0, reason: str = '', ticket=True):
+        self._record(False, latency, reason, ticket)
+
+    def record_response(self, status_code: int, latency: float, ticket=True):
+        if is_failure_status(status_code):
+            self.record_failure(latency, f'HTTP {status_code}', ticket)
+        else:
+            self.record_success(latency, ticket)
+
+    def abandon(self, ticket):
+        """The call was cancelled before it finished: free the probe without judging the provider."""
+        if ticket is True:
+            return
+        data = self._load()
+        if data['state'] == HALF_OPEN and data.get('probe') == ticket:
+            data.update({'probe': None, 'probe_until': 0})
+            self._save(data)
+        self._release_probe(ticket)
+
+    def _record(self, ok: bool, latency: float, reason: str = '', ticket=True):
+        now = time.time()
+        data = self._load()
+        horizon = now - _setting('PROVIDER_WINDOW_SECONDS', 60)
+        window = [entry for entry in data['window'] if entry[0] >= horizon]
+        window.append([now, ok, round(latency, 3)])
+        data['window'] = window[-200:]
+
+        if data['state'] == HALF_OPEN and ticket is not True and ticket == data.get('probe'):
+            self._release_probe(ticket)
+            data.update({'probe': None, 'probe_until': 0})
+            if ok and latency < _setting('PROVIDER_SLOW_CALL_SECONDS', 10.0):
+                self._close(data)
+            else:
+                self._open(data, reason or 'probe too slow')
+        elif data['state'] == CLOSED:
+            verdict = self._evaluate(window)
+            if verdict:
+                self._open(data, verdict)
+        self._save(data)
+
+    def _evaluate(self, window):
+        if len(window) < _setting('PROVIDER_MIN_CALLS', 5):
+            return None
+        failures = sum(1 for _, ok, _ in window if not ok)
+        slow = sum(1 for _, ok, latency in window if ok and latency >= _setting('PROVIDER_SLOW_CALL_SECONDS', 10.0))
+        if failures / len(window) >= _setting('PROVIDER_ERROR_RATE', 0.5):
+            return f'error rate {failures}/{len(window)}'
+        if slow / len(window) >= _setting('PROVIDER_SLOW_CALL_RATE', 0.5):
+            return f'slow calls {slow}/{len(window)}'
+        return None
+
+    def _open(self, data, reason):
+        data['opened'] += 1
+        wait = min(
+            _setting('PROVIDER_OPEN_SECONDS', 5.0) * (2 ** (data['opened'] - 1)),
+            _setting('PROVIDER_MAX_OPEN_SECONDS', 300.0)
+        )
+        data['state'] = OPEN
+        data['open_until'] = time.time() + wait
+        data['reason'] = reason
+        logger.warning(f"[BREAKER] {self.name} opened for {wait:.0f}s: {reason}")
+
+    def _close(self, data):
+        data.update({'state': CLOSED, 'open_until': 0, 'opened': 0, 'window': [], 'reason': ''})
+        logger.info(f"[BREAKER] {self.name} closed")
+
+    # ----------------------------------------
+    # Admin
+    # ----------------------------------------
+    def _release_probe(self, token=None):
+        try:
+            release_lease(self.probe_key, token)
+        except DatabaseError as e:
+            logger.warning(f"[BREAKER] {self.name} probe lease not released (expires by itself): {e}")
+
+    def reset(self):
+        cache.delete(self.key)
+        self._release_probe()
+
+    def status(self) -> Dict:
+        data = self._load()
+        horizon = time.time() - _setting('PROVIDER_WINDOW_SECONDS', 60)
+        window = [entry for entry in data['window'] if entry[0] >= horizon]
+        state = data['state']
+        if state == OPEN and time.time() >= data['open_until']:
+            state = HALF_OPEN  # Next call will probe
+        return {
+            'provider': self.name,
+            'state': state,
+            'reason': data.get('reason', ''),
+            'retry_in_s': max(round(data['open_until'] - time.time(), 1), 0) if state == OPEN else 0,
+            'consecutive_opens': data['opened'],
+            'window_calls': len(window),
+            'window_failures': sum(1 for _, ok, _ in window if not ok),
+            'window_p90_latency_s': percentile([latency for _, ok, latency in window if ok], 90),
+        }
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(name)
+
+
+def breaker_states() -> Dict:
+    return {name: get_breaker(name).status() for name in PROVIDERS}
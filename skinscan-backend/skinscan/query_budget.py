@@ -0,0 +1,86 @@
+"""
+Query-count budgets for API views (used by skinscan/test_query_budgets.py).
+
+QueryRecorder wraps the DB connection and keeps, for every query, the code
+that triggered it: the lazy relation that was loaded (e.g.
+`PredictionResult.image`) and the first frame in project code
+(`prediction/views_doctor.py:326  'image_url': item.report.image.image_url`).
+report() groups repeated statements, so an N+1 shows up as one line with its
+count and the attribute access that causes it.
+"""
+import linecache
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+DESCRIPTORS = os.path.join('django', 'db', 'models', 'fields', 'related_descriptors.py')
+SKIP = ('site-packages', os.sep + 'query_budget.py', os.sep + 'test_')
+
+
+def _relation(descriptor) -> str:
+    field = getattr(descriptor, 'field', None)
+    if field is not None and not hasattr(descriptor, 'rel'):
+        return f'{field.model.__name__}.{field.name}'
+    related = getattr(descriptor, 'related', None) or getattr(descriptor, 'rel', None)
+    if related is not None:
+        return f'{related.model.__name__}.{related.get_accessor_name()}'
+    return type(descriptor).__name__
+
+
+def _origin():
+    """(lazy relation or None, 'file:line  source') of the code issuing the current query."""
+    relation, location = None, None
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if relation is None and filename.endswith(DESCRIPTORS) and 'self' in frame.f_locals:
+            relation = _relation(frame.f_locals['self'])
+        elif filename.startswith(PROJECT_ROOT) and not any(part in filename for part in SKIP):
+            source = linecache.getline(filename, frame.f_lineno).strip()
+            location = f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno}  {source}'
+            break
+        frame = frame.f_back
+    return relation, location
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []  # (sql, relation, location)
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        relation, location = _origin()
+        self.queries.append((sql, relation, location))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def report(self) -> str:
+        counts = Counter(sql for sql, _, _ in self.queries)
+        origins = defaultdict(Counter)
+        for sql, relation, location in self.queries:
+            origins[sql][(relation, location)] += 1
+
+        lines = [f'{len(self.queries)} queries in {self.elapsed * 1000:.0f} ms']
+        for sql, count in counts.most_common():
+            lines.append(f'  {count:4d} x {sql[:160]}')
+            for (relation, location), hits in origins[sql].most_common(3):
+                via = f'lazy load of {relation} ' if relation else ''
+                lines.append(f'         {via}at {location or "<outside project code>"}' + (f' ({hits}x)' if count > 1 else ''))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries():
+    recorder = QueryRecorder()
+    started = time.perf_counter()
+    with connection.execute_wrapper(recorder):
+        yield recorder
+    recorder.elapsed = time.perf_counter() - started
@@ -0,0 +1,40 @@
+"""
+JSON renderer for the API: DRF's JSONRenderer output, encoded with orjson.
+
+orjson is an optional dependency. Without it, or for anything it can't encode
+identically (indented output, integers beyond 64 bits, unusual types), the
+standard JSONRenderer is used. Dates, times and other non-JSON types are
+passed to DRF's encoder, so they are formatted exactly as before. The one
+known difference is notation for floats below 1e-4 or from 1e16 up (0.00001
+instead of 1e-05); the value is the same.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    _default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not ORJSON_AVAILABLE or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=OPTIONS)
+        except (TypeError, ValueError):
+            # orjson.JSONEncodeError is a TypeError; ValueError comes from DRF's encoder
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same strict-JavaScript escaping as JSONRenderer
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
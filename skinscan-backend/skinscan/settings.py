@@ -55,6 +55,7 @@ INSTALLED_APPS = [
     'prediction',
     'chatbot',
     'admin_module',
+    'skinscan',  # Shared models (skinscan/leases.py)
 ]
 
 # Silencing warnings for development
@@ -63,14 +64,17 @@ SILENCED_SYSTEM_CHECKS = ['django_ratelimit.E003', 'django_ratelimit.W001']
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be at top
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'skinscan.middleware.SessionMiddleware',  # Session/CSRF/auth/messages skip API_PATH_PREFIX
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'skinscan.middleware.CsrfViewMiddleware',
+    'skinscan.middleware.AuthenticationMiddleware',
+    'skinscan.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# LEAN API MIDDLEWARE (see skinscan/middleware.py)
+API_PATH_PREFIX = '/api/'  # JWT-only routes: no session, CSRF cookie or messages
+
 ROOT_URLCONF = 'skinscan.urls'
 
 TEMPLATES = [
@@ -149,13 +153,25 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'skinscan.renderers.FastJSONRenderer',  # orjson when installed (see skinscan/renderers.py)
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'EXCEPTION_HANDLER': 'skinscan.utils.custom_exception_handler',
 }
 
 # JWT SETTINGS
 JWT_SECRET_KEY = config('JWT_SECRET_KEY', default=SECRET_KEY)
 JWT_ALGORITHM = 'HS256'
-JWT_EXPIRATION_DELTA = timedelta(hours=2)  # Reduced from 24h for security
+JWT_EXPIRATION_DELTA = timedelta(minutes=config('JWT_ACCESS_MINUTES', default=15, cast=int))  # Access tokens; renewed via the refresh token
+JWT_REFRESH_EXPIRATION_DELTA = timedelta(days=config('JWT_REFRESH_DAYS', default=14, cast=int))
+TOKEN_REVOCATION_CAPACITY = 10000  # Revocation bloom filter size (see authentication/tokens.py)
+
+# PASSWORD HASHING POOL (see authentication/password_pool.py)
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)  # 0 = hash on the request thread
+PASSWORD_HASH_MAX_PENDING = config('PASSWORD_HASH_MAX_PENDING', default=16, cast=int)  # Per web process
+PASSWORD_HASH_QUEUE_TIMEOUT = 5.0  # Seconds to wait for a slot before answering 503
+IMPORT_HASH_WORKERS = config('IMPORT_HASH_WORKERS', default=1, cast=int)  # Admin user imports get their own pool; 0 = hash in the job thread
 
 # EMAIL SETTINGS (for OTP)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -176,6 +192,8 @@ IMAGE_MIN_RESOLUTION = (50, 50)
 
 # CNN MODEL SETTINGS
 MODEL_PATH = BASE_DIR / 'ml_models' / 'skinscan1.pth'
+# Candidate checkpoints (shadow, canary, rescore_scans) are not committed; mount them here (see prediction/cnn_inference.checkpoint_path)
+CANDIDATE_MODEL_DIR = config('CANDIDATE_MODEL_DIR', default=str(BASE_DIR / 'ml_models'))
 DISEASE_CLASSES = [
     'Eczema',
     'Warts Molluscum',
@@ -189,6 +207,69 @@ DISEASE_CLASSES = [
     'Tinea Ringworm Candidiasis',
 ]
 
+# SHADOW MODEL EVALUATION (see prediction/shadow.py)
+SHADOW_CPU_THREADS = config('SHADOW_CPU_THREADS', default=1, cast=int)  # Torch threads in the shadow worker
+SHADOW_CPU_BUDGET = config('SHADOW_CPU_BUDGET', default=0.25, cast=float)  # Max busy fraction of those threads
+SHADOW_QUEUE_SIZE = 64  # Mirrored uploads waiting beyond this are dropped
+SHADOW_BATCH_SIZE = 8
+SHADOW_BATCH_WAIT = 2.0  # Seconds to wait for a batch to fill
+
+# LLM HTTP CLIENT (see skinscan/llm_client.py)
+LLM_POOL_SIZE = config('LLM_POOL_SIZE', default=10, cast=int)  # Keep-alive connections per provider and process
+LLM_ASYNC_POOL_SIZE = config('LLM_ASYNC_POOL_SIZE', default=200, cast=int)  # Per provider and event loop (ASGI)
+LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', default=5.0, cast=float)
+LLM_MAX_RETRIES = config('LLM_MAX_RETRIES', default=2, cast=int)
+LLM_RETRY_BACKOFF = 0.5  # Seconds; full jitter over base * 2^attempt
+
+# LLM PROVIDER HEDGING (see prediction/treatment_generator.py)
+LLM_DEADLINE = config('LLM_DEADLINE', default=20.0, cast=float)  # Overall seconds before the static fallback
+LLM_HEDGE_DELAY = config('LLM_HEDGE_DELAY', default=0.0, cast=float)  # 0 = preferred provider's observed p90
+LLM_HEDGE_DEFAULT_DELAY = 5.0  # Used until LLM_HEDGE_MIN_SAMPLES latencies have been observed
+LLM_HEDGE_MIN_SAMPLES = 20
+
+# SHARED CACHE (cross-process state such as provider circuit breakers)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# LLM PROVIDER CIRCUIT BREAKERS (see skinscan/provider_health.py)
+PROVIDER_WINDOW_SECONDS = 60  # Outcomes considered when deciding to open
+PROVIDER_MIN_CALLS = 5
+PROVIDER_ERROR_RATE = 0.5  # Open when this share of calls fail (timeouts, 429, 5xx)
+PROVIDER_SLOW_CALL_SECONDS = config('PROVIDER_SLOW_CALL_SECONDS', default=10.0, cast=float)
+PROVIDER_SLOW_CALL_RATE = 0.5  # ... or this share of calls are slower than the limit above
+PROVIDER_OPEN_SECONDS = 5.0  # First open period, doubled on each consecutive failed probe
+PROVIDER_MAX_OPEN_SECONDS = 300.0
+PROVIDER_PROBE_TIMEOUT = 30  # Seconds before a lost half-open probe lock expires
+
+# TREATMENT PLAN CACHE (see prediction/treatment_cache.py)
+TREATMENT_CACHE_TTL = config('TREATMENT_CACHE_TTL', default=7 * 24 * 3600, cast=int)  # Seconds
+
+# CHATBOT FAQ CACHE (see chatbot/faq_cache.py)
+CHAT_FAQ_SIMILARITY = config('CHAT_FAQ_SIMILARITY', default=0.8, cast=float)  # TF-IDF cosine needed for a hit
+CHAT_FAQ_TTL = config('CHAT_FAQ_TTL', default=3 * 24 * 3600, cast=int)  # Seconds
+CHAT_FAQ_MAX_ENTRIES = 5000
+
+# CHATBOT CONVERSATION MEMORY (see chatbot/memory.py)
+CHAT_MEMORY_TOKEN_BUDGET = config('CHAT_MEMORY_TOKEN_BUDGET', default=1200, cast=int)  # Recent turns sent verbatim
+CHAT_MEMORY_SUMMARY_TOKENS = config('CHAT_MEMORY_SUMMARY_TOKENS', default=250, cast=int)  # Summary of older turns
+
+# CHATBOT KNOWLEDGE BASE (see chatbot/retrieval.py)
+CHAT_KB_DIRECT_ANSWERS = config('CHAT_KB_DIRECT_ANSWERS', default=True, cast=bool)  # Answer curated questions without Gemini
+CHAT_KB_TOP_K = 3  # Curated passages added to the Gemini prompt
+
+# AUTH PRINCIPAL CACHE (see authentication/principal_cache.py)
+AUTH_PRINCIPAL_TTL = config('AUTH_PRINCIPAL_TTL', default=60, cast=int)  # Seconds; bounds staleness of out-of-band user edits
+
+# NOTIFICATION PUSH CHANNEL (see authentication/notifications.py)
+NOTIFICATION_STREAM_SECONDS = config('NOTIFICATION_STREAM_SECONDS', default=300, cast=int)  # Per connection under ASGI
+NOTIFICATION_SHORT_POLL_SECONDS = config('NOTIFICATION_SHORT_POLL_SECONDS', default=15, cast=int)  # Client poll interval under WSGI (no stream)
+NOTIFICATION_POLL_INTERVAL = 1.0  # Seconds between checks of the user's change marker in the cache
+
 # GOOGLE CLOUD STORAGE (for production)
 USE_GCS = config('USE_GCS', default=False, cast=bool)
 GCS_BUCKET_NAME = config('GCS_BUCKET_NAME', default='skinscan-images')
@@ -0,0 +1,124 @@
+"""
+Query-count and wall-time budgets for the list / dashboard API views.
+
+Every endpoint is called after seeding SMALL rows of everything it lists,
+then again after seeding LARGE rows, with a cold cache both times. The query
+count must stay within the endpoint's budget and must not grow with the data. A failure prints the recorder report
+(skinscan/query_budget.py), which names the attribute access behind each
+repeated query.
+
+    python manage.py test skinscan.test_query_budgets
+"""
+import datetime
+import uuid
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from authentication.models import DoctorDocument, DoctorProfile, Notification, User, UserProfile
+from chatbot import sessions
+from prediction.models import Appointment, PredictionResult, ScanHistory, SharedReport, SkinImage
+
+from .query_budget import record_queries
+
+SMALL, LARGE = 2, 25
+MAX_SECONDS = 1.0  # Per request at LARGE volume
+
+# (method, url, who calls it, max queries)
+BUDGETS = [
+    ('get', '/api/auth/profile', 'patient', 3),
+    ('get', '/api/auth/notifications', 'patient', 3),
+    ('get', '/api/predict/history', 'patient', 2),
+    ('get', '/api/predict/scan-history', 'patient', 2),
+    ('get', '/api/predict/doctors', 'patient', 2),
+    ('get', '/api/predict/appointments/my', 'patient', 2),
+    ('get', '/api/predict/appointments/my?role=doctor', 'doctor', 2),
+    ('get', '/api/predict/documents', 'patient', 2),
+    ('get', '/api/predict/doctor/stats', 'doctor', 12),
+    ('get', '/api/predict/doctor/patients', 'doctor', 2),
+    ('get', '/api/predict/reports/shared', 'doctor', 2),
+    ('get', '/api/chat/sessions', 'patient', 2),
+    ('get', '/api/chat/history', 'patient', 3),
+    ('get', '/api/admin/users/', 'admin', 3),
+    ('get', '/api/admin/doctors/', 'admin', 3),
+    ('get', '/api/admin/reports/', 'admin', 2),
+    ('get', '/api/admin/content/', 'admin', 2),
+]
+
+
+def _user(email, **fields):
+    user = User.objects.create(email=email, account_status='ACTIVE', **fields)
+    UserProfile.objects.create(user=user, first_name='Test', last_name=email.split('@')[0], gender='F')
+    return user
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-budgets'}},
+    PASSWORD_HASH_WORKERS=0,
+)
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            'patient': _user('patient@budget.test'),
+            'doctor': _user('doctor@budget.test', is_doctor=True),
+            'admin': _user('admin@budget.test', is_admin=True),
+        }
+        DoctorProfile.objects.create(user=cls.users['doctor'], medical_license_number='BUDGET-0', is_verified=True)
+        cls.seeded = 0
+
+    def seed(self, upto):
+        """Add rows until every listing has `upto` entries."""
+        patient, doctor = self.users['patient'], self.users['doctor']
+        for i in range(self.seeded, upto):
+            other = _user(f'patient{i}@budget.test')
+            other_doctor = _user(f'doctor{i}@budget.test', is_doctor=True)
+            DoctorProfile.objects.create(user=other_doctor, medical_license_number=f'BUDGET-{i + 1}', is_verified=True)
+
+            image = SkinImage.objects.create(user=patient, image_url=f'https://img/{i}.jpg', original_filename=f'{i}.jpg', file_size=1)
+            result = PredictionResult.objects.create(user=patient, image=image, disease_name='Eczema', confidence_score=90, recommendation='-')
+            ScanHistory.objects.create(user=patient, image=image, result=result, title=f'Scan {i}')
+
+            other_image = SkinImage.objects.create(user=other, image_url=f'https://img/o{i}.jpg', original_filename='o.jpg', file_size=1)
+            other_result = PredictionResult.objects.create(user=other, image=other_image, disease_name='Psoriasis', confidence_score=80, recommendation='-')
+            SharedReport.objects.create(report=other_result, doctor=doctor)
+
+            day = datetime.date.today() - datetime.timedelta(days=i % 7)
+            Appointment.objects.create(patient=other, doctor=doctor, date=day, time_slot='10:00 AM')
+            Appointment.objects.create(patient=patient, doctor=other_doctor, date=day, time_slot='11:00 AM')
+            DoctorDocument.objects.create(
+                doctor=other_doctor, patient=patient, name=f'Doc {i}', document=ContentFile(b'-', name=f'doc{i}.txt')
+            )
+            Notification.objects.create(user=patient, title=f'N{i}', message='-', type='SYSTEM')
+            session_id = str(uuid.uuid4())
+            sessions.record_message(patient, 'user', f'Question {i}', session_id)
+            sessions.record_message(patient, 'bot', f'Answer {i}', session_id)
+        self.seeded = upto
+
+    def measure(self, method, url, user):
+        client = APIClient()
+        # A fresh instance, as the authentication layer would hand to the view
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        cache.clear()
+        with record_queries() as recorder:
+            response = getattr(client, method)(url)
+        self.assertLess(response.status_code, 400, f'{url}: {response.status_code} {getattr(response, "data", "")}')
+        return recorder
+
+    def test_query_budgets(self):
+        self.seed(SMALL)
+        small = {url: len(self.measure(method, url, self.users[role])) for method, url, role, _ in BUDGETS}
+        self.seed(LARGE)
+        for method, url, role, budget in BUDGETS:
+            with self.subTest(url=url, role=role):
+                large = self.measure(method, url, self.users[role])
+                self.assertEqual(
+                    small[url], len(large),
+                    f'{url}: query count grows with rows ({SMALL} rows: {small[url]}, {LARGE} rows: {len(large)})\n'
+                    f'{large.report()}'
+                )
+                self.assertLessEqual(len(large), budget, f'{url}: over its budget of {budget} queries\n{large.report()}')
+                self.assertLess(large.elapsed, MAX_SECONDS, f'{url}: slower than {MAX_SECONDS}s\n{large.report()}')
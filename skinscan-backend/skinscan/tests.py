@@ -0,0 +1,490 @@
+import asyncio
+import datetime
+import json
+import time
+import uuid
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import jwt
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient, AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from rest_framework.renderers import JSONRenderer
+
+from authentication.jwt_auth import generate_jwt_token
+from authentication.models import Notification, User, UserProfile
+from authentication.notification_serializers import NOTIFICATION_ROWS, NotificationSerializer
+from authentication.serializers import USER_PROFILE_ROW, UserSerializer
+from authentication.tokens import revoke_user_tokens
+from prediction.models import PredictionResult, ScanHistory, SkinImage
+from prediction.serializers import SCAN_HISTORY_ROWS, ScanHistorySerializer
+
+from . import llm_client, middleware
+from .async_views import AsyncAPIView, api_response
+from .models import Lease
+from .provider_health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .renderers import ORJSON_AVAILABLE, FastJSONRenderer
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'skinscan-tests'}}
+
+
+# ============================================
+# CIRCUIT BREAKERS
+# ============================================
+@override_settings(CACHES=LOCMEM, PROVIDER_MIN_CALLS=4, PROVIDER_ERROR_RATE=0.5, PROVIDER_OPEN_SECONDS=5.0)
+class CircuitBreakerTests(TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker('test-provider')
+        self.breaker.reset()
+
+    def trip(self):
+        for _ in range(4):
+            self.breaker.record_failure(0.1, 'HTTP 503')
+        self.assertEqual(self.breaker._load()['state'], OPEN)
+
+    def end_wait(self):
+        data = self.breaker._load()
+        data['open_until'] = time.time() - 1
+        self.breaker._save(data)
+
+    def test_opens_on_error_rate_and_refuses_calls(self):
+        for _ in range(3):
+            self.breaker.record_success(0.2)
+        self.assertEqual(self.breaker._load()['state'], CLOSED)
+        self.assertIs(self.breaker.allow_request(), True)
+        self.trip()
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_single_probe_closes_the_breaker(self):
+        self.trip()
+        self.end_wait()
+        probe = self.breaker.allow_request()
+        self.assertIsInstance(probe, str)
+        self.assertFalse(self.breaker.allow_request())
+
+        # A worker that missed the HALF_OPEN write still can't probe: the lease is held
+        data = self.breaker._load()
+        data['probe_until'] = 0
+        self.breaker._save(data)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success(0.3, probe)
+        self.assertEqual(self.breaker._load()['state'], CLOSED)
+        self.assertFalse(Lease.objects.exists())
+
+    def test_outcomes_without_the_probe_token_are_ignored_in_half_open(self):
+        self.trip()
+        self.end_wait()
+        probe = self.breaker.allow_request()
+
+        # Calls admitted before the breaker opened finish now
+        self.breaker.record_success(0.2)
+        self.breaker.record_failure(0.2, 'timeout')
+        self.assertEqual(self.breaker._load()['state'], HALF_OPEN)
+
+        self.breaker.record_failure(0.2, 'HTTP 500', probe)
+        data = self.breaker._load()
+        self.assertEqual((data['state'], data['opened']), (OPEN, 2))
+        self.assertGreater(data['open_until'], time.time() + 9)  # Wait doubled
+
+    def test_expired_probe_lease_is_taken_over(self):
+        self.trip()
+        self.end_wait()
+        stuck = self.breaker.allow_request()
+        data = self.breaker._load()
+        data['probe_until'] = 0
+        self.breaker._save(data)
+        Lease.objects.update(expires_at='2000-01-01T00:00:00Z')
+
+        probe = self.breaker.allow_request()
+        self.assertIsInstance(probe, str)
+        self.assertNotEqual(probe, stuck)
+        self.breaker.record_success(0.1, stuck)
+        self.assertEqual(self.breaker._load()['state'], HALF_OPEN)
+
+    def test_abandoned_probe_lets_the_next_call_probe(self):
+        self.trip()
+        self.end_wait()
+        probe = self.breaker.allow_request()
+        self.breaker.abandon(probe)
+        data = self.breaker._load()
+        self.assertEqual((data['state'], data['opened']), (HALF_OPEN, 1))  # Not judged either way
+        self.assertFalse(Lease.objects.exists())
+
+        self.breaker.abandon(True)  # Calls that weren't the probe have nothing to give up
+        self.assertIsInstance(self.breaker.allow_request(), str)
+
+    def test_reset_closes_and_frees_the_probe(self):
+        self.trip()
+        self.end_wait()
+        self.breaker.allow_request()
+        self.breaker.reset()
+        self.assertEqual(self.breaker.status()['state'], CLOSED)
+        self.assertFalse(Lease.objects.exists())
+
+
+class AsyncCancellationTests(TestCase):
+
+    def test_cancelled_probe_call_is_abandoned(self):
+        async def slow_send(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        breaker = mock.Mock(allow_request=mock.Mock(return_value='probe-token'))
+        client = mock.Mock(send=slow_send)
+
+        async def hedge_loses():
+            task = asyncio.ensure_future(llm_client.apost('gemini', 'https://example.test', {}))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with mock.patch('skinscan.llm_client.get_breaker', return_value=breaker), \
+                mock.patch('skinscan.llm_client.get_async_client', return_value=client):
+            asyncio.run(hedge_loses())
+        breaker.abandon.assert_called_once_with('probe-token')
+        breaker.record_failure.assert_not_called()
+
+
+# ============================================
+# LLM CLIENT RETRIES
+# ============================================
+def _responses(*statuses):
+    return [mock.Mock(status_code=status) for status in statuses]
+
+
+@override_settings(LLM_MAX_RETRIES=2)
+@mock.patch('skinscan.llm_client._backoff', return_value=0)
+class LLMClientRetryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.breaker = mock.Mock(allow_request=mock.Mock(return_value=True))
+        patcher = mock.patch('skinscan.llm_client.get_breaker', return_value=self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, *outcomes):
+        session = mock.Mock()
+        session.post.side_effect = outcomes
+        with mock.patch('skinscan.llm_client.get_session', return_value=session):
+            return llm_client.post('gemini', 'https://example.test', {}), session.post
+
+    def test_throttling_and_gateway_errors_are_retried(self, _):
+        for status in (429, 502, 503, 504):
+            with self.subTest(status=status):
+                first, second = _responses(status, 200)
+                response, post = self.post(first, second)
+                self.assertIs(response, second)
+                self.assertEqual(post.call_count, 2)
+                first.close.assert_called_once()
+
+        self.assertEqual(self.breaker.record_response.call_args.args[0], 200)  # Only the final answer is judged
+
+    def test_client_errors_are_not_retried(self, _):
+        for status in (400, 401, 403, 404):
+            with self.subTest(status=status):
+                response, post = self.post(*_responses(status, 200))
+                self.assertEqual((response.status_code, post.call_count), (status, 1))
+
+    def test_retries_stop_at_the_limit_or_the_deadline(self, backoff):
+        response, post = self.post(*_responses(503, 503, 503, 200))
+        self.assertEqual((response.status_code, post.call_count), (503, 3))
+
+        backoff.return_value = 60  # Longer than the request timeout
+        response, post = self.post(*_responses(503, 200))
+        self.assertEqual((response.status_code, post.call_count), (503, 1))
+
+    def test_connect_errors_are_retried_but_read_timeouts_are_not(self, _):
+        ok = mock.Mock(status_code=200)
+        with self.assertLogs('skinscan.llm_client', 'INFO'):
+            response, post = self.post(requests.ConnectionError('refused'), ok)
+        self.assertEqual((response, post.call_count), (ok, 2))
+
+        with self.assertRaises(requests.ReadTimeout):
+            self.post(requests.ReadTimeout('slow'), ok)
+        self.breaker.record_failure.assert_called_once()
+
+    def test_async_client_follows_the_same_policy(self, _):
+        first, second = _responses(429, 200)
+        first.aclose = mock.AsyncMock()
+        client = mock.Mock(send=mock.AsyncMock(side_effect=[first, second]))
+        with mock.patch('skinscan.llm_client.get_async_client', return_value=client), \
+                self.assertLogs('skinscan.llm_client', 'INFO'):
+            response = asyncio.run(llm_client.apost('gemini', 'https://example.test', {}))
+        self.assertIs(response, second)
+        first.aclose.assert_awaited_once()
+
+        client = mock.Mock(send=mock.AsyncMock(side_effect=_responses(400, 200)))
+        with mock.patch('skinscan.llm_client.get_async_client', return_value=client):
+            response = asyncio.run(llm_client.apost('gemini', 'https://example.test', {}))
+        self.assertEqual((response.status_code, client.send.await_count), (400, 1))
+
+
+# ============================================
+# ASYNC API VIEWS
+# ============================================
+class _EchoView(AsyncAPIView):
+
+    async def get(self, request):
+        return api_response({'user_id': request.user.id, 'data': request.data})
+
+    async def post(self, request):
+        return api_response({'user_id': request.user.id, 'data': request.data})
+
+
+@override_settings(CACHES=LOCMEM)
+class AsyncAPIViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='async-view@test.com', account_status='ACTIVE')
+        self.auth = f'Bearer {generate_jwt_token(self.user)}'
+        self.view = _EchoView.as_view()
+
+    async def call(self, method='post', data=None, content_type='application/json', auth=None):
+        factory = AsyncRequestFactory()
+        headers = {'Authorization': auth} if auth else {}
+        if method == 'get':
+            return await self.view(factory.get('/', headers=headers))
+        return await self.view(factory.post('/', data, content_type=content_type, headers=headers))
+
+    def assertError(self, response, status, error_code, message=None):
+        body = json.loads(response.content)
+        self.assertEqual((response.status_code, body['status'], body['error_code']), (status, 'error', error_code))
+        if message:
+            self.assertEqual(body['message'], message)
+
+    async def test_missing_credentials_are_401(self):
+        self.assertError(await self.call(data={}), 401, 'not_authenticated')
+
+    async def test_bad_tokens_are_401(self):
+        expired = jwt.encode({'type': 'access', 'user_id': self.user.id, 'account_status': 'ACTIVE',
+                              'exp': datetime.datetime.utcnow() - datetime.timedelta(seconds=1)},
+                             settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        cases = {
+            'Token abc': 'Invalid token prefix',
+            'Bearer': 'Invalid authorization header format',
+            'Bearer not-a-jwt': 'Invalid token',
+            f'Bearer {expired}': 'Token has expired',
+        }
+        for header, message in cases.items():
+            with self.subTest(header=header[:12]):
+                response = await self.call(data={}, auth=header)
+                self.assertError(response, 401, 'authentication_failed', message)
+
+    async def test_locked_and_revoked_tokens_are_401(self):
+        locked = await sync_to_async(generate_jwt_token)(User(id=self.user.id, email='x', account_status='LOCKED'))
+        response = await self.call(data={}, auth=f'Bearer {locked}')
+        self.assertError(response, 401, 'authentication_failed', 'Account is locked')
+
+        await sync_to_async(revoke_user_tokens)(self.user.id)
+        self.assertError(await self.call(data={}, auth=self.auth), 401, 'authentication_failed', 'Token has been revoked')
+
+    async def test_body_is_parsed_into_request_data(self):
+        response = await self.call(data={'message': 'hi'}, auth=self.auth)
+        self.assertEqual(json.loads(response.content), {'user_id': self.user.id, 'data': {'message': 'hi'}})
+
+        response = await self.call(data='message=hi&x=1', content_type='application/x-www-form-urlencoded', auth=self.auth)
+        self.assertEqual(json.loads(response.content)['data'], {'message': 'hi', 'x': '1'})
+        response = await self.call('get', auth=self.auth)
+        self.assertEqual(json.loads(response.content)['data'], {})
+
+    async def test_unparseable_json_is_400(self):
+        for body in ('{"message": ', '["not", "an", "object"]', '\xff'):
+            with self.subTest(body=body):
+                response = await self.call(data=body, auth=self.auth)
+                self.assertError(response, 400, 'parse_error', 'JSON parse error')
+
+
+# ============================================
+# PATH-AWARE MIDDLEWARE
+# ============================================
+@override_settings(API_PATH_PREFIX='/api/')
+class WebOnlyMiddlewareTests(SimpleTestCase):
+    MIDDLEWARE = {
+        middleware.SessionMiddleware: 'session',
+        middleware.AuthenticationMiddleware: 'user',
+        middleware.MessageMiddleware: '_messages',
+    }
+
+    def run_through(self, middleware_class, request):
+        seen = {}
+
+        def view(request):
+            seen['attrs'] = set(vars(request))
+            return HttpResponse()
+
+        if middleware_class is not middleware.SessionMiddleware:
+            middleware.SessionMiddleware(lambda r: None).process_request(request)
+        middleware_class(view)(request)
+        return seen['attrs']
+
+    def test_api_requests_pass_straight_through(self):
+        factory = RequestFactory()
+        for middleware_class, attr in self.MIDDLEWARE.items():
+            with self.subTest(middleware_class.__name__):
+                self.assertNotIn(attr, self.run_through(middleware_class, factory.get('/api/auth/profile')))
+                self.assertIn(attr, self.run_through(middleware_class, factory.get('/admin/')))
+
+    def test_csrf_is_checked_outside_the_api_only(self):
+        csrf = middleware.CsrfViewMiddleware(lambda request: HttpResponse())
+        view = lambda request: HttpResponse()
+        factory = RequestFactory()
+        self.assertIsNone(csrf.process_view(factory.post('/api/scans'), view, (), {}))
+        with self.assertLogs('django.security.csrf', 'WARNING'):
+            self.assertEqual(csrf.process_view(factory.post('/admin/login/'), view, (), {}).status_code, 403)
+
+    def test_subclasses_keep_the_admin_checks_happy(self):
+        for middleware_class in (*self.MIDDLEWARE, middleware.CsrfViewMiddleware):
+            self.assertTrue(issubclass(middleware_class, middleware_class.wrapped))
+            self.assertEqual(middleware_class.__name__, middleware_class.wrapped.__name__)
+
+
+@override_settings(CACHES=LOCMEM, RATELIMIT_ENABLE=False)
+class MiddlewareStackTests(TestCase):
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        user = User.objects.create(email='middleware@test.com', account_status='ACTIVE')
+        self.auth = {'Authorization': f'Bearer {generate_jwt_token(user)}'}
+
+    def assertNoSessionOrCsrf(self, response):
+        self.assertNotIn('csrftoken', response.cookies)
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_api_responses_carry_no_session_or_csrf_cookie(self):
+        response = self.client.get('/api/auth/profile', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNoSessionOrCsrf(response)
+
+        response = self.client.post('/api/auth/login', {'email': 'nobody@test.com', 'password': 'x'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)  # Reached the view without a CSRF token
+        self.assertNoSessionOrCsrf(response)
+
+    async def test_async_api_view_too(self):
+        response = await AsyncClient().get('/api/auth/notifications/stream', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNoSessionOrCsrf(response)
+
+    def test_admin_keeps_csrf_protection(self):
+        response = self.client.get('/admin/login/')
+        self.assertIn('csrftoken', response.cookies)
+        self.assertIn('Cookie', response['Vary'])
+
+        with self.assertLogs('django.security.csrf', 'WARNING'):
+            response = self.client.post('/admin/login/', {'username': 'admin@test.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.post('/admin/login/', {
+            'username': 'admin@test.com', 'password': 'x', 'csrfmiddlewaretoken': self.client.cookies['csrftoken'].value
+        })
+        self.assertEqual(response.status_code, 200)  # Form redisplayed with the login error
+
+
+# ============================================
+# FAST SERIALIZATION
+# ============================================
+class ProjectionTests(TestCase):
+    """Each Projection must produce exactly the JSON of the serializer it replaced."""
+
+    def assertSameOutput(self, projected, serialized):
+        self.assertEqual(list(projected), list(serialized))  # Key order too
+        self.assertEqual(projected, dict(serialized))
+        self.assertEqual(JSONRenderer().render(projected), JSONRenderer().render(serialized))
+
+    def profile_pairs(self):
+        full = User.objects.create(email='full@test.com', account_status='ACTIVE', last_login=datetime.datetime(
+            2024, 3, 1, 23, 30, 15, 123456, tzinfo=datetime.timezone.utc))
+        UserProfile.objects.create(user=full, first_name='Ana', last_name='Lee', phone='555', gender='F',
+                                   date_of_birth=datetime.date(1990, 5, 17), avatar='avatars/ana.png', skin_type='Dry')
+        bare = User.objects.create(email='bare@test.com', account_status='ACTIVE')
+        UserProfile.objects.create(user=bare)  # Null avatar and date of birth
+        legacy = User.objects.create(email='legacy@test.com', account_status='ACTIVE',
+                                     date_of_birth=datetime.date(1985, 1, 2))  # No profile row at all
+
+        for user in (full, bare, legacy):
+            yield (USER_PROFILE_ROW.one(User.objects.filter(id=user.id)),
+                   UserSerializer(User.objects.get(id=user.id)).data)
+
+    def test_user_profile_row(self):
+        for projected, serialized in self.profile_pairs():
+            with self.subTest(email=projected['email']):
+                self.assertSameOutput(projected, serialized)
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_user_profile_row_in_another_timezone(self):
+        for projected, serialized in self.profile_pairs():
+            self.assertSameOutput(projected, serialized)
+        self.assertTrue(projected['created_at'].endswith('+05:30'))
+
+    def test_scan_history_rows(self):
+        user = User.objects.create(email='scans@test.com', account_status='ACTIVE')
+        for index, (disease, title) in enumerate((('Eczema', 'Left arm'), (None, ''))):
+            image = SkinImage.objects.create(user=user, image_url=f'https://storage/scans/{index}.jpg',
+                                             original_filename='a.jpg', file_size=10)
+            result = PredictionResult.objects.create(user=user, image=image, disease_name=disease,
+                                                     confidence_score=87.5, recommendation='-')
+            ScanHistory.objects.create(user=user, image=image, result=result, title=title,
+                                       severity_tag='Mild' if index == 0 else '', is_bookmarked=index == 0)
+
+        scans = ScanHistory.objects.filter(user=user)
+        serialized = ScanHistorySerializer([{
+            'id': scan.id, 'title': scan.title, 'body_location': scan.body_location,
+            'disease_name': scan.result.disease_name, 'confidence': scan.result.confidence_score,
+            'image_url': scan.image.image_url, 'date': scan.created_at, 'severity': scan.severity_tag,
+            'notes': scan.notes, 'is_bookmarked': scan.is_bookmarked,
+        } for scan in scans], many=True).data
+        projected = SCAN_HISTORY_ROWS.many(scans)
+
+        self.assertEqual(len(projected), 2)
+        for row, expected in zip(projected, serialized):
+            self.assertSameOutput(row, expected)
+
+    def test_notification_rows(self):
+        user = User.objects.create(email='notes@test.com', account_status='ACTIVE')
+        Notification.objects.create(user=user, title='Scan ready', message='Done \u2028', type='SCAN_COMPLETED')
+        Notification.objects.create(user=user, title='Read', message='-', type='SYSTEM', is_read=True)
+
+        notifications = Notification.objects.filter(user=user).order_by('id')
+        for row, expected in zip(NOTIFICATION_ROWS.many(notifications), NotificationSerializer(notifications, many=True).data):
+            self.assertSameOutput(row, expected)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+
+    DATA = {
+        'status': 'success',
+        'data': {
+            'when': datetime.datetime(2024, 3, 1, 23, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 3, 1),
+            'id': uuid.UUID(int=7),
+            'price': Decimal('12.50'),
+            'numbers': [0, -1, 1.5, 87.25, None, True],
+            'text': 'Café \u2028 \u2029 "quoted" </script>',
+            7: 'non-string key',
+        },
+    }
+
+    @skipUnless(ORJSON_AVAILABLE, 'orjson is not installed')
+    def test_orjson_output_matches_json_renderer(self):
+        expected = JSONRenderer().render(self.DATA)
+        with mock.patch.object(JSONRenderer, 'render', side_effect=AssertionError('fell back')):
+            self.assertEqual(FastJSONRenderer().render(self.DATA), expected)
+
+    def test_unsupported_output_falls_back_to_json_renderer(self):
+        data = {**self.DATA, 'big': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        context = {'indent': 2}
+        self.assertEqual(FastJSONRenderer().render(self.DATA, 'application/json', context),
+                         JSONRenderer().render(self.DATA, 'application/json', context))
+
+    def test_tiny_floats_differ_only_in_notation(self):
+        data = {'values': [0.00001, 1e16, 1e-7]}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
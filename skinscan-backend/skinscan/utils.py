@@ -28,3 +28,12 @@ def custom_exception_handler(exc, context):
         response.data = custom_response
 
     return response
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None for an empty list)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return round(ordered[index], 2)
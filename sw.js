@@ -14,6 +14,8 @@ const ASSETS_TO_CACHE = [
     '/disease-info.html',
     '/style.css',
     '/doctor-dashboard.css',
+    '/auth-session.js',
+    '/notification-stream.js',
     '/script.js',
     '/doctor-dashboard.js',
     '/manifest.json',